@@ -23,8 +23,15 @@ hiddenimports = [
     'flask',
     'werkzeug',
     'requests',
+    # 以下模块通过 startup.lazy_import 按名称延迟导入，PyInstaller无法自动发现
     'google.generativeai',
+    'google.genai',
+    'google.genai.types',
     'tencentcloud',
+    'tencentcloud.ai3d.v20250513.ai3d_client',
+    'tencentcloud.ai3d.v20250513.models',
+    'waitress',
+    'brotli',
 ]
 
 a = Analysis(
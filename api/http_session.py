@@ -0,0 +1,147 @@
+"""
+共享HTTP连接池 - 下载3D模型、视频参考图等所有出站HTTP请求复用同一组keep-alive连接
+
+直接调用 requests.get 每次都要重新建立TCP连接和TLS握手（到腾讯云COS、Google存储往返几百毫秒），
+共享的 Session 会按主机保留空闲连接，同一台主机的后续下载直接复用。
+
+    from api.http_session import get_session
+    response = get_session().get(url, timeout=request_timeout(60))
+
+连接建立失败（连接被重置、DNS临时失败等）在连接池层面快速重试；
+HTTP错误状态码和超时由调用方的 call_with_retry 按共享的重试策略处理，避免两层重试叠加。
+
+环境变量：
+    HTTP_POOL_CONNECTIONS   缓存连接池的主机数，默认 10
+    HTTP_POOL_MAXSIZE       每台主机最多保留的连接数，默认 16（与 SERVER_THREADS 一致）
+    HTTP_CONNECT_TIMEOUT    建立连接的超时秒数，默认 5
+    HTTP_READ_TIMEOUT       等待响应数据的超时秒数（调用方未指定时），默认 60
+    HTTP_MAX_RETRIES        连接失败时的重试次数，默认 2
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_config():
+    return {
+        'pool_connections': int(os.getenv('HTTP_POOL_CONNECTIONS', '10')),
+        'pool_maxsize': int(os.getenv('HTTP_POOL_MAXSIZE', '16')),
+        'connect_timeout': float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+        'read_timeout': float(os.getenv('HTTP_READ_TIMEOUT', '60')),
+        'max_retries': int(os.getenv('HTTP_MAX_RETRIES', '2')),
+    }
+
+
+def request_timeout(read_timeout: float = None):
+    """(连接超时, 读取超时)，读取超时未指定时使用 HTTP_READ_TIMEOUT"""
+    config = _pool_config()
+    return (config['connect_timeout'], read_timeout if read_timeout is not None else config['read_timeout'])
+
+
+def async_request_timeout(read_timeout: float = None):
+    """request_timeout 的 httpx 版本"""
+    import httpx
+
+    connect_timeout, read_timeout = request_timeout(read_timeout)
+    return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+
+class _TimeoutAdapter(HTTPAdapter):
+    """调用方没有传 timeout 时使用默认超时，避免请求无限期挂起"""
+
+    def __init__(self, default_timeout, **kwargs):
+        self.default_timeout = default_timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout if timeout is not None else self.default_timeout, **kwargs)
+
+
+def create_session() -> requests.Session:
+    """按环境变量配置创建带连接池的Session"""
+    config = _pool_config()
+    retry = Retry(
+        total=config['max_retries'],
+        connect=config['max_retries'],
+        # 已发出的请求不在这一层重试，状态码也交给 call_with_retry
+        read=0,
+        status=0,
+        backoff_factor=0.2,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    adapter = _TimeoutAdapter(
+        (config['connect_timeout'], config['read_timeout']),
+        pool_connections=config['pool_connections'],
+        pool_maxsize=config['pool_maxsize'],
+        max_retries=retry,
+        # 连接都被占用时等待空闲连接，而不是临时新建后丢弃
+        pool_block=True,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'HLTraining/1.0'
+    return session
+
+
+# 全局实例
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """获取共享的Session（单例模式，requests.Session 可以在多个线程中同时使用）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+                logger.debug("🔌 已创建共享HTTP连接池")
+    return _session
+
+
+def reset_session():
+    """关闭并丢弃共享Session（gunicorn fork 之后或测试中使用）"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+# 每个事件循环一个httpx连接池（httpx.AsyncClient 不能跨事件循环使用）
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """获取当前事件循环的 httpx.AsyncClient；没有安装httpx时抛出ImportError"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        config = _pool_config()
+        client = httpx.AsyncClient(
+            follow_redirects=True,
+            headers={'User-Agent': 'HLTraining/1.0'},
+            timeout=async_request_timeout(),
+            # httpx 的 retries 只重试连接失败，与 requests 这边的配置一致；
+            # httpx 没有按主机的连接上限，总连接数按 主机数 × 每台主机连接数 估算
+            transport=httpx.AsyncHTTPTransport(
+                retries=config['max_retries'],
+                limits=httpx.Limits(max_connections=config['pool_connections'] * config['pool_maxsize'],
+                                    max_keepalive_connections=config['pool_maxsize']),
+            ),
+        )
+        _async_clients[loop] = client
+    return client
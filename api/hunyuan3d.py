@@ -7,21 +7,26 @@ import os
 import base64
 import json
 import uuid
-import time
-import requests
+import logging
 from PIL import Image
-from tencentcloud.common import credential
-from tencentcloud.common.profile.client_profile import ClientProfile
-from tencentcloud.common.profile.http_profile import HttpProfile
-from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+from api.rate_limiter import get_scheduler
+from api.retry_policy import RetryPolicy
+from api import upstream
+from api.upstream import UpstreamCall, Sleep, run_steps, run_steps_async
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
 
 class Hunyuan3DGenerator:
+    # 腾讯云SDK的异常类型，SDK导入后才设置
+    _sdk_error_types = ()
+
     def __init__(self):
         # 确保models文件夹存在
         self.models_folder = "models"
         if not os.path.exists(self.models_folder):
             os.makedirs(self.models_folder)
-            print(f"✅ 创建模型目录: {self.models_folder}")
+            logger.info(f"✅ 创建模型目录: {self.models_folder}")
         
         # 初始化腾讯云客户端
         self._init_tencent_client()
@@ -29,13 +34,17 @@ class Hunyuan3DGenerator:
     def _init_tencent_client(self):
         """初始化腾讯云AI3D客户端"""
         try:
-            # 尝试导入AI3D模块
+            # 尝试导入AI3D模块（腾讯云SDK较大，第一次生成3D模型时才导入）
             try:
-                from tencentcloud.ai3d.v20250513 import ai3d_client, models
-                self.ai3d_client = ai3d_client
-                self.models = models
+                self.ai3d_client = lazy_import('tencentcloud.ai3d.v20250513.ai3d_client')
+                self.models = lazy_import('tencentcloud.ai3d.v20250513.models')
+                from tencentcloud.common import credential
+                from tencentcloud.common.profile.client_profile import ClientProfile
+                from tencentcloud.common.profile.http_profile import HttpProfile
+                from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+                self._sdk_error_types = (TencentCloudSDKException,)
             except ImportError:
-                print("⚠️ 腾讯云AI3D SDK未安装，请运行: pip install tencentcloud-sdk-python-ai3d")
+                logger.warning("⚠️ 腾讯云AI3D SDK未安装，请运行: pip install tencentcloud-sdk-python-ai3d")
                 self.client = None
                 return
             
@@ -48,7 +57,7 @@ class Hunyuan3DGenerator:
                 secret_key = os.getenv("TENCENTCLOUD_SECRET_KEY")
                 
                 if not secret_id or not secret_key:
-                    print("⚠️ 未找到腾讯云密钥，请设置TENCENTCLOUD_SECRET_ID和TENCENTCLOUD_SECRET_KEY环境变量")
+                    logger.warning("⚠️ 未找到腾讯云密钥，请设置TENCENTCLOUD_SECRET_ID和TENCENTCLOUD_SECRET_KEY环境变量")
                     self.client = None
                     return
                 
@@ -57,6 +66,8 @@ class Hunyuan3DGenerator:
             # 实例化HTTP选项
             httpProfile = HttpProfile()
             httpProfile.endpoint = "ai3d.tencentcloudapi.com"
+            # 提交任务和之后的数十次状态查询复用同一个连接
+            httpProfile.keepAlive = True
             
             # 实例化client选项
             clientProfile = ClientProfile()
@@ -65,23 +76,31 @@ class Hunyuan3DGenerator:
             # 实例化AI3D客户端
             self.client = self.ai3d_client.Ai3dClient(cred, "ap-guangzhou", clientProfile)
             
-            print("✅ 腾讯云AI3D客户端初始化成功")
+            logger.info("✅ 腾讯云AI3D客户端初始化成功")
             
         except Exception as e:
-            print(f"❌ 腾讯云客户端初始化失败: {str(e)}")
+            logger.error(f"❌ 腾讯云客户端初始化失败: {str(e)}")
             self.client = None
     
-    def generate_3d_model(self, image_path):
+    def generate_3d_model(self, image_path, output_dir=None):
         """从2D图片生成3D模型"""
+        return run_steps(self.generate_3d_model_steps(image_path, output_dir))
+    
+    async def generate_3d_model_async(self, image_path, output_dir=None):
+        """从2D图片生成3D模型（协程版本，轮询等待期间不占用线程）"""
+        return await run_steps_async(self.generate_3d_model_steps(image_path, output_dir))
+    
+    def generate_3d_model_steps(self, image_path, output_dir=None):
+        """3D模型生成流程（生成器，见 api/upstream.py）；output_dir为模型保存目录，默认models"""
         try:
-            print("🎯 开始生成3D模型...")
+            logger.info("🎯 开始生成3D模型...")
             
             # 检查AI3D API是否可用
             if not self.client:
                 raise Exception("❌ 腾讯云AI3D服务不可用，请检查API密钥配置")
             
             # 使用腾讯云AI3D API生成3D模型
-            model_path = self._generate_with_ai3d_api(image_path)
+            model_path = yield from self._generate_with_ai3d_api_steps(image_path, output_dir)
             if model_path:
                 return model_path
             
@@ -89,13 +108,13 @@ class Hunyuan3DGenerator:
             raise Exception("❌ 腾讯云AI3D服务调用失败，请稍后重试")
             
         except Exception as e:
-            print(f"❌ 3D模型生成错误: {str(e)}")
+            logger.error(f"❌ 3D模型生成错误: {str(e)}")
             raise e
     
-    def _generate_with_ai3d_api(self, image_path):
+    def _generate_with_ai3d_api_steps(self, image_path, output_dir=None):
         """使用腾讯云AI3D API生成3D模型"""
         try:
-            print("🚀 调用腾讯云AI3D API...")
+            logger.info("🚀 调用腾讯云AI3D API...")
             
             # 检查客户端和模型是否可用
             if not self.client or not hasattr(self, 'models'):
@@ -114,30 +133,34 @@ class Hunyuan3DGenerator:
             }
             req.from_json_string(json.dumps(params))
             
-            # 提交3D生成任务
-            resp = self.client.SubmitHunyuanTo3DJob(req)
-            result = json.loads(resp.to_json_string())
-            
-            if 'JobId' in result:
-                job_id = result['JobId']
-                print(f"✅ 3D生成任务已提交，JobId: {job_id}")
+            # 提交3D生成任务并轮询状态（混元3D限制同时运行的任务数，任务完成前一直占用并发名额）
+            model_url = None
+            slot = yield get_scheduler().acquire('hunyuan3d')
+            with slot:
+                resp = yield UpstreamCall(self.client.SubmitHunyuanTo3DJob, req, service='hunyuan3d')
+                result = json.loads(resp.to_json_string())
                 
-                # 轮询任务状态
-                model_url = self._poll_job_status(job_id)
-                if model_url:
-                    # 下载模型文件
-                    return self._download_3d_model(model_url, image_path)
+                if 'JobId' in result:
+                    job_id = result['JobId']
+                    logger.info(f"✅ 3D生成任务已提交，JobId: {job_id}")
+                    
+                    # 轮询任务状态
+                    model_url = yield from self._poll_job_status_steps(job_id)
+            
+            if model_url:
+                # 下载模型文件
+                return (yield from self._download_3d_model_steps(model_url, image_path, output_dir))
             
             return None
             
-        except TencentCloudSDKException as e:
-            print(f"❌ 腾讯云SDK错误: {e}")
+        except self._sdk_error_types as e:
+            logger.error(f"❌ 腾讯云SDK错误: {e}")
             return None
         except Exception as e:
-            print(f"❌ AI3D API调用错误: {str(e)}")
+            logger.error(f"❌ AI3D API调用错误: {str(e)}")
             return None
     
-    def _poll_job_status(self, job_id, max_attempts=30):
+    def _poll_job_status_steps(self, job_id, max_attempts=30):
         """轮询任务状态"""
         try:
             # 检查客户端和模型是否可用
@@ -145,59 +168,63 @@ class Hunyuan3DGenerator:
                 raise Exception("AI3D客户端未初始化")
             
             for attempt in range(max_attempts):
-                print(f"⏳ 检查任务状态... ({attempt + 1}/{max_attempts})")
+                logger.debug(f"⏳ 检查任务状态... ({attempt + 1}/{max_attempts})")
                 
                 # 查询任务状态
                 req = self.models.QueryHunyuanTo3DJobRequest()
                 params = {"JobId": job_id}
                 req.from_json_string(json.dumps(params))
                 
-                resp = self.client.QueryHunyuanTo3DJob(req)
+                resp = yield UpstreamCall(self.client.QueryHunyuanTo3DJob, req, service='hunyuan3d',
+                                          policy=RetryPolicy(max_attempts=3, deadline=30))
                 result = json.loads(resp.to_json_string())
                 
                 if 'Status' in result:
                     status = result['Status']
-                    print(f"📊 任务状态: {status}")
+                    logger.debug(f"📊 任务状态: {status}")
                     
                     if status in ['SUCCESS', 'DONE']:  # 修复：添加DONE状态
                         # 检查是否有模型文件
                         result_files = result.get('ResultFile3Ds', [])
                         if result_files:
                             model_url = result_files[0].get('Url', '')
-                            print(f"🎉 3D模型生成完成: {model_url}")
+                            logger.info(f"🎉 3D模型生成完成: {model_url}")
                             return model_url
                         else:
                             # 尝试旧的字段名
                             model_url = result.get('ModelUrl', '')
                             if model_url:
-                                print(f"🎉 3D模型生成完成: {model_url}")
+                                logger.info(f"🎉 3D模型生成完成: {model_url}")
                                 return model_url
                             else:
-                                print("❌ 3D模型生成完成但未找到下载链接")
+                                logger.error("❌ 3D模型生成完成但未找到下载链接")
                                 return None
                     elif status in ['FAILED', 'ERROR']:
                         error_msg = result.get('ErrorMessage', '生成失败')
-                        print(f"❌ 3D模型生成失败: {error_msg}")
+                        logger.error(f"❌ 3D模型生成失败: {error_msg}")
                         return None
                     elif status in ['PROCESSING', 'PENDING', 'RUN', 'RUNNING']:
-                        time.sleep(10)  # 等待10秒后重试
+                        yield Sleep(10)  # 等待10秒后重试
                         continue
                 
-                time.sleep(5)  # 短暂等待
+                yield Sleep(5)  # 短暂等待
             
-            print("⏰ 任务查询超时")
+            logger.warning("⏰ 任务查询超时")
             return None
             
         except Exception as e:
-            print(f"❌ 任务状态查询错误: {str(e)}")
+            logger.error(f"❌ 任务状态查询错误: {str(e)}")
             return None
     
-    def _download_3d_model(self, model_url, image_path):
+    def _download_3d_model_steps(self, model_url, image_path, output_dir=None):
         """下载GLB格式的3D模型文件"""
         try:
-            print(f"📥 下载GLB格式3D模型...")
+            logger.debug("📥 下载GLB格式3D模型...")
             
-            response = requests.get(model_url, timeout=60)
+            # 通过共享连接池下载（http_get在调用时解析，便于压测替换为假实现）
+            response = yield UpstreamCall(lambda: upstream.http_get(model_url, timeout=60),
+                                          async_func=lambda: upstream.http_get_async(model_url, timeout=60),
+                                          service='model-download')
             if response.status_code == 200:
                 # 生成文件名
                 base_name = os.path.splitext(os.path.basename(image_path))[0]
@@ -205,20 +232,20 @@ class Hunyuan3DGenerator:
                 
                 # 直接保存为GLB文件
                 glb_filename = f"{base_name}_ai3d_{unique_id}.glb"
-                glb_path = os.path.join(self.models_folder, glb_filename)
+                glb_path = os.path.join(output_dir or self.models_folder, glb_filename)
                 
                 with open(glb_path, 'wb') as f:
                     f.write(response.content)
                 
-                print(f"✅ GLB模型下载完成: {glb_path}")
+                logger.info(f"✅ GLB模型下载完成: {glb_path}")
                 return glb_path
                 
             else:
-                print(f"❌ 模型下载失败: {response.status_code}")
+                logger.error(f"❌ 模型下载失败: {response.status_code}")
                 return None
                 
         except Exception as e:
-            print(f"❌ 模型下载错误: {str(e)}")
+            logger.error(f"❌ 模型下载错误: {str(e)}")
             return None
     def _encode_image_to_base64(self, image_path):
         """将图片编码为base64格式"""
@@ -226,7 +253,7 @@ class Hunyuan3DGenerator:
             with open(image_path, 'rb') as image_file:
                 return base64.b64encode(image_file.read()).decode('utf-8')
         except Exception as e:
-            print(f"❌ 图片编码错误: {str(e)}")
+            logger.error(f"❌ 图片编码错误: {str(e)}")
             return None
 
 
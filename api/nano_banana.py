@@ -1,15 +1,37 @@
 import requests
 import os
+import logging
 import json
 import time
+import uuid
 from PIL import Image, ImageOps
 import base64
 import io
-import google.generativeai as genai
+from api.retry_policy import RetryableError, CircuitOpenError
+from api.rate_limiter import RateLimitTimeout
+from api.upstream import UpstreamCall, run_steps, run_steps_async
+from metrics import span
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# google.generativeai 导入较慢，第一次创建客户端时才导入
+genai = None
+
+
+def _load_genai():
+    global genai
+    if genai is None:
+        genai = lazy_import('google.generativeai')
+    return genai
+
 
 class NanoBananaAPI:
     """Nano Banana API类 - 使用Gemini 2.5 Flash Image实现"""
     
+    # 使用的Gemini图像模型（也作为生成结果缓存键的一部分）
+    MODEL_NAME = 'gemini-2.5-flash-image'
+    
     def __init__(self):
         # 从环境变量获取API密钥，优先使用Gemini密钥
         self.api_key = os.getenv('GEMINI_API_KEY') or os.getenv('NANO_BANANA_API_KEY', 'your-nano-banana-api-key-here')
@@ -17,14 +39,47 @@ class NanoBananaAPI:
         
         # 初始化Gemini客户端
         try:
+            _load_genai()
             genai.configure(api_key=self.api_key)
             # 使用真正的Nano Banana模型！
-            self.client = genai.GenerativeModel('gemini-2.5-flash-image')  # 这就是Nano Banana！
-            print("✅ Nano Banana (gemini-2.5-flash-image) API 客户端初始化成功")
+            self.client = genai.GenerativeModel(self.MODEL_NAME)  # 这就是Nano Banana！
+            logger.info("✅ Nano Banana (gemini-2.5-flash-image) API 客户端初始化成功")
         except Exception as e:
-            print(f"❌ Nano Banana API 初始化失败: {str(e)}")
+            logger.error(f"❌ Nano Banana API 初始化失败: {str(e)}")
             self.client = None
     
+    def _content_call(self, contents, client=None, require_image=False):
+        """
+        一次Gemini生成调用（在生成流程中 yield，见 api/upstream.py）
+        
+        每次尝试都经过限流调度器排队，失败时按共享重试策略退避重试，
+        require_image=True 时响应中没有图片也视为可重试的失败。
+        """
+        client = client or self.client
+        
+        def check(response):
+            if require_image and not self._extract_image_parts(response):
+                raise RetryableError("响应中没有找到图片数据")
+        
+        return UpstreamCall(
+            client.generate_content, contents,
+            async_func=client.generate_content_async,
+            service=self.MODEL_NAME, rate_limit=self.MODEL_NAME, validate=check
+        )
+    
+    def _generate_content(self, contents, client=None, require_image=False):
+        """同步调用Gemini生成内容"""
+        return self._content_call(contents, client=client, require_image=require_image).run()
+    
+    def _extract_image_parts(self, response):
+        """从Gemini响应中提取图像字节数据"""
+        if not response or not getattr(response, 'candidates', None):
+            return []
+        content = response.candidates[0].content
+        if not content or not content.parts:
+            return []
+        return [part.inline_data.data for part in content.parts if part.inline_data]
+    
     def convert_image_for_video(self, image_path, aspect_ratio='16:9', padding_mode='ai'):
         """
         将图片转换为指定宽高比，用于视频生成
@@ -47,9 +102,9 @@ class NanoBananaAPI:
             img = Image.open(image_path)
             original_width, original_height = img.size
             
-            print(f"📐 原始图片尺寸: {original_width}x{original_height}")
-            print(f"� 目标宽高比: {aspect_ratio}")
-            print(f"�🎨 填充模式: {padding_mode}")
+            logger.debug(f"📐 原始图片尺寸: {original_width}x{original_height}")
+            logger.debug(f"📐 目标宽高比: {aspect_ratio}")
+            logger.debug(f"🎨 填充模式: {padding_mode}")
             
             # 计算目标尺寸
             if aspect_ratio == '16:9':
@@ -63,16 +118,16 @@ class NanoBananaAPI:
                 target_height = int(target_width * 16 / 9)
                 is_landscape = False
             else:
-                print(f"⚠️ 不支持的宽高比: {aspect_ratio}，使用原图")
+                logger.warning(f"⚠️ 不支持的宽高比: {aspect_ratio}，使用原图")
                 return image_path
             
-            print(f"🎯 目标尺寸: {target_width}x{target_height}")
+            logger.debug(f"🎯 目标尺寸: {target_width}x{target_height}")
             
             # 如果原图已经符合或超过目标比例，进行裁剪
             if is_landscape:
                 # 横屏模式：检查宽度
                 if original_width / original_height >= 16 / 9:
-                    print("✂️ 图片已经足够宽，进行中心裁剪")
+                    logger.debug("✂️ 图片已经足够宽，进行中心裁剪")
                     left = (original_width - target_width) // 2
                     img_converted = img.crop((left, 0, left + target_width, target_height))
                 else:
@@ -84,7 +139,7 @@ class NanoBananaAPI:
             else:
                 # 竖屏模式：检查高度
                 if original_height / original_width >= 16 / 9:
-                    print("✂️ 图片已经足够高，进行中心裁剪")
+                    logger.debug("✂️ 图片已经足够高，进行中心裁剪")
                     top = (original_height - target_height) // 2
                     img_converted = img.crop((0, top, target_width, top + target_height))
                 else:
@@ -101,14 +156,12 @@ class NanoBananaAPI:
             output_path = os.path.join(self.upload_folder, output_filename)
             
             img_converted.save(output_path)
-            print(f"✅ 图片已转换为{aspect_ratio}: {output_path}")
+            logger.info(f"✅ 图片已转换为{aspect_ratio}: {output_path}")
             
             return output_path
             
         except Exception as e:
-            print(f"❌ 图片转换失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ 图片转换失败: {str(e)}")
             return image_path  # 转换失败时返回原图
     
     def _apply_horizontal_padding(self, img, target_width, target_height, padding_width, padding_mode):
@@ -116,17 +169,17 @@ class NanoBananaAPI:
         from PIL import ImageFilter
         
         if padding_mode == 'black':
-            print("⬛ 使用黑边填充（横向）")
+            logger.debug("⬛ 使用黑边填充（横向）")
             canvas = Image.new('RGB', (target_width, target_height), (0, 0, 0))
             canvas.paste(img, (padding_width, 0))
             return canvas
             
         elif padding_mode == 'ai':
-            print("🤖 使用AI智能填充（横向）")
+            logger.debug("🤖 使用AI智能填充（横向）")
             return self._ai_horizontal_padding(img, target_width, target_height, padding_width)
             
         else:  # blur
-            print("🌫️ 使用模糊边缘填充（横向）")
+            logger.debug("🌫️ 使用模糊边缘填充（横向）")
             canvas = Image.new('RGB', (target_width, target_height), (240, 240, 240))
             
             if padding_width > 10:
@@ -152,17 +205,17 @@ class NanoBananaAPI:
         from PIL import ImageFilter
         
         if padding_mode == 'black':
-            print("⬛ 使用黑边填充（纵向）")
+            logger.debug("⬛ 使用黑边填充（纵向）")
             canvas = Image.new('RGB', (target_width, target_height), (0, 0, 0))
             canvas.paste(img, (0, padding_height))
             return canvas
             
         elif padding_mode == 'ai':
-            print("🤖 使用AI智能填充（纵向）")
+            logger.debug("🤖 使用AI智能填充（纵向）")
             return self._ai_vertical_padding(img, target_width, target_height, padding_height)
             
         else:  # blur
-            print("🌫️ 使用模糊边缘填充（纵向）")
+            logger.debug("🌫️ 使用模糊边缘填充（纵向）")
             canvas = Image.new('RGB', (target_width, target_height), (240, 240, 240))
             
             if padding_height > 10:
@@ -186,7 +239,7 @@ class NanoBananaAPI:
     def _ai_horizontal_padding(self, img, target_width, target_height, padding_width):
         """使用AI智能填充横向边缘（生成新像素，而非拉伸）"""
         try:
-            print("🔮 正在使用AI生成横向边缘填充...")
+            logger.info("🔮 正在使用AI生成横向边缘填充...")
             
             # 创建提示词，让AI扩展图片边缘
             extend_prompt = """
@@ -199,17 +252,13 @@ class NanoBananaAPI:
 """
             
             # 调用Gemini进行图像扩展
-            response = self.client.generate_content([
+            response = self._generate_content([
                 extend_prompt,
                 img
             ])
             
             # 提取生成的图像
-            image_parts = [
-                part.inline_data.data
-                for part in response.candidates[0].content.parts
-                if part.inline_data
-            ]
+            image_parts = self._extract_image_parts(response)
             
             if image_parts:
                 # 加载AI生成的扩展图像
@@ -218,20 +267,20 @@ class NanoBananaAPI:
                 # 调整到目标尺寸
                 ai_img_resized = ai_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
                 
-                print("✨ AI横向填充完成")
+                logger.info("✨ AI横向填充完成")
                 return ai_img_resized
             else:
-                print("⚠️ AI填充失败，回退到模糊填充")
+                logger.warning("⚠️ AI填充失败，回退到模糊填充")
                 return self._apply_horizontal_padding(img, target_width, target_height, padding_width, 'blur')
                 
         except Exception as e:
-            print(f"⚠️ AI填充出错: {str(e)}, 回退到模糊填充")
+            logger.warning(f"⚠️ AI填充出错: {str(e)}, 回退到模糊填充")
             return self._apply_horizontal_padding(img, target_width, target_height, padding_width, 'blur')
     
     def _ai_vertical_padding(self, img, target_width, target_height, padding_height):
         """使用AI智能填充纵向边缘（生成新像素，而非拉伸）"""
         try:
-            print("🔮 正在使用AI生成纵向边缘填充...")
+            logger.info("🔮 正在使用AI生成纵向边缘填充...")
             
             # 创建提示词，让AI扩展图片边缘
             extend_prompt = """
@@ -244,17 +293,13 @@ class NanoBananaAPI:
 """
             
             # 调用Gemini进行图像扩展
-            response = self.client.generate_content([
+            response = self._generate_content([
                 extend_prompt,
                 img
             ])
             
             # 提取生成的图像
-            image_parts = [
-                part.inline_data.data
-                for part in response.candidates[0].content.parts
-                if part.inline_data
-            ]
+            image_parts = self._extract_image_parts(response)
             
             if image_parts:
                 # 加载AI生成的扩展图像
@@ -263,14 +308,14 @@ class NanoBananaAPI:
                 # 调整到目标尺寸
                 ai_img_resized = ai_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
                 
-                print("✨ AI纵向填充完成")
+                logger.info("✨ AI纵向填充完成")
                 return ai_img_resized
             else:
-                print("⚠️ AI填充失败，回退到模糊填充")
+                logger.warning("⚠️ AI填充失败，回退到模糊填充")
                 return self._apply_vertical_padding(img, target_width, target_height, padding_height, 'blur')
                 
         except Exception as e:
-            print(f"⚠️ AI填充出错: {str(e)}, 回退到模糊填充")
+            logger.warning(f"⚠️ AI填充出错: {str(e)}, 回退到模糊填充")
             return self._apply_vertical_padding(img, target_width, target_height, padding_height, 'blur')
     
     def _encode_image_to_base64(self, image_path):
@@ -279,14 +324,22 @@ class NanoBananaAPI:
             with open(image_path, 'rb') as image_file:
                 return base64.b64encode(image_file.read()).decode('utf-8')
         except Exception as e:
-            print(f"图片编码错误: {str(e)}")
+            logger.error(f"图片编码错误: {str(e)}")
             return None
     
-    def colorize_sketch(self, sketch_path, description="", style="cute", color_preference="colorful", expert_mode=False):
+    def colorize_sketch(self, *args, **kwargs):
         """为手绘简笔画上色 - 使用Gemini 2.5 Flash Image"""
+        return run_steps(self.colorize_sketch_steps(*args, **kwargs))
+    
+    async def colorize_sketch_async(self, *args, **kwargs):
+        return await run_steps_async(self.colorize_sketch_steps(*args, **kwargs))
+    
+    def colorize_sketch_steps(self, sketch_path, description="", style="cute", color_preference="colorful", expert_mode=False,
+                              output_dir=None):
+        """上色流程（生成器，见 api/upstream.py）；output_dir为结果保存目录，默认uploads"""
         try:
-            print("🍌 开始使用Nano Banana (Gemini)进行图像上色...")
-            print(f"🎨 风格: {style}, 色彩偏好: {color_preference}, Expert模式: {expert_mode}")
+            logger.info("🍌 开始使用Nano Banana (Gemini)进行图像上色...")
+            logger.info(f"🎨 风格: {style}, 色彩偏好: {color_preference}, Expert模式: {expert_mode}")
             
             # 检查客户端
             if not self.client:
@@ -299,7 +352,7 @@ class NanoBananaAPI:
             # Expert模式：直接使用用户输入的prompt，不添加任何额外内容
             if expert_mode:
                 prompt = description if description else "为这张图片上色"
-                print(f"⚡ Expert模式 - 原始prompt: {prompt}")
+                logger.debug(f"⚡ Expert模式 - 原始prompt: {prompt}")
             else:
                 # 风格映射
                 style_prompts = {
@@ -360,33 +413,30 @@ class NanoBananaAPI:
 请生成一张完全上色的图像！
 """
             
-            print(f"🎨 用户描述：{description or '使用默认风格'}")
+            logger.info(f"🎨 用户描述：{description or '使用默认风格'}")
             
             # 将图像转换为PIL Image对象
             pil_image = Image.open(io.BytesIO(image_bytes))
             
-            response = self.client.generate_content([
+            response = yield self._content_call([
                 prompt,
                 pil_image
-            ])
+            ], require_image=True)
             
             # 提取生成的图像
-            image_parts = [
-                part.inline_data.data
-                for part in response.candidates[0].content.parts
-                if part.inline_data
-            ]
+            image_parts = self._extract_image_parts(response)
             
             if image_parts:
                 # 保存图像
                 base_name = os.path.splitext(os.path.basename(sketch_path))[0]
-                colored_filename = f"{base_name}_colored.png"
-                output_path = os.path.join(self.upload_folder, colored_filename)
+                # 相同内容的手绘图共用一个文件，结果文件名加上随机后缀避免并发生成时互相覆盖
+                colored_filename = f"{base_name}_colored_{uuid.uuid4().hex[:8]}.png"
+                output_path = os.path.join(output_dir or self.upload_folder, colored_filename)
                 
-                with open(output_path, 'wb') as f:
+                with span('write_output'), open(output_path, 'wb') as f:
                     f.write(image_parts[0])
                 
-                print(f"✅ Nano Banana上色完成: {output_path}")
+                logger.info(f"✅ Nano Banana上色完成: {output_path}")
                 
                 # 不再自动转换为16:9，保持原始1024x1024
                 return output_path
@@ -395,19 +445,19 @@ class NanoBananaAPI:
                 
         except Exception as e:
             error_msg = str(e)
-            print(f"❌ Nano Banana上色错误: {error_msg}")
+            logger.error(f"❌ Nano Banana上色错误: {error_msg}")
             
             # 检查是否是配额耗尽错误
             if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
-                print("⚠️  API配额已耗尽，请稍后再试")
-                # 可以在这里添加额外的配额耗尽处理逻辑
+                logger.warning("⚠️  API配额已耗尽，请稍后再试")
             
-            return None
+            # 重试已在共享重试策略中完成，这里把错误交给调用方，便于给用户明确的提示
+            raise e
     
     def generate_figurine_style(self, colored_image_path, description=""):
         """生成手办风格图片 - 使用Gemini 2.5 Flash Image"""
         try:
-            print("🏺 开始使用Nano Banana (Gemini)生成手办风格...")
+            logger.info("🏺 开始使用Nano Banana (Gemini)生成手办风格...")
             
             # 检查客户端
             if not self.client:
@@ -434,22 +484,18 @@ class NanoBananaAPI:
 请生成一张具有手办质感的图像。
 """
             
-            print(f"🎯 用户描述：{description or '使用默认手办风格'}")
+            logger.info(f"🎯 用户描述：{description or '使用默认手办风格'}")
             
             # 将图像转换为PIL Image对象
             pil_image = Image.open(io.BytesIO(image_bytes))
             
-            response = self.client.generate_content([
+            response = self._generate_content([
                 figurine_prompt,
                 pil_image
-            ])
+            ], require_image=True)
             
             # 提取生成的图像
-            image_parts = [
-                part.inline_data.data
-                for part in response.candidates[0].content.parts
-                if part.inline_data
-            ]
+            image_parts = self._extract_image_parts(response)
             
             if image_parts:
                 # 保存图像
@@ -460,7 +506,7 @@ class NanoBananaAPI:
                 with open(output_path, 'wb') as f:
                     f.write(image_parts[0])
                 
-                print(f"✅ Nano Banana手办风格生成完成: {output_path}")
+                logger.info(f"✅ Nano Banana手办风格生成完成: {output_path}")
                 
                 # 不再自动转换为16:9，保持原始尺寸
                 return output_path
@@ -468,7 +514,7 @@ class NanoBananaAPI:
                 raise Exception("未能从Gemini响应中提取图像")
                 
         except Exception as e:
-            print(f"❌ Nano Banana手办风格生成错误: {str(e)}")
+            logger.error(f"❌ Nano Banana手办风格生成错误: {str(e)}")
             raise e
     
     def check_api_status(self):
@@ -476,15 +522,23 @@ class NanoBananaAPI:
         try:
             return self.client is not None and self.api_key != 'your-nano-banana-api-key-here'
         except Exception as e:
-            print(f"API状态检查失败: {str(e)}")
+            logger.error(f"API状态检查失败: {str(e)}")
             return False
     
-    def generate_image_from_text(self, text_prompt, style="cute", color_preference="colorful", expert_mode=False):
+    def generate_image_from_text(self, *args, **kwargs):
         """从文字描述生成图片 - 使用真正的Nano Banana图像生成！"""
+        return run_steps(self.generate_image_from_text_steps(*args, **kwargs))
+    
+    async def generate_image_from_text_async(self, *args, **kwargs):
+        return await run_steps_async(self.generate_image_from_text_steps(*args, **kwargs))
+    
+    def generate_image_from_text_steps(self, text_prompt, style="cute", color_preference="colorful", expert_mode=False,
+                                       output_dir=None):
+        """文字生成图片流程（生成器，见 api/upstream.py）"""
         try:
-            print(f"🎨 开始使用真正的Nano Banana (gemini-2.5-flash-image)生成图片...")
-            print(f"📝 提示词: {text_prompt}")
-            print(f"🎨 风格: {style}, 色彩偏好: {color_preference}, Expert模式: {expert_mode}")
+            logger.info("🎨 开始使用真正的Nano Banana (gemini-2.5-flash-image)生成图片...")
+            logger.info(f"📝 提示词: {text_prompt}")
+            logger.info(f"🎨 风格: {style}, 色彩偏好: {color_preference}, Expert模式: {expert_mode}")
             
             # 检查客户端
             if not self.client:
@@ -493,7 +547,7 @@ class NanoBananaAPI:
             # Expert模式：直接使用用户输入的prompt
             if expert_mode:
                 image_prompt = text_prompt
-                print(f"⚡ Expert模式 - 原始prompt: {image_prompt}")
+                logger.debug(f"⚡ Expert模式 - 原始prompt: {image_prompt}")
             else:
                 # 风格映射
                 style_prompts = {
@@ -528,131 +582,47 @@ class NanoBananaAPI:
 - 主体突出，背景纯色或简单渐变
 - 整体风格统一，色彩和谐"""
             
-            print(f"📝 最终提示词: {image_prompt}")
-            
-            # 使用专门的图像生成模型，支持重试机制
-            max_retries = 3
-            retry_count = 0
-            last_error = None
-            
-            while retry_count < max_retries:
-                try:
-                    retry_count += 1
-                    print(f"🔥 正在使用Nano Banana生成真实图片... (尝试 {retry_count}/{max_retries})")
-                    
-                    # 使用正确的客户端API调用方式
-                    # 创建图像生成专用模型 - 使用正确的Nano Banana模型
-                    image_gen_client = genai.GenerativeModel('gemini-2.5-flash-image')
-                    response = image_gen_client.generate_content(image_prompt)
-                    
-                    # 检查是否成功生成图片
-                    print(f"🔍 响应检查: response={bool(response)}")
-                    if response:
-                        print(f"🔍 candidates: {hasattr(response, 'candidates')} - {bool(response.candidates) if hasattr(response, 'candidates') else 'N/A'}")
-                        
-                    if response and hasattr(response, 'candidates') and response.candidates:
-                        print(f"🔍 候选项数量: {len(response.candidates)}")
-                        if response.candidates[0].content and response.candidates[0].content.parts:
-                            print(f"🔍 内容部分数量: {len(response.candidates[0].content.parts)}")
-                            for i, part in enumerate(response.candidates[0].content.parts):
-                                print(f"🔍 Part {i}: text={bool(part.text)}, inline_data={bool(part.inline_data)}")
-                        
-                        # 查找返回的图像数据
-                        image_parts = [
-                            part.inline_data.data
-                            for part in response.candidates[0].content.parts
-                            if part.inline_data
-                        ]
-                        
-                        if image_parts:
-                            # 保存图片数据到文件
-                            timestamp = int(time.time())
-                            filename = f"nano_banana_text_{timestamp}.png"
-                            filepath = os.path.join(self.upload_folder, filename)
-                            
-                            # 处理Gemini返回的图像数据
-                            from io import BytesIO
-                            
-                            # Gemini返回的是原始字节数据，不是base64编码的
-                            image_data = image_parts[0]  # 直接使用bytes数据
-                            image = Image.open(BytesIO(image_data))
-                            image.save(filepath)
-                            
-                            print(f"✅ Nano Banana真实图片生成并保存成功: {filepath}")
-                            
-                            # 不再自动转换为16:9，保持原始尺寸
-                            return filepath
-                        else:
-                            error_msg = "响应中没有找到图片数据"
-                            print(f"⚠️ {error_msg}")
-                            if retry_count < max_retries:
-                                print(f"🔄 将进行第 {retry_count + 1} 次重试...")
-                                last_error = Exception(error_msg)
-                                continue
-                            else:
-                                raise Exception(error_msg)
-                    else:
-                        error_msg = "Nano Banana未返回有效响应"
-                        print(f"⚠️ {error_msg}")
-                        if retry_count < max_retries:
-                            print(f"🔄 将进行第 {retry_count + 1} 次重试...")
-                            last_error = Exception(error_msg)
-                            continue
-                        else:
-                            raise Exception(error_msg)
-                            
-                except Exception as img_error:
-                    last_error = img_error
-                    print(f"⚠️ 第 {retry_count} 次尝试失败: {img_error}")
-                    if retry_count < max_retries:
-                        print(f"🔄 将进行第 {retry_count + 1} 次重试...")
-                        continue
-                    else:
-                        print(f"❌ 所有 {max_retries} 次重试都失败了")
-                        break
-                        
-            # 如果所有重试都失败，降级到艺术指导方案
-            print("🔄 降级使用艺术指导方案...")
+            logger.debug(f"📝 最终提示词: {image_prompt}")
             
+            # 使用专门的图像生成模型，由共享重试策略处理上游故障（指数退避 + 熔断）
             try:
-                # 降级方案：使用原有的艺术指导方法
-                art_prompt = f"""
-作为一位专业的儿童美术老师，请根据以下描述为10-14岁的孩子创作一幅详细的绘画作品：
-
-{text_prompt}
-
-请提供详细的绘画步骤和色彩搭配建议：
-1. 画面构图布局
-2. 主要元素的形状和位置
-3. 具体的颜色搭配（RGB值）
-4. 绘画技巧和细节处理
-5. 整体风格建议
-
-要求内容健康正面，适合儿童，富有创意和教育意义。
-"""
+                logger.info("🔥 正在使用Nano Banana生成真实图片...")
                 
-                # 调用Gemini获取艺术指导
-                response = self.client.generate_content([art_prompt])
-            
-                if response and hasattr(response, 'candidates') and response.candidates:
-                    art_guidance = response.candidates[0].content.parts[0].text
-                    print(f"🎨 AI艺术指导: {art_guidance}")
-                    
-                    # 如果无法生成图片，直接抛出异常说明降级到艺术指导
-                    raise Exception("没有图片数据，使用备用方案")
-                else:
-                    raise Exception("未能从Gemini获取艺术指导")
-            except Exception as art_error:
-                # 如果艺术指导也失败，抛出原始图片生成错误
-                raise last_error if last_error else art_error
+                # 创建图像生成专用模型 - 使用正确的Nano Banana模型
+                image_gen_client = genai.GenerativeModel(self.MODEL_NAME)
+                response = yield self._content_call(image_prompt, client=image_gen_client, require_image=True)
+                image_parts = self._extract_image_parts(response)
+                
+                # 保存图片数据到文件
+                timestamp = int(time.time())
+                filename = f"nano_banana_text_{timestamp}_{uuid.uuid4().hex[:8]}.png"
+                filepath = os.path.join(output_dir or self.upload_folder, filename)
+                
+                # Gemini返回的是原始字节数据，不是base64编码的
+                with span('write_output'):
+                    image = Image.open(io.BytesIO(image_parts[0]))
+                    image.save(filepath)
+                
+                logger.info(f"✅ Nano Banana真实图片生成并保存成功: {filepath}")
+                
+                # 不再自动转换为16:9，保持原始尺寸
+                return filepath
+                
+            except (CircuitOpenError, RateLimitTimeout):
+                # 服务已熔断或排队超时，直接快速失败
+                raise
+            except Exception as img_error:
+                # 重试已由共享策略完成，不再额外调用上游（降级调用的结果也无法使用，只会放大负载）
+                logger.error(f"❌ Nano Banana图片生成失败: {img_error}")
+                raise
                 
         except Exception as e:
             error_msg = str(e)
-            print(f"❌ Nano Banana文字生成图片错误: {error_msg}")
+            logger.error(f"❌ Nano Banana文字生成图片错误: {error_msg}")
             
             # 检查是否是配额耗尽错误
             if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
-                print("⚠️  API配额已耗尽，请稍后再试")
+                logger.warning("⚠️  API配额已耗尽，请稍后再试")
             
             # AI服务不可用时直接返回错误
             raise e
@@ -660,35 +630,60 @@ class NanoBananaAPI:
 
 
     # 新的统一工作流程方法
-    def generate_image_from_sketch(self, sketch_path, style="cute", color_preference="colorful", expert_mode=False):
+    def generate_image_from_sketch(self, *args, **kwargs):
         """从手绘图片生成图片（纯图片模式）"""
+        return run_steps(self.generate_image_from_sketch_steps(*args, **kwargs))
+    
+    async def generate_image_from_sketch_async(self, *args, **kwargs):
+        return await run_steps_async(self.generate_image_from_sketch_steps(*args, **kwargs))
+    
+    def generate_image_from_sketch_steps(self, sketch_path, style="cute", color_preference="colorful", expert_mode=False,
+                                         output_dir=None):
+        """纯图片模式流程（生成器，见 api/upstream.py）"""
         try:
-            print(f"🎨 纯图片模式：为手绘图生成AI图片 - {sketch_path}")
+            logger.info(f"🎨 纯图片模式：为手绘图生成AI图片 - {sketch_path}")
             
             # 使用已有的上色方法，传入风格参数和expert_mode
-            return self.colorize_sketch(sketch_path, "", style=style, color_preference=color_preference, expert_mode=expert_mode)
+            return (yield from self.colorize_sketch_steps(sketch_path, "", style=style, color_preference=color_preference,
+                                                          expert_mode=expert_mode, output_dir=output_dir))
             
         except Exception as e:
-            print(f"❌ 纯图片模式生成失败: {str(e)}")
-            return None
+            logger.error(f"❌ 纯图片模式生成失败: {str(e)}")
+            raise e
 
-    def generate_image_from_sketch_and_text(self, sketch_path, text_prompt, style="cute", color_preference="colorful", expert_mode=False):
+    def generate_image_from_sketch_and_text(self, *args, **kwargs):
         """从手绘图片和文字描述生成图片（图片+文字模式）"""
+        return run_steps(self.generate_image_from_sketch_and_text_steps(*args, **kwargs))
+    
+    async def generate_image_from_sketch_and_text_async(self, *args, **kwargs):
+        return await run_steps_async(self.generate_image_from_sketch_and_text_steps(*args, **kwargs))
+    
+    def generate_image_from_sketch_and_text_steps(self, sketch_path, text_prompt, style="cute", color_preference="colorful",
+                                                  expert_mode=False, output_dir=None):
+        """图片+文字模式流程（生成器，见 api/upstream.py）"""
         try:
-            print(f"🎨 图片+文字模式：为手绘图生成AI图片 - {sketch_path}")
+            logger.info(f"🎨 图片+文字模式：为手绘图生成AI图片 - {sketch_path}")
             
             # 使用已有的上色方法，传入文字描述和expert_mode
-            return self.colorize_sketch(sketch_path, text_prompt, style=style, color_preference=color_preference, expert_mode=expert_mode)
+            return (yield from self.colorize_sketch_steps(sketch_path, text_prompt, style=style, color_preference=color_preference,
+                                                          expert_mode=expert_mode, output_dir=output_dir))
             
         except Exception as e:
-            print(f"❌ 图片+文字模式生成失败: {str(e)}")
-            return None
+            logger.error(f"❌ 图片+文字模式生成失败: {str(e)}")
+            raise e
 
-    def adjust_image(self, current_image_path, adjust_prompt, expert_mode=False):
+    def adjust_image(self, *args, **kwargs):
         """调整现有图片"""
+        return run_steps(self.adjust_image_steps(*args, **kwargs))
+    
+    async def adjust_image_async(self, *args, **kwargs):
+        return await run_steps_async(self.adjust_image_steps(*args, **kwargs))
+    
+    def adjust_image_steps(self, current_image_path, adjust_prompt, expert_mode=False, output_dir=None):
+        """图片调整流程（生成器，见 api/upstream.py）；output_dir为结果保存目录，默认uploads"""
         try:
-            print(f"🔧 图片调整模式：{current_image_path} - 调整说明: {adjust_prompt}")
-            print(f"⚡ Expert模式: {expert_mode}")
+            logger.info(f"🔧 图片调整模式：{current_image_path} - 调整说明: {adjust_prompt}")
+            logger.debug(f"⚡ Expert模式: {expert_mode}")
             
             if not self.client:
                 raise Exception("Nano Banana API未配置，请检查GEMINI_API_KEY环境变量")
@@ -700,7 +695,7 @@ class NanoBananaAPI:
             # Expert模式：直接使用用户输入的prompt
             if expert_mode:
                 prompt = adjust_prompt
-                print(f"⚡ Expert模式 - 原始prompt: {prompt}")
+                logger.debug(f"⚡ Expert模式 - 原始prompt: {prompt}")
             else:
                 # 构建调整提示词
                 prompt = f"""
@@ -722,30 +717,26 @@ class NanoBananaAPI:
             # 将图像转换为PIL Image对象
             pil_image = Image.open(io.BytesIO(image_bytes))
             
-            response = self.client.generate_content([
+            response = yield self._content_call([
                 prompt,
                 pil_image
-            ])
+            ], require_image=True)
             
             # 提取生成的图像
-            image_parts = [
-                part.inline_data.data
-                for part in response.candidates[0].content.parts
-                if part.inline_data
-            ]
+            image_parts = self._extract_image_parts(response)
             
             if image_parts:
                 # 保存调整后的图像
                 timestamp = int(time.time())
                 base_name = os.path.splitext(os.path.basename(current_image_path))[0]
-                adjusted_filename = f"{base_name}_adjusted_{timestamp}.png"
-                adjusted_path = os.path.join(self.upload_folder, adjusted_filename)
+                adjusted_filename = f"{base_name}_adjusted_{timestamp}_{uuid.uuid4().hex[:8]}.png"
+                adjusted_path = os.path.join(output_dir or self.upload_folder, adjusted_filename)
                 
                 # 保存图像
-                with open(adjusted_path, 'wb') as f:
+                with span('write_output'), open(adjusted_path, 'wb') as f:
                     f.write(image_parts[0])
                 
-                print(f"✅ 图片调整完成: {adjusted_path}")
+                logger.info(f"✅ 图片调整完成: {adjusted_path}")
                 
                 # 不再自动转换为16:9，保持原始尺寸
                 return adjusted_path
@@ -753,5 +744,5 @@ class NanoBananaAPI:
                 raise Exception("未能生成调整后的图片")
                 
         except Exception as e:
-            print(f"❌ 图片调整失败: {str(e)}")
-            return None
\ No newline at end of file
+            logger.error(f"❌ 图片调整失败: {str(e)}")
+            raise e
\ No newline at end of file
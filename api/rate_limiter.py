@@ -0,0 +1,414 @@
+"""
+上游AI服务限流调度器
+为Gemini、Veo和混元3D调用提供按模型划分的令牌桶（每分钟请求数 + 并发数），
+请求按先来先服务排队并支持截止时间，遇到429/配额耗尽时自动降速并遵守Retry-After。
+同步代码用 with，协程中用 async with（排队时让出事件循环，不阻塞线程）。
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from metrics import record_upstream_call, record_queue_wait
+
+logger = logging.getLogger(__name__)
+
+
+# 各模型的默认限额：(每分钟请求数, 最大并发数, 环境变量前缀)
+DEFAULT_LIMITS = {
+    'gemini-2.5-flash-image': (10, 4, 'GEMINI'),
+    'veo-3.1-generate-preview': (2, 2, 'VEO'),
+    'hunyuan3d': (20, 3, 'HUNYUAN3D'),
+}
+
+# 排队等待时间较长的模型（混元3D任务在完成前一直占用并发名额，需要等待更久）
+DEFAULT_QUEUE_TIMEOUTS = {
+    'hunyuan3d': 600.0,
+}
+
+# 未配置的模型使用的默认限额
+FALLBACK_LIMIT = (30, 4)
+
+# 没有Retry-After信息时，被限流后暂停的秒数
+DEFAULT_THROTTLE_SECONDS = 30.0
+
+# 协程排队时不会被Condition唤醒，按这个间隔重新检查（秒）
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class RateLimitTimeout(Exception):
+    """排队等待超过截止时间"""
+
+
+# 表示配额耗尽/限流的错误码（腾讯云SDK的 code 按前缀匹配，如 RequestLimitExceeded.UinLimitExceeded）
+QUOTA_ERROR_CODES = ('RESOURCE_EXHAUSTED', 'LimitExceeded', 'RequestLimitExceeded')
+
+# 没有结构化状态码时，在错误信息中整词匹配（"quota" 不区分大小写）
+_QUOTA_MESSAGE_PATTERN = re.compile(r'(?<![\w.])(?:429|RESOURCE_EXHAUSTED|(?:Request)?LimitExceeded|(?i:quota))(?!\w)')
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """
+    异常对应的HTTP状态码：requests/httpx 异常的 response.status_code，
+    google.api_core / google.genai 异常的 code（如 ResourceExhausted 为429）；没有时返回None
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if isinstance(status, int) and 100 <= status < 600:
+        return status
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and not isinstance(code, bool) and 100 <= code < 600:
+        return int(code)
+    return None
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """
+    上游SDK的错误码：腾讯云SDK异常的 code（如 AuthFailure.SignatureExpire），
+    google.genai 异常的 status 或 google.api_core 异常的gRPC状态名（如 RESOURCE_EXHAUSTED）；没有时返回None
+    """
+    for attr in ('code', 'status'):
+        value = getattr(error, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    name = getattr(getattr(error, 'grpc_status_code', None), 'name', None)
+    return name if isinstance(name, str) else None
+
+
+def code_matches(code: str, names) -> bool:
+    """错误码等于names中的某一项，或是它的子错误码（腾讯云的 "大类.子类" 格式）"""
+    return any(code == name or code.startswith(name + '.') for name in names)
+
+
+def is_quota_error(error: Exception) -> bool:
+    """判断异常是否是配额耗尽/限流错误：优先看HTTP状态码和SDK错误码，都没有时才匹配错误信息"""
+    status = error_status(error)
+    if status is not None:
+        return status == 429
+    code = error_code(error)
+    if code:
+        return code_matches(code, QUOTA_ERROR_CODES)
+    return bool(_QUOTA_MESSAGE_PATTERN.search(str(error)))
+
+
+def extract_retry_after(error: Exception) -> Optional[float]:
+    """尝试从异常中提取建议的重试等待秒数（Retry-After）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except (TypeError, ValueError):
+                pass
+
+    # Gemini的错误信息中通常包含 "retry_delay { seconds: 30 }" 或 "Please retry in 30.5s"
+    match = re.search(r'retry[_ ]?(?:delay|after|in)\D{0,20}?(\d+(?:\.\d+)?)', str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """单个模型的令牌桶，带公平排队、并发限制和自适应速率"""
+
+    def __init__(self, name: str, requests_per_minute: float, max_concurrency: int):
+        self.name = name
+        self.configured_rpm = float(requests_per_minute)
+        self.rpm = float(requests_per_minute)
+        self.max_concurrency = max(1, int(max_concurrency))
+
+        self.tokens = min(self.rpm, float(self.max_concurrency))
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+
+        self._cond = threading.Condition()
+        self._waiters = deque()
+
+        # 统计数据
+        self.acquired_total = 0
+        self.timeout_total = 0
+        self.throttled_total = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._recent_waits = deque(maxlen=500)
+
+    def _refill(self, now: float):
+        """按当前速率补充令牌（最多攒够一个并发批次）"""
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        capacity = max(1.0, min(self.rpm, float(self.max_concurrency)))
+        self.tokens = min(capacity, self.tokens + elapsed * self.rpm / 60.0)
+
+    def _next_ready_in(self, now: float) -> float:
+        """距离下一个令牌可用还需等待的秒数"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * 60.0 / self.rpm
+
+    def _try_take(self, ticket, deadline) -> float:
+        """
+        尝试为排队凭证取得令牌和并发名额（调用方需持有 self._cond）。
+        成功返回0，否则返回建议的等待秒数；超过截止时间抛出RateLimitTimeout。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        is_head = self._waiters[0] is ticket
+        wait = self._next_ready_in(now)
+
+        if is_head and wait <= 0 and self.in_flight < self.max_concurrency:
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0.0
+
+        if deadline is not None and now >= deadline:
+            self.timeout_total += 1
+            raise RateLimitTimeout(f"{self.name} 当前使用人数较多，排队超时，请稍后再试")
+
+        # 等待令牌补充、并发名额释放或被前面的请求唤醒
+        sleep_for = wait if (is_head and wait > 0) else 1.0
+        if deadline is not None:
+            sleep_for = min(sleep_for, deadline - now)
+        return max(0.01, sleep_for)
+
+    def _record_wait(self, start: float) -> float:
+        """记录排队耗时（调用方需持有 self._cond）"""
+        waited = time.monotonic() - start
+        self.acquired_total += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self._recent_waits.append(waited)
+        return waited
+
+    def acquire(self, timeout: float = None) -> float:
+        """排队获取一个令牌和一个并发名额，返回排队等待的秒数，超时抛出RateLimitTimeout"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        ticket = object()
+
+        with self._cond:
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    sleep_for = self._try_take(ticket, deadline)
+                    if not sleep_for:
+                        break
+                    self._cond.wait(sleep_for)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+            return self._record_wait(start)
+
+    async def acquire_async(self, timeout: float = None) -> float:
+        """acquire 的协程版本：和同步请求在同一个队列中排队，等待时让出事件循环"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        ticket = object()
+
+        with self._cond:
+            self._waiters.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    sleep_for = self._try_take(ticket, deadline)
+                if not sleep_for:
+                    break
+                await asyncio.sleep(min(sleep_for, ASYNC_POLL_INTERVAL))
+        finally:
+            with self._cond:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+        with self._cond:
+            return self._record_wait(start)
+
+    def release(self):
+        """归还并发名额"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    def on_throttled(self, retry_after: float = None):
+        """被上游限流：暂停到Retry-After之后，并把速率减半"""
+        with self._cond:
+            pause = retry_after if retry_after is not None else DEFAULT_THROTTLE_SECONDS
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            self.rpm = max(1.0, self.rpm / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.throttled_total += 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        """调用成功：速率逐步恢复到配置值"""
+        with self._cond:
+            if self.rpm < self.configured_rpm:
+                self.rpm = min(self.configured_rpm, self.rpm + max(1.0, self.configured_rpm / 10))
+
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        with self._cond:
+            recent = sorted(self._recent_waits)
+            p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+            return {
+                'configured_rpm': self.configured_rpm,
+                'current_rpm': round(self.rpm, 2),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'queue_depth': len(self._waiters),
+                'blocked_for_seconds': round(max(0.0, self.blocked_until - time.monotonic()), 2),
+                'acquired_total': self.acquired_total,
+                'timeout_total': self.timeout_total,
+                'throttled_total': self.throttled_total,
+                'wait_seconds_avg': round(self.wait_time_total / self.acquired_total, 4) if self.acquired_total else 0.0,
+                'wait_seconds_p95': round(p95, 4),
+                'wait_seconds_max': round(self.wait_time_max, 4)
+            }
+
+
+class _Slot:
+    """
+    令牌使用期间的上下文管理器，退出时归还并发名额并根据结果调整速率。
+    同时支持 with 和 async with；也可以先调用 wait()/wait_async() 排队，再用 with 包住调用过程。
+    """
+
+    def __init__(self, bucket: TokenBucket, timeout: float = None):
+        self.bucket = bucket
+        self.timeout = timeout
+        self._acquired = False
+
+    def _on_acquired(self, waited: float):
+        record_queue_wait(self.bucket.name, waited)
+        self._started = time.perf_counter()
+        self._acquired = True
+
+    def wait(self):
+        """排队直到取得名额"""
+        if not self._acquired:
+            try:
+                waited = self.bucket.acquire(self.timeout)
+            except RateLimitTimeout:
+                record_upstream_call(self.bucket.name, 'queue_timeout')
+                raise
+            self._on_acquired(waited)
+        return self
+
+    async def wait_async(self):
+        """排队直到取得名额（协程版本）"""
+        if not self._acquired:
+            try:
+                waited = await self.bucket.acquire_async(self.timeout)
+            except RateLimitTimeout:
+                record_upstream_call(self.bucket.name, 'queue_timeout')
+                raise
+            self._on_acquired(waited)
+        return self
+
+    def __enter__(self):
+        return self.wait()
+
+    async def __aenter__(self):
+        return await self.wait_async()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._acquired = False
+        self.bucket.release()
+        duration = time.perf_counter() - self._started
+        if exc is None:
+            self.bucket.on_success()
+            record_upstream_call(self.bucket.name, 'success', duration)
+        elif is_quota_error(exc):
+            retry_after = extract_retry_after(exc)
+            logger.warning(f"⚠️ {self.bucket.name} 配额耗尽，暂停 {retry_after or DEFAULT_THROTTLE_SECONDS} 秒并降低请求速率")
+            self.bucket.on_throttled(retry_after)
+            record_upstream_call(self.bucket.name, 'throttled', duration)
+        else:
+            record_upstream_call(self.bucket.name, 'error', duration)
+        return False
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class RateLimitScheduler:
+    """中央限流调度器，按模型名管理令牌桶"""
+
+    def __init__(self, limits: Dict = None, queue_timeout: float = None):
+        self.queue_timeout = queue_timeout if queue_timeout is not None else \
+            float(os.getenv('RATE_LIMIT_QUEUE_TIMEOUT', '60'))
+        self._limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, model: str):
+        """读取模型的限额配置（环境变量优先）"""
+        if self._limits and model in self._limits:
+            return self._limits[model]
+
+        rpm, concurrency, prefix = DEFAULT_LIMITS.get(model, FALLBACK_LIMIT + (None,))
+        if prefix:
+            rpm = float(os.getenv(f'RATE_LIMIT_{prefix}_RPM', rpm))
+            concurrency = int(os.getenv(f'RATE_LIMIT_{prefix}_CONCURRENCY', concurrency))
+        return rpm, concurrency
+
+    def bucket(self, model: str) -> TokenBucket:
+        """获取（必要时创建）模型对应的令牌桶"""
+        with self._lock:
+            if model not in self._buckets:
+                rpm, concurrency = self._limit_for(model)
+                self._buckets[model] = TokenBucket(model, rpm, concurrency)
+            return self._buckets[model]
+
+    def _queue_timeout_for(self, model: str) -> float:
+        """读取模型的排队超时时间（环境变量优先）"""
+        prefix = DEFAULT_LIMITS.get(model, (None, None, None))[2]
+        default = DEFAULT_QUEUE_TIMEOUTS.get(model, self.queue_timeout)
+        if prefix:
+            return float(os.getenv(f'RATE_LIMIT_{prefix}_QUEUE_TIMEOUT', default))
+        return default
+
+    def acquire(self, model: str, timeout: float = None) -> _Slot:
+        """
+        获取调用名额，用法：
+
+            with get_scheduler().acquire('gemini-2.5-flash-image'):
+                response = client.generate_content(...)
+
+            async with get_scheduler().acquire('gemini-2.5-flash-image'):
+                response = await client.generate_content_async(...)
+        """
+        if timeout is None:
+            timeout = self._queue_timeout_for(model)
+        return _Slot(self.bucket(model), timeout)
+
+    def report_throttled(self, model: str, retry_after: float = None):
+        """在名额之外发现的限流（如轮询接口）也可以手动上报"""
+        self.bucket(model).on_throttled(retry_after)
+
+    def stats(self) -> Dict:
+        """获取所有模型的排队和等待统计"""
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return {name: bucket.stats() for name, bucket in buckets}
+
+
+# 全局实例
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """获取限流调度器实例（单例模式）"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler()
+    return _scheduler
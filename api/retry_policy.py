@@ -0,0 +1,299 @@
+"""
+上游AI服务重试策略与熔断器
+NanoBananaAPI、Veo31API 和 Hunyuan3DGenerator 共用：区分可重试/不可重试错误，
+指数退避加随机抖动，遵守总截止时间，连续失败后熔断，让后续请求快速失败。
+"""
+
+import os
+import re
+import time
+import asyncio
+import random
+import logging
+import threading
+from typing import Callable, Dict
+
+from api.rate_limiter import (
+    RateLimitTimeout, is_quota_error, extract_retry_after, error_status, error_code, code_matches
+)
+from metrics import record_upstream_call
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableError(Exception):
+    """明确标记为可重试的错误（例如上游返回了空结果）"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+# 除所有5xx之外可重试的HTTP状态码（429由 is_quota_error 判断）
+RETRYABLE_STATUS_CODES = (408, 425)
+
+# SDK错误码：gRPC状态名（google）和腾讯云错误码（按 "大类" 前缀匹配）
+RETRYABLE_ERROR_CODES = (
+    'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL', 'ABORTED',
+    'InternalError', 'ServiceUnavailable', 'FailedOperation.InnerError', 'ClientNetworkError',
+)
+NON_RETRYABLE_ERROR_CODES = (
+    'INVALID_ARGUMENT', 'PERMISSION_DENIED', 'UNAUTHENTICATED', 'NOT_FOUND', 'FAILED_PRECONDITION',
+    'AuthFailure', 'InvalidParameter', 'InvalidParameterValue', 'MissingParameter',
+    'UnauthorizedOperation', 'ResourceNotFound',
+)
+
+# 没有结构化状态码和错误码时（SDK把状态写在信息里，如 "503 UNAVAILABLE"），在错误信息中整词匹配这些特征
+RETRYABLE_MARKERS = (
+    '500', '502', '503', '504',
+    'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL', 'InternalError',
+    'timed out', 'timeout', 'Timeout', 'Connection', 'connection reset',
+    'ServiceUnavailable', 'FailedOperation.InnerError',
+)
+NON_RETRYABLE_MARKERS = (
+    '400', '401', '403', '404',
+    'INVALID_ARGUMENT', 'PERMISSION_DENIED', 'UNAUTHENTICATED', 'NOT_FOUND',
+    'API key not valid', 'SAFETY', 'AuthFailure', 'InvalidParameter',
+)
+
+
+def _marker_pattern(markers):
+    # 前后不能紧接字母数字（或前面的小数点），"upload_500.png"、"1.503秒"中的数字不算状态码
+    return re.compile(r'(?<![\w.])(?:' + '|'.join(re.escape(m) for m in markers) + r')(?!\w)')
+
+
+_RETRYABLE_PATTERN = _marker_pattern(RETRYABLE_MARKERS)
+_NON_RETRYABLE_PATTERN = _marker_pattern(NON_RETRYABLE_MARKERS)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    判断错误是否值得重试：先看异常类型，再看HTTP状态码（requests/httpx的响应、google异常的code）
+    和SDK错误码（腾讯云的code、google的gRPC状态），都没有时才整词匹配错误信息
+    """
+    if isinstance(error, (CircuitOpenError, RateLimitTimeout)):
+        return False
+    if isinstance(error, RetryableError):
+        return True
+    if isinstance(error, (FileNotFoundError, ValueError, TypeError, KeyError)):
+        return False
+    if is_quota_error(error):
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+
+    code = error_code(error)
+    if code:
+        if code_matches(code, NON_RETRYABLE_ERROR_CODES):
+            return False
+        if code_matches(code, RETRYABLE_ERROR_CODES):
+            return True
+
+    # requests等库的网络异常
+    name = type(error).__name__
+    if name in ('ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout', 'ChunkedEncodingError'):
+        return True
+
+    message = str(error)
+    if _NON_RETRYABLE_PATTERN.search(message):
+        return False
+    return bool(_RETRYABLE_PATTERN.search(message))
+
+
+class RetryPolicy:
+    """指数退避重试策略（full jitter）"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None,
+                 max_delay: float = None, deadline: float = None):
+        self.max_attempts = max_attempts if max_attempts is not None else \
+            int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))
+        self.base_delay = base_delay if base_delay is not None else \
+            float(os.getenv('RETRY_BASE_DELAY', '1'))
+        self.max_delay = max_delay if max_delay is not None else \
+            float(os.getenv('RETRY_MAX_DELAY', '20'))
+        self.deadline = deadline if deadline is not None else \
+            float(os.getenv('RETRY_DEADLINE', '120'))
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次失败后的等待时间：在[0, base * 2^(attempt-1)]之间随机取值"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却时间过后放行一次试探请求"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold if failure_threshold is not None else \
+            int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else \
+            float(os.getenv('CIRCUIT_RESET_SECONDS', '60'))
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips_total = 0
+        self.rejected_total = 0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """调用前检查，熔断打开时直接抛出CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at >= self.reset_timeout:
+                    self.state = self.HALF_OPEN
+                    self._trial_in_progress = False
+                else:
+                    self.rejected_total += 1
+                    raise CircuitOpenError(f"{self.name} 服务暂时不可用，请稍后再试")
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_progress:
+                    self.rejected_total += 1
+                    raise CircuitOpenError(f"{self.name} 服务正在恢复中，请稍后再试")
+                self._trial_in_progress = True
+
+    def on_success(self):
+        """调用成功，关闭熔断器"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def on_failure(self):
+        """上游故障（可重试错误）计入失败次数"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips_total += 1
+                    logger.error(f"🔌 {self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def on_ignored_failure(self):
+        """与上游健康无关的错误（如参数错误），只释放试探名额"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def stats(self) -> Dict:
+        """获取熔断器状态"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips_total': self.trips_total,
+                'rejected_total': self.rejected_total
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(service: str) -> CircuitBreaker:
+    """获取服务对应的熔断器（每个服务一个实例）"""
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+def circuit_breaker_stats() -> Dict:
+    """获取所有熔断器的状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {name: breaker.stats() for name, breaker in breakers}
+
+
+def _retry_delay(error: Exception, attempt: int, start: float, policy: RetryPolicy,
+                 service: str, breaker: CircuitBreaker):
+    """记录一次失败并计算重试前的等待秒数，不应再重试时返回None"""
+    retryable = is_retryable_error(error)
+    if retryable:
+        breaker.on_failure()
+    else:
+        breaker.on_ignored_failure()
+
+    if not retryable or attempt >= policy.max_attempts:
+        return None
+
+    delay = policy.backoff(attempt)
+    retry_after = extract_retry_after(error) if is_quota_error(error) else None
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    if time.monotonic() - start + delay > policy.deadline:
+        logger.warning(f"⏰ {service} 重试将超过总截止时间 {policy.deadline:.0f} 秒，停止重试")
+        return None
+
+    logger.warning(f"🔄 {service} 第 {attempt} 次调用失败: {error}，{delay:.1f} 秒后重试...")
+    return delay
+
+
+def _before_attempt(service: str, breaker: CircuitBreaker):
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        record_upstream_call(service, 'circuit_open')
+        raise
+
+
+def call_with_retry(func: Callable, *args, service: str = 'default', policy: RetryPolicy = None, **kwargs):
+    """
+    按重试策略调用func，可重试错误会指数退避后重试，
+    超过最大次数或总截止时间后抛出最后一次的错误。
+    """
+    policy = policy or RetryPolicy()
+    breaker = get_circuit_breaker(service)
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        _before_attempt(service, breaker)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _retry_delay(e, attempt, start, policy, service, breaker)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+
+        breaker.on_success()
+        return result
+
+
+async def call_with_retry_async(func: Callable, *args, service: str = 'default', policy: RetryPolicy = None, **kwargs):
+    """call_with_retry 的协程版本：func 是协程函数，退避等待时让出事件循环"""
+    policy = policy or RetryPolicy()
+    breaker = get_circuit_breaker(service)
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        _before_attempt(service, breaker)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            delay = _retry_delay(e, attempt, start, policy, service, breaker)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.on_success()
+        return result
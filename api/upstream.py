@@ -0,0 +1,176 @@
+"""
+上游调用步骤 - 同一份生成流程既可以在Flask线程中同步执行，也可以在事件循环中以协程执行
+
+生成流程写成生成器：每次需要等待上游时 yield 一个步骤，执行器完成后把结果送回：
+
+    def colorize_sketch_steps(self, path):
+        image = load(path)
+        response = yield UpstreamCall(client.generate_content, [prompt, image],
+                                      async_func=client.generate_content_async,
+                                      service=MODEL, rate_limit=MODEL)
+        return save(response)
+
+    run_steps(api.colorize_sketch_steps(path))                 # Flask视图：阻塞当前线程
+    await run_steps_async(api.colorize_sketch_steps(path))     # asgi.py：等待时让出事件循环
+
+可以 yield 的步骤：
+    UpstreamCall   一次上游调用（经过限流排队和共享重试策略），上游异常会在 yield 处抛出
+    Sleep          等待一段时间（轮询任务状态）
+    Offload        耗时较长的本地处理（如3D模型简化），协程执行时放到线程池中，不阻塞事件循环
+    限流名额        get_scheduler().acquire(model)，排队取得名额后送回，再用 with 包住需要占用名额的步骤
+
+步骤之间的本地处理（读写图片、更新会话JSON）仍然直接执行，耗时都在毫秒级；超过这个量级的用 Offload。
+"""
+
+import time
+import asyncio
+import logging
+
+from api.rate_limiter import get_scheduler, _Slot
+from api.http_session import get_session, get_async_client, request_timeout, async_request_timeout
+from api.retry_policy import call_with_retry, call_with_retry_async, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamCall:
+    """
+    一次上游调用：func 同步执行，async_func（可选）是对应的协程函数；
+    没有协程版本的SDK（腾讯云）在线程池中执行，只在调用期间占用线程。
+    """
+
+    def __init__(self, func, *args, async_func=None, service: str = 'default', rate_limit: str = None,
+                 policy: RetryPolicy = None, validate=None, **kwargs):
+        self.func = func
+        self.async_func = async_func
+        self.args = args
+        self.kwargs = kwargs
+        self.service = service
+        self.rate_limit = rate_limit
+        self.policy = policy
+        # 检查结果的函数，结果不可用时抛出RetryableError触发重试
+        self.validate = validate
+
+    def run(self):
+        def attempt():
+            if self.rate_limit:
+                with get_scheduler().acquire(self.rate_limit):
+                    result = self.func(*self.args, **self.kwargs)
+            else:
+                result = self.func(*self.args, **self.kwargs)
+            if self.validate:
+                self.validate(result)
+            return result
+
+        return call_with_retry(attempt, service=self.service, policy=self.policy)
+
+    async def _call_async(self):
+        if self.async_func is not None:
+            return await self.async_func(*self.args, **self.kwargs)
+        return await asyncio.to_thread(self.func, *self.args, **self.kwargs)
+
+    async def run_async(self):
+        async def attempt():
+            if self.rate_limit:
+                async with get_scheduler().acquire(self.rate_limit):
+                    result = await self._call_async()
+            else:
+                result = await self._call_async()
+            if self.validate:
+                self.validate(result)
+            return result
+
+        return await call_with_retry_async(attempt, service=self.service, policy=self.policy)
+
+
+class Sleep:
+    """等待指定秒数"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+
+class Offload:
+    """本地CPU密集处理：同步执行时直接调用，协程执行时在线程池中调用"""
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+def _run_step(step):
+    if isinstance(step, UpstreamCall):
+        return step.run()
+    if isinstance(step, Sleep):
+        time.sleep(step.seconds)
+        return None
+    if isinstance(step, Offload):
+        return step.func(*step.args, **step.kwargs)
+    if isinstance(step, _Slot):
+        return step.wait()
+    raise TypeError(f"不支持的步骤类型: {type(step).__name__}")
+
+
+async def _run_step_async(step):
+    if isinstance(step, UpstreamCall):
+        return await step.run_async()
+    if isinstance(step, Sleep):
+        await asyncio.sleep(step.seconds)
+        return None
+    if isinstance(step, Offload):
+        return await asyncio.to_thread(step.func, *step.args, **step.kwargs)
+    if isinstance(step, _Slot):
+        return await step.wait_async()
+    raise TypeError(f"不支持的步骤类型: {type(step).__name__}")
+
+
+def run_steps(steps):
+    """同步执行生成流程，返回生成器的返回值"""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        value, error = None, None
+        try:
+            value = _run_step(step)
+        except Exception as e:
+            error = e
+
+
+async def run_steps_async(steps):
+    """以协程执行生成流程，返回生成器的返回值"""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        value, error = None, None
+        try:
+            value = await _run_step_async(step)
+        except Exception as e:
+            error = e
+
+
+def http_get(url: str, timeout: float = None):
+    """同步下载，使用共享的keep-alive连接池（timeout为读取超时秒数）"""
+    response = get_session().get(url, timeout=request_timeout(timeout))
+    response.raise_for_status()
+    return response
+
+
+async def http_get_async(url: str, timeout: float = None):
+    """
+    异步下载（httpx），返回的响应和requests一样有 content / status_code。
+    没有安装httpx时退回到线程池中的requests。
+    """
+    try:
+        client = get_async_client()
+    except ImportError:
+        return await asyncio.to_thread(http_get, url, timeout)
+    response = await client.get(url, timeout=async_request_timeout(timeout))
+    response.raise_for_status()
+    return response
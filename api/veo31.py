@@ -6,10 +6,31 @@ Veo 3.1 视频生成API集成
 
 import os
 import time
-import google.genai as genai
-from google.genai import types
+import uuid
+import logging
 from typing import Dict, Optional
 import base64
+import media_paths
+import video_processing
+from api.retry_policy import RetryPolicy
+from api import upstream
+from api.upstream import UpstreamCall, Offload, run_steps, run_steps_async
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# google.genai 导入较慢，第一次创建客户端时才导入
+genai = None
+types = None
+
+
+def _load_genai():
+    global genai, types
+    if genai is None:
+        genai = lazy_import('google.genai')
+    if types is None:
+        types = lazy_import('google.genai.types')
+
 
 class Veo31API:
     """Veo 3.1 视频生成API客户端"""
@@ -21,14 +42,22 @@ class Veo31API:
             raise ValueError("未找到GEMINI_API_KEY或NANO_BANANA_API_KEY环境变量")
         
         # 初始化Gemini客户端
+        _load_genai()
         self.client = genai.Client(api_key=self.api_key)
         
         # 存储任务操作（用于轮询）
         self.operations = {}
         
-        print("✅ Veo 3.1 API (Google Gemini)初始化成功")
+        logger.info("✅ Veo 3.1 API (Google Gemini)初始化成功")
     
-    def generate_video(
+    def generate_video(self, *args, **kwargs) -> Dict:
+        """生成视频（Image-to-Video），参数见 generate_video_steps"""
+        return run_steps(self.generate_video_steps(*args, **kwargs))
+    
+    async def generate_video_async(self, *args, **kwargs) -> Dict:
+        return await run_steps_async(self.generate_video_steps(*args, **kwargs))
+    
+    def generate_video_steps(
         self, 
         image_url: str, 
         prompt: str, 
@@ -36,9 +65,9 @@ class Veo31API:
         aspect_ratio: str = "16:9",
         quality: str = "720p",
         motion_intensity: str = "medium"
-    ) -> Dict:
+    ):
         """
-        生成视频（Image-to-Video）
+        生成视频（Image-to-Video）的流程（生成器，见 api/upstream.py）
         
         Args:
             image_url: 源图片URL（本地路径或HTTP URL）
@@ -52,41 +81,36 @@ class Veo31API:
             包含operation_name的字典
         """
         try:
-            print(f"\n🎬 开始使用Veo 3.1生成视频:")
-            print(f"   图片: {image_url}")
-            print(f"   提示词: {prompt}")
-            print(f"   时长: {duration}秒")
-            print(f"   宽高比: {aspect_ratio}")
-            print(f"   分辨率: {quality}")
+            logger.info(f"🎬 开始使用Veo 3.1生成视频: {image_url}")
+            logger.debug("🎬 提示词: %s, 时长: %s秒, 宽高比: %s, 分辨率: %s", prompt, duration, aspect_ratio, quality)
             
             # 读取图片并通过Nano Banana重新生成以获得正确的图片对象
             if image_url.startswith('/'):
-                # 本地文件路径
-                image_path = image_url.lstrip('/')
+                # 本地文件URL（/uploads/... 或 /session-files/...）
+                image_path = media_paths.to_path(image_url)
                 if not os.path.exists(image_path):
                     # 尝试添加当前目录
-                    image_path = os.path.join(os.getcwd(), image_url.lstrip('/'))
+                    image_path = os.path.join(os.getcwd(), image_path)
                 
                 if not os.path.exists(image_path):
                     raise FileNotFoundError(f"图片文件不存在: {image_url}")
                 
-                print(f"   📖 读取图片文件: {image_path}")
+                logger.debug(f"📖 读取图片文件: {image_path}")
             else:
-                # HTTP URL - 需要先下载
-                import requests
-                
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
+                # HTTP URL - 需要先下载（共享连接池）
+                response = yield UpstreamCall(lambda: upstream.http_get(image_url, timeout=30),
+                                              async_func=lambda: upstream.http_get_async(image_url, timeout=30),
+                                              service="image-download")
                 
                 # 保存为临时文件
-                image_path = os.path.join('uploads', f'temp_veo_{int(time.time())}.png')
+                image_path = os.path.join('uploads', f'temp_veo_{int(time.time())}_{uuid.uuid4().hex[:8]}.png')
                 with open(image_path, 'wb') as f:
                     f.write(response.content)
                 
-                print(f"   📖 图片已下载并保存: {image_path}")
+                logger.info(f"📖 图片已下载并保存: {image_path}")
             
             # 上传图片到Gemini
-            print(f"   📤 上传图片到Gemini...")
+            logger.debug("📤 上传图片到Gemini...")
             
             # 确定MIME类型
             if image_path.lower().endswith('.png'):
@@ -96,25 +120,37 @@ class Veo31API:
             else:
                 mime_type = 'image/png'  # 默认
             
-            with open(image_path, 'rb') as f:
-                uploaded_file = self.client.files.upload(
-                    file=f,
+            def upload_image():
+                with open(image_path, 'rb') as f:
+                    return self.client.files.upload(
+                        file=f,
+                        config=types.UploadFileConfig(mime_type=mime_type)
+                    )
+            
+            async def upload_image_async():
+                return await self.client.aio.files.upload(
+                    file=image_path,
                     config=types.UploadFileConfig(mime_type=mime_type)
                 )
-            print(f"   ✅ 图片已上传: {uploaded_file.name}")
+            
+            uploaded_file = yield UpstreamCall(upload_image, async_func=upload_image_async, service="gemini-files")
+            logger.info(f"✅ 图片已上传: {uploaded_file.name}")
             
             # 删除临时文件
             if 'temp_veo_' in image_path:
                 os.remove(image_path)
             
             # 使用Nano Banana重新生成图片以获得正确的图片对象格式
-            print(f"   🔄 通过Nano Banana处理图片...")
-            result = self.client.models.generate_content(
-                model="gemini-2.5-flash-image",
-                contents=[
-                    types.Part(file_data=types.FileData(file_uri=uploaded_file.uri)),
-                    "Generate an exact copy of this image"
-                ]
+            logger.debug("🔄 通过Nano Banana处理图片...")
+            copy_contents = [
+                types.Part(file_data=types.FileData(file_uri=uploaded_file.uri)),
+                "Generate an exact copy of this image"
+            ]
+            result = yield UpstreamCall(
+                self.client.models.generate_content,
+                async_func=self.client.aio.models.generate_content,
+                model="gemini-2.5-flash-image", contents=copy_contents,
+                service="gemini-2.5-flash-image", rate_limit="gemini-2.5-flash-image"
             )
             
             # 获取生成的图片对象
@@ -125,14 +161,14 @@ class Veo31API:
                     for part in candidate.content.parts:
                         if hasattr(part, 'inline_data') and part.inline_data:
                             image_data = part.inline_data
-                            print(f"   ✅ 图片对象已准备 (mime: {image_data.mime_type}, size: {len(image_data.data)} bytes)")
+                            logger.debug(f"✅ 图片对象已准备 (mime: {image_data.mime_type}, size: {len(image_data.data)} bytes)")
                             break
                     
                     if not image_data:
                         # 调试：打印part结构
-                        print(f"   ⚠️  未找到inline_data，检查parts结构:")
+                        logger.debug("⚠️  未找到inline_data，检查parts结构:")
                         for i, part in enumerate(candidate.content.parts):
-                            print(f"      Part {i}: {type(part)}, 属性: {[attr for attr in dir(part) if not attr.startswith('_')]}")
+                            logger.debug("Part %s: %s, 属性: %s", i, type(part), [attr for attr in dir(part) if not attr.startswith('_')])
                         raise Exception("无法从Nano Banana获取图片数据（未找到inline_data）")
                 else:
                     raise Exception("返回结果格式不正确（无parts属性）")
@@ -151,10 +187,10 @@ class Veo31API:
             if duration not in valid_durations:
                 # 找到最接近的有效时长
                 duration = min(valid_durations, key=lambda x: abs(x - duration))
-                print(f"   ⚠️  时长调整为{duration}秒（Veo 3.1支持: {valid_durations}）")
+                logger.warning(f"⚠️  时长调整为{duration}秒（Veo 3.1支持: {valid_durations}）")
             
             # 调用Veo 3.1 API
-            print(f"   🚀 调用Veo 3.1 API...")
+            logger.debug("🚀 调用Veo 3.1 API...")
             
             # 使用types.Image，接受image_bytes（原始字节）和mime_type
             image_obj = types.Image(
@@ -162,9 +198,11 @@ class Veo31API:
                 mime_type=image_data.mime_type
             )
             
-            print(f"   📦 Image对象已创建 (mime: {image_data.mime_type}, size: {len(image_data.data)} bytes)")
+            logger.debug(f"📦 Image对象已创建 (mime: {image_data.mime_type}, size: {len(image_data.data)} bytes)")
             
-            operation = self.client.models.generate_videos(
+            operation = yield UpstreamCall(
+                self.client.models.generate_videos,
+                async_func=self.client.aio.models.generate_videos,
                 model="veo-3.1-generate-preview",
                 prompt=enhanced_prompt,
                 image=image_obj,
@@ -172,14 +210,14 @@ class Veo31API:
                     aspect_ratio=aspect_ratio,
                     resolution=quality,
                     duration_seconds=duration,
-                )
+                ),
+                service="veo-3.1-generate-preview", rate_limit="veo-3.1-generate-preview"
             )
             
             operation_name = operation.name
             self.operations[operation_name] = operation
             
-            print(f"✅ 视频生成任务已创建")
-            print(f"   操作ID: {operation_name}")
+            logger.info(f"✅ 视频生成任务已创建，操作ID: {operation_name}")
             
             return {
                 'task_id': operation_name,
@@ -188,14 +226,19 @@ class Veo31API:
             }
             
         except Exception as e:
-            print(f"❌ 视频生成失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ 视频生成失败: {str(e)}")
             raise Exception(f"视频生成失败: {str(e)}")
     
     def check_status(self, task_id: str) -> Dict:
+        """检查视频生成状态，参数见 check_status_steps"""
+        return run_steps(self.check_status_steps(task_id))
+    
+    async def check_status_async(self, task_id: str) -> Dict:
+        return await run_steps_async(self.check_status_steps(task_id))
+    
+    def check_status_steps(self, task_id: str):
         """
-        检查视频生成状态
+        检查视频生成状态的流程（生成器，见 api/upstream.py）
         
         Args:
             task_id: 任务ID（operation name）
@@ -211,14 +254,19 @@ class Veo31API:
                 # 从名称重新获取操作
                 operation = types.GenerateVideosOperation(name=task_id)
             
-            # 刷新操作状态
-            operation = self.client.operations.get(operation)
+            # 刷新操作状态（轮询请求本身只做少量重试，前端会继续轮询）
+            operation = yield UpstreamCall(
+                self.client.operations.get, operation,
+                async_func=self.client.aio.operations.get,
+                service="veo-3.1-generate-preview",
+                policy=RetryPolicy(max_attempts=2, deadline=15)
+            )
             self.operations[task_id] = operation
             
             if operation.done:
                 # 检查是否成功
                 if hasattr(operation, 'error') and operation.error:
-                    print(f"❌ 视频生成失败: {operation.error}")
+                    logger.error(f"❌ 视频生成失败: {operation.error}")
                     return {
                         'status': 'failed',
                         'error': str(operation.error),
@@ -229,19 +277,19 @@ class Veo31API:
                 try:
                     # 检查response和generated_videos
                     if not hasattr(operation, 'response') or not operation.response:
-                        print(f"❌ Operation没有response属性")
-                        print(f"   Operation属性: {[attr for attr in dir(operation) if not attr.startswith('_')]}")
+                        logger.error("❌ Operation没有response属性")
+                        logger.debug(f"Operation属性: {[attr for attr in dir(operation) if not attr.startswith('_')]}")
                         raise Exception("视频生成完成但无法获取结果")
                     
                     if not hasattr(operation.response, 'generated_videos') or not operation.response.generated_videos:
-                        print(f"❌ Response没有generated_videos或为空")
-                        print(f"   Response属性: {[attr for attr in dir(operation.response) if not attr.startswith('_')]}")
-                        print(f"   Response内容: {operation.response}")
+                        logger.error("❌ Response没有generated_videos或为空")
+                        logger.debug(f"Response属性: {[attr for attr in dir(operation.response) if not attr.startswith('_')]}")
+                        logger.debug("Response内容: %s", operation.response)
                         
                         # 检查是否是内容安全过滤导致的失败
                         if hasattr(operation.response, 'rai_media_filtered_reasons') and operation.response.rai_media_filtered_reasons:
                             reasons = operation.response.rai_media_filtered_reasons
-                            print(f"⚠️ 内容安全过滤原因: {reasons}")
+                            logger.warning(f"⚠️ 内容安全过滤原因: {reasons}")
                             
                             # 返回特定的内容安全错误
                             return {
@@ -257,46 +305,58 @@ class Veo31API:
                     video_file = generated_video.video
                     
                     # 下载视频到本地
-                    video_filename = f"veo_generated_{int(time.time())}.mp4"
+                    # 同一秒内完成的多个任务不能写到同一个文件
+                    video_filename = f"veo_generated_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp4"
                     video_path = os.path.join('uploads', video_filename)
                     
                     # 确保uploads目录存在
                     os.makedirs('uploads', exist_ok=True)
                     
                     # 下载视频
-                    print(f"📥 下载视频到: {video_path}")
+                    logger.info(f"📥 下载视频到: {video_path}")
+                    
+                    video_data = yield UpstreamCall(
+                        self.client.files.download,
+                        async_func=self.client.aio.files.download,
+                        file=video_file, service="gemini-files"
+                    )
                     
                     with open(video_path, 'wb') as f:
-                        # download方法返回的是一个迭代器，每个chunk可能是int或bytes
-                        total_bytes = 0
+                        if isinstance(video_data, (bytes, bytearray)):
+                            f.write(video_data)
+                            total_bytes = len(video_data)
+                        else:
+                            # 旧版SDK的download返回迭代器，每个chunk可能是int或bytes
+                            total_bytes = 0
+                            for chunk in video_data:
+                                if isinstance(chunk, bytes):
+                                    f.write(chunk)
+                                    total_bytes += len(chunk)
+                                elif isinstance(chunk, int):
+                                    # 单个字节，转换为bytes
+                                    f.write(bytes([chunk]))
+                                    total_bytes += 1
                         
-                        for chunk in self.client.files.download(file=video_file):
-                            # 确保chunk是bytes类型
-                            if isinstance(chunk, bytes):
-                                f.write(chunk)
-                                total_bytes += len(chunk)
-                            elif isinstance(chunk, int):
-                                # 单个字节，转换为bytes
-                                f.write(bytes([chunk]))
-                                total_bytes += 1
-                        
-                        print(f"✅ 视频下载完成: {total_bytes / (1024*1024):.2f} MB")
+                        logger.info(f"✅ 视频下载完成: {total_bytes / (1024*1024):.2f} MB")
                     
                     video_url = f"/uploads/{video_filename}"
                     
-                    print(f"✅ 视频已生成: {video_url}")
+                    logger.info(f"✅ 视频已生成: {video_url}")
+                    
+                    # 提取封面和低分辨率预览（在线程池中执行，失败时只返回完整视频）
+                    video_info = yield Offload(video_processing.process_video, video_path)
                     
                     return {
                         'status': 'completed',
                         'progress': 100,
                         'video_url': video_url,
+                        'poster_url': media_paths.to_url(video_info['poster']) if video_info and video_info['poster'] else None,
+                        'preview_url': media_paths.to_url(video_info['preview']) if video_info and video_info['preview'] else None,
                         'message': '视频生成完成！'
                     }
                     
                 except Exception as e:
-                    print(f"❌ 处理视频结果失败: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception(f"❌ 处理视频结果失败: {str(e)}")
                     return {
                         'status': 'failed',
                         'error': str(e),
@@ -304,7 +364,7 @@ class Veo31API:
                     }
             else:
                 # 还在处理中
-                print(f"⏳ 视频生成中...")
+                logger.debug("⏳ 视频生成中...")
                 return {
                     'status': 'processing',
                     'progress': 50,  # 无法获取精确进度，使用固定值
@@ -312,7 +372,7 @@ class Veo31API:
                 }
                 
         except Exception as e:
-            print(f"❌ 状态检查失败: {str(e)}")
+            logger.error(f"❌ 状态检查失败: {str(e)}")
             return {
                 'status': 'failed',
                 'error': str(e),
@@ -1,25 +1,64 @@
+# 最先导入，作为启动计时的起点（重量级依赖通过 startup.lazy_import 延迟导入）
+import startup
 from flask import Flask, render_template, request, jsonify, send_file
 import os
-import uuid
-from werkzeug.utils import secure_filename
 from PIL import Image
-import cv2
-import numpy as np
 from api.nano_banana import NanoBananaAPI
 from api.hunyuan3d import Hunyuan3DGenerator
+from api.rate_limiter import get_scheduler
+from api.retry_policy import circuit_breaker_stats
+from api.upstream import run_steps, Offload
 from gallery_manager import GalleryManager
 from creation_session_manager import CreationSessionManager
+from generation_cache import GenerationCache
+import metrics
+from metrics import span
 import json
+import logging
+import logging_setup
+import profiling
+import static_assets
+import compression
+import upload_ingest
+import media_paths
+import video_processing
+import garbage_collector
+from upload_ingest import UploadRejected
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# 日志写入后台队列，不阻塞请求线程
+logging_setup.setup_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# 注册请求耗时统计和 /metrics 路由
+metrics.init_app(app)
+
+# 为每个请求分配关联ID（日志和响应头 X-Request-ID）
+logging_setup.init_app(app)
+
+# 按需请求性能分析（管理员请求头或按比例采样），结果在 /admin/profiles 查看
+profiling.init_app(app)
+
+# 模板中的CSS/JS指向构建后带哈希的文件（python static_assets.py），并设置长期缓存
+static_assets.init_app(app)
+
+# 按 Accept-Encoding 压缩HTML/JSON等动态响应（图片、视频、模型文件不压缩）
+compression.init_app(app)
+
+# 上传的图片边接收边计算哈希、检查文件头，相同内容只保存一份
+upload_ingest.init_app(app)
+
+# 记录启动耗时，并在后台预热OpenCV和AI SDK
+startup.init_app(app)
+
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -27,6 +66,12 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 gallery_manager = GalleryManager()
 session_manager = CreationSessionManager()
 
+# 定期回收过期的会话、上传图片和模型文件，总占用控制在磁盘预算之内（管理接口 /admin/gc）
+garbage_collector.init_app(app, session_manager=session_manager)
+
+# 生成结果缓存（通过GENERATION_CACHE_ENABLED环境变量开启）
+generation_cache = GenerationCache()
+
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 
@@ -38,6 +83,15 @@ def allowed_file(filename):
 def preprocess_sketch(image_path):
     """预处理手绘图片"""
     try:
+        # OpenCV导入较慢，第一次预处理时才导入
+        cv2 = startup.lazy_import('cv2')
+
+        # 原图按内容命名，预处理结果已存在说明是同一张图，直接复用
+        processed_path = upload_ingest.derived_path(image_path, 'processed')
+        if os.path.exists(processed_path):
+            logger.debug("♻️ 复用已有的预处理结果: %s", processed_path)
+            return processed_path
+        
         # 读取图片
         img = cv2.imread(image_path)
         if img is None:
@@ -49,35 +103,43 @@ def preprocess_sketch(image_path):
         # 二值化处理
         _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
         
-        # 保存预处理后的图片
-        processed_path = image_path.replace('.', '_processed.')
-        cv2.imwrite(processed_path, binary)
+        # 保存预处理后的图片（先写临时文件，同一张图的并发请求不会读到写了一半的文件）
+        temp_path = upload_ingest.atomic_temp_path(processed_path)
+        if not cv2.imwrite(temp_path, binary):
+            return None
+        os.replace(temp_path, processed_path)
         
         return processed_path
     except Exception as e:
-        print(f"图片预处理错误: {str(e)}")
+        logger.error(f"图片预处理错误: {str(e)}")
         return None
 
 def generate_3d_model_from_image(image_path):
-    """从图片生成3D模型的辅助函数"""
-    print(f"🧊 开始3D模型生成: {image_path}")
+    """从图片生成3D模型的辅助函数，返回模型URL"""
+    return media_paths.to_url(run_steps(generate_3d_model_from_image_steps(image_path)))
+
+def generate_3d_model_from_image_steps(image_path, output_dir=None):
+    """generate_3d_model_from_image 的步骤版本，返回模型文件路径（output_dir为空时保存到models/）"""
+    logger.info(f"🧊 开始3D模型生成: {image_path}")
     
     # 初始化3D生成器
     generator_3d = Hunyuan3DGenerator()
     
     # 生成3D模型（如果失败会抛出异常）
-    model_path = generator_3d.generate_3d_model(image_path)
+    model_path = yield from generator_3d.generate_3d_model_steps(image_path, output_dir=output_dir)
     
-    print(f"✅ 3D模型生成成功: {model_path}")
-    return model_path.replace('uploads/', '/uploads/')
+    logger.info(f"✅ 3D模型生成成功: {model_path}")
+    return model_path
 
 @app.route('/')
 def index():
     """主页"""
     # 获取最新的4个作品用于首页展示
-    gallery_manager = GalleryManager()
-    latest_artworks = gallery_manager.get_latest_artworks(limit=4)
-    return render_template('index.html', latest_artworks=latest_artworks)
+    with span('load_gallery'):
+        gallery_manager = GalleryManager()
+        latest_artworks = gallery_manager.get_latest_artworks(limit=4)
+    with span('render_template'):
+        return render_template('index.html', latest_artworks=latest_artworks)
 
 @app.route('/create')
 def create():
@@ -87,9 +149,11 @@ def create():
 @app.route('/gallery')
 def gallery():
     """显示作品画廊"""
-    gallery_manager = GalleryManager()
-    artworks = gallery_manager.get_all_artworks()
-    return render_template('gallery.html', artworks=artworks)
+    with span('load_gallery'):
+        gallery_manager = GalleryManager()
+        artworks = gallery_manager.get_all_artworks()
+    with span('render_template'):
+        return render_template('gallery.html', artworks=artworks)
 
 @app.route('/tutorial')
 def tutorial():
@@ -161,10 +225,31 @@ def create_session():
     except Exception as e:
         return jsonify({'error': f'创建会话失败: {str(e)}'}), 500
 
+def session_json_response(session_id, build):
+    """
+    带ETag的会话JSON响应：ETag是会话的修订号，请求的 If-None-Match 与之相同时直接返回304，
+    不读取会话数据也不序列化；否则调用 build() 生成响应。
+    修订号只表示内容语义相同（压缩与否字节不同），所以使用弱ETag（W/"..."），按弱比较匹配。
+    """
+    revision = session_manager.get_revision(session_id)
+    if revision is None:
+        return build()
+    
+    etag = f'session-{revision}'
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = build()
+    response = app.make_response(response)
+    response.set_etag(etag, weak=True)
+    # 浏览器每次都带上 If-None-Match 重新验证，fetch拿到的仍是完整的200响应
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/session/<session_id>/info')
 def get_session_info(session_id):
     """获取会话信息"""
-    try:
+    def build():
         session_info = session_manager.get_session_info(session_id)
         if not session_info:
             return jsonify({'error': '会话不存在'}), 404
@@ -173,6 +258,9 @@ def get_session_info(session_id):
             'success': True,
             'session': session_info
         })
+    
+    try:
+        return session_json_response(session_id, build)
         
     except Exception as e:
         return jsonify({'error': f'获取会话信息失败: {str(e)}'}), 500
@@ -180,7 +268,7 @@ def get_session_info(session_id):
 @app.route('/session/<session_id>/versions')
 def get_session_versions(session_id):
     """获取会话的所有版本"""
-    try:
+    def build():
         version_type = request.args.get('type')  # 'image' 或 'model'
         versions = session_manager.get_session_versions(session_id, version_type)
         
@@ -188,6 +276,9 @@ def get_session_versions(session_id):
             'success': True,
             'versions': versions
         })
+    
+    try:
+        return session_json_response(session_id, build)
         
     except Exception as e:
         return jsonify({'error': f'获取版本失败: {str(e)}'}), 500
@@ -195,17 +286,50 @@ def get_session_versions(session_id):
 @app.route('/session/<session_id>/selected-versions')
 def get_selected_versions(session_id):
     """获取当前选择的版本"""
-    try:
+    def build():
         selected = session_manager.get_selected_versions(session_id)
         
         return jsonify({
             'success': True,
             'selected': selected
         })
+    
+    try:
+        return session_json_response(session_id, build)
         
     except Exception as e:
         return jsonify({'error': f'获取选择版本失败: {str(e)}'}), 500
 
+@app.route('/session/<session_id>/snapshot')
+def get_session_snapshot(session_id):
+    """
+    获取会话快照：会话信息、版本列表和选择的版本一次返回，代替分别请求 info、versions 和 selected-versions
+    
+    查询参数：type（'image' 或 'model'）筛选版本，offset/limit 分页（limit=0 只返回会话信息和选择的版本）
+    """
+    try:
+        version_type = request.args.get('type') or None
+        # 按原始值解析：type=int 遇到非整数时会悄悄退回默认值
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = request.args.get('limit')
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            return jsonify({'error': '无效的查询参数'}), 400
+        if version_type not in (None, 'image', 'model') or offset < 0 or (limit is not None and limit < 0):
+            return jsonify({'error': '无效的查询参数'}), 400
+        
+        def build():
+            snapshot = session_manager.get_session_snapshot(session_id, version_type, offset, limit)
+            if not snapshot:
+                return jsonify({'error': '会话不存在'}), 404
+            return jsonify({'success': True, **snapshot})
+        
+        return session_json_response(session_id, build)
+        
+    except Exception as e:
+        return jsonify({'error': f'获取会话快照失败: {str(e)}'}), 500
+
 @app.route('/session/<session_id>/select-version', methods=['POST'])
 def select_version(session_id):
     """选择版本"""
@@ -241,7 +365,17 @@ def delete_version(session_id):
 @app.route('/generate-image', methods=['POST'])
 def generate_image():
     """统一的图片生成接口 - 支持文字和图片混合输入，支持会话版本管理"""
+    return run_steps(generate_image_steps())
+
+def load_form_data():
+    """解析表单：上传数据在这里流式写入临时文件并计算哈希（之后读取 request.form/files 不再解析）"""
+    return request.form, request.files
+
+def generate_image_steps():
+    """generate_image 的处理流程，上游调用以步骤形式yield（asgi.py中以协程执行）"""
     try:
+        # 解析表单和接收上传、保存上传、预处理都是本地IO和CPU处理，协程执行时放到线程池中
+        yield Offload(load_form_data)
         prompt = request.form.get('prompt', '').strip()
         style = request.form.get('style', 'cute')
         color_preference = request.form.get('color_preference', 'colorful')
@@ -250,59 +384,92 @@ def generate_image():
         original_image_path = request.form.get('original_image_path', '').strip()
         session_id = request.form.get('session_id')
         version_note = request.form.get('version_note', '')
+        generate_fresh = request.form.get('generate_fresh', 'false').lower() == 'true'
         
         if not prompt and not uploaded_file and not original_image_path:
             return jsonify({'error': '请输入文字描述或上传图片'}), 400
         
-        print(f"🎨 生成参数 - 风格: {style}, 色彩: {color_preference}, Expert模式: {expert_mode}")
-        
-        # 初始化Nano Banana API
-        nano_banana = NanoBananaAPI()
+        logger.info(f"🎨 生成参数 - 风格: {style}, 色彩: {color_preference}, Expert模式: {expert_mode}")
         
         # 处理上传的图片或使用原始图片路径
         sketch_path = None
         if uploaded_file and allowed_file(uploaded_file.filename):
-            filename = str(uuid.uuid4()) + '_' + secure_filename(uploaded_file.filename)
-            sketch_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            uploaded_file.save(sketch_path)
+            # 上传数据在表单解析时已流式写入临时文件并计算了哈希，这里按内容命名保存（相同图片只保存一份）
+            with span('save_upload'):
+                ingested = yield Offload(upload_ingest.ingest, uploaded_file, app.config['UPLOAD_FOLDER'])
+                sketch_path = ingested.path
             
             # 预处理手绘图片
-            processed_sketch = preprocess_sketch(sketch_path)
+            with span('preprocess_sketch'):
+                processed_sketch = yield Offload(preprocess_sketch, sketch_path)
             if processed_sketch:
                 sketch_path = processed_sketch
         elif original_image_path:
             # 使用已有的原始图片（生成更多功能）
             # 将URL路径转换为文件系统路径
-            if original_image_path.startswith('/uploads/'):
-                sketch_path = 'uploads' + original_image_path[8:]
-            elif original_image_path.startswith('uploads/'):
-                sketch_path = original_image_path
-            else:
-                sketch_path = os.path.join('uploads', original_image_path)
-        
-        print(f"🎨 开始生成图片 - 文字: {prompt}, 图片: {sketch_path}")
-        
-        # 根据输入类型生成图片（不再自动转换16:9）
-        if sketch_path and prompt:
-            # 图片+文字模式
-            generated_image_path = nano_banana.generate_image_from_sketch_and_text(
-                sketch_path, prompt, style=style, color_preference=color_preference, expert_mode=expert_mode
-            )
-        elif sketch_path:
-            # 纯图片模式
-            generated_image_path = nano_banana.generate_image_from_sketch(
-                sketch_path, style=style, color_preference=color_preference, expert_mode=expert_mode
-            )
+            sketch_path = media_paths.to_path(original_image_path)
+        
+        logger.info(f"🎨 开始生成图片 - 文字: {prompt}, 图片: {sketch_path}")
+        
+        # 会话存在时生成结果直接写到会话目录，添加版本时只需重命名，不再复制一份
+        output_dir = session_manager.session_dir(session_id)
+        
+        # 查询生成结果缓存（相同参数和相同手绘图直接复用之前的结果）
+        cache_key = None
+        generated_image_path = None
+        if generation_cache.enabled:
+            with span('cache_lookup'):
+                cache_key = generation_cache.make_key(
+                    prompt, style, color_preference, expert_mode,
+                    sketch_path=sketch_path, model_name=NanoBananaAPI.MODEL_NAME
+                )
+                if generate_fresh:
+                    generation_cache.record_bypass()
+                else:
+                    generated_image_path = generation_cache.get(cache_key, output_dir or app.config['UPLOAD_FOLDER'])
+        
+        from_cache = generated_image_path is not None
+        if from_cache:
+            logger.info(f"⚡ 命中生成结果缓存: {generated_image_path}")
         else:
-            # 纯文字模式
-            generated_image_path = nano_banana.generate_image_from_text(
-                prompt, style=style, color_preference=color_preference, expert_mode=expert_mode
-            )
+            # 初始化Nano Banana API
+            with span('init_client'):
+                nano_banana = NanoBananaAPI()
+            
+            # 根据输入类型生成图片（不再自动转换16:9）
+            with span('generate'):
+                if sketch_path and prompt:
+                    # 图片+文字模式
+                    generated_image_path = yield from nano_banana.generate_image_from_sketch_and_text_steps(
+                        sketch_path, prompt, style=style, color_preference=color_preference, expert_mode=expert_mode,
+                        output_dir=output_dir
+                    )
+                elif sketch_path:
+                    # 纯图片模式
+                    generated_image_path = yield from nano_banana.generate_image_from_sketch_steps(
+                        sketch_path, style=style, color_preference=color_preference, expert_mode=expert_mode,
+                        output_dir=output_dir
+                    )
+                else:
+                    # 纯文字模式
+                    generated_image_path = yield from nano_banana.generate_image_from_text_steps(
+                        prompt, style=style, color_preference=color_preference, expert_mode=expert_mode,
+                        output_dir=output_dir
+                    )
+            
+            if cache_key and generated_image_path:
+                with span('cache_store'):
+                    generation_cache.put(cache_key, generated_image_path, {
+                        'prompt': prompt,
+                        'style': style,
+                        'color_preference': color_preference,
+                        'expert_mode': expert_mode
+                    })
         
-        print(f"✅ 图片生成完成: {generated_image_path}")
+        logger.info(f"✅ 图片生成完成: {generated_image_path}")
         
         # 返回相对路径用于前端显示
-        relative_path = generated_image_path.replace('uploads/', '/uploads/')
+        relative_path = media_paths.to_url(generated_image_path)
         
         # 如果有会话ID，添加到会话版本管理
         version_id = None
@@ -311,43 +478,75 @@ def generate_image():
                 'prompt': prompt,
                 'has_sketch': sketch_path is not None,
                 'generation_type': 'mixed' if sketch_path and prompt else ('sketch' if sketch_path else 'text'),
+                'from_cache': from_cache,
                 'note': version_note
             }
             
-            version_result = session_manager.add_version(
-                session_id=session_id,
-                version_type='image',
-                file_path=generated_image_path,
-                metadata=metadata
-            )
+            with span('add_version'):
+                version_result = session_manager.add_version(
+                    session_id=session_id,
+                    version_type='image',
+                    file_path=generated_image_path,
+                    metadata=metadata,
+                    move=True
+                )
             
             if version_result['success']:
                 version_id = version_result['version_id']
+                relative_path = version_result['url_path']
                 # 自动选择新生成的版本
-                session_manager.select_version(session_id, version_id)
+                with span('select_version'):
+                    session_manager.select_version(session_id, version_id)
         
         # 准备返回数据
         response_data = {
             'success': True,
             'image_url': relative_path,
             'version_id': version_id,
+            'from_cache': from_cache,
             'message': '图片生成成功！'
         }
         
         # 如果有上传的图片，也返回原始图片路径
         if sketch_path:
-            original_relative_path = sketch_path.replace('uploads/', '/uploads/')
+            original_relative_path = media_paths.to_url(sketch_path)
             response_data['original_image_url'] = original_relative_path
         
         return jsonify(response_data)
             
+    except UploadRejected as e:
+        logger.warning(f"⚠️ 上传图片被拒绝: {e.description}")
+        return jsonify({'error': e.description}), e.code
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ 图片生成错误: {str(e)}")
+        logger.error(f"❌ 图片生成错误: {str(e)}")
         return jsonify({'error': f'生成失败: {str(e)}'}), 500
 
+@app.route('/api/generation-cache/stats')
+def generation_cache_stats():
+    """获取生成结果缓存的统计信息（命中率等）"""
+    return jsonify({
+        'success': True,
+        'stats': generation_cache.stats()
+    })
+
+@app.route('/api/rate-limit/stats')
+def rate_limit_stats():
+    """获取上游AI服务限流调度器的排队深度、等待时间统计和熔断器状态"""
+    return jsonify({
+        'success': True,
+        'models': get_scheduler().stats(),
+        'circuit_breakers': circuit_breaker_stats()
+    })
+
 @app.route('/adjust-image', methods=['POST'])
 def adjust_image():
     """调整现有图片"""
+    return run_steps(adjust_image_steps())
+
+def adjust_image_steps():
+    """adjust_image 的处理流程，上游调用以步骤形式yield（asgi.py中以协程执行）"""
     try:
         current_image = request.form.get('current_image')
         adjust_prompt = request.form.get('adjust_prompt', '').strip()
@@ -358,22 +557,29 @@ def adjust_image():
         if not current_image or not adjust_prompt:
             return jsonify({'error': '缺少图片路径或调整说明'}), 400
         
-        # 将相对路径转换为绝对路径
-        if current_image.startswith('/uploads/'):
-            current_image = current_image.replace('/uploads/', 'uploads/')
+        # 将URL转换为文件路径
+        try:
+            current_image = media_paths.to_path(current_image)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        output_dir = session_manager.session_dir(session_id)
         
         # 初始化Nano Banana API
-        nano_banana = NanoBananaAPI()
+        with span('init_client'):
+            nano_banana = NanoBananaAPI()
         
-        print(f"🔧 开始调整图片: {current_image} - 调整说明: {adjust_prompt}, Expert模式: {expert_mode}")
+        logger.info(f"🔧 开始调整图片: {current_image} - 调整说明: {adjust_prompt}, Expert模式: {expert_mode}")
         
         # 使用调整提示词重新生成图片
-        adjusted_image_path = nano_banana.adjust_image(current_image, adjust_prompt, expert_mode=expert_mode)
+        with span('generate'):
+            adjusted_image_path = yield from nano_banana.adjust_image_steps(
+                current_image, adjust_prompt, expert_mode=expert_mode, output_dir=output_dir
+            )
         
-        print(f"✅ 图片调整完成: {adjusted_image_path}")
+        logger.info(f"✅ 图片调整完成: {adjusted_image_path}")
         
         # 返回相对路径用于前端显示
-        relative_path = adjusted_image_path.replace('uploads/', '/uploads/')
+        relative_path = media_paths.to_url(adjusted_image_path)
         
         # 如果有会话ID，添加到会话版本管理
         version_id = None
@@ -385,17 +591,21 @@ def adjust_image():
                 'note': version_note
             }
             
-            version_result = session_manager.add_version(
-                session_id=session_id,
-                version_type='image',
-                file_path=adjusted_image_path,
-                metadata=metadata
-            )
+            with span('add_version'):
+                version_result = session_manager.add_version(
+                    session_id=session_id,
+                    version_type='image',
+                    file_path=adjusted_image_path,
+                    metadata=metadata,
+                    move=True
+                )
             
             if version_result['success']:
                 version_id = version_result['version_id']
+                relative_path = version_result['url_path']
                 # 自动选择新调整的版本
-                session_manager.select_version(session_id, version_id)
+                with span('select_version'):
+                    session_manager.select_version(session_id, version_id)
         
         return jsonify({
             'success': True,
@@ -405,12 +615,16 @@ def adjust_image():
         })
             
     except Exception as e:
-        print(f"❌ 图片调整错误: {str(e)}")
+        logger.error(f"❌ 图片调整错误: {str(e)}")
         return jsonify({'error': f'调整失败: {str(e)}'}), 500
 
 @app.route('/generate-3d-model', methods=['POST'])
 def generate_3d_model_endpoint():
     """从图片生成3D模型，支持会话版本管理"""
+    return run_steps(generate_3d_model_endpoint_steps())
+
+def generate_3d_model_endpoint_steps():
+    """generate_3d_model_endpoint 的处理流程，上游调用以步骤形式yield（asgi.py中以协程执行）"""
     try:
         image_path = request.form.get('image_path')
         session_id = request.form.get('session_id')
@@ -419,49 +633,66 @@ def generate_3d_model_endpoint():
         if not image_path:
             return jsonify({'error': '缺少图片路径'}), 400
         
-        # 将相对路径转换为绝对路径
-        if image_path.startswith('/uploads/'):
-            image_path = image_path.replace('/uploads/', 'uploads/')
+        # 将URL转换为文件路径
+        try:
+            image_path = media_paths.to_path(image_path)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        output_dir = session_manager.session_dir(session_id)
         
-        print(f"🧊 开始生成3D模型: {image_path}")
+        logger.info(f"🧊 开始生成3D模型: {image_path}")
         
         # 生成3D模型
-        model_result = generate_3d_model_from_image(image_path)
+        with span('generate_3d'):
+            model_path = yield from generate_3d_model_from_image_steps(image_path, output_dir=output_dir)
+        
+        logger.info(f"✅ 3D模型生成完成: {model_path}")
         
-        print(f"✅ 3D模型生成完成: {model_result}")
+        # 统计模型信息并生成低面数预览模型，前端先显示预览再加载完整模型
+        # （glb_processing 依赖numpy，第一次处理模型时才导入）
+        glb_processing = startup.lazy_import('glb_processing')
+        with span('process_glb'):
+            model_info = yield Offload(glb_processing.process_model, model_path)
+        preview_path = glb_processing.preview_path(model_path) if model_info and model_info['preview'] else None
+        model_url = media_paths.to_url(model_path)
         
         # 如果有会话ID，添加到会话版本管理
         version_id = None
         if session_id:
-            # 转换回绝对路径用于存储
-            model_abs_path = model_result.replace('/uploads/', 'uploads/')
-            
             metadata = {
                 'source_image': image_path,
+                'model_stats': model_info,
                 'note': version_note
             }
             
-            version_result = session_manager.add_version(
-                session_id=session_id,
-                version_type='model',
-                file_path=model_abs_path,
-                metadata=metadata
-            )
+            with span('add_version'):
+                version_result = session_manager.add_version(
+                    session_id=session_id,
+                    version_type='model',
+                    file_path=model_path,
+                    metadata=metadata,
+                    move=True
+                )
             
             if version_result['success']:
                 version_id = version_result['version_id']
+                model_url = version_result['url_path']
+                preview_path = glb_processing.move_preview(model_path, version_result['file_path'])
                 # 自动选择新生成的版本
-                session_manager.select_version(session_id, version_id)
+                with span('select_version'):
+                    session_manager.select_version(session_id, version_id)
         
         return jsonify({
             'success': True,
-            'model_url': model_result,
+            'model_url': model_url,
+            'model_preview_url': media_paths.to_url(preview_path) if preview_path else None,
+            'model_stats': model_info,
             'version_id': version_id,
             'message': '3D模型生成成功！'
         })
             
     except Exception as e:
-        print(f"❌ 3D模型生成错误: {str(e)}")
+        logger.error(f"❌ 3D模型生成错误: {str(e)}")
         return jsonify({'error': f'生成失败: {str(e)}'}), 500
 
 @app.route('/save-artwork', methods=['POST'])
@@ -469,23 +700,24 @@ def save_artwork():
     """从创作会话保存作品到作品集"""
     try:
         data = request.get_json()
-        print(f"📨 收到保存作品请求: {data}")
+        logger.debug("📨 收到保存作品请求: %s", data)
         
         # 验证必需的参数
         session_id = data.get('session_id')
-        print(f"🔍 会话ID: {session_id}")
+        logger.debug("🔍 会话ID: %s", session_id)
         
         if not session_id:
-            print("❌ 缺少会话ID")
+            logger.warning("❌ 缺少会话ID")
             return jsonify({'error': '缺少会话ID'}), 400
         
         # 从会话获取选择的版本
-        print(f"🔄 获取会话 {session_id} 的选择版本...")
-        selected_versions = session_manager.get_selected_versions(session_id)
-        print(f"📋 选择的版本: {selected_versions}")
+        logger.debug("🔄 获取会话 %s 的选择版本...", session_id)
+        with span('load_selected_versions'):
+            selected_versions = session_manager.get_selected_versions(session_id)
+        logger.debug("📋 选择的版本: %s", selected_versions)
         
         if 'image' not in selected_versions:
-            print("❌ 没有选择图片版本")
+            logger.warning("❌ 没有选择图片版本")
             return jsonify({'error': '请先选择一个图片版本'}), 400
         
         # 获取文件路径
@@ -502,22 +734,33 @@ def save_artwork():
         if model_path and not os.path.exists(model_path):
             return jsonify({'error': '选择的3D模型文件不存在'}), 400
         
+        # 会话中生成和调整图片时使用的提示词，保存到作品中用于搜索
+        prompts = []
+        for version in reversed(session_manager.get_session_versions(session_id, 'image')):
+            metadata = version.get('metadata') or {}
+            for key in ('prompt', 'adjust_prompt'):
+                if metadata.get(key) and metadata[key] not in prompts:
+                    prompts.append(metadata[key])
+        
         # 保存作品
-        result = gallery_manager.save_artwork(
-            original_image_path=None,  # 创作会话中可能没有原始图片
-            generated_image_path=image_path,
-            model_path=model_path,
-            title=data.get('title', '我的作品'),
-            artist_name=data.get('artist_name', '小朋友'),
-            artist_age=int(data.get('artist_age', 10)),
-            category=data.get('category', '其他'),
-            description=data.get('description', ''),
-            version_note=f"从创作会话保存 - 图片v{image_version.get('metadata', {}).get('note', '')}"
-        )
+        with span('save_artwork'):
+            result = gallery_manager.save_artwork(
+                original_image_path=None,  # 创作会话中可能没有原始图片
+                generated_image_path=image_path,
+                model_path=model_path,
+                title=data.get('title', '我的作品'),
+                artist_name=data.get('artist_name', '小朋友'),
+                artist_age=int(data.get('artist_age', 10)),
+                category=data.get('category', '其他'),
+                description=data.get('description', ''),
+                version_note=f"从创作会话保存 - 图片v{image_version.get('metadata', {}).get('note', '')}",
+                prompts=prompts
+            )
         
         if result['success']:
             # 关闭会话（标记为完成）
-            session_manager.close_session(session_id)
+            with span('close_session'):
+                session_manager.close_session(session_id)
             
             return jsonify({
                 'success': True,
@@ -531,17 +774,47 @@ def save_artwork():
     except Exception as e:
         return jsonify({'error': f'保存作品失败: {str(e)}'}), 500
 
+@app.route('/api/search')
+def search_artworks():
+    """
+    搜索作品集：按标题、作者、分类、说明和创作提示词匹配，结果按相关度排序
+    
+    查询参数：q 搜索词，category 分类，page 页码（从1开始），per_page 每页数量（最多50）
+    """
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    if not query:
+        return jsonify({'error': '请输入搜索内容'}), 400
+    
+    with span('search'):
+        found = gallery_manager.search_artworks(query, category=category,
+                                                offset=(page - 1) * per_page, limit=per_page)
+    
+    return jsonify({
+        'success': True,
+        'query': query,
+        'total': found['total'],
+        'page': page,
+        'per_page': per_page,
+        'results': [{**item['artwork'], 'score': item['score']} for item in found['results']]
+    })
+
 @app.route('/artwork/<artwork_id>')
 def view_artwork(artwork_id):
     """查看单个作品详情"""
-    artwork = gallery_manager.get_artwork_by_id(artwork_id)
+    with span('load_artwork'):
+        artwork = gallery_manager.get_artwork_by_id(artwork_id)
     if not artwork:
         return "作品不存在", 404
     
     # 增加浏览次数
-    gallery_manager.increment_views(artwork_id)
+    with span('increment_views'):
+        gallery_manager.increment_views(artwork_id)
     
-    return render_template('artwork_detail.html', artwork=artwork)
+    with span('render_template'):
+        return render_template('artwork_detail.html', artwork=artwork)
 
 @app.route('/like-artwork/<artwork_id>', methods=['POST'])
 def like_artwork(artwork_id):
@@ -567,26 +840,25 @@ def convert_image_for_video():
             return jsonify({'success': False, 'error': '缺少图片路径'}), 400
         
         # 转换路径
-        if image_path.startswith('/uploads/'):
-            image_path = 'uploads' + image_path[8:]
-        elif image_path.startswith('uploads/'):
-            pass
-        else:
-            image_path = os.path.join('uploads', image_path)
+        try:
+            image_path = media_paths.to_path(image_path)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        print(f"🎬 转换图片用于视频: {image_path}")
-        print(f"📐 目标宽高比: {aspect_ratio}, 填充模式: {padding_mode}")
+        logger.info(f"🎬 转换图片用于视频: {image_path}")
+        logger.debug(f"📐 目标宽高比: {aspect_ratio}, 填充模式: {padding_mode}")
         
         # 调用转换函数
         nano_banana = NanoBananaAPI()
-        converted_path = nano_banana.convert_image_for_video(
-            image_path, 
-            aspect_ratio=aspect_ratio, 
-            padding_mode=padding_mode
-        )
+        with span('convert_image'):
+            converted_path = nano_banana.convert_image_for_video(
+                image_path, 
+                aspect_ratio=aspect_ratio, 
+                padding_mode=padding_mode
+            )
         
         # 返回相对路径
-        relative_path = converted_path.replace('uploads/', '/uploads/')
+        relative_path = media_paths.to_url(converted_path)
         
         return jsonify({
             'success': True,
@@ -594,14 +866,16 @@ def convert_image_for_video():
         })
         
     except Exception as e:
-        print(f"❌ 图片转换错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ 图片转换错误: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/generate-video', methods=['POST'])
 def generate_video():
     """生成视频"""
+    return run_steps(generate_video_steps())
+
+def generate_video_steps():
+    """generate_video 的处理流程，上游调用以步骤形式yield（asgi.py中以协程执行）"""
     try:
         from api.veo31 import get_veo_api
         
@@ -620,25 +894,21 @@ def generate_video():
                 'error': '缺少必需参数'
             }), 400
         
-        print(f"\n🎬 收到视频生成请求:")
-        print(f"   Session ID: {session_id}")
-        print(f"   Image URL: {image_url}")
-        print(f"   Prompt: {prompt}")
-        print(f"   Duration: {duration}s")
-        print(f"   Aspect Ratio: {aspect_ratio}")
-        print(f"   Quality: {quality}")
-        print(f"   Motion: {motion_intensity}")
+        logger.info(f"🎬 收到视频生成请求: 会话 {session_id}, 图片 {image_url}")
+        logger.debug("🎬 视频参数 - Prompt: %s, Duration: %ss, Aspect Ratio: %s, Quality: %s, Motion: %s",
+                     prompt, duration, aspect_ratio, quality, motion_intensity)
         
         # 调用Veo API
         veo_api = get_veo_api()
-        result = veo_api.generate_video(
-            image_url=image_url,
-            prompt=prompt,
-            duration=duration,
-            aspect_ratio=aspect_ratio,
-            quality=quality,
-            motion_intensity=motion_intensity
-        )
+        with span('submit_video'):
+            result = yield from veo_api.generate_video_steps(
+                image_url=image_url,
+                prompt=prompt,
+                duration=duration,
+                aspect_ratio=aspect_ratio,
+                quality=quality,
+                motion_intensity=motion_intensity
+            )
         
         return jsonify({
             'success': True,
@@ -647,9 +917,7 @@ def generate_video():
         })
         
     except Exception as e:
-        print(f"❌ 视频生成错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ 视频生成错误: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -658,21 +926,36 @@ def generate_video():
 @app.route('/api/video-status/<path:task_id>')
 def video_status(task_id):
     """检查视频生成状态"""
+    return run_steps(video_status_steps(task_id))
+
+def video_status_steps(task_id):
+    """video_status 的处理流程"""
     try:
         from api.veo31 import get_veo_api
         
         veo_api = get_veo_api()
-        status_result = veo_api.check_status(task_id)
+        with span('check_status'):
+            status_result = yield from veo_api.check_status_steps(task_id)
         
         return jsonify(status_result)
         
     except Exception as e:
-        print(f"❌ 状态检查错误: {str(e)}")
+        logger.error(f"❌ 状态检查错误: {str(e)}")
         return jsonify({
             'status': 'failed',
             'error': str(e)
         }), 500
 
+# 需要等待上游AI服务的接口：端点名 -> 处理流程生成器
+# Flask视图用 run_steps 在请求线程中执行；asgi.py 在事件循环中执行，等待上游时不占线程
+STEP_VIEWS = {
+    'generate_image': generate_image_steps,
+    'adjust_image': adjust_image_steps,
+    'generate_3d_model_endpoint': generate_3d_model_endpoint_steps,
+    'generate_video': generate_video_steps,
+    'video_status': video_status_steps,
+}
+
 @app.route('/api/save-video', methods=['POST'])
 def save_video():
     """保存视频到作品集"""
@@ -688,18 +971,45 @@ def save_video():
                 'error': '缺少必需参数'
             }), 400
         
-        # TODO: 实现视频保存到作品集的逻辑
-        # 这里可以扩展gallery_manager来支持视频作品
+        try:
+            video_path = media_paths.to_path(video_url)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if not os.path.exists(video_path):
+            return jsonify({'success': False, 'error': '视频文件不存在'}), 400
+        
+        # 生成时已经提取的封面和预览直接使用，缺少时现在生成
+        with span('process_video'):
+            video_info = video_processing.process_video(video_path, reuse_existing=True)
+        
+        # 会话中选择的图片作为视频的源图片
+        selected_image = session_manager.get_selected_versions(session_id).get('image')
+        source_image_path = selected_image['file_path'] if selected_image else None
+        
+        with span('save_video'):
+            result = gallery_manager.save_video(
+                video_path,
+                video_info=video_info,
+                source_image_path=source_image_path,
+                title=data.get('title') or '我的视频',
+                artist_name=data.get('artist_name', '小朋友'),
+                artist_age=int(data.get('artist_age', 10)),
+                category=data.get('category', '其他'),
+                description=prompt
+            )
+        if not result['success']:
+            return jsonify(result), 500
         
-        print(f"✅ 视频已保存: {video_url}")
+        logger.info(f"✅ 视频已保存: {video_url}")
         
         return jsonify({
             'success': True,
+            'artwork_id': result['artwork_id'],
             'message': '视频已保存到作品集'
         })
         
     except Exception as e:
-        print(f"❌ 视频保存错误: {str(e)}")
+        logger.error(f"❌ 视频保存错误: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -713,7 +1023,7 @@ def too_large(e):
 @app.errorhandler(500)
 def internal_error(e):
     """内部服务器错误处理"""
-    print(f"服务器错误: {str(e)}")
+    logger.error(f"服务器错误: {str(e)}")
     return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
 
 if __name__ == '__main__':
@@ -726,4 +1036,6 @@ if __name__ == '__main__':
     print("   - 适合儿童：10-14岁友好界面设计")
     print("\n🌐 访问地址: http://127.0.0.1:8080")
     print("🔗 创作页面: http://127.0.0.1:8080/create")
-    app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
+    # 服务器类型由 SERVER_MODE 决定（默认waitress，未安装时用开发服务器），调试模式需设置 FLASK_DEBUG=true
+    import server
+    server.run(app, host='0.0.0.0', port=8080)
\ No newline at end of file
@@ -0,0 +1,19 @@
+"""
+接口测试的公共工具
+
+test_session_api.py、test_gallery_api.py 等用Flask测试客户端请求接口的测试脚本共用
+"""
+
+import os
+
+
+def import_app():
+    """导入应用时不预热依赖、不启动定期垃圾回收（导入后恢复环境变量，不影响其他测试）"""
+    saved = dict(os.environ)
+    os.environ.update(STARTUP_WARMUP='false', GC_ENABLED='false', LOG_LEVEL='WARNING')
+    try:
+        import app
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    return app
@@ -0,0 +1,221 @@
+"""
+ASGI入口 - 生成接口在事件循环中以协程执行，等待上游AI服务时不占用线程
+
+WSGI服务器（waitress/gunicorn）中每个生成请求从头到尾占着一个线程，
+3D模型生成要轮询几分钟，一个班的学生同时点“生成”时线程很快就用完了，
+连首页和作品集都要排队。
+
+这里的做法：
+    - app.STEP_VIEWS 中的接口（生成图片、调整图片、3D模型、视频、视频状态）
+      在事件循环中执行同一份处理流程（见 api/upstream.py），
+      等待上游、排队限流、轮询间隔都只是挂起的协程
+    - 其他路由（页面、静态文件、作品集等）仍是普通Flask视图，放到线程池中执行
+    - 请求体边接收边写入 SpooledTemporaryFile，大文件上传转存到磁盘，不整体缓存在内存中；
+      解析表单、保存上传和预处理在生成接口中以 Offload 步骤放到线程池中执行
+    - before_request / after_request 等钩子、错误处理、会话和指标与WSGI部署完全一致
+
+运行（需要 pip install uvicorn httpx）：
+    SERVER_MODE=asgi python server.py
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+注意：只能用单个worker进程，原因同 PRODUCTION_DEPLOYMENT.md 中的多进程说明。
+"""
+
+import sys
+import asyncio
+import logging
+import tempfile
+
+from werkzeug.exceptions import HTTPException
+
+from app import app, STEP_VIEWS
+from api.upstream import run_steps_async
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+# 请求体在内存中最多缓存的字节数，超过后转存到临时文件
+BODY_SPOOL_BYTES = 1024 * 1024
+
+
+async def _spool_body(receive, limit=None):
+    """
+    接收请求体，写入 SpooledTemporaryFile：小于 BODY_SPOOL_BYTES 时留在内存中，更大的上传转存到临时文件，
+    整个请求体不会一次性缓存在内存中。超过limit时停止接收（后续由Flask按MAX_CONTENT_LENGTH返回413）。
+    返回 (文件对象, 已接收字节数)
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+    size = 0
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            if chunk:
+                if size + len(chunk) > BODY_SPOOL_BYTES:
+                    # 已经（或这次将要）转存到磁盘，写文件放到线程池中
+                    await asyncio.to_thread(body.write, chunk)
+                else:
+                    body.write(chunk)
+                size += len(chunk)
+            if limit is not None and size > limit:
+                break
+            if not message.get('more_body', False):
+                break
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body, size
+
+
+def build_environ(scope, body, body_size: int = 0) -> dict:
+    """把ASGI的HTTP scope转换为WSGI environ；body 是请求体的文件对象"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            key = 'CONTENT_TYPE'
+        elif name == 'CONTENT_LENGTH':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = f'HTTP_{name}'
+        # 同名请求头按HTTP规范用逗号合并
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if 'CONTENT_LENGTH' not in environ and body_size:
+        environ['CONTENT_LENGTH'] = str(body_size)
+    return environ
+
+
+def _match_step_view(environ):
+    """返回 (处理流程, 路由参数)；不是生成接口或路由不匹配时返回 (None, None)"""
+    adapter = app.url_map.bind_to_environ(environ)
+    try:
+        endpoint, view_args = adapter.match()
+    except HTTPException:
+        # 404/405/重定向交给Flask按原来的方式处理
+        return None, None
+    return STEP_VIEWS.get(endpoint), view_args
+
+
+async def _send_response(send, status: str, headers, chunks):
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    for chunk in chunks:
+        if chunk:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def _run_steps_view(steps_factory, view_args, environ, send):
+    """在事件循环中处理生成接口，请求处理流程和 Flask.full_dispatch_request 一致"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+
+    ctx = app.request_context(environ)
+    error = None
+    try:
+        ctx.push()
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await run_steps_async(steps_factory(**view_args))
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+        response = app.finalize_request(rv)
+    except Exception as e:
+        error = e
+        response = app.handle_exception(e)
+    try:
+        # 生成接口返回的都是JSON，直接在事件循环中取出响应体
+        body = list(response(environ, start_response))
+    finally:
+        ctx.pop(error)
+    await _send_response(send, started['status'], started['headers'], body)
+
+
+async def _run_wsgi(environ, send):
+    """在线程池中执行普通Flask视图，逐块转发响应（文件下载不会一次读入内存）"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+
+    iterable = await asyncio.to_thread(app, environ, start_response)
+    iterator = iter(iterable)
+    try:
+        first = await asyncio.to_thread(next, iterator, _END)
+        await send({
+            'type': 'http.response.start',
+            'status': int(started['status'].split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in started['headers']],
+        })
+        chunk = first
+        while chunk is not _END:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await asyncio.to_thread(next, iterator, _END)
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            logger.info(f"🚀 ASGI应用已启动（{len(STEP_VIEWS)} 个生成接口以协程执行）")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI应用"""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise RuntimeError(f"不支持的ASGI连接类型: {scope['type']}")
+
+    body, body_size = await _spool_body(receive, app.config.get('MAX_CONTENT_LENGTH'))
+    try:
+        environ = build_environ(scope, body, body_size)
+        steps_factory, view_args = _match_step_view(environ)
+        if steps_factory is not None:
+            await _run_steps_view(steps_factory, view_args, environ, send)
+        else:
+            await _run_wsgi(environ, send)
+    finally:
+        body.close()
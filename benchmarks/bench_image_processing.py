@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+图片处理微基准测试
+
+覆盖请求路径上的CPU密集函数：
+    - preprocess_sketch（app.py，手绘图二值化）
+    - convert_image_for_video（NanoBananaAPI，黑边/模糊填充）
+    - 缩略图生成（Image.thumbnail）
+    - 编码（PNG / JPEG）
+
+输入尺寸 512–4096px，横向(4:3)和纵向(3:4)两种方向。每个用例先预热，再重复执行直到
+满足最少次数和时间预算，输出中位数/平均值/标准差/P95；内存峰值用tracemalloc单独测量
+（不影响计时）。注意tracemalloc只统计Python和numpy的分配，Pillow内部的像素缓冲区不在其中，
+报告末尾另外给出整个进程的RSS峰值作为参考。
+
+用法：
+    python benchmarks/bench_image_processing.py
+    python benchmarks/bench_image_processing.py --sizes 512,1024 --save-baseline benchmarks/baselines/image_processing.json
+    python benchmarks/bench_image_processing.py --compare benchmarks/baselines/image_processing.json --threshold 0.2
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime
+
+# 添加项目根目录到路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.fake_backends import install_fake_backends
+
+DEFAULT_SIZES = (512, 1024, 2048, 4096)
+ORIENTATIONS = ('landscape', 'portrait')
+
+
+def make_input_image(long_edge: int, orientation: str, seed: int = 0) -> Image.Image:
+    """用numpy生成带渐变、噪声和线条的测试图（比逐像素循环快几个数量级）"""
+    short_edge = long_edge * 3 // 4
+    width, height = (long_edge, short_edge) if orientation == 'landscape' else (short_edge, long_edge)
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    pixels += rng.normal(0, 12, pixels.shape).astype(np.float32)
+
+    # 画一些深色粗线，模拟手绘线条
+    for _ in range(20):
+        if rng.random() < 0.5:
+            row = rng.integers(0, height - 8)
+            pixels[row:row + 6, :, :] = 20
+        else:
+            col = rng.integers(0, width - 8)
+            pixels[:, col:col + 6, :] = 20
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+
+
+class Case:
+    """一个基准测试用例"""
+
+    def __init__(self, name, size, orientation, func):
+        self.name = name
+        self.size = size
+        self.orientation = orientation
+        self.func = func
+
+    @property
+    def key(self):
+        return f"{self.name}/{self.size}/{self.orientation}"
+
+
+def time_case(case: Case, min_repeats: int, max_repeats: int, budget: float, warmup: int):
+    """重复执行用例，返回耗时统计（秒）"""
+    for _ in range(warmup):
+        case.func()
+
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_repeats:
+        t0 = time.perf_counter()
+        case.func()
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= min_repeats and time.perf_counter() - started >= budget:
+            break
+
+    ordered = sorted(samples)
+    return {
+        'repeats': len(samples),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.mean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def measure_memory(case: Case):
+    """用tracemalloc测量单次执行的Python/numpy分配峰值（字节）"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        case.func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def build_cases(workdir, sizes, orientations):
+    """准备输入图片并生成所有用例"""
+    from app import preprocess_sketch
+    import upload_ingest
+    from api.nano_banana import NanoBananaAPI
+
+    nano_banana = NanoBananaAPI()
+    nano_banana.upload_folder = workdir
+
+    cases = []
+    for size in sizes:
+        for orientation in orientations:
+            image = make_input_image(size, orientation, seed=size)
+            path = os.path.join(workdir, f"input_{size}_{orientation}.png")
+            image.save(path)
+            aspect_ratio = '16:9' if orientation == 'landscape' else '9:16'
+
+            def preprocess(p=path):
+                # preprocess_sketch 会复用已有的 _processed 文件，每次先删掉才是真正的二值化耗时
+                processed = upload_ingest.derived_path(p, 'processed')
+                if os.path.exists(processed):
+                    os.remove(processed)
+                preprocess_sketch(p)
+
+            cases.append(Case('preprocess_sketch', size, orientation, preprocess))
+            for mode in ('black', 'blur'):
+                cases.append(Case(f'convert_for_video_{mode}', size, orientation,
+                                  lambda p=path, r=aspect_ratio, m=mode: nano_banana.convert_image_for_video(
+                                      p, aspect_ratio=r, padding_mode=m)))
+
+            def thumbnail(p=path):
+                with Image.open(p) as img:
+                    img.thumbnail((512, 512))
+                    img.save(io.BytesIO(), format='JPEG', quality=85)
+
+            def encode_png(img=image):
+                img.save(io.BytesIO(), format='PNG')
+
+            def encode_jpeg(img=image):
+                img.save(io.BytesIO(), format='JPEG', quality=90)
+
+            cases.append(Case('thumbnail_512_jpeg', size, orientation, thumbnail))
+            cases.append(Case('encode_png', size, orientation, encode_png))
+            cases.append(Case('encode_jpeg', size, orientation, encode_jpeg))
+    return cases
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """对比基线，返回变慢超过阈值的用例列表"""
+    regressions = []
+    previous = baseline.get('results', {})
+    for key, current in results.items():
+        old = previous.get(key)
+        if not old or not old.get('median'):
+            continue
+        ratio = current['median'] / old['median']
+        current['baseline_median'] = old['median']
+        current['change'] = round(ratio - 1, 4)
+        if ratio - 1 > threshold:
+            regressions.append((key, old['median'], current['median'], ratio - 1))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='图片处理函数微基准测试')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='输入长边尺寸（逗号分隔）')
+    parser.add_argument('--orientations', default=','.join(ORIENTATIONS), help='方向：landscape,portrait')
+    parser.add_argument('--filter', default='', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--min-repeats', type=int, default=5, help='每个用例最少重复次数')
+    parser.add_argument('--max-repeats', type=int, default=50, help='每个用例最多重复次数')
+    parser.add_argument('--budget', type=float, default=1.0, help='每个用例的计时预算（秒）')
+    parser.add_argument('--warmup', type=int, default=1, help='预热次数')
+    parser.add_argument('--no-memory', action='store_true', help='跳过内存峰值测量')
+    parser.add_argument('--save-baseline', help='把结果保存为基线JSON')
+    parser.add_argument('--compare', help='与基线JSON对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位数变慢超过该比例视为退化')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    orientations = [o.strip() for o in args.orientations.split(',') if o.strip()]
+    output_paths = {name: os.path.abspath(path) for name, path in
+                    (('save', args.save_baseline), ('compare', args.compare), ('output', args.output)) if path}
+
+    workdir = tempfile.mkdtemp(prefix='hltraining_imgbench_')
+    original_cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        # 每次调用都会输出INFO日志，基准测试中只保留警告和错误
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        install_fake_backends()
+        cases = [c for c in build_cases(workdir, sizes, orientations) if args.filter in c.name]
+
+        results = {}
+        print(f"{'用例':<44}{'次数':>6}{'中位数(ms)':>12}{'平均(ms)':>11}{'标准差':>9}{'P95(ms)':>10}{'内存峰值(MB)':>14}")
+        for case in cases:
+            row = time_case(case, args.min_repeats, args.max_repeats, args.budget, args.warmup)
+            if not args.no_memory:
+                row['peak_memory_bytes'] = measure_memory(case)
+            results[case.key] = row
+            peak = f"{row['peak_memory_bytes'] / 1024 / 1024:>14.1f}" if 'peak_memory_bytes' in row else f"{'-':>14}"
+            print(f"{case.key:<46}{row['repeats']:>6}{row['median'] * 1000:>12.2f}{row['mean'] * 1000:>11.2f}"
+                  f"{row['stdev'] * 1000:>9.2f}{row['p95'] * 1000:>10.2f}{peak}")
+
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pillow': Image.__version__,
+            'numpy': np.__version__,
+            'results': results,
+        }
+        try:
+            import resource
+            # Linux上ru_maxrss单位是KB
+            report['process_max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+            print(f"\n📈 进程RSS峰值: {report['process_max_rss_mb']} MB")
+        except ImportError:
+            pass
+
+        exit_code = 0
+        if 'compare' in output_paths:
+            with open(output_paths['compare'], 'r', encoding='utf-8') as f:
+                regressions = compare_with_baseline(results, json.load(f), args.threshold)
+            if regressions:
+                exit_code = 1
+                print(f"\n⚠️ 有 {len(regressions)} 个用例比基线慢 {args.threshold:.0%} 以上：")
+                for key, old, new, change in regressions:
+                    print(f"   {key}: {old * 1000:.2f}ms → {new * 1000:.2f}ms (+{change:.0%})")
+            else:
+                print("\n✅ 没有发现性能退化")
+
+        for name in ('save', 'output'):
+            if name in output_paths:
+                os.makedirs(os.path.dirname(output_paths[name]) or '.', exist_ok=True)
+                with open(output_paths[name], 'w', encoding='utf-8') as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+                print(f"💾 结果已保存: {output_paths[name]}")
+        return exit_code
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
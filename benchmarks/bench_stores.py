@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+数据存储规模基准测试
+
+生成 1k / 10k / 100k 规模的合成数据，测量 GalleryManager、VersionManager 和
+CreationSessionManager 各操作的延迟以及数据文件大小，为存储方案的选择提供依据。
+
+每个规模在独立的临时目录中运行：
+    - gallery_data.json       N 个作品
+    - artwork_versions.json   N × 每个作品的版本数
+    - creation_sessions/      N 个会话（一半已完成且超过7天，供 cleanup_old_sessions 清理）
+
+用法：
+    python benchmarks/bench_stores.py
+    python benchmarks/bench_stores.py --scales 1000,10000 --output stores.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from gallery_manager import GalleryManager
+from version_manager import VersionManager
+from creation_session_manager import CreationSessionManager
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+CATEGORIES = ['动物', '风景', '人物', '幻想', '其他']
+
+
+def generate_gallery(count, rng):
+    """生成作品集数据（新作品在前，和 save_artwork 的顺序一致）"""
+    now = datetime.now()
+    artworks = []
+    for i in range(count):
+        artwork_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        artworks.append({
+            'id': artwork_id,
+            'title': f'我的作品{i}',
+            'artist_name': f'学生{i % 300}',
+            'artist_age': 10 + i % 5,
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'description': '一只在月亮上跳舞的小猫，背景是星空和彩虹',
+            'created_at': (now - timedelta(minutes=i)).isoformat(),
+            'original_image': None,
+            'generated_image': f'gallery/{artwork_id}/generated_{artwork_id}.png',
+            'model_file': f'gallery/{artwork_id}/model_{artwork_id}.glb',
+            'likes': rng.randint(0, 50),
+            'views': rng.randint(0, 500),
+            'has_versions': True,
+            'version_count': 1
+        })
+    return artworks
+
+
+def generate_versions(artworks, per_artwork, rng):
+    """为每个作品生成若干版本，最后一个为当前版本"""
+    versions = []
+    for artwork in artworks:
+        for v in range(per_artwork):
+            version_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            versions.append({
+                'version_id': version_id,
+                'artwork_id': artwork['id'],
+                'created_at': artwork['created_at'],
+                'version_note': '从创作会话保存',
+                'auto_note': '初始创建' if v == 0 else '',
+                'files': {
+                    'image': f"gallery/{artwork['id']}/versions/{version_id}/image_v{version_id}.png",
+                    'model': f"gallery/{artwork['id']}/versions/{version_id}/model_v{version_id}.glb"
+                },
+                'is_current': v == per_artwork - 1
+            })
+    return versions
+
+
+def generate_sessions(folder, count, rng):
+    """生成会话目录；一半是已完成且超过7天的旧会话"""
+    now = datetime.now()
+    session_ids = []
+    for i in range(count):
+        session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        old = i % 2 == 0
+        created = now - timedelta(days=30 if old else 0, minutes=i)
+        data = {
+            'session_id': session_id,
+            'created_at': created.isoformat(),
+            'user_info': {},
+            'versions': [{
+                'version_id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'type': 'image',
+                'file_path': f'{folder}/{session_id}/image_v1.png',
+                'filename': 'image_v1.png',
+                'created_at': created.isoformat(),
+                'metadata': {'prompt': '一只猫', 'generation_type': 'text'},
+                'is_selected': True
+            }],
+            'current_step': 'image_generated',
+            'status': 'completed' if old else 'active'
+        }
+        session_dir = os.path.join(folder, session_id)
+        os.makedirs(session_dir)
+        with open(os.path.join(session_dir, 'session.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        if not old:
+            session_ids.append(session_id)
+    return session_ids
+
+
+def folder_size(folder):
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def measure(func, min_repeats, max_repeats, budget):
+    """重复执行func，返回耗时统计（秒）"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_repeats:
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= min_repeats and time.perf_counter() - started >= budget:
+            break
+    ordered = sorted(samples)
+    return {
+        'repeats': len(samples),
+        'median': statistics.median(ordered),
+        'mean': statistics.mean(ordered),
+        'max': ordered[-1],
+    }
+
+
+def run_scale(scale, args, rng):
+    """在临时目录中生成一个规模的数据并测量所有操作"""
+    results = {}
+    sizes = {}
+
+    def record(name, func, repeats=None):
+        if repeats == 1:
+            t0 = time.perf_counter()
+            func()
+            duration = time.perf_counter() - t0
+            row = {'repeats': 1, 'median': duration, 'mean': duration, 'max': duration}
+        else:
+            row = measure(func, args.min_repeats, args.max_repeats, args.budget)
+        results[name] = row
+        print(f"  {name:<36}{row['repeats']:>6}{row['median'] * 1000:>14.2f}{row['mean'] * 1000:>14.2f}{row['max'] * 1000:>14.2f}")
+
+    print(f"\n📦 规模 {scale}：生成数据...")
+    t0 = time.perf_counter()
+    artworks = generate_gallery(scale, rng)
+    with open('gallery_data.json', 'w', encoding='utf-8') as f:
+        json.dump(artworks, f, ensure_ascii=False, indent=2)
+    versions = generate_versions(artworks, args.versions_per_artwork, rng)
+    with open('artwork_versions.json', 'w', encoding='utf-8') as f:
+        json.dump(versions, f, ensure_ascii=False, indent=2)
+    session_count = min(scale, args.max_sessions) if args.max_sessions else scale
+    active_sessions = generate_sessions('creation_sessions', session_count, rng)
+    print(f"   数据生成耗时 {time.perf_counter() - t0:.1f} 秒"
+          f"（{scale} 个作品，{len(versions)} 个版本，{session_count} 个会话）")
+    del versions
+
+    os.makedirs('uploads', exist_ok=True)
+    with open('uploads/sample.png', 'wb') as f:
+        f.write(os.urandom(200 * 1024))
+
+    gallery = GalleryManager()
+    version_manager = gallery.version_manager
+    sessions = CreationSessionManager()
+    artwork_ids = [a['id'] for a in artworks]
+    del artworks
+
+    print(f"  {'操作':<34}{'次数':>6}{'中位数(ms)':>14}{'平均(ms)':>14}{'最大(ms)':>14}")
+    record('gallery.list_all', lambda: gallery.get_all_artworks())
+    record('gallery.list_category', lambda: gallery.get_all_artworks(category='动物', limit=20))
+    record('gallery.latest', lambda: gallery.get_latest_artworks(4))
+    record('gallery.get_by_id', lambda: gallery.get_artwork_by_id(rng.choice(artwork_ids)))
+    record('gallery.increment_views', lambda: gallery.increment_views(rng.choice(artwork_ids)))
+
+    record('versions.list_for_artwork', lambda: version_manager.get_artwork_versions(rng.choice(artwork_ids)))
+    created = []
+
+    def create_version():
+        artwork_id = rng.choice(artwork_ids)
+        result = version_manager.create_version(artwork_id, image_path='uploads/sample.png', version_note='基准测试')
+        created.append((artwork_id, result['version_id']))
+
+    record('versions.create_version', create_version)
+    record('versions.set_current_version', lambda: version_manager.set_current_version(*rng.choice(created)))
+
+    session_id = rng.choice(active_sessions)
+    record('sessions.add_version', lambda: sessions.add_version(session_id, 'image', 'uploads/sample.png', {'prompt': '基准测试'}))
+    record('sessions.get_session_info', lambda: sessions.get_session_info(rng.choice(active_sessions)))
+
+    sizes['gallery_data_bytes'] = os.path.getsize('gallery_data.json')
+    sizes['artwork_versions_bytes'] = os.path.getsize('artwork_versions.json')
+    sizes['creation_sessions_bytes'] = folder_size('creation_sessions')
+
+    # 第一次清理会删除一半的会话，之后再测一次全部保留时的扫描开销
+    record('sessions.cleanup_old_sessions', lambda: sessions.cleanup_old_sessions(days=7), repeats=1)
+    record('sessions.cleanup_scan_only', lambda: sessions.cleanup_old_sessions(days=7), repeats=1)
+
+    print(f"   gallery_data.json {sizes['gallery_data_bytes'] / 1024 / 1024:.1f} MB，"
+          f"artwork_versions.json {sizes['artwork_versions_bytes'] / 1024 / 1024:.1f} MB，"
+          f"creation_sessions/ {sizes['creation_sessions_bytes'] / 1024 / 1024:.1f} MB")
+    return {'operations': results, 'file_sizes': sizes, 'session_count': session_count}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='作品集/版本/会话存储规模基准测试')
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES), help='作品数量规模（逗号分隔）')
+    parser.add_argument('--versions-per-artwork', type=int, default=3, help='每个作品的版本数')
+    parser.add_argument('--max-sessions', type=int, default=0, help='会话数量上限（0表示与规模相同）')
+    parser.add_argument('--min-repeats', type=int, default=3, help='每个操作最少重复次数')
+    parser.add_argument('--max-repeats', type=int, default=30, help='每个操作最多重复次数')
+    parser.add_argument('--budget', type=float, default=2.0, help='每个操作的计时预算（秒）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    output_path = os.path.abspath(args.output) if args.output else None
+    original_cwd = os.getcwd()
+
+    report = {'created_at': datetime.now().isoformat(), 'config': vars(args), 'scales': {}}
+    for scale in scales:
+        workdir = tempfile.mkdtemp(prefix=f'hltraining_stores_{scale}_')
+        try:
+            os.chdir(workdir)
+            report['scales'][str(scale)] = run_scale(scale, args, random.Random(args.seed + scale))
+        finally:
+            os.chdir(original_cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {output_path}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+课堂场景离线压测
+
+模拟一个班的学生同时使用创作流程：创建会话 → 生成图片（一半学生上传手绘图）→ 调整图片 →
+生成3D模型 → 保存作品，可选浏览作品集和生成视频。所有上游AI服务都由 fake_backends 模拟，
+不消耗真实配额，可以在改动前后各跑一次来比较每一步的P50/P95/P99延迟、吞吐量和错误数。
+
+应用运行在临时目录中（uploads/、models/、creation_sessions/ 等都写到临时目录），
+通过真实的多线程WSGI服务器访问，和生产环境的并发行为一致。
+
+用法：
+    python benchmarks/classroom_benchmark.py --students 30 --time-scale 0.05
+    python benchmarks/classroom_benchmark.py --students 30 --video --gallery --output result.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import requests
+from PIL import Image, ImageDraw
+
+from benchmarks.fake_backends import FakeBackendConfig, LatencyModel, install_fake_backends, call_stats
+
+
+PROMPTS = [
+    '一只在月亮上跳舞的小猫', '会飞的彩虹独角兽', '海底的城堡和小鱼', '戴帽子的恐龙在踢足球',
+    '森林里的蘑菇房子', '太空中的宇航员小熊', '下雨天撑伞的青蛙', '开着火车的小兔子'
+]
+
+ADJUST_PROMPTS = ['把背景改成蓝色', '让它笑起来', '加上一些星星', '颜色更鲜艳一点']
+
+
+def make_sketch_png(seed: int, size: int = 512) -> bytes:
+    """画一张简单的线稿作为学生上传的手绘图"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        points = [(rng.randint(0, size), rng.randint(0, size)) for _ in range(4)]
+        draw.line(points, fill='black', width=rng.randint(2, 6))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """线程安全地记录每一步的耗时和错误"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.errors = {}
+        self.error_samples = {}
+
+    def record(self, step, duration, error=None):
+        with self._lock:
+            if error is None:
+                self.durations.setdefault(step, []).append(duration)
+            else:
+                self.errors[step] = self.errors.get(step, 0) + 1
+                self.error_samples.setdefault(step, [])
+                if len(self.error_samples[step]) < 3:
+                    self.error_samples[step].append(str(error)[:200])
+
+    def summary(self, wall_time):
+        steps = {}
+        for step in sorted(set(self.durations) | set(self.errors)):
+            values = self.durations.get(step, [])
+            steps[step] = {
+                'count': len(values),
+                'errors': self.errors.get(step, 0),
+                'p50': round(percentile(values, 50), 4),
+                'p95': round(percentile(values, 95), 4),
+                'p99': round(percentile(values, 99), 4),
+                'mean': round(statistics.mean(values), 4) if values else 0.0,
+                'max': round(max(values), 4) if values else 0.0,
+                'throughput_per_second': round(len(values) / wall_time, 4) if wall_time else 0.0,
+            }
+        return steps
+
+
+class StudentSession:
+    """一个学生的完整创作流程"""
+
+    def __init__(self, base_url, index, recorder, args):
+        self.base_url = base_url
+        self.index = index
+        self.recorder = recorder
+        self.args = args
+        self.http = requests.Session()
+        self.rng = random.Random(args.seed + index)
+
+    def _step(self, name, method, path, **kwargs):
+        start = time.perf_counter()
+        error = None
+        data = None
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.args.request_timeout, **kwargs)
+            content_type = response.headers.get('Content-Type', '')
+            data = response.json() if 'json' in content_type else {}
+            if response.status_code >= 400 or data.get('success') is False:
+                error = f"HTTP {response.status_code}: {data.get('error', '') if data else response.text[:100]}"
+        except Exception as e:
+            error = e
+        self.recorder.record(name, time.perf_counter() - start, error)
+        if error is not None:
+            raise RuntimeError(f"{name}: {error}")
+        return data
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            session_id = self._step('create_session', 'POST', '/create-session',
+                                    json={'student': f'student-{self.index}'})['session_id']
+
+            form = {
+                'prompt': self.rng.choice(PROMPTS),
+                'style': self.rng.choice(['cute', 'realistic', 'cartoon']),
+                'color_preference': 'colorful',
+                'session_id': session_id,
+            }
+            files = None
+            if self.index % 2 == 0:
+                files = {'sketch': (f'sketch_{self.index}.png', make_sketch_png(self.args.seed + self.index), 'image/png')}
+            image_url = self._step('generate_image', 'POST', '/generate-image', data=form, files=files)['image_url']
+
+            image_url = self._step('adjust_image', 'POST', '/adjust-image', data={
+                'current_image': image_url,
+                'adjust_prompt': self.rng.choice(ADJUST_PROMPTS),
+                'session_id': session_id,
+            })['image_url']
+
+            self._step('generate_3d', 'POST', '/generate-3d-model', data={
+                'image_path': image_url,
+                'session_id': session_id,
+            })
+
+            if self.args.video:
+                self._run_video(session_id, image_url)
+
+            self._step('save_artwork', 'POST', '/save-artwork', json={
+                'session_id': session_id,
+                'title': f'作品{self.index}',
+                'artist_name': f'学生{self.index}',
+                'artist_age': 10,
+            })
+
+            if self.args.gallery:
+                self._step('gallery_page', 'GET', '/gallery')
+
+            self.recorder.record('student_total', time.perf_counter() - started)
+        except Exception as e:
+            self.recorder.record('student_total', time.perf_counter() - started, e)
+
+    def _run_video(self, session_id, image_url):
+        converted = self._step('convert_image_for_video', 'POST', '/api/convert-image-for-video', json={
+            'image_path': image_url,
+            'aspect_ratio': '16:9',
+            'padding_mode': 'blur',
+        })['converted_image_url']
+
+        task_id = self._step('submit_video', 'POST', '/api/generate-video', json={
+            'session_id': session_id,
+            'image_url': converted,
+            'prompt': '让画面动起来',
+            'duration': 4,
+        })['task_id']
+
+        start = time.perf_counter()
+        while True:
+            status = self._step('video_status_poll', 'GET', f'/api/video-status/{task_id}')
+            if status.get('status') != 'processing':
+                break
+            time.sleep(self.args.poll_interval)
+        self.recorder.record('video_total_wait', time.perf_counter() - start)
+
+        if status.get('status') != 'completed':
+            raise RuntimeError(f"视频生成失败: {status}")
+        self._step('save_video', 'POST', '/api/save-video', json={
+            'session_id': session_id,
+            'video_url': status['video_url'],
+            'prompt': '让画面动起来',
+        })
+
+
+def configure_environment(args, workdir):
+    """在导入应用之前配置限流、重试和缓存参数"""
+    os.chdir(workdir)
+    scale = args.time_scale
+
+    # 按时间缩放系数同比例放大每分钟请求数、缩短重试退避，保证压缩后的场景和真实场景等价
+    if args.no_rate_limit:
+        for prefix in ('GEMINI', 'VEO', 'HUNYUAN3D'):
+            os.environ[f'RATE_LIMIT_{prefix}_RPM'] = '100000'
+            os.environ[f'RATE_LIMIT_{prefix}_CONCURRENCY'] = '1000'
+    else:
+        for prefix, rpm in (('GEMINI', 10), ('VEO', 2), ('HUNYUAN3D', 20)):
+            configured = float(os.getenv(f'RATE_LIMIT_{prefix}_RPM', rpm))
+            os.environ[f'RATE_LIMIT_{prefix}_RPM'] = str(configured / scale)
+    os.environ['RETRY_BASE_DELAY'] = str(float(os.getenv('RETRY_BASE_DELAY', '1')) * scale)
+    os.environ['RETRY_MAX_DELAY'] = str(float(os.getenv('RETRY_MAX_DELAY', '20')) * scale)
+    os.environ['GENERATION_CACHE_ENABLED'] = 'true' if args.cache else 'false'
+
+
+def start_server(app):
+    """在后台线程中启动多线程WSGI服务器，返回基础URL和服务器对象"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def print_report(steps, wall_time, args):
+    print()
+    print(f"📊 课堂压测结果：{args.students} 名学生，并发 {args.concurrency}，"
+          f"时间缩放 {args.time_scale}，总耗时 {wall_time:.2f} 秒")
+    header = f"{'步骤':<26}{'次数':>6}{'错误':>6}{'P50(s)':>10}{'P95(s)':>10}{'P99(s)':>10}{'最大(s)':>10}{'吞吐(/s)':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, row in steps.items():
+        print(f"{name:<28}{row['count']:>6}{row['errors']:>6}{row['p50']:>10.3f}{row['p95']:>10.3f}"
+              f"{row['p99']:>10.3f}{row['max']:>10.3f}{row['throughput_per_second']:>10.3f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='课堂场景离线压测（上游AI服务全部模拟）')
+    parser.add_argument('--students', type=int, default=30, help='学生人数')
+    parser.add_argument('--concurrency', type=int, default=None, help='同时操作的学生数（默认等于学生人数）')
+    parser.add_argument('--ramp', type=float, default=60.0, help='所有学生在多少秒内陆续开始（会按时间缩放）')
+    parser.add_argument('--time-scale', type=float, default=0.05, help='上游延迟缩放系数，1表示真实延迟')
+    parser.add_argument('--gemini-latency', default='6,15', help='Gemini延迟 "中位数,P95"（秒）')
+    parser.add_argument('--veo-latency', default='60,120', help='Veo延迟 "中位数,P95"（秒）')
+    parser.add_argument('--hunyuan-latency', default='90,180', help='混元3D延迟 "中位数,P95"（秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='上游返回503的概率')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='上游返回429的概率')
+    parser.add_argument('--image-size', type=int, default=1024, help='生成图片的边长')
+    parser.add_argument('--glb-vertices', type=int, default=20000, help='生成模型的顶点数')
+    parser.add_argument('--video', action='store_true', help='包含视频生成步骤')
+    parser.add_argument('--gallery', action='store_true', help='保存后浏览作品集页面')
+    parser.add_argument('--cache', action='store_true', help='开启生成结果缓存')
+    parser.add_argument('--no-rate-limit', action='store_true', help='关闭限流调度器（只测应用自身开销）')
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='视频状态轮询间隔（秒）')
+    parser.add_argument('--request-timeout', type=float, default=600, help='单个请求超时（秒）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时目录（查看生成的文件）')
+    parser.add_argument('--quiet', action='store_true', help='隐藏应用的控制台输出')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.concurrency = args.concurrency or args.students
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    config = FakeBackendConfig(
+        gemini_latency=LatencyModel.parse(args.gemini_latency),
+        veo_latency=LatencyModel.parse(args.veo_latency),
+        hunyuan_latency=LatencyModel.parse(args.hunyuan_latency),
+        time_scale=args.time_scale,
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        image_size=args.image_size,
+        glb_vertices=args.glb_vertices,
+        seed=args.seed,
+    )
+
+    workdir = tempfile.mkdtemp(prefix='hltraining_bench_')
+    original_cwd = os.getcwd()
+    real_stdout = sys.stdout
+    try:
+        configure_environment(args, workdir)
+        install_fake_backends(config)
+
+        if args.quiet:
+            import logging
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            sys.stdout = open(os.devnull, 'w')
+        from app import app
+        from api.rate_limiter import get_scheduler
+        from api.retry_policy import circuit_breaker_stats
+
+        base_url, server = start_server(app)
+        recorder = Recorder()
+        ramp = args.ramp * args.time_scale
+
+        def run_student(index):
+            time.sleep(ramp * index / max(1, args.students))
+            StudentSession(base_url, index, recorder, args).run()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(run_student, range(args.students)))
+        wall_time = time.perf_counter() - started
+        server.shutdown()
+        sys.stdout = real_stdout
+
+        steps = recorder.summary(wall_time)
+        print_report(steps, wall_time, args)
+
+        result = {
+            'config': vars(args),
+            'wall_time_seconds': round(wall_time, 3),
+            'students_completed': steps.get('student_total', {}).get('count', 0),
+            'steps': steps,
+            'error_samples': recorder.error_samples,
+            'upstream_calls': dict(call_stats.counts),
+            'rate_limit': get_scheduler().stats(),
+            'circuit_breakers': circuit_breaker_stats(),
+        }
+        if output_path:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"💾 结果已保存: {output_path}")
+        return result
+    finally:
+        sys.stdout = real_stdout
+        os.chdir(original_cwd)
+        if args.keep_workdir:
+            print(f"📁 临时目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
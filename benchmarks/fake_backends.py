@@ -0,0 +1,526 @@
+"""
+离线基准测试用的假上游服务
+
+模拟 NanoBananaAPI (google.generativeai)、Veo31API (google.genai) 和
+Hunyuan3DGenerator (腾讯云AI3D SDK + 模型下载) 所依赖的客户端，
+可以配置延迟分布、失败率和输出大小，完全不消耗真实配额。
+
+用法：
+    from benchmarks.fake_backends import FakeBackendConfig, install_fake_backends
+    install_fake_backends(FakeBackendConfig(time_scale=0.05))
+    from app import app   # 之后导入的应用只会访问假服务
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import types
+import random
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+
+@dataclass
+class LatencyModel:
+    """对数正态延迟分布，由中位数和P95描述（单位：秒）"""
+    median: float
+    p95: float
+
+    def sample(self, rng: random.Random, time_scale: float = 1.0) -> float:
+        if self.median <= 0:
+            return 0.0
+        sigma = max(1e-6, math.log(max(self.p95, self.median) / self.median) / 1.645)
+        return rng.lognormvariate(math.log(self.median), sigma) * time_scale
+
+    @classmethod
+    def parse(cls, text: str) -> 'LatencyModel':
+        """解析 "中位数,P95" 格式，例如 "6,15" """
+        parts = [float(p) for p in text.split(',')]
+        return cls(parts[0], parts[1] if len(parts) > 1 else parts[0])
+
+
+@dataclass
+class FakeBackendConfig:
+    """假上游服务的行为配置"""
+    gemini_latency: LatencyModel = field(default_factory=lambda: LatencyModel(6.0, 15.0))
+    veo_latency: LatencyModel = field(default_factory=lambda: LatencyModel(60.0, 120.0))
+    hunyuan_latency: LatencyModel = field(default_factory=lambda: LatencyModel(90.0, 180.0))
+    download_latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.5, 2.0))
+    # 所有延迟乘以这个系数，便于快速跑完整场景
+    time_scale: float = 1.0
+    # 调用失败的概率（返回503）和被限流的概率（返回429）
+    failure_rate: float = 0.0
+    throttle_rate: float = 0.0
+    # 输出大小
+    image_size: int = 1024
+    glb_vertices: int = 20000
+    video_seconds: int = 8
+    video_size: tuple = (1280, 720)
+    seed: int = 42
+
+
+class _CallStats:
+    """记录每个假服务被调用的次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def inc(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+call_stats = _CallStats()
+
+_config = FakeBackendConfig()
+_rng = random.Random(_config.seed)
+_rng_lock = threading.Lock()
+_payload_cache = {}
+
+
+def _sleep(latency: LatencyModel):
+    with _rng_lock:
+        delay = latency.sample(_rng, _config.time_scale)
+    time.sleep(delay)
+
+
+async def _sleep_async(latency: LatencyModel):
+    import asyncio
+    with _rng_lock:
+        delay = latency.sample(_rng, _config.time_scale)
+    await asyncio.sleep(delay)
+
+
+def _maybe_fail(service: str):
+    """按配置的概率模拟上游故障"""
+    with _rng_lock:
+        roll = _rng.random()
+    if roll < _config.throttle_rate:
+        raise Exception(f"429 RESOURCE_EXHAUSTED: fake {service} quota exceeded. Please retry in 1s")
+    if roll < _config.throttle_rate + _config.failure_rate:
+        raise Exception(f"503 UNAVAILABLE: fake {service} is overloaded")
+
+
+def fake_png_bytes(size: int) -> bytes:
+    """生成指定边长的PNG图片（带噪声，文件大小接近真实生成结果）"""
+    key = ('png', size)
+    if key not in _payload_cache:
+        rng = np.random.default_rng(size)
+        y, x = np.mgrid[0:size, 0:size]
+        base = np.stack([x * 255 // max(1, size - 1), y * 255 // max(1, size - 1),
+                         (x + y) * 255 // max(1, 2 * size - 2)], axis=-1).astype(np.int16)
+        noise = rng.integers(-24, 24, size=base.shape, dtype=np.int16)
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'RGB').save(buffer, format='PNG')
+        _payload_cache[key] = buffer.getvalue()
+    return _payload_cache[key]
+
+
+def fake_mp4_bytes(seconds: int, size: tuple, fps: int = 24) -> bytes:
+    """生成一段可以正常解码的MP4视频（移动的渐变画面），封面和预览生成走真实的解码路径"""
+    key = ('mp4', seconds, size, fps)
+    if key not in _payload_cache:
+        import cv2
+        width, height = size
+        y, x = np.mgrid[0:height, 0:width]
+        base = np.stack([x * 255 // max(1, width - 1), y * 255 // max(1, height - 1),
+                         (x + y) * 255 // max(1, width + height - 2)], axis=-1).astype(np.uint8)
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        try:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            for i in range(seconds * fps):
+                writer.write(np.roll(base, i * 8, axis=1))
+            writer.release()
+            with open(path, 'rb') as f:
+                _payload_cache[key] = f.read()
+        finally:
+            os.remove(path)
+    return _payload_cache[key]
+
+
+def fake_glb_bytes(vertex_count: int, texture_size: int = 256) -> bytes:
+    """生成一个带纹理的球面网格GLB文件，顶点数约为vertex_count"""
+    key = ('glb', vertex_count, texture_size)
+    if key in _payload_cache:
+        return _payload_cache[key]
+
+    rings = max(3, int(math.sqrt(vertex_count / 2)))
+    segments = max(3, vertex_count // rings)
+    theta = np.linspace(0, math.pi, rings)
+    phi = np.linspace(0, 2 * math.pi, segments)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    normals = np.stack([np.sin(t) * np.cos(p), np.cos(t), np.sin(t) * np.sin(p)], axis=-1).reshape(-1, 3)
+    positions = (normals * 0.5).astype(np.float32)
+    normals = normals.astype(np.float32)
+    uvs = np.stack([p / (2 * math.pi), t / math.pi], axis=-1).reshape(-1, 2).astype(np.float32)
+
+    r, s = np.meshgrid(np.arange(rings - 1), np.arange(segments - 1), indexing='ij')
+    a = (r * segments + s).ravel()
+    b = a + segments
+    indices = np.stack([a, b, a + 1, a + 1, b, b + 1], axis=-1).reshape(-1).astype(np.uint32)
+
+    blobs = [positions.tobytes(), normals.tobytes(), uvs.tobytes(), indices.tobytes(),
+             fake_png_bytes(texture_size)]
+
+    binary = b''
+    views = []
+    for blob in blobs:
+        views.append({'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(blob)})
+        binary += blob + b'\x00' * ((4 - len(blob) % 4) % 4)
+    for view in views[:3]:
+        view['target'] = 34962
+    views[3]['target'] = 34963
+
+    count = len(positions)
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'HLTraining fake backend'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{
+            'attributes': {'POSITION': 0, 'NORMAL': 1, 'TEXCOORD_0': 2},
+            'indices': 3,
+            'material': 0
+        }]}],
+        'materials': [{'pbrMetallicRoughness': {'baseColorTexture': {'index': 0}}}],
+        'textures': [{'source': 0}],
+        'images': [{'bufferView': 4, 'mimeType': 'image/png'}],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126, 'count': count, 'type': 'VEC3',
+             'min': positions.min(axis=0).tolist(), 'max': positions.max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': 5126, 'count': count, 'type': 'VEC3'},
+            {'bufferView': 2, 'componentType': 5126, 'count': count, 'type': 'VEC2'},
+            {'bufferView': 3, 'componentType': 5125, 'count': len(indices), 'type': 'SCALAR'},
+        ],
+        'bufferViews': views,
+        'buffers': [{'byteLength': len(binary)}],
+    }
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * ((4 - len(json_chunk) % 4) % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    glb = (struct.pack('<III', 0x46546C67, 2, total)
+           + struct.pack('<II', len(json_chunk), 0x4E4F534A) + json_chunk
+           + struct.pack('<II', len(binary), 0x004E4942) + binary)
+    _payload_cache[key] = glb
+    return glb
+
+
+def _image_response():
+    part = SimpleNamespace(text=None, inline_data=SimpleNamespace(
+        data=fake_png_bytes(_config.image_size), mime_type='image/png'))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+# ===== google.generativeai（NanoBananaAPI） =====
+
+class FakeGenerativeModel:
+    """替代 google.generativeai.GenerativeModel"""
+
+    def __init__(self, model_name, *args, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, *args, **kwargs):
+        call_stats.inc('gemini.generate_content')
+        _sleep(_config.gemini_latency)
+        _maybe_fail('gemini')
+        return _image_response()
+
+    async def generate_content_async(self, contents, *args, **kwargs):
+        call_stats.inc('gemini.generate_content')
+        await _sleep_async(_config.gemini_latency)
+        _maybe_fail('gemini')
+        return _image_response()
+
+
+fake_generativeai = SimpleNamespace(
+    configure=lambda **kwargs: None,
+    GenerativeModel=FakeGenerativeModel,
+)
+
+
+# ===== google.genai（Veo31API） =====
+
+class _FakeFiles:
+    def upload(self, file=None, config=None, **kwargs):
+        call_stats.inc('genai.files.upload')
+        _sleep(_config.download_latency)
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        return SimpleNamespace(name=name, uri=f"https://fake.googleapis.com/{name}")
+
+    def download(self, file=None, **kwargs):
+        call_stats.inc('genai.files.download')
+        _sleep(_config.download_latency)
+        data = fake_mp4_bytes(_config.video_seconds, _config.video_size)
+        for offset in range(0, len(data), 256 * 1024):
+            yield data[offset:offset + 256 * 1024]
+
+
+class _FakeOperations:
+    def __init__(self, operations):
+        self._operations = operations
+
+    def get(self, operation, **kwargs):
+        call_stats.inc('genai.operations.get')
+        name = getattr(operation, 'name', operation)
+        ready_at = self._operations.get(name, 0)
+        done = time.monotonic() >= ready_at
+        response = SimpleNamespace(
+            generated_videos=[SimpleNamespace(video=SimpleNamespace(name=f"{name}/video"))],
+            rai_media_filtered_reasons=None
+        ) if done else None
+        return SimpleNamespace(name=name, done=done, error=None, response=response)
+
+
+class _FakeModels:
+    def __init__(self, operations):
+        self._operations = operations
+
+    def generate_content(self, model=None, contents=None, **kwargs):
+        call_stats.inc('genai.models.generate_content')
+        _sleep(_config.gemini_latency)
+        _maybe_fail('gemini')
+        return _image_response()
+
+    def generate_videos(self, model=None, prompt=None, image=None, config=None, **kwargs):
+        call_stats.inc('genai.models.generate_videos')
+        _maybe_fail('veo')
+        name = f"operations/{uuid.uuid4().hex[:16]}"
+        with _rng_lock:
+            duration = _config.veo_latency.sample(_rng, _config.time_scale)
+        self._operations[name] = time.monotonic() + duration
+        return SimpleNamespace(name=name, done=False, error=None, response=None)
+
+
+class FakeGenAIClient:
+    """替代 google.genai.Client"""
+
+    _operations = {}
+
+    def __init__(self, api_key=None, **kwargs):
+        self.files = _FakeFiles()
+        self.models = _FakeModels(self._operations)
+        self.operations = _FakeOperations(self._operations)
+        self.aio = _FakeAio(self)
+
+
+class _FakeAio:
+    """替代 client.aio：同样的调用，等待时让出事件循环"""
+
+    def __init__(self, client):
+        self.files = SimpleNamespace(upload=self._upload, download=self._download)
+        self.models = SimpleNamespace(generate_content=self._generate_content,
+                                      generate_videos=self._generate_videos)
+        self.operations = SimpleNamespace(get=self._get_operation)
+        self._client = client
+
+    async def _upload(self, file=None, config=None, **kwargs):
+        call_stats.inc('genai.files.upload')
+        await _sleep_async(_config.download_latency)
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        return SimpleNamespace(name=name, uri=f"https://fake.googleapis.com/{name}")
+
+    async def _download(self, file=None, **kwargs):
+        # 新版SDK的异步download直接返回bytes
+        call_stats.inc('genai.files.download')
+        await _sleep_async(_config.download_latency)
+        return fake_mp4_bytes(_config.video_seconds, _config.video_size)
+
+    async def _generate_content(self, model=None, contents=None, **kwargs):
+        call_stats.inc('genai.models.generate_content')
+        await _sleep_async(_config.gemini_latency)
+        _maybe_fail('gemini')
+        return _image_response()
+
+    async def _generate_videos(self, **kwargs):
+        return self._client.models.generate_videos(**kwargs)
+
+    async def _get_operation(self, operation, **kwargs):
+        return self._client.operations.get(operation, **kwargs)
+
+
+def _make_fake_genai_types():
+    """google.genai未安装时使用的最小types模块"""
+    fake_types = types.ModuleType('google.genai.types')
+
+    class _Model(SimpleNamespace):
+        def __init__(self, *args, **kwargs):
+            super().__init__(**kwargs)
+
+    for name in ('Part', 'FileData', 'UploadFileConfig', 'Image',
+                 'GenerateVideosConfig', 'GenerateVideosOperation'):
+        setattr(fake_types, name, type(name, (_Model,), {}))
+    return fake_types
+
+
+# ===== 腾讯云AI3D SDK（Hunyuan3DGenerator） =====
+
+class _FakeRequest:
+    def from_json_string(self, text):
+        self.params = json.loads(text)
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def to_json_string(self):
+        return json.dumps(self._payload)
+
+
+class FakeAi3dClient:
+    """替代 tencentcloud.ai3d.v20250513.ai3d_client.Ai3dClient"""
+
+    _jobs = {}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def SubmitHunyuanTo3DJob(self, req):
+        call_stats.inc('ai3d.submit')
+        _maybe_fail('hunyuan3d')
+        job_id = uuid.uuid4().hex
+        with _rng_lock:
+            duration = _config.hunyuan_latency.sample(_rng, _config.time_scale)
+        self._jobs[job_id] = time.monotonic() + duration
+        return _FakeResponse({'JobId': job_id, 'RequestId': uuid.uuid4().hex})
+
+    def QueryHunyuanTo3DJob(self, req):
+        call_stats.inc('ai3d.query')
+        job_id = req.params['JobId']
+        # 直接在查询中等到任务完成，避免真实客户端里固定10秒的轮询间隔扭曲测量结果
+        remaining = self._jobs.get(job_id, 0) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return _FakeResponse({
+            'Status': 'DONE',
+            'ResultFile3Ds': [{'Type': 'GLB', 'Url': f"https://fake.tencentcos.cn/{job_id}.glb"}]
+        })
+
+
+fake_ai3d_models = SimpleNamespace(
+    SubmitHunyuanTo3DJobRequest=_FakeRequest,
+    QueryHunyuanTo3DJobRequest=_FakeRequest,
+)
+
+
+class FakeHttpResponse:
+    """替代requests的响应对象"""
+
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'Content-Length': str(len(content))}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"{self.status_code} Server Error")
+
+    def iter_content(self, chunk_size=65536):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+def fake_http_get(url, *args, **kwargs):
+    """替代 upstream.http_get：.glb 返回模型，其他返回图片"""
+    call_stats.inc('http.get')
+    _sleep(_config.download_latency)
+    if url.endswith('.glb'):
+        return FakeHttpResponse(fake_glb_bytes(_config.glb_vertices))
+    return FakeHttpResponse(fake_png_bytes(_config.image_size))
+
+
+async def fake_http_get_async(url, timeout=60):
+    """替代 upstream.http_get_async"""
+    call_stats.inc('http.get')
+    await _sleep_async(_config.download_latency)
+    if url.endswith('.glb'):
+        return FakeHttpResponse(fake_glb_bytes(_config.glb_vertices))
+    return FakeHttpResponse(fake_png_bytes(_config.image_size))
+
+
+def _install_module_stub(name: str, **attributes):
+    """真实SDK未安装时注册一个占位模块，使 import 语句能够成功"""
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        sys.modules[name] = module
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(sys.modules[parent], child, module)
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    return module
+
+
+def _ensure_sdk_importable():
+    """在没有安装腾讯云SDK或google-genai的环境中提供可导入的占位模块"""
+    try:
+        import tencentcloud.common.credential  # noqa: F401
+    except ImportError:
+        class TencentCloudSDKException(Exception):
+            pass
+
+        _install_module_stub('tencentcloud')
+        _install_module_stub('tencentcloud.common')
+        _install_module_stub('tencentcloud.common.credential',
+                             EnvironmentVariableCredential=lambda: SimpleNamespace(get_credential=lambda: None),
+                             Credential=lambda *args: None)
+        _install_module_stub('tencentcloud.common.profile')
+        _install_module_stub('tencentcloud.common.profile.client_profile', ClientProfile=SimpleNamespace)
+        _install_module_stub('tencentcloud.common.profile.http_profile', HttpProfile=SimpleNamespace)
+        _install_module_stub('tencentcloud.common.exception')
+        _install_module_stub('tencentcloud.common.exception.tencent_cloud_sdk_exception',
+                             TencentCloudSDKException=TencentCloudSDKException)
+
+    try:
+        import google.genai  # noqa: F401
+    except ImportError:
+        import google
+        fake_types = _make_fake_genai_types()
+        genai_module = _install_module_stub('google.genai', Client=FakeGenAIClient, types=fake_types)
+        sys.modules['google.genai.types'] = fake_types
+        google.genai = genai_module
+
+
+def install_fake_backends(config: FakeBackendConfig = None):
+    """把api包中的上游客户端全部替换为假实现"""
+    global _config, _rng
+    import os
+
+    _config = config or FakeBackendConfig()
+    _rng = random.Random(_config.seed)
+    os.environ.setdefault('GEMINI_API_KEY', 'fake-benchmark-key')
+
+    _ensure_sdk_importable()
+
+    import api.nano_banana as nano_banana
+    import api.veo31 as veo31
+    import api.hunyuan3d as hunyuan3d
+    import api.upstream as upstream
+
+    nano_banana.genai = fake_generativeai
+    veo31.genai = SimpleNamespace(Client=FakeGenAIClient)
+    veo31.veo_api = None
+    upstream.http_get = fake_http_get
+    upstream.http_get_async = fake_http_get_async
+
+    def _init_fake_tencent_client(self):
+        self.ai3d_client = SimpleNamespace(Ai3dClient=FakeAi3dClient)
+        self.models = fake_ai3d_models
+        self.client = FakeAi3dClient()
+
+    hunyuan3d.Hunyuan3DGenerator._init_tencent_client = _init_fake_tencent_client
+    return _config
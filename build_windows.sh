@@ -17,6 +17,10 @@ mkdir -p dist/HLTraining-v1.0-Windows
 echo "🧹 清理之前的构建..."
 rm -rf build dist/HLTraining
 
+# 构建静态资源（压缩并生成带哈希的文件名）
+echo "🎨 构建静态资源..."
+python static_assets.py
+
 # 使用PyInstaller打包
 echo "📦 开始打包..."
 pyinstaller HLTraining.spec --clean
@@ -0,0 +1,109 @@
+"""
+响应压缩 - 按浏览器的 Accept-Encoding 用 brotli 或 gzip 压缩 HTML、JSON、JS 和 CSS
+
+作品集页面会渲染所有作品，会话版本列表等JSON接口也可能很大，压缩后通常只有原来的 1/5 左右。
+PNG、JPEG、MP4、GLB 这类本身已经压缩过的文件不在可压缩类型中，直接原样返回；
+send_file 返回的文件（包括静态文件）不会在请求时压缩，
+构建后的 static/dist 文件由 static_assets 在构建时预先压缩好。
+
+brotli 是可选依赖（pip install brotli），没有安装时只使用 gzip。
+
+环境变量：
+    COMPRESSION_ENABLED          是否压缩响应，默认开启
+    COMPRESSION_MIN_SIZE         小于该字节数的响应不压缩，默认 1024
+    COMPRESSION_GZIP_LEVEL       gzip压缩级别（1-9），默认 6
+    COMPRESSION_BROTLI_QUALITY   brotli压缩质量（0-11），默认 4；请求时压缩优先速度
+"""
+
+import os
+import gzip
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 可压缩的内容类型；图片、视频、GLB模型等已压缩的格式不在其中
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/csv',
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'model/gltf+json',
+}
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def supported_encodings():
+    """服务器支持的编码，按优先级排列"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings, available=None):
+    """根据请求的 Accept-Encoding（werkzeug的Accept对象）选择编码，不接受压缩时返回None"""
+    available = supported_encodings() if available is None else available
+    if not available:
+        return None
+    return accept_encodings.best_match(available)
+
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """用指定编码压缩数据；mtime固定为0，相同内容的压缩结果完全一致"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f"不支持的编码: {encoding}")
+
+
+def init_app(app):
+    """注册响应压缩钩子"""
+    from flask import request
+
+    if not _env_flag('COMPRESSION_ENABLED'):
+        return
+
+    min_size = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    gzip_level = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    brotli_quality = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+    logger.debug("🗜️ 响应压缩已开启: %s（最小 %d 字节）", ', '.join(supported_encodings()), min_size)
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.mimetype not in COMPRESSIBLE_TYPES
+                or response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or request.method == 'HEAD'):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        compressed = compress(data, encoding, gzip_level, brotli_quality)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # 压缩后的内容和原始内容字节不同，强ETag改为弱ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,15 +1,142 @@
+"""
+创作会话管理器
+
+每个会话目录中的数据由两个文件组成：
+    session.json   快照（格式与以前的会话文件相同，多一个 log_seq 字段，记录快照包含到第几条事件）
+    events.jsonl   追加写入的事件日志，每行一个事件：add_version / select_version / delete_version / close_session
+
+修改会话只在事件日志末尾追加一行（一次write调用），不再重写整个session.json；
+事件数达到 SESSION_COMPACT_EVENTS 或会话关闭时把当前状态写成新快照（原子替换）再清空日志。
+快照写入后、日志清空前进程崩溃时，序号不大于 log_seq 的事件在重放时跳过，不会重复应用；
+进程在追加过程中崩溃留下的半行在读取时忽略，下一次追加前截掉。
+
+追加和压缩都在事件日志的文件锁（fcntl.flock）下进行：先读取其他进程在此期间追加的事件，
+再按最新的序号追加，多个gunicorn worker同时修改同一会话时不会覆盖或截掉彼此的事件。
+Windows上没有fcntl，只有进程内的锁（Windows使用单进程的waitress部署）。
+
+管理器在内存中保存每个会话的当前状态（快照+已重放的事件），每次访问只检查两个文件的大小和修改时间：
+日志变长时只读取新增的部分，快照变化（其他进程压缩过）时重新加载，多进程部署下也能看到其他进程的修改。
+
+最后一个事件的序号就是会话的修订号（只增不减），会话接口用它作为ETag。
+
+环境变量：
+    SESSION_COMPACT_EVENTS   日志中的事件数达到多少时压缩为快照，默认 64
+"""
+
 import json
 import os
+import copy
 from datetime import datetime
 import uuid
 import shutil
-from typing import List, Dict, Optional
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+from json_store import atomic_write_json, locked
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SNAPSHOT_NAME = 'session.json'
+EVENT_LOG_NAME = 'events.jsonl'
+
+
+def _read_events(log_path: str, offset: int = 0) -> Tuple[List[Dict], int]:
+    """从offset开始读取事件，返回 (事件列表, 最后一个完整行之后的偏移)；末尾不完整的行不读取，损坏的行跳过"""
+    events = []
+    try:
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return events, offset
+
+
+def _apply_event(data: Dict, event: Dict):
+    """把一个事件应用到会话状态上"""
+    op = event['op']
+    if op == 'add_version':
+        data['versions'].append(event['version'])
+        data['current_step'] = event['current_step']
+    elif op == 'select_version':
+        selected_type = event['version_type']
+        for version in data['versions']:
+            if version['type'] == selected_type:
+                version['is_selected'] = version['version_id'] == event['version_id']
+    elif op == 'delete_version':
+        data['versions'] = [v for v in data['versions'] if v['version_id'] != event['version_id']]
+    elif op == 'close_session':
+        data['status'] = 'completed'
+        data['completed_at'] = event['completed_at']
+
+
+def load_session(session_dir: str) -> Optional[Dict]:
+    """读取快照并重放事件日志，返回会话的当前状态（会话不存在或快照损坏时返回None）"""
+    try:
+        with open(os.path.join(session_dir, SNAPSHOT_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    seq = data.pop('log_seq', 0)
+    for event in _read_events(os.path.join(session_dir, EVENT_LOG_NAME))[0]:
+        if event.get('seq', 0) > seq:
+            _apply_event(data, event)
+            seq = event['seq']
+    return data
+
+
+@contextmanager
+def _log_file_lock(log_path: str):
+    """持有事件日志的进程间排他锁，返回日志的文件描述符（O_APPEND）"""
+    fd = os.open(log_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        # 关闭文件描述符时锁随之释放
+        os.close(fd)
+
+
+def _file_stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class _SessionView:
+    """内存中的会话状态，以及它对应的快照和日志位置"""
+    
+    __slots__ = ('data', 'seq', 'pending', 'snapshot_stamp', 'log_offset')
+    
+    def __init__(self, data: Dict, seq: int, snapshot_stamp):
+        self.data = data
+        self.seq = seq                      # 已应用的最后一个事件序号
+        self.pending = 0                    # 快照之后日志中的事件数
+        self.snapshot_stamp = snapshot_stamp
+        self.log_offset = 0                 # 日志中已读取到的位置
+
 
 class CreationSessionManager:
     """创作会话管理器 - 在创作过程中管理版本，方便用户选择"""
     
-    def __init__(self, sessions_folder='creation_sessions'):
+    def __init__(self, sessions_folder='creation_sessions', compact_events: int = None):
         self.sessions_folder = sessions_folder
+        self.compact_events = compact_events or int(os.getenv('SESSION_COMPACT_EVENTS', '64'))
+        self._lock = threading.RLock()
+        self._views = {}   # 会话ID -> _SessionView
         self.ensure_directories()
     
     def ensure_directories(self):
@@ -31,11 +158,46 @@ class CreationSessionManager:
             'status': 'active'
         }
         
-        self._save_session_data(session_id, session_data)
+        with self._lock:
+            self._write_snapshot(session_id, session_data, seq=0)
         return session_id
     
+    def get_revision(self, session_id: str) -> Optional[int]:
+        """会话的修订号（每次修改加一，会话不存在时返回None）；会话没有变化时不读取文件内容"""
+        with self._lock:
+            if not self._view(session_id):
+                return None
+            return self._views[os.path.basename(session_id)].seq
+    
+    def session_dir(self, session_id: str) -> Optional[str]:
+        """会话目录（会话不存在时返回None），生成接口可以把结果直接写到这里"""
+        if not session_id:
+            return None
+        session_dir = os.path.join(self.sessions_folder, os.path.basename(session_id))
+        if not os.path.exists(os.path.join(session_dir, SNAPSHOT_NAME)):
+            return None
+        return session_dir
+    
+    @staticmethod
+    def _transfer_file(src: str, dest: str, move: bool):
+        """复制文件；move=True时转移所有权：同一文件系统内直接重命名，否则复制后删除原文件"""
+        if not move:
+            shutil.copy2(src, dest)
+            return
+        try:
+            os.replace(src, dest)
+            return
+        except OSError:
+            # 跨文件系统（EXDEV）或Windows上文件被占用时退回到复制
+            shutil.copy2(src, dest)
+        try:
+            os.remove(src)
+        except OSError:
+            pass
+    
+    @locked
     def add_version(self, session_id: str, version_type: str, file_path: str,
-                    metadata: Dict = None) -> Dict:
+                    metadata: Dict = None, move: bool = False) -> Dict:
         """
         向会话添加新版本
         
@@ -44,16 +206,17 @@ class CreationSessionManager:
             version_type: 版本类型 ('image' 或 'model')
             file_path: 文件路径
             metadata: 版本元数据（如提示词、参数等）
+            move: 文件只属于这次生成时传True，文件被移动（重命名）到会话目录而不是复制一份
         """
         try:
-            session_data = self._load_session_data(session_id)
+            session_data = self._view(session_id)
             if not session_data:
                 return {'success': False, 'error': '会话不存在'}
             
             version_id = str(uuid.uuid4())
             timestamp = datetime.now()
             
-            # 复制文件到会话目录
+            # 复制（或移动）文件到会话目录
             session_dir = os.path.join(self.sessions_folder, session_id)
             if version_type == 'image':
                 filename = f"image_v{len([v for v in session_data['versions'] if v['type'] == 'image']) + 1}_{version_id[:8]}.png"
@@ -61,7 +224,7 @@ class CreationSessionManager:
                 filename = f"model_v{len([v for v in session_data['versions'] if v['type'] == 'model']) + 1}_{version_id[:8]}.glb"
             
             dest_path = os.path.join(session_dir, filename)
-            shutil.copy2(file_path, dest_path)
+            self._transfer_file(file_path, dest_path, move)
             
             # 创建版本数据
             version_data = {
@@ -74,46 +237,43 @@ class CreationSessionManager:
                 'is_selected': False
             }
             
-            session_data['versions'].append(version_data)
-            
             # 更新会话状态
+            current_step = session_data['current_step']
             if version_type == 'image':
-                session_data['current_step'] = 'image_generated'
+                current_step = 'image_generated'
             elif version_type == 'model':
-                session_data['current_step'] = 'model_generated'
+                current_step = 'model_generated'
             
-            self._save_session_data(session_id, session_data)
+            self._append_event(session_id, {'op': 'add_version', 'version': version_data,
+                                            'current_step': current_step})
             
             return {
                 'success': True,
                 'version_id': version_id,
                 'filename': filename,
+                'file_path': dest_path,
+                'url_path': self._file_path_to_url(dest_path),
                 'message': f'{version_type.title()}版本已添加'
             }
             
         except Exception as e:
             return {'success': False, 'error': f'添加版本失败: {str(e)}'}
     
+    @locked
     def select_version(self, session_id: str, version_id: str) -> Dict:
         """选择指定版本作为当前版本"""
         try:
-            session_data = self._load_session_data(session_id)
+            session_data = self._view(session_id)
             if not session_data:
                 return {'success': False, 'error': '会话不存在'}
             
-            # 清除同类型的所有选择状态
-            selected_version = None
-            for version in session_data['versions']:
-                if version['version_id'] == version_id:
-                    selected_version = version
-                    version['is_selected'] = True
-                elif selected_version and version['type'] == selected_version['type']:
-                    version['is_selected'] = False
-            
+            selected_version = next((v for v in session_data['versions'] if v['version_id'] == version_id), None)
             if not selected_version:
                 return {'success': False, 'error': '版本不存在'}
             
-            self._save_session_data(session_id, session_data)
+            # 选中该版本，同时清除同类型其他版本的选择状态
+            self._append_event(session_id, {'op': 'select_version', 'version_id': version_id,
+                                            'version_type': selected_version['type']})
             
             return {
                 'success': True,
@@ -125,13 +285,12 @@ class CreationSessionManager:
     
     def get_session_versions(self, session_id: str, version_type: str = None) -> List[Dict]:
         """获取会话的所有版本"""
-        session_data = self._load_session_data(session_id)
-        if not session_data:
-            return []
-        
-        versions = session_data['versions']
-        if version_type:
-            versions = [v for v in versions if v['type'] == version_type]
+        with self._lock:
+            session_data = self._view(session_id)
+            if not session_data:
+                return []
+            versions = [dict(v) for v in session_data['versions']
+                        if not version_type or v['type'] == version_type]
         
         # 按创建时间排序（最新在前）
         versions.sort(key=lambda x: x['created_at'], reverse=True)
@@ -144,32 +303,29 @@ class CreationSessionManager:
     
     def get_selected_versions(self, session_id: str) -> Dict:
         """获取当前选择的版本"""
-        session_data = self._load_session_data(session_id)
-        if not session_data:
-            return {}
-        
-        selected = {}
-        for version in session_data['versions']:
-            if version.get('is_selected', False):
-                selected[version['type']] = version.copy()
-                selected[version['type']]['url_path'] = self._file_path_to_url(version['file_path'])
+        with self._lock:
+            session_data = self._view(session_id)
+            if not session_data:
+                return {}
+            
+            selected = {}
+            for version in session_data['versions']:
+                if version.get('is_selected', False):
+                    selected[version['type']] = version.copy()
+                    selected[version['type']]['url_path'] = self._file_path_to_url(version['file_path'])
         
         return selected
     
+    @locked
     def delete_version(self, session_id: str, version_id: str) -> Dict:
         """删除指定版本"""
         try:
-            session_data = self._load_session_data(session_id)
+            session_data = self._view(session_id)
             if not session_data:
                 return {'success': False, 'error': '会话不存在'}
             
             # 找到要删除的版本
-            version_to_delete = None
-            for i, version in enumerate(session_data['versions']):
-                if version['version_id'] == version_id:
-                    version_to_delete = version
-                    session_data['versions'].pop(i)
-                    break
+            version_to_delete = next((v for v in session_data['versions'] if v['version_id'] == version_id), None)
             
             if not version_to_delete:
                 return {'success': False, 'error': '版本不存在'}
@@ -178,12 +334,12 @@ class CreationSessionManager:
             if version_to_delete.get('is_selected', False):
                 return {'success': False, 'error': '不能删除当前选中的版本，请先选择其他版本'}
             
+            self._append_event(session_id, {'op': 'delete_version', 'version_id': version_id})
+            
             # 删除文件
             if os.path.exists(version_to_delete['file_path']):
                 os.remove(version_to_delete['file_path'])
             
-            self._save_session_data(session_id, session_data)
-            
             return {
                 'success': True,
                 'message': f'{version_to_delete["type"].title()}版本已删除'
@@ -198,31 +354,63 @@ class CreationSessionManager:
         if not session_data:
             return None
         
-        # 统计版本信息
-        image_versions = [v for v in session_data['versions'] if v['type'] == 'image']
-        model_versions = [v for v in session_data['versions'] if v['type'] == 'model']
+        session_data['stats'] = self._version_stats(session_data['versions'])
+        return session_data
+    
+    def get_session_snapshot(self, session_id: str, version_type: str = None,
+                             offset: int = 0, limit: int = None) -> Optional[Dict]:
+        """
+        一次返回页面需要的全部会话状态：会话信息和统计、版本列表（可按类型筛选并分页，最新在前）、
+        当前选择的版本和修订号，都来自同一个版本的会话数据
+        """
+        with self._lock:
+            session_data = self._view(session_id)
+            if not session_data:
+                return None
+            
+            versions = [v for v in session_data['versions'] if not version_type or v['type'] == version_type]
+            versions.sort(key=lambda x: x['created_at'], reverse=True)
+            page = versions[offset:offset + limit if limit is not None else None]
+            
+            def with_url(version):
+                version = dict(version)
+                version['url_path'] = self._file_path_to_url(version['file_path'])
+                return version
+            
+            session = {key: value for key, value in session_data.items() if key != 'versions'}
+            session['stats'] = self._version_stats(session_data['versions'])
+            return {
+                'session': copy.deepcopy(session),
+                'versions': [with_url(v) for v in page],
+                'total': len(versions),
+                'selected': {v['type']: with_url(v) for v in session_data['versions'] if v.get('is_selected')},
+                'revision': self._views[os.path.basename(session_id)].seq
+            }
+    
+    @staticmethod
+    def _version_stats(versions: List[Dict]) -> Dict:
+        """统计版本信息"""
+        image_versions = [v for v in versions if v['type'] == 'image']
+        model_versions = [v for v in versions if v['type'] == 'model']
         
-        session_data['stats'] = {
-            'total_versions': len(session_data['versions']),
+        return {
+            'total_versions': len(versions),
             'image_versions': len(image_versions),
             'model_versions': len(model_versions),
             'selected_image': any(v.get('is_selected') for v in image_versions),
             'selected_model': any(v.get('is_selected') for v in model_versions)
         }
-        
-        return session_data
     
+    @locked
     def close_session(self, session_id: str) -> Dict:
         """关闭会话（标记为完成）"""
         try:
-            session_data = self._load_session_data(session_id)
-            if not session_data:
+            if not self._view(session_id):
                 return {'success': False, 'error': '会话不存在'}
             
-            session_data['status'] = 'completed'
-            session_data['completed_at'] = datetime.now().isoformat()
-            
-            self._save_session_data(session_id, session_data)
+            # 关闭后不会再有修改，直接压缩为快照
+            self._append_event(session_id, {'op': 'close_session', 'completed_at': datetime.now().isoformat()},
+                               compact=True)
             
             return {'success': True, 'message': '会话已关闭'}
             
@@ -242,7 +430,9 @@ class CreationSessionManager:
                     if session_data:
                         created_at = datetime.fromisoformat(session_data['created_at']).timestamp()
                         if created_at < cutoff_date and session_data.get('status') == 'completed':
-                            shutil.rmtree(session_path)
+                            with self._lock:
+                                shutil.rmtree(session_path)
+                                self._views.pop(session_dir, None)
                             cleaned_count += 1
             
             return {
@@ -255,24 +445,97 @@ class CreationSessionManager:
             return {'success': False, 'error': f'清理失败: {str(e)}'}
     
     def _load_session_data(self, session_id: str) -> Optional[Dict]:
-        """加载会话数据"""
-        session_file = os.path.join(self.sessions_folder, session_id, 'session.json')
-        if os.path.exists(session_file):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
+        """加载会话数据（副本，调用方可以随意修改）"""
+        with self._lock:
+            session_data = self._view(session_id)
+            return copy.deepcopy(session_data) if session_data else None
+    
+    def _view(self, session_id: str) -> Optional[Dict]:
+        """
+        内存中的会话状态（调用方持有 self._lock，不能修改返回值）：
+        快照没变时只读取日志新增的事件，快照变了或日志变短（被其他进程压缩）时重新加载
+        """
+        session_id = os.path.basename(session_id)
+        session_dir = os.path.join(self.sessions_folder, session_id)
+        snapshot_stamp = _file_stamp(os.path.join(session_dir, SNAPSHOT_NAME))
+        if snapshot_stamp is None:
+            self._views.pop(session_id, None)
+            return None
+        
+        log_path = os.path.join(session_dir, EVENT_LOG_NAME)
+        log_stamp = _file_stamp(log_path)
+        log_size = log_stamp[0] if log_stamp else 0
+        view = self._views.get(session_id)
+        if view is None or view.snapshot_stamp != snapshot_stamp or log_size < view.log_offset:
+            view = self._load_view(session_dir, snapshot_stamp)
+            if view is None:
+                self._views.pop(session_id, None)
                 return None
-        return None
+            self._views[session_id] = view
+        
+        if log_size > view.log_offset:
+            events, view.log_offset = _read_events(log_path, view.log_offset)
+            for event in events:
+                if event.get('seq', 0) > view.seq:
+                    _apply_event(view.data, event)
+                    view.seq = event['seq']
+                    view.pending += 1
+        return view.data
+    
+    @staticmethod
+    def _load_view(session_dir: str, snapshot_stamp) -> Optional[_SessionView]:
+        try:
+            with open(os.path.join(session_dir, SNAPSHOT_NAME), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return _SessionView(data, data.pop('log_seq', 0), snapshot_stamp)
     
-    def _save_session_data(self, session_id: str, data: Dict):
-        """保存会话数据"""
+    def _append_event(self, session_id: str, event: Dict, compact: bool = False):
+        """
+        在日志末尾追加一个事件并应用到内存状态（调用方持有 self._lock）；
+        积累的事件达到 compact_events 或 compact=True 时压缩为快照
+        """
+        session_id = os.path.basename(session_id)
+        session_dir = os.path.join(self.sessions_folder, session_id)
+        log_path = os.path.join(session_dir, EVENT_LOG_NAME)
+        
+        with _log_file_lock(log_path) as fd:
+            # 持有锁之后重新读取日志，其他进程在调用方 _view() 之后追加的事件不会丢失
+            if self._view(session_id) is None:
+                raise FileNotFoundError(f"会话不存在: {session_id}")
+            view = self._views[session_id]
+            event = {'seq': view.seq + 1, **event}
+            line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+            
+            # 完整的事件都已读入，日志中超出 log_offset 的只可能是崩溃留下的半行，截掉后从行首追加
+            if os.fstat(fd).st_size > view.log_offset:
+                os.ftruncate(fd, view.log_offset)
+            os.write(fd, line)
+            
+            _apply_event(view.data, event)
+            view.seq = event['seq']
+            view.pending += 1
+            view.log_offset += len(line)
+            
+            if compact or view.pending >= self.compact_events:
+                self._write_snapshot(session_id, view.data, view.seq)
+    
+    def _write_snapshot(self, session_id: str, data: Dict, seq: int):
+        """把会话状态原子地写成快照，然后清空事件日志（调用方持有 self._lock；已有日志时还要持有日志的文件锁）"""
+        session_id = os.path.basename(session_id)
         session_dir = os.path.join(self.sessions_folder, session_id)
         os.makedirs(session_dir, exist_ok=True)
         
-        session_file = os.path.join(session_dir, 'session.json')
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        snapshot_path = os.path.join(session_dir, SNAPSHOT_NAME)
+        atomic_write_json(snapshot_path, {**data, 'log_seq': seq})
+        # 快照已包含全部事件；此时崩溃留下的旧事件序号都不大于 log_seq，重放时会跳过
+        log_path = os.path.join(session_dir, EVENT_LOG_NAME)
+        if os.path.exists(log_path):
+            os.truncate(log_path, 0)
+        
+        view = _SessionView(data, seq, _file_stamp(snapshot_path))
+        self._views[session_id] = view
     
     def _file_path_to_url(self, file_path: str) -> str:
         """将文件路径转换为URL路径"""
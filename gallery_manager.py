@@ -3,13 +3,20 @@ import os
 from datetime import datetime
 import uuid
 import shutil
+import threading
 from version_manager import VersionManager
+from json_store import atomic_write_json, locked
+from startup import lazy_import
+import search_index
 
 class GalleryManager:
     def __init__(self, data_file='gallery_data.json', gallery_folder='static/gallery'):
         self.data_file = data_file
         self.gallery_folder = gallery_folder
         self.version_manager = VersionManager(gallery_folder)
+        # 同一个数据文件的所有 GalleryManager 共用一个搜索索引
+        self.search_index = search_index.get_index(data_file)
+        self._lock = threading.RLock()
         self.ensure_directories()
         
     def ensure_directories(self):
@@ -29,14 +36,15 @@ class GalleryManager:
         return []
     
     def save_gallery_data(self, data):
-        """保存作品集数据"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """保存作品集数据，并增量更新搜索索引"""
+        atomic_write_json(self.data_file, data)
+        self.search_index.refresh(data)
     
+    @locked
     def save_artwork(self, original_image_path, generated_image_path, model_path=None, 
                      title="我的作品", artist_name="小朋友", artist_age=10, 
-                     category="其他", description="", version_note="初始版本"):
-        """保存作品到作品集"""
+                     category="其他", description="", version_note="初始版本", prompts=None):
+        """保存作品到作品集（prompts：创作时使用的提示词，用于搜索）"""
         try:
             # 生成唯一ID
             artwork_id = str(uuid.uuid4())
@@ -61,10 +69,13 @@ class GalleryManager:
             
             # 处理3D模型文件（如果存在）
             model_filename = None
+            model_preview_filename = None
+            model_stats = None
             if model_path and os.path.exists(model_path):
                 model_filename = f"model_{artwork_id}.glb"
                 model_dest = os.path.join(artwork_dir, model_filename)
                 shutil.copy2(model_path, model_dest)
+                model_stats, model_preview_filename = self._process_model(model_path, model_dest)
             
             # 创建初始版本
             version_result = self.version_manager.create_version(
@@ -87,10 +98,13 @@ class GalleryManager:
                 'artist_age': artist_age,
                 'category': category,
                 'description': description,
+                'prompts': prompts or [],
                 'created_at': timestamp.isoformat(),
                 'original_image': f"gallery/{artwork_id}/{original_filename}" if original_filename else None,
                 'generated_image': f"gallery/{artwork_id}/{generated_filename}",
                 'model_file': f"gallery/{artwork_id}/{model_filename}" if model_filename else None,
+                'model_preview_file': f"gallery/{artwork_id}/{model_preview_filename}" if model_preview_filename else None,
+                'model_stats': model_stats,
                 'likes': 0,
                 'views': 0,
                 'has_versions': True,  # 标记支持版本控制
@@ -117,6 +131,92 @@ class GalleryManager:
                 'error': f'保存作品失败: {str(e)}'
             }
     
+    @locked
+    def save_video(self, video_path, video_info=None, source_image_path=None,
+                   title="我的视频", artist_name="小朋友", artist_age=10,
+                   category="其他", description=""):
+        """保存视频作品：完整视频、封面和预览视频一起复制到作品目录，列表页只加载封面"""
+        try:
+            artwork_id = str(uuid.uuid4())
+            timestamp = datetime.now()
+            video_info = video_info or {}
+            
+            artwork_dir = os.path.join(self.gallery_folder, artwork_id)
+            os.makedirs(artwork_dir, exist_ok=True)
+            
+            def copy_into_artwork(source, prefix):
+                if not source or not os.path.exists(source):
+                    return None
+                filename = f"{prefix}_{artwork_id}{os.path.splitext(source)[1]}"
+                shutil.copy2(source, os.path.join(artwork_dir, filename))
+                return f"gallery/{artwork_id}/{filename}"
+            
+            video_file = copy_into_artwork(video_path, 'video')
+            poster = copy_into_artwork(video_info.get('poster'), 'poster')
+            preview = copy_into_artwork(video_info.get('preview'), 'preview')
+            original = copy_into_artwork(source_image_path, 'original')
+            
+            artwork_data = {
+                'id': artwork_id,
+                'type': 'video',
+                'title': title,
+                'artist_name': artist_name,
+                'artist_age': artist_age,
+                'category': category,
+                'description': description,
+                'created_at': timestamp.isoformat(),
+                'original_image': original,
+                # 卡片和首页显示的图片：封面，没有封面时用视频的源图片
+                'generated_image': poster or original,
+                'model_file': None,
+                'video_file': video_file,
+                'video_poster': poster,
+                'video_preview': preview,
+                'video_stats': {key: video_info.get(key) for key in
+                                ('duration', 'width', 'height', 'fps', 'bytes', 'preview_bytes')},
+                'likes': 0,
+                'views': 0,
+                'has_versions': False,
+                'version_count': 0
+            }
+            
+            gallery_data = self.load_gallery_data()
+            gallery_data.insert(0, artwork_data)
+            self.save_gallery_data(gallery_data)
+            
+            return {
+                'success': True,
+                'artwork_id': artwork_id,
+                'message': '视频已保存到作品集！'
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'保存视频失败: {str(e)}'
+            }
+    
+    @staticmethod
+    def _process_model(source_path, model_dest):
+        """统计作品模型并准备预览模型：源模型已有预览时直接复制，否则现在生成"""
+        # glb_processing 依赖numpy，第一次保存模型时才导入
+        glb_processing = lazy_import('glb_processing')
+        source_preview = glb_processing.preview_path(source_path)
+        if os.path.exists(source_preview):
+            dest_preview = glb_processing.preview_path(model_dest)
+            shutil.copy2(source_preview, dest_preview)
+            try:
+                stats = glb_processing.file_stats(model_dest)
+                stats['preview'] = glb_processing.file_stats(dest_preview)
+            except (OSError, ValueError, KeyError):
+                return None, os.path.basename(dest_preview)
+            return stats, os.path.basename(dest_preview)
+        
+        stats = glb_processing.process_model(model_dest)
+        if stats and stats['preview']:
+            return stats, os.path.basename(glb_processing.preview_path(model_dest))
+        return stats, None
+    
     def get_all_artworks(self, category=None, limit=None):
         """获取所有作品"""
         data = self.load_gallery_data()
@@ -138,6 +238,10 @@ class GalleryManager:
         data.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         return data[:limit]
     
+    def search_artworks(self, query, category=None, offset=0, limit=20):
+        """按标题、作者、分类、说明和提示词搜索作品，结果按相关度排序"""
+        return self.search_index.search(query, category=category, offset=offset, limit=limit)
+    
     def get_artwork_by_id(self, artwork_id):
         """根据ID获取作品"""
         data = self.load_gallery_data()
@@ -146,6 +250,7 @@ class GalleryManager:
                 return artwork
         return None
     
+    @locked
     def increment_views(self, artwork_id):
         """增加浏览次数"""
         data = self.load_gallery_data()
@@ -155,6 +260,7 @@ class GalleryManager:
                 self.save_gallery_data(data)
                 break
     
+    @locked
     def toggle_like(self, artwork_id):
         """切换点赞状态（简化版本，实际应该基于用户）"""
         data = self.load_gallery_data()
@@ -167,6 +273,7 @@ class GalleryManager:
     
     # ===== 版本控制相关方法 =====
     
+    @locked
     def create_new_version(self, artwork_id, image_path=None, model_path=None, 
                           version_note="", auto_note=""):
         """为现有作品创建新版本"""
@@ -197,6 +304,7 @@ class GalleryManager:
                 'error': f'创建版本失败: {str(e)}'
             }
     
+    @locked
     def revert_to_version(self, artwork_id, version_id):
         """回退到指定版本"""
         try:
@@ -228,6 +336,7 @@ class GalleryManager:
         """获取作品的当前版本"""
         return self.version_manager.get_current_version(artwork_id)
     
+    @locked
     def delete_version(self, artwork_id, version_id):
         """删除指定版本"""
         try:
@@ -0,0 +1,491 @@
+"""
+磁盘垃圾回收 - 定期清理过期的创作会话、上传图片、生成结果和3D模型，并把总占用控制在磁盘预算之内
+
+以前只有 CreationSessionManager.cleanup_old_sessions，而且没有地方调用它，
+uploads/ 中的生成图片、调整结果、16:9转换图、Veo临时文件和 models/ 中的GLB模型会一直累积。
+
+回收规则：
+    - 每类文件有各自的过期时间（按最后访问时间计算，见下方环境变量）
+    - 过期清理之后总占用仍超过 GC_DISK_BUDGET_MB 时，按最后访问时间从旧到新继续删除（LRU）
+    - 仍被会话（快照和事件日志中的 source_image 等字段）或作品集数据引用的文件不会删除
+    - 最近 GC_MIN_AGE_MINUTES 分钟内创建或访问过的文件不会删除（生成中的结果、刚上传的图片）
+    - 创作会话作为整体回收：最后一次修改或访问会话文件之后超过会话过期时间才删除整个目录
+
+最后访问时间取文件修改时间和访问索引中的记录两者较新的一个；
+访问索引记录 /uploads、/models、/session-files 的每次访问，每轮回收后保存到 cache/gc_index.json。
+会话引用按会话文件（session.json 和 events.jsonl）的修改时间缓存，没有变化的会话不会重复解析。
+
+多进程部署时每个worker都有回收线程，但只有拿到回收锁（cache/gc.lock，fcntl.flock）的一个worker执行回收，
+持有锁的worker退出后由其他worker接替。gunicorn preload 模式下master只加载应用，不启动回收线程
+（gunicorn.conf.py 设置 GC_START_IN_WORKERS，worker在 post_fork 中调用 reinit_after_fork 启动）。
+
+管理接口（需要 GC_ADMIN_TOKEN，未设置时使用 PROFILE_ADMIN_TOKEN，放在请求头 X-Admin-Token 中）：
+    GET  /admin/gc              当前占用和最近一次回收报告
+    POST /admin/gc/run          立即执行一次回收（?dry_run=1 只报告不删除）
+
+环境变量：
+    GC_ENABLED                 是否定期自动回收，默认开启
+    GC_INTERVAL_MINUTES        回收间隔，默认 60
+    GC_INITIAL_DELAY_SECONDS   启动后多久执行第一次回收，默认 300
+    GC_DISK_BUDGET_MB          uploads、models、creation_sessions 的总占用预算，默认 2048
+    GC_MIN_AGE_MINUTES         最近创建/访问的文件的保护时间，默认 60
+    GC_TEMP_TTL_HOURS          临时文件（Veo临时图、未完成的上传）的过期时间，默认 1
+    GC_UPLOAD_TTL_HOURS        uploads/ 中图片和视频的过期时间，默认 72
+    GC_MODEL_TTL_HOURS         models/ 中3D模型的过期时间，默认 72
+    GC_SESSION_TTL_HOURS       创作会话的过期时间（不论是否已完成），默认 168
+    GC_START_IN_WORKERS        加载应用时不启动回收线程，等fork出worker后再启动，默认关闭（由 gunicorn.conf.py 设置）
+"""
+
+import os
+import json
+import time
+import hmac
+import shutil
+import fnmatch
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from json_store import atomic_write_json
+from creation_session_manager import SNAPSHOT_NAME, EVENT_LOG_NAME, load_session
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 临时文件的文件名模式（在 uploads/ 中优先于普通文件匹配）
+TEMP_PATTERNS = ('temp_veo_*', '.ingest_*', '*.tmp.*')
+
+# 回收时跳过的文件
+IGNORED_NAMES = ('.gitkeep',)
+
+# 默认过期时间（小时）和对应的环境变量
+DEFAULT_TTL_HOURS = {
+    'temp': ('GC_TEMP_TTL_HOURS', 1),
+    'upload': ('GC_UPLOAD_TTL_HOURS', 72),
+    'model': ('GC_MODEL_TTL_HOURS', 72),
+    'session': ('GC_SESSION_TTL_HOURS', 168),
+}
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _normalize(path: str) -> str:
+    """统一路径写法（使用 / 分隔）"""
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def _session_version(session_dir: str) -> Optional[float]:
+    """会话最后一次修改的时间：快照和事件日志中较新的修改时间（没有快照时返回None）"""
+    try:
+        version = os.path.getmtime(os.path.join(session_dir, SNAPSHOT_NAME))
+    except OSError:
+        return None
+    try:
+        return max(version, os.path.getmtime(os.path.join(session_dir, EVENT_LOG_NAME)))
+    except OSError:
+        return version
+
+
+@dataclass
+class Artifact:
+    """一个可回收的文件或会话目录"""
+    path: str
+    kind: str
+    size: int
+    last_access: float
+    # 会话目录扫描时会话文件的修改时间，删除前用来确认期间没有新的修改
+    version: float = 0.0
+
+
+class GarbageCollector:
+    """按过期时间和磁盘预算回收生成产物"""
+
+    def __init__(self, upload_folder='uploads', models_folder='models', sessions_folder='creation_sessions',
+                 reference_files=('gallery_data.json', 'artwork_versions.json'),
+                 index_file='cache/gc_index.json', disk_budget_bytes=None, min_age_seconds=None,
+                 ttl_seconds: Dict[str, float] = None, session_lock=None):
+        self.upload_folder = _normalize(upload_folder)
+        self.models_folder = _normalize(models_folder)
+        self.sessions_folder = _normalize(sessions_folder)
+        self.reference_files = reference_files
+        self.index_file = index_file
+        self.disk_budget_bytes = disk_budget_bytes if disk_budget_bytes is not None else \
+            int(float(os.getenv('GC_DISK_BUDGET_MB', '2048')) * 1024 * 1024)
+        self.min_age_seconds = min_age_seconds if min_age_seconds is not None else \
+            float(os.getenv('GC_MIN_AGE_MINUTES', '60')) * 60
+        self.ttl_seconds = {
+            kind: float(os.getenv(env_name, default)) * 3600
+            for kind, (env_name, default) in DEFAULT_TTL_HOURS.items()
+        }
+        self.ttl_seconds.update(ttl_seconds or {})
+        # 会话管理器的锁：删除会话目录时不会与 add_version 等操作交错
+        self.session_lock = session_lock or threading.RLock()
+
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._access = self._load_index()
+        self._session_refs = {}   # 会话ID -> (会话文件修改时间, 引用的文件集合)
+        self.last_report = None
+
+    # ===== 访问索引 =====
+
+    def _load_index(self) -> Dict[str, float]:
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return {path: float(ts) for path, ts in json.load(f).get('last_access', {}).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_index(self):
+        with self._lock:
+            data = {'last_access': dict(self._access)}
+        try:
+            atomic_write_json(self.index_file, data, indent=None)
+        except OSError as e:
+            logger.warning(f"⚠️ 保存垃圾回收访问索引失败: {str(e)}")
+
+    def _index_key(self, path: str) -> str:
+        """会话中的文件按会话目录记录"""
+        path = _normalize(path)
+        prefix = self.sessions_folder + '/'
+        if path.startswith(prefix):
+            session_id = path[len(prefix):].split('/', 1)[0]
+            return prefix + session_id
+        return path
+
+    def touch(self, path: str, when: float = None):
+        """记录一次访问"""
+        with self._lock:
+            self._access[self._index_key(path)] = when or time.time()
+
+    # ===== 引用 =====
+
+    def _collect_strings(self, value, found: set):
+        if isinstance(value, str):
+            folders = (self.upload_folder + '/', self.models_folder + '/')
+            # 会话中的路径可能是 uploads/x.png，也可能是URL形式的 /uploads/x.png
+            for path in (_normalize(value), _normalize(value.lstrip('/'))):
+                if path.startswith(folders):
+                    found.add(path)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._collect_strings(item, found)
+        elif isinstance(value, list):
+            for item in value:
+                self._collect_strings(item, found)
+
+    def _references_in_file(self, path: str) -> set:
+        found = set()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._collect_strings(json.load(f), found)
+        except (OSError, ValueError):
+            pass
+        return found
+
+    def collect_references(self) -> set:
+        """所有会话和作品集数据中引用的 uploads/、models/ 文件"""
+        references = set()
+        for path in self.reference_files:
+            references |= self._references_in_file(path)
+
+        seen = set()
+        if os.path.isdir(self.sessions_folder):
+            for session_id in os.listdir(self.sessions_folder):
+                session_dir = os.path.join(self.sessions_folder, session_id)
+                mtime = _session_version(session_dir)
+                if mtime is None:
+                    continue
+                seen.add(session_id)
+                cached = self._session_refs.get(session_id)
+                if cached is None or cached[0] != mtime:
+                    found = set()
+                    self._collect_strings(load_session(session_dir), found)
+                    cached = (mtime, found)
+                    self._session_refs[session_id] = cached
+                references |= cached[1]
+        # 已删除的会话不再缓存
+        for session_id in set(self._session_refs) - seen:
+            del self._session_refs[session_id]
+        return references
+
+    # ===== 扫描 =====
+
+    def _last_access(self, path: str, mtime: float) -> float:
+        with self._lock:
+            return max(mtime, self._access.get(path, 0.0))
+
+    def _scan_files(self, folder: str, default_kind: str) -> List[Artifact]:
+        artifacts = []
+        if not os.path.isdir(folder):
+            return artifacts
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name in IGNORED_NAMES or not entry.is_file(follow_symlinks=False):
+                    continue
+                kind = 'temp' if any(fnmatch.fnmatch(entry.name, p) for p in TEMP_PATTERNS) else default_kind
+                stat = entry.stat(follow_symlinks=False)
+                path = f"{folder}/{entry.name}"
+                artifacts.append(Artifact(path, kind, stat.st_size, self._last_access(path, stat.st_mtime)))
+        return artifacts
+
+    def _scan_sessions(self) -> List[Artifact]:
+        artifacts = []
+        if not os.path.isdir(self.sessions_folder):
+            return artifacts
+        with os.scandir(self.sessions_folder) as entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                size, newest = 0, entry.stat().st_mtime
+                for root, _, files in os.walk(entry.path):
+                    for name in files:
+                        try:
+                            stat = os.stat(os.path.join(root, name))
+                        except OSError:
+                            continue
+                        size += stat.st_size
+                        newest = max(newest, stat.st_mtime)
+                path = f"{self.sessions_folder}/{entry.name}"
+                version = _session_version(entry.path) or 0.0
+                artifacts.append(Artifact(path, 'session', size, self._last_access(path, newest), version))
+        return artifacts
+
+    def scan(self) -> List[Artifact]:
+        """列出所有可回收的文件和会话目录"""
+        return (self._scan_files(self.upload_folder, 'upload')
+                + self._scan_files(self.models_folder, 'model')
+                + self._scan_sessions())
+
+    def usage(self) -> Dict:
+        """当前各类产物的占用"""
+        summary = {}
+        for artifact in self.scan():
+            item = summary.setdefault(artifact.kind, {'count': 0, 'bytes': 0})
+            item['count'] += 1
+            item['bytes'] += artifact.size
+        return {
+            'total_bytes': sum(item['bytes'] for item in summary.values()),
+            'budget_bytes': self.disk_budget_bytes,
+            'by_kind': summary
+        }
+
+    # ===== 回收 =====
+
+    def _delete(self, artifact: Artifact) -> bool:
+        try:
+            if artifact.kind == 'session':
+                with self.session_lock:
+                    # 扫描之后会话又有新的修改，说明还在使用
+                    version = _session_version(artifact.path)
+                    if version is not None and version != artifact.version:
+                        return False
+                    shutil.rmtree(artifact.path)
+            else:
+                os.remove(artifact.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ 回收 {artifact.path} 失败: {str(e)}")
+            return False
+        with self._lock:
+            self._access.pop(artifact.path, None)
+        return True
+
+    def collect(self, dry_run: bool = False, now: float = None) -> Dict:
+        """执行一次回收，返回报告（dry_run时只计算不删除）"""
+        with self._run_lock:
+            started = time.perf_counter()
+            now = now or time.time()
+            references = self.collect_references()
+            artifacts = self.scan()
+            usage_before = sum(a.size for a in artifacts)
+
+            candidates, protected = [], 0
+            for artifact in artifacts:
+                if artifact.path in references or now - artifact.last_access < self.min_age_seconds:
+                    protected += 1
+                else:
+                    candidates.append(artifact)
+
+            # 先删除过期的，再按LRU删到预算以内
+            expired = [a for a in candidates if now - a.last_access > self.ttl_seconds[a.kind]]
+            to_delete = {a.path: (a, 'expired') for a in expired}
+            remaining = usage_before - sum(a.size for a in expired)
+            if remaining > self.disk_budget_bytes:
+                for artifact in sorted(candidates, key=lambda a: a.last_access):
+                    if remaining <= self.disk_budget_bytes:
+                        break
+                    if artifact.path not in to_delete:
+                        to_delete[artifact.path] = (artifact, 'over_budget')
+                        remaining -= artifact.size
+
+            deleted = {}
+            reclaimed = 0
+            for artifact, reason in to_delete.values():
+                if not dry_run and not self._delete(artifact):
+                    continue
+                item = deleted.setdefault(artifact.kind, {'count': 0, 'bytes': 0, 'over_budget': 0})
+                item['count'] += 1
+                item['bytes'] += artifact.size
+                if reason == 'over_budget':
+                    item['over_budget'] += 1
+                reclaimed += artifact.size
+
+            if not dry_run:
+                # 已经不存在的路径不再保留访问记录
+                existing = {a.path for a in artifacts}
+                with self._lock:
+                    for path in [p for p in self._access if p not in existing]:
+                        del self._access[path]
+                self._save_index()
+
+            report = {
+                'finished_at': datetime.now().isoformat(),
+                'duration_seconds': round(time.perf_counter() - started, 3),
+                'dry_run': dry_run,
+                'scanned': len(artifacts),
+                'protected': protected,
+                'deleted': deleted,
+                'reclaimed_bytes': reclaimed,
+                'usage_bytes_before': usage_before,
+                'usage_bytes_after': usage_before - reclaimed,
+                'budget_bytes': self.disk_budget_bytes
+            }
+            if not dry_run:
+                self.last_report = report
+            count = sum(item['count'] for item in deleted.values())
+            logger.info(f"🧹 垃圾回收{'（演练）' if dry_run else ''}完成：删除 {count} 项，"
+                        f"释放 {reclaimed / 1024 / 1024:.1f} MB，当前占用 {report['usage_bytes_after'] / 1024 / 1024:.1f} MB")
+            return report
+
+
+class GarbageCollectorScheduler:
+    """后台线程定期执行回收"""
+
+    def __init__(self, collector: GarbageCollector, interval_seconds: float = None, initial_delay: float = None,
+                 lock_file: str = None):
+        self.collector = collector
+        self.lock_file = lock_file or os.path.join(os.path.dirname(collector.index_file), 'gc.lock')
+        self.interval_seconds = interval_seconds if interval_seconds is not None else \
+            float(os.getenv('GC_INTERVAL_MINUTES', '60')) * 60
+        self.initial_delay = initial_delay if initial_delay is not None else \
+            float(os.getenv('GC_INITIAL_DELAY_SECONDS', '300'))
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_fd = None
+
+    def acquire_leadership(self) -> bool:
+        """尝试拿到进程间的回收锁，拿到后一直持有到进程退出；其他进程已持有时返回False"""
+        if self._lock_fd is not None or fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_file) or '.', exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info(f"🧹 本进程（{os.getpid()}）负责定期垃圾回收")
+        return True
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            try:
+                if self.acquire_leadership():
+                    self.collector.collect()
+            except Exception as e:
+                logger.exception(f"❌ 垃圾回收出错: {str(e)}")
+            delay = self.interval_seconds
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='garbage-collector', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_scheduler: Optional[GarbageCollectorScheduler] = None
+
+
+def reinit_after_fork():
+    """fork出的worker中（重新）启动回收线程（父进程的线程不会被继承）"""
+    if _scheduler is not None:
+        _scheduler._thread = None
+        _scheduler._lock_fd = None
+        _scheduler.start()
+
+
+def _is_admin(request) -> bool:
+    token = os.getenv('GC_ADMIN_TOKEN') or os.getenv('PROFILE_ADMIN_TOKEN', '')
+    provided = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(provided, token)
+
+
+def init_app(app, session_manager=None, collector: GarbageCollector = None) -> GarbageCollector:
+    """注册访问记录钩子和管理接口，并按配置启动定期回收"""
+    from flask import request, jsonify
+
+    global _scheduler
+    if collector is None:
+        collector = GarbageCollector(
+            upload_folder=app.config.get('UPLOAD_FOLDER', 'uploads'),
+            sessions_folder=session_manager.sessions_folder if session_manager else 'creation_sessions',
+            session_lock=session_manager._lock if session_manager else None
+        )
+
+    # 端点名 -> 文件所在目录（None表示路径参数本身就是相对路径）
+    tracked_endpoints = {
+        'uploaded_file': collector.upload_folder,
+        'model_file': collector.models_folder,
+        'session_file': None,
+    }
+
+    @app.after_request
+    def _record_artifact_access(response):
+        if request.endpoint in tracked_endpoints and response.status_code in (200, 206, 304):
+            args = request.view_args or {}
+            name = args.get('filename') or args.get('filepath')
+            if name:
+                folder = tracked_endpoints[request.endpoint]
+                collector.touch(f"{folder}/{name}" if folder else name)
+        return response
+
+    @app.route('/admin/gc')
+    def gc_status():
+        """当前磁盘占用和最近一次回收报告"""
+        if not _is_admin(request):
+            return jsonify({'error': '需要管理员令牌'}), 403
+        return jsonify({'success': True, 'usage': collector.usage(), 'last_report': collector.last_report})
+
+    @app.route('/admin/gc/run', methods=['POST'])
+    def gc_run():
+        """立即执行一次回收"""
+        if not _is_admin(request):
+            return jsonify({'error': '需要管理员令牌'}), 403
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        return jsonify({'success': True, 'report': collector.collect(dry_run=dry_run)})
+
+    if _env_flag('GC_ENABLED'):
+        _scheduler = GarbageCollectorScheduler(collector)
+        if not _env_flag('GC_START_IN_WORKERS', False):
+            _scheduler.start()
+    return collector
@@ -0,0 +1,291 @@
+import json
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from json_store import atomic_write_json
+from upload_ingest import atomic_temp_path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class GenerationCache:
+    """生成结果缓存 - 相同的提示词、风格和输入图片直接返回已生成的图片，节省Gemini配额
+
+    缓存键由 (prompt, style, color_preference, expert_mode, 手绘图内容哈希, 模型名) 计算得出，
+    结果文件保存在磁盘上，按最近访问时间做LRU淘汰，并带有过期时间(TTL)。
+
+    最近访问时间就是结果文件的修改时间（命中时 os.utime），命中缓存不写索引；
+    只有写入和淘汰时在索引的文件锁（fcntl.flock）下重新读取索引、修改后保存，
+    多个gunicorn worker共用同一个缓存目录时不会覆盖彼此的条目。
+    """
+
+    INDEX_FILENAME = 'index.json'
+    LOCK_FILENAME = 'index.lock'
+
+    def __init__(self, cache_folder='cache/generation', max_bytes=None, max_entries=None,
+                 ttl_seconds=None, enabled=None):
+        self.cache_folder = cache_folder
+        self.enabled = _env_flag('GENERATION_CACHE_ENABLED') if enabled is None else enabled
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv('GENERATION_CACHE_MAX_MB', '512')) * 1024 * 1024)
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', '1000'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            int(float(os.getenv('GENERATION_CACHE_TTL_HOURS', '168')) * 3600)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._index = {}
+        self._index_stamp = None
+
+        if self.enabled:
+            self.ensure_directories()
+            self._refresh_index()
+
+    def ensure_directories(self):
+        """确保必要的目录存在"""
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    @staticmethod
+    def hash_file(file_path: str) -> Optional[str]:
+        """计算文件内容的SHA-256哈希"""
+        if not file_path or not os.path.exists(file_path):
+            return None
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, prompt: str, style: str, color_preference: str, expert_mode: bool,
+                 sketch_path: str = None, model_name: str = '', sketch_hash: str = None) -> str:
+        """根据生成参数计算缓存键"""
+        if sketch_hash is None and sketch_path:
+            sketch_hash = self.hash_file(sketch_path)
+
+        key_data = {
+            'prompt': (prompt or '').strip(),
+            'style': style or '',
+            'color_preference': color_preference or '',
+            'expert_mode': bool(expert_mode),
+            'sketch': sketch_hash or '',
+            'model': model_name or ''
+        }
+        raw = json.dumps(key_data, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, dest_folder: str = 'uploads') -> Optional[str]:
+        """查找缓存结果，命中时复制一份到dest_folder并返回新路径"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._refresh_index()
+            entry = self._index.get(key)
+            cached_path = os.path.join(self.cache_folder, entry['filename']) if entry else None
+            usable = entry is not None and not self._is_expired(entry) and os.path.exists(cached_path)
+            if not usable:
+                self._misses += 1
+
+        if not usable:
+            if entry:
+                # 过期或文件已丢失的条目直接移除
+                self._update_index(lambda: self._discard_stale(key))
+            return None
+
+        # 复制一份给本次请求使用，后续流程（会话版本管理等）可以像处理新生成的图片一样处理它
+        os.makedirs(dest_folder, exist_ok=True)
+        output_path = os.path.join(dest_folder, f"cached_{key[:12]}_{str(uuid.uuid4())[:8]}.png")
+        try:
+            # 更新修改时间作为最近访问时间
+            os.utime(cached_path)
+            shutil.copyfile(cached_path, output_path)
+        except OSError:
+            # 刚被其他进程淘汰
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._hits += 1
+        return output_path
+
+    def put(self, key: str, file_path: str, metadata: Dict = None) -> bool:
+        """将生成结果写入缓存"""
+        if not self.enabled or not file_path or not os.path.exists(file_path):
+            return False
+
+        try:
+            filename = f"{key}.png"
+            dest_path = os.path.join(self.cache_folder, filename)
+            # 相同的请求同时完成时（例如连点两次）各自写自己的临时文件
+            tmp_path = atomic_temp_path(dest_path)
+            try:
+                shutil.copyfile(file_path, tmp_path)
+                os.replace(tmp_path, dest_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            entry = {
+                'filename': filename,
+                'size': os.path.getsize(dest_path),
+                'created_at': time.time(),
+                'metadata': metadata or {}
+            }
+
+            def add():
+                self._index[key] = entry
+
+            self._update_index(add)
+            return True
+
+        except Exception as e:
+            logger.warning(f"⚠️ 生成结果缓存写入失败: {str(e)}")
+            return False
+
+    def record_bypass(self):
+        """记录一次跳过缓存（用户要求重新生成）"""
+        with self._lock:
+            self._bypassed += 1
+
+    def stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            if self.enabled:
+                self._refresh_index()
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._index),
+                'total_bytes': sum(e.get('size', 0) for e in self._index.values()),
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'bypassed': self._bypassed,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        removed = []
+
+        def remove_all():
+            removed.extend(self._index.keys())
+            for key in list(self._index.keys()):
+                self._remove_entry(key)
+
+        self._update_index(remove_all)
+        return len(removed)
+
+    def _is_expired(self, entry: Dict) -> bool:
+        """检查条目是否过期"""
+        return self.ttl_seconds > 0 and time.time() - entry.get('created_at', 0) > self.ttl_seconds
+
+    def _last_access(self, entry: Dict) -> float:
+        """最近访问时间（结果文件的修改时间）"""
+        try:
+            return os.path.getmtime(os.path.join(self.cache_folder, entry['filename']))
+        except OSError:
+            return 0.0
+
+    def _discard_stale(self, key: str):
+        """重新读取索引后条目仍然过期或文件丢失时才移除（其他进程可能刚写入了新结果）"""
+        entry = self._index.get(key)
+        if entry and (self._is_expired(entry) or
+                      not os.path.exists(os.path.join(self.cache_folder, entry['filename']))):
+            self._remove_entry(key)
+
+    def _evict(self):
+        """删除过期条目，然后按最近访问时间淘汰直到满足容量限制"""
+        for key in [k for k, e in self._index.items() if self._is_expired(e)]:
+            self._remove_entry(key)
+
+        total_bytes = sum(e.get('size', 0) for e in self._index.values())
+        lru_keys = sorted(self._index.keys(), key=lambda k: self._last_access(self._index[k]))
+        for key in lru_keys:
+            if len(self._index) <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            total_bytes -= self._index[key].get('size', 0)
+            self._remove_entry(key)
+
+    def _remove_entry(self, key: str):
+        """删除缓存条目及其文件"""
+        entry = self._index.pop(key, None)
+        if entry:
+            cached_path = os.path.join(self.cache_folder, entry['filename'])
+            if os.path.exists(cached_path):
+                os.remove(cached_path)
+
+    def _load_index(self) -> Dict:
+        """加载缓存索引"""
+        index_file = os.path.join(self.cache_folder, self.INDEX_FILENAME)
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                return {}
+        return {}
+
+    def _refresh_index(self):
+        """索引文件被（其他进程）修改过时重新加载，只检查大小和修改时间"""
+        stamp = _file_stamp(os.path.join(self.cache_folder, self.INDEX_FILENAME))
+        if stamp != self._index_stamp:
+            self._index = self._load_index()
+            self._index_stamp = stamp
+
+    @contextmanager
+    def _index_file_lock(self):
+        """持有缓存索引的进程间排他锁"""
+        fd = os.open(os.path.join(self.cache_folder, self.LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # 关闭文件描述符时锁随之释放
+            os.close(fd)
+
+    def _update_index(self, change):
+        """在文件锁下重新读取索引，执行change修改 self._index，淘汰后保存"""
+        self.ensure_directories()
+        with self._lock, self._index_file_lock():
+            self._index = self._load_index()
+            change()
+            self._evict()
+            index_file = os.path.join(self.cache_folder, self.INDEX_FILENAME)
+            atomic_write_json(index_file, self._index, indent=None)
+            self._index_stamp = _file_stamp(index_file)
+
+
+def _file_stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
@@ -0,0 +1,684 @@
+"""
+GLB模型处理 - 为3D模型生成低面数预览版本，并统计顶点数、三角形数和文件大小
+
+混元3D生成的GLB通常有几十万个三角形和2048×2048的贴图，文件十几MB，
+查看器要等整个文件下载完才显示任何内容。模型下载完成和保存到作品集时在这里处理：
+
+    1. 只用NumPy解析GLB（JSON块 + 二进制块），读取每个三角形图元的顶点属性和索引
+    2. 顶点聚类简化：把顶点按网格聚类合并（贴图坐标也参与聚类，保留UV接缝），
+       网格大小二分查找到三角形数不超过 GLB_PREVIEW_TARGET_TRIANGLES
+    3. 贴图缩小到 GLB_PREVIEW_TEXTURE_SIZE，不透明的贴图重新编码为JPEG
+    4. 写出 <模型名>_preview.glb，查看器先加载它，再在后台加载完整模型替换
+
+完整模型可以选择再做一遍压缩（GLB_OPTIMIZE_ENABLED）：
+    - 顶点属性量化（KHR_mesh_quantization）：位置 int16（反量化的平移和缩放放到节点上），
+      法线和切线 int8 归一化，0~1范围内的贴图坐标 uint16 归一化；索引能用 uint16 时不用 uint32
+    - 贴图按 GLB_OPTIMIZE_TEXTURE_QUALITY 重新编码，结果比原图大时保留原图
+    - 内容相同的缓冲区视图（重复的贴图等）只保存一份
+    - 写出前重新解析，逐个图元检查顶点数、索引和反量化后的误差，检查不通过时保留原文件
+
+有动画、蒙皮、变形目标或压缩扩展（Draco等）的模型不生成预览也不压缩，只统计信息。
+
+环境变量：
+    GLB_PREVIEW_ENABLED            是否生成预览模型，默认 true
+    GLB_PREVIEW_TARGET_TRIANGLES   预览模型的三角形数上限，默认 20000
+    GLB_PREVIEW_TEXTURE_SIZE       预览贴图的最大边长，默认 512
+    GLB_OPTIMIZE_ENABLED           是否压缩保存的完整模型，默认 false
+    GLB_OPTIMIZE_TEXTURE_QUALITY   重新编码贴图的JPEG质量，默认 85
+    GLB_OPTIMIZE_TEXTURE_SIZE      完整模型贴图的最大边长，默认 0（不缩小）
+"""
+
+import io
+import os
+import json
+import struct
+import hashlib
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from upload_ingest import derived_path, atomic_temp_path
+
+logger = logging.getLogger(__name__)
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+
+# 预览模型保留的顶点属性（切线等在简化后失效，直接丢弃）
+PREVIEW_ATTRIBUTES = ('POSITION', 'NORMAL', 'TEXCOORD_0', 'COLOR_0')
+TRIANGLES = 4
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+class GLBError(ValueError):
+    """不是有效的GLB文件或包含不支持的内容"""
+
+
+def preview_enabled() -> bool:
+    return os.getenv('GLB_PREVIEW_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def optimize_enabled() -> bool:
+    return os.getenv('GLB_OPTIMIZE_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def preview_path(model_path: str) -> str:
+    """预览模型的文件路径（与完整模型同目录）"""
+    return derived_path(model_path, 'preview')
+
+
+# ===== GLB读写 =====
+
+def read_glb(data: bytes):
+    """解析GLB，返回 (glTF JSON, 二进制块)"""
+    if len(data) < 20 or data[:4] != GLB_MAGIC:
+        raise GLBError("不是GLB文件")
+    _, length = struct.unpack_from('<II', data, 4)
+    offset = 12
+    gltf, bin_data = None, b''
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk.decode('utf-8'))
+        elif chunk_type == CHUNK_BIN and not bin_data:
+            bin_data = chunk
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise GLBError("GLB缺少JSON块")
+    return gltf, bin_data
+
+
+def write_glb(gltf: Dict, bin_data: bytes) -> bytes:
+    """把glTF JSON和二进制数据打包为GLB（块长度按4字节对齐）"""
+    json_chunk = json.dumps(gltf, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_chunk = bytes(bin_data) + b'\x00' * (-len(bin_data) % 4)
+    length = 12 + 8 + len(json_chunk) + (8 + len(bin_chunk) if bin_chunk else 0)
+    parts = [struct.pack('<4sII', GLB_MAGIC, 2, length),
+             struct.pack('<II', len(json_chunk), CHUNK_JSON), json_chunk]
+    if bin_chunk:
+        parts += [struct.pack('<II', len(bin_chunk), CHUNK_BIN), bin_chunk]
+    return b''.join(parts)
+
+
+def _buffer_view_bytes(gltf: Dict, bin_data: bytes, index: int) -> bytes:
+    view = gltf['bufferViews'][index]
+    if view.get('buffer', 0) != 0:
+        raise GLBError("只支持内嵌在GLB中的缓冲区")
+    start = view.get('byteOffset', 0)
+    return bin_data[start:start + view['byteLength']]
+
+
+def read_accessor(gltf: Dict, bin_data: bytes, index: int, normalize: bool = True) -> np.ndarray:
+    """读取访问器数据，返回形状为 (count, 分量数) 的数组；normalize 时归一化整数转换为浮点数"""
+    accessor = gltf['accessors'][index]
+    if 'sparse' in accessor or 'bufferView' not in accessor:
+        raise GLBError("不支持稀疏访问器")
+    dtype = np.dtype(COMPONENT_DTYPES[accessor['componentType']]).newbyteorder('<')
+    components = TYPE_SIZES[accessor['type']]
+    count = accessor['count']
+    view = gltf['bufferViews'][accessor['bufferView']]
+    data = _buffer_view_bytes(gltf, bin_data, accessor['bufferView'])
+    offset = accessor.get('byteOffset', 0)
+    element_size = dtype.itemsize * components
+    stride = view.get('byteStride') or element_size
+
+    if stride == element_size:
+        array = np.frombuffer(data, dtype=dtype, count=count * components, offset=offset).reshape(count, components)
+    else:
+        # 交错存储的顶点属性：按步长取出每个元素
+        raw = np.frombuffer(data, dtype=np.uint8, count=stride * (count - 1) + element_size, offset=offset)
+        rows = np.lib.stride_tricks.as_strided(raw, shape=(count, element_size), strides=(stride, 1))
+        array = np.ascontiguousarray(rows).view(dtype).reshape(count, components)
+
+    if normalize and accessor.get('normalized') and dtype.kind in 'iu':
+        array = np.maximum(array.astype(np.float32) / np.iinfo(dtype).max, -1.0)
+    return array
+
+
+# ===== 统计 =====
+
+def _image_size(gltf: Dict, bin_data: bytes, image: Dict):
+    if 'bufferView' not in image:
+        return None
+    try:
+        with Image.open(io.BytesIO(_buffer_view_bytes(gltf, bin_data, image['bufferView']))) as img:
+            return list(img.size)
+    except Exception:
+        return None
+
+
+def model_stats(gltf: Dict, bin_data: bytes, file_size: int) -> Dict:
+    """顶点数、三角形数、文件大小和贴图尺寸（只读取JSON和贴图文件头）"""
+    vertices = triangles = 0
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            position = primitive.get('attributes', {}).get('POSITION')
+            if position is None:
+                continue
+            vertex_count = gltf['accessors'][position]['count']
+            vertices += vertex_count
+            if primitive.get('mode', TRIANGLES) == TRIANGLES:
+                index_count = gltf['accessors'][primitive['indices']]['count'] if 'indices' in primitive else vertex_count
+                triangles += index_count // 3
+    textures = [size for size in (_image_size(gltf, bin_data, image) for image in gltf.get('images', [])) if size]
+    return {
+        'vertices': vertices,
+        'triangles': triangles,
+        'bytes': file_size,
+        'textures': textures,
+    }
+
+
+def file_stats(path: str) -> Dict:
+    """统计GLB文件"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    gltf, bin_data = read_glb(data)
+    return model_stats(gltf, bin_data, len(data))
+
+
+# ===== 简化 =====
+
+def _cluster_keys(values: np.ndarray, grid: int) -> np.ndarray:
+    """把每行数值量化到 grid 个格子，返回每行的格子编号（各列组合成一个整数）"""
+    low = values.min(axis=0)
+    extent = float((values.max(axis=0) - low).max())
+    if extent <= 0:
+        return np.zeros(len(values), dtype=np.int64)
+    cells = np.floor((values - low) * ((grid - 1e-6) / extent)).astype(np.int64)
+    keys = np.zeros(len(values), dtype=np.int64)
+    for column in cells.T:
+        keys = keys * grid + column
+    return keys
+
+
+def _collapse(keys_position: np.ndarray, keys_uv: Optional[np.ndarray], grid: int, indices: np.ndarray):
+    """按聚类合并顶点，返回 (每个顶点所属的聚类, 聚类数, 保留的三角形)"""
+    keys = keys_position if keys_uv is None else keys_position * (grid * grid) + keys_uv
+    unique_keys, cluster = np.unique(keys, return_inverse=True)
+    triangles = cluster[indices].reshape(-1, 3)
+    # 去掉退化三角形（有两个顶点落在同一聚类）
+    keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+    triangles = triangles[keep]
+    # 去掉重复的三角形（顶点相同、顺序不同），保留原来的朝向
+    if len(triangles):
+        _, first = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+        triangles = triangles[np.sort(first)]
+    return cluster, len(unique_keys), triangles
+
+
+def decimate(attributes: Dict[str, np.ndarray], indices: np.ndarray, target_triangles: int):
+    """
+    顶点聚类简化：返回 (新的顶点属性, 新的索引)。
+    网格越细保留的三角形越多，二分查找满足目标的最细网格。
+    """
+    positions = attributes['POSITION'].astype(np.float64)
+    uv = attributes.get('TEXCOORD_0')
+    if len(indices) // 3 <= target_triangles:
+        return attributes, indices
+
+    best = None
+    low, high = 2, 1024
+    while low <= high:
+        grid = (low + high) // 2
+        keys_position = _cluster_keys(positions, grid)
+        keys_uv = _cluster_keys(uv.astype(np.float64), grid) if uv is not None else None
+        cluster, cluster_count, triangles = _collapse(keys_position, keys_uv, grid, indices)
+        if len(triangles) <= target_triangles:
+            best = (cluster, cluster_count, triangles)
+            low = grid + 1
+        else:
+            high = grid - 1
+    if best is None:
+        raise GLBError("无法简化到目标三角形数")
+
+    cluster, cluster_count, triangles = best
+    counts = np.bincount(cluster, minlength=cluster_count).astype(np.float64)
+    merged = {}
+    for name, values in attributes.items():
+        columns = [np.bincount(cluster, weights=values[:, i], minlength=cluster_count) / counts
+                   for i in range(values.shape[1])]
+        merged[name] = np.stack(columns, axis=1).astype(np.float32)
+    if 'NORMAL' in merged:
+        lengths = np.linalg.norm(merged['NORMAL'], axis=1, keepdims=True)
+        merged['NORMAL'] = merged['NORMAL'] / np.maximum(lengths, 1e-12)
+
+    # 只保留仍被三角形使用的顶点
+    used, remapped = np.unique(triangles, return_inverse=True)
+    return {name: values[used] for name, values in merged.items()}, remapped.reshape(-1).astype(np.uint32)
+
+
+# ===== 贴图 =====
+
+def encode_image(data: bytes, max_size: int = 0, quality: int = 85, force: bool = False):
+    """
+    缩小（max_size为0时不缩小）并重新编码贴图，返回 (图片数据, MIME类型)：
+    有透明通道的保存为PNG，其余保存为JPEG。不需要缩小且没有 force 时返回None。
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        needs_resize = bool(max_size) and max(img.size) > max_size
+        if not needs_resize and not force:
+            return None
+        has_alpha = 'A' in img.getbands() or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        if needs_resize:
+            img.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            img.save(buffer, format='PNG', optimize=True)
+            return buffer.getvalue(), 'image/png'
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        return buffer.getvalue(), 'image/jpeg'
+
+
+def downscale_image(data: bytes, max_size: int):
+    """缩小贴图，返回 (图片数据, MIME类型)；不需要缩小时返回None"""
+    return encode_image(data, max_size)
+
+
+# ===== 写出 =====
+
+class _BufferBuilder:
+    """按4字节对齐依次写入缓冲区视图和访问器，内容相同的缓冲区视图只写一份"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.buffer_views = []
+        self.accessors = []
+        self._views_by_content = {}
+        self.deduplicated_bytes = 0
+
+    def add_view(self, data: bytes, target: int = None, stride: int = None) -> int:
+        key = (hashlib.sha256(data).digest(), len(data), target, stride)
+        if key in self._views_by_content:
+            self.deduplicated_bytes += len(data)
+            return self._views_by_content[key]
+        self.data += b'\x00' * (-len(self.data) % 4)
+        view = {'buffer': 0, 'byteOffset': len(self.data), 'byteLength': len(data)}
+        if stride:
+            view['byteStride'] = stride
+        if target:
+            view['target'] = target
+        self.buffer_views.append(view)
+        self.data += data
+        self._views_by_content[key] = len(self.buffer_views) - 1
+        return len(self.buffer_views) - 1
+
+    def add_accessor(self, array: np.ndarray, type_name: str, component_type: int, target: int,
+                     with_bounds: bool = False, normalized: bool = False) -> int:
+        array = np.ascontiguousarray(array, dtype=COMPONENT_DTYPES[component_type])
+        if array.ndim == 1:
+            array = array.reshape(-1, 1)
+        count, components = array.shape
+        stride = None
+        row_bytes = array.itemsize * components
+        if target == ARRAY_BUFFER and row_bytes % 4:
+            # 顶点属性的步长必须是4的倍数（如 int16 的VEC3），每行补齐到4字节
+            stride = row_bytes + (-row_bytes % 4)
+            padded = np.zeros((count, stride // array.itemsize), dtype=array.dtype)
+            padded[:, :components] = array
+            data = padded.tobytes()
+        else:
+            data = array.tobytes()
+        accessor = {
+            'bufferView': self.add_view(data, target, stride),
+            'componentType': component_type,
+            'count': count if type_name != 'SCALAR' else array.size,
+            'type': type_name,
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if with_bounds and count:
+            accessor['min'] = array.min(axis=0).tolist()
+            accessor['max'] = array.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def finish(self, gltf: Dict) -> bytes:
+        gltf['accessors'] = self.accessors
+        gltf['bufferViews'] = self.buffer_views
+        gltf['buffers'] = [{'byteLength': len(self.data)}]
+        return write_glb(gltf, self.data)
+
+
+def _vector_type(values: np.ndarray) -> str:
+    return {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4'}[values.shape[1]]
+
+
+def _check_supported(gltf: Dict):
+    required = [name for name in gltf.get('extensionsRequired', []) if name != QUANTIZATION_EXTENSION]
+    if required:
+        raise GLBError(f"不支持的扩展: {', '.join(required)}")
+    if gltf.get('animations') or gltf.get('skins'):
+        raise GLBError("不支持带动画或蒙皮的模型")
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            if primitive.get('mode', TRIANGLES) != TRIANGLES or primitive.get('targets'):
+                raise GLBError("只支持普通三角形网格")
+
+
+def _read_indices(gltf: Dict, bin_data: bytes, primitive: Dict, vertex_count: int) -> np.ndarray:
+    if 'indices' in primitive:
+        return read_accessor(gltf, bin_data, primitive['indices']).reshape(-1).astype(np.int64)
+    return np.arange(vertex_count, dtype=np.int64)
+
+
+def _index_type(vertex_count: int) -> int:
+    return 5123 if vertex_count < 65536 else 5125
+
+
+def _without_extension(names, extension):
+    names = [name for name in names if name != extension]
+    return names or None
+
+
+def _copy_images(gltf: Dict, bin_data: bytes, builder: _BufferBuilder, convert) -> list:
+    """写入内嵌贴图，convert(数据) 返回 (新数据, MIME类型) 或 None（保留原图）"""
+    images = []
+    for image in gltf.get('images', []):
+        if 'bufferView' not in image:
+            images.append(image)
+            continue
+        data = _buffer_view_bytes(gltf, bin_data, image['bufferView'])
+        mime_type = image.get('mimeType', 'image/png')
+        converted = convert(data)
+        if converted:
+            data, mime_type = converted
+        images.append({**image, 'bufferView': builder.add_view(data), 'mimeType': mime_type})
+    return images
+
+
+# ===== 生成预览 =====
+
+def build_preview(gltf: Dict, bin_data: bytes, target_triangles: int, texture_size: int) -> bytes:
+    """生成预览GLB：网格按三角形数比例分配目标面数后简化，贴图缩小"""
+    _check_supported(gltf)
+    total = model_stats(gltf, bin_data, 0)['triangles'] or 1
+    builder = _BufferBuilder()
+    preview = dict(gltf)
+
+    meshes = []
+    for mesh in gltf.get('meshes', []):
+        primitives = []
+        for primitive in mesh.get('primitives', []):
+            attributes = {name: read_accessor(gltf, bin_data, index).astype(np.float32)
+                          for name, index in primitive.get('attributes', {}).items() if name in PREVIEW_ATTRIBUTES}
+            if 'POSITION' not in attributes:
+                continue
+            indices = _read_indices(gltf, bin_data, primitive, len(attributes['POSITION']))
+            share = max(12, int(target_triangles * (len(indices) // 3) / total))
+            attributes, indices = decimate(attributes, indices, share)
+
+            new_primitive = {key: value for key, value in primitive.items() if key not in ('attributes', 'indices')}
+            new_primitive['attributes'] = {
+                name: builder.add_accessor(values, _vector_type(values), 5126, ARRAY_BUFFER,
+                                           with_bounds=(name == 'POSITION'))
+                for name, values in attributes.items()
+            }
+            new_primitive['indices'] = builder.add_accessor(indices, 'SCALAR', _index_type(len(attributes['POSITION'])),
+                                                            ELEMENT_ARRAY_BUFFER)
+            primitives.append(new_primitive)
+        meshes.append({**mesh, 'primitives': primitives})
+    if meshes:
+        preview['meshes'] = meshes
+
+    images = _copy_images(gltf, bin_data, builder, lambda data: downscale_image(data, texture_size))
+    if images:
+        preview['images'] = images
+
+    # 预览的顶点属性都是浮点数，即使原模型是量化过的也不再需要量化扩展
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        if key in preview:
+            names = _without_extension(preview[key], QUANTIZATION_EXTENSION)
+            if names:
+                preview[key] = names
+            else:
+                del preview[key]
+    return builder.finish(preview)
+
+
+# ===== 压缩完整模型 =====
+
+# 各属性反量化后允许的最大误差（位置按量化步长计算）
+_TOLERANCE = {'NORMAL': 1.5 / 127, 'TANGENT': 1.5 / 127}
+_TEXCOORD_TOLERANCE = 1.5 / 65535
+
+
+def _quantize_attribute(name: str, values: np.ndarray, accessor: Dict):
+    """返回 (量化后的数组, componentType, normalized)；不量化的属性返回None"""
+    if accessor['componentType'] != 5126:
+        return None
+    if name in ('NORMAL', 'TANGENT'):
+        return np.clip(np.round(values * 127), -127, 127).astype(np.int8), 5120, True
+    if name.startswith('TEXCOORD_') and len(values) and values.min() >= 0 and values.max() <= 1:
+        return np.round(values * 65535).astype(np.uint16), 5123, True
+    return None
+
+
+def optimize_glb(gltf: Dict, bin_data: bytes, texture_quality: int = 85, texture_size: int = 0) -> bytes:
+    """量化顶点属性、重新编码贴图、合并重复的缓冲区视图，并检查结果可以正确读取"""
+    _check_supported(gltf)
+    if QUANTIZATION_EXTENSION in gltf.get('extensionsUsed', []):
+        raise GLBError("模型已经量化过")
+
+    builder = _BufferBuilder()
+    optimized = dict(gltf)
+    mesh_transforms = {}
+    meshes = []
+    for mesh_index, mesh in enumerate(gltf.get('meshes', [])):
+        positions = [read_accessor(gltf, bin_data, primitive['attributes']['POSITION']).astype(np.float64)
+                     for primitive in mesh['primitives'] if 'POSITION' in primitive.get('attributes', {})]
+        if positions:
+            low = np.min([p.min(axis=0) for p in positions if len(p)], axis=0)
+            high = np.max([p.max(axis=0) for p in positions if len(p)], axis=0)
+            offset = (low + high) / 2
+            # 各轴使用相同的缩放，法线方向不受节点缩放影响
+            scale = float((high - low).max()) / 2 / 32767 or 1.0
+            mesh_transforms[mesh_index] = (offset, scale)
+
+        primitives = []
+        for primitive in mesh['primitives']:
+            attributes = {}
+            for name, index in primitive.get('attributes', {}).items():
+                accessor = gltf['accessors'][index]
+                if name == 'POSITION' and accessor['componentType'] == 5126:
+                    offset, scale = mesh_transforms[mesh_index]
+                    values = read_accessor(gltf, bin_data, index).astype(np.float64)
+                    quantized = np.clip(np.round((values - offset) / scale), -32767, 32767).astype(np.int16)
+                    attributes[name] = builder.add_accessor(quantized, 'VEC3', 5122, ARRAY_BUFFER, with_bounds=True)
+                    continue
+                values = read_accessor(gltf, bin_data, index, normalize=False)
+                quantized = _quantize_attribute(name, values, accessor)
+                if quantized:
+                    array, component_type, normalized = quantized
+                else:
+                    array, component_type, normalized = values, accessor['componentType'], accessor.get('normalized', False)
+                attributes[name] = builder.add_accessor(array, accessor['type'], component_type, ARRAY_BUFFER,
+                                                        with_bounds=(name == 'POSITION'), normalized=normalized)
+
+            new_primitive = {**primitive, 'attributes': attributes}
+            if 'indices' in primitive:
+                vertex_count = gltf['accessors'][primitive['attributes']['POSITION']]['count']
+                indices = _read_indices(gltf, bin_data, primitive, vertex_count)
+                new_primitive['indices'] = builder.add_accessor(indices, 'SCALAR', _index_type(vertex_count),
+                                                                ELEMENT_ARRAY_BUFFER)
+            primitives.append(new_primitive)
+        meshes.append({**mesh, 'primitives': primitives})
+    if meshes:
+        optimized['meshes'] = meshes
+
+    # 反量化的平移和缩放：引用网格的节点把网格交给一个带变换的子节点
+    nodes = [dict(node) for node in gltf.get('nodes', [])]
+    for node in list(nodes):
+        mesh_index = node.get('mesh')
+        if mesh_index not in mesh_transforms:
+            continue
+        offset, scale = mesh_transforms[mesh_index]
+        nodes.append({'mesh': node.pop('mesh'), 'translation': offset.tolist(), 'scale': [scale] * 3})
+        node['children'] = node.get('children', []) + [len(nodes) - 1]
+    if nodes:
+        optimized['nodes'] = nodes
+
+    images = _copy_images(gltf, bin_data, builder,
+                          lambda data: _recompress_image(data, texture_quality, texture_size))
+    if images:
+        optimized['images'] = images
+
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        optimized[key] = list(gltf.get(key, [])) + [QUANTIZATION_EXTENSION]
+    data = builder.finish(optimized)
+    _verify_optimized(gltf, bin_data, data, mesh_transforms)
+    if builder.deduplicated_bytes:
+        logger.debug("♻️ 合并了 %d 字节重复的缓冲区数据", builder.deduplicated_bytes)
+    return data
+
+
+def _recompress_image(data: bytes, quality: int, max_size: int):
+    """重新编码贴图，只在结果更小（或需要缩小）时使用"""
+    converted = encode_image(data, max_size, quality=quality, force=True)
+    if converted and (len(converted[0]) < len(data) or max_size):
+        return converted
+    return None
+
+
+def _verify_optimized(gltf: Dict, bin_data: bytes, data: bytes, mesh_transforms: Dict):
+    """重新解析压缩后的模型，逐个图元比较顶点数、索引和反量化后的属性值"""
+    new_gltf, new_bin = read_glb(data)
+    for mesh_index, (mesh, new_mesh) in enumerate(zip(gltf.get('meshes', []), new_gltf.get('meshes', []))):
+        for primitive, new_primitive in zip(mesh['primitives'], new_mesh['primitives']):
+            for name, index in primitive.get('attributes', {}).items():
+                original = read_accessor(gltf, bin_data, index).astype(np.float64)
+                decoded = read_accessor(new_gltf, new_bin, new_primitive['attributes'][name]).astype(np.float64)
+                if decoded.shape != original.shape:
+                    raise GLBError(f"压缩后 {name} 的数量不一致")
+                if name == 'POSITION' and mesh_index in mesh_transforms:
+                    offset, scale = mesh_transforms[mesh_index]
+                    decoded = decoded * scale + offset
+                    tolerance = scale
+                elif name.startswith('TEXCOORD_'):
+                    tolerance = _TEXCOORD_TOLERANCE
+                else:
+                    tolerance = _TOLERANCE.get(name, 1e-6)
+                if len(original) and np.abs(decoded - original).max() > tolerance:
+                    raise GLBError(f"压缩后 {name} 的误差超出范围")
+            if 'indices' in primitive:
+                original_indices = _read_indices(gltf, bin_data, primitive, 0)
+                new_indices = _read_indices(new_gltf, new_bin, new_primitive, 0)
+                if not np.array_equal(original_indices, new_indices):
+                    raise GLBError("压缩后索引不一致")
+    for image in new_gltf.get('images', []):
+        if 'bufferView' in image:
+            with Image.open(io.BytesIO(_buffer_view_bytes(new_gltf, new_bin, image['bufferView']))) as img:
+                img.load()
+
+
+# ===== 处理流程 =====
+
+def _write_atomic(path: str, data: bytes):
+    temp_path = atomic_temp_path(path)
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def process_model(model_path: str, target_triangles: int = None, texture_size: int = None,
+                  optimize: bool = None) -> Optional[Dict]:
+    """
+    处理模型文件：统计信息，需要时在同目录生成预览模型，启用时压缩完整模型。
+    返回 {'vertices', 'triangles', 'bytes', 'textures', 'preview': 预览模型的同样统计 或 None}，
+    压缩过的模型另有 'original_bytes'；预览文件路径为 preview_path(model_path)。
+    文件无法解析时返回None（不影响生成流程）。
+    """
+    target_triangles = target_triangles or int(os.getenv('GLB_PREVIEW_TARGET_TRIANGLES', '20000'))
+    texture_size = texture_size or int(os.getenv('GLB_PREVIEW_TEXTURE_SIZE', '512'))
+    optimize = optimize_enabled() if optimize is None else optimize
+    try:
+        with open(model_path, 'rb') as f:
+            data = f.read()
+        gltf, bin_data = read_glb(data)
+        stats = model_stats(gltf, bin_data, len(data))
+    except (OSError, GLBError, ValueError, KeyError) as e:
+        logger.warning(f"⚠️ 无法解析3D模型 {model_path}: {str(e)}")
+        return None
+
+    stats['preview'] = None
+    small_enough = stats['triangles'] <= target_triangles and all(max(size) <= texture_size for size in stats['textures'])
+    if preview_enabled() and not small_enough:
+        try:
+            preview_data = build_preview(gltf, bin_data, target_triangles, texture_size)
+        except (GLBError, ValueError, KeyError, IndexError) as e:
+            logger.info(f"ℹ️ 模型 {model_path} 不生成预览: {str(e)}")
+        else:
+            if optimize:
+                preview_data = _optimized_or_original(preview_data)
+            path = preview_path(model_path)
+            _write_atomic(path, preview_data)
+            preview_gltf, preview_bin = read_glb(preview_data)
+            stats['preview'] = model_stats(preview_gltf, preview_bin, len(preview_data))
+            logger.info(f"🧊 已生成预览模型 {path}：{stats['triangles']} -> {stats['preview']['triangles']} 个三角形，"
+                        f"{stats['bytes'] // 1024}KB -> {stats['preview']['bytes'] // 1024}KB")
+
+    if optimize:
+        stats = _optimize_file(model_path, gltf, bin_data, stats)
+    return stats
+
+
+def _optimize_options() -> Dict:
+    return {
+        'texture_quality': int(os.getenv('GLB_OPTIMIZE_TEXTURE_QUALITY', '85')),
+        'texture_size': int(os.getenv('GLB_OPTIMIZE_TEXTURE_SIZE', '0')),
+    }
+
+
+def _optimized_or_original(data: bytes) -> bytes:
+    """预览模型同样量化（贴图已经缩小过，只重新编码）"""
+    try:
+        optimized = optimize_glb(*read_glb(data), texture_quality=_optimize_options()['texture_quality'])
+    except (GLBError, ValueError, KeyError, IndexError, OSError):
+        return data
+    return optimized if len(optimized) < len(data) else data
+
+
+def _optimize_file(model_path: str, gltf: Dict, bin_data: bytes, stats: Dict) -> Dict:
+    """压缩完整模型，结果更小时替换原文件，返回更新后的统计"""
+    try:
+        optimized = optimize_glb(gltf, bin_data, **_optimize_options())
+    except (GLBError, ValueError, KeyError, IndexError, OSError) as e:
+        logger.info(f"ℹ️ 模型 {model_path} 保持原样: {str(e)}")
+        return stats
+    if len(optimized) >= stats['bytes']:
+        return stats
+
+    _write_atomic(model_path, optimized)
+    new_gltf, new_bin = read_glb(optimized)
+    new_stats = {**model_stats(new_gltf, new_bin, len(optimized)),
+                 'preview': stats['preview'], 'original_bytes': stats['bytes']}
+    logger.info(f"📦 已压缩3D模型 {model_path}：{stats['bytes'] // 1024}KB -> {new_stats['bytes'] // 1024}KB")
+    return new_stats
+
+
+def move_preview(model_path: str, new_model_path: str) -> Optional[str]:
+    """完整模型被移动或改名后，预览模型随之改名；没有预览时返回None"""
+    old = preview_path(model_path)
+    if not os.path.exists(old):
+        return None
+    new = preview_path(new_model_path)
+    os.replace(old, new)
+    return new
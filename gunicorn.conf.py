@@ -0,0 +1,64 @@
+"""
+gunicorn 配置（仅Linux/macOS）
+
+    gunicorn -c gunicorn.conf.py app:app
+    或 SERVER_MODE=gunicorn python server.py
+
+默认 1 个worker进程 + 多线程，原因见 PRODUCTION_DEPLOYMENT.md：
+JSON数据文件的读-改-写只在进程内加锁，Veo视频任务状态、限流令牌桶和熔断器都保存在进程内存中。
+平滑重启：kill -HUP <master进程号>（重新加载配置并逐个替换worker）；
+更新代码后用 kill -USR2 启动新的master，再对旧master发送 TERM。
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"{os.getenv('SERVER_HOST', '0.0.0.0')}:{os.getenv('SERVER_PORT', '8080')}")
+
+# 进程与线程
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', os.getenv('SERVER_THREADS', '16')))
+worker_class = 'gthread'
+
+# 生成图片、3D模型（混元3D最长约5分钟）都是同步长请求，超时必须大于最慢的一次生成
+timeout = int(os.getenv('GUNICORN_TIMEOUT', os.getenv('SERVER_TIMEOUT', '600')))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+keepalive = 5
+
+# 在master中预先导入应用，worker fork后共享只读内存、启动更快
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# 定期替换worker，防止长时间运行后内存膨胀（加随机抖动避免同时重启）
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# 日志交给应用自己的非阻塞日志系统，gunicorn只输出到标准输出
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+# preload模式下由master在fork之前同步预热依赖（见 when_ready），不在master中启动预热线程；
+# 垃圾回收线程也不在master中启动，只在worker中启动（见 post_fork）
+if preload_app:
+    os.environ.setdefault('STARTUP_WARMUP', 'false')
+    os.environ.setdefault('GC_START_IN_WORKERS', 'true')
+
+
+def when_ready(server):
+    """preload模式下在fork worker之前导入OpenCV和AI SDK，worker直接继承已导入的模块"""
+    if preload_app:
+        import startup
+        startup.warm_up()
+
+
+def post_fork(server, worker):
+    """fork之后master中启动的后台线程不会被继承，需要在worker中重新启动"""
+    import logging_setup
+    logging_setup.reinit_after_fork()
+
+    import garbage_collector
+    garbage_collector.reinit_after_fork()
+
+    # master预热时可能已建立的keep-alive连接不能在多个进程间共用
+    from api.http_session import reset_session
+    reset_session()
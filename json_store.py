@@ -0,0 +1,52 @@
+"""
+JSON数据文件的原子写入
+
+先写入同目录下的临时文件再用 os.replace 替换，读取方永远只会看到完整的旧文件或新文件，
+进程在写入过程中崩溃也不会留下半截的JSON。
+"""
+
+import os
+import json
+import time
+import tempfile
+import functools
+
+# Windows上os.replace遇到文件占用时的重试次数
+REPLACE_RETRIES = 5
+
+
+def atomic_write_json(path: str, data, indent: int = 2):
+    """原子地把data写入path"""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                # Windows上目标文件正被其他线程读取时替换会失败，稍等后重试
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def locked(method):
+    """
+    方法装饰器：在实例的 self._lock 下执行，
+    保证同一进程内多个线程对同一数据文件的“读-改-写”不会互相覆盖
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,203 @@
+"""
+非阻塞日志 - 请求线程只把日志记录放入内存队列，由后台线程负责格式化和写出
+
+用法：
+    import logging
+    logger = logging.getLogger(__name__)
+
+    logger.info("✅ 图片生成完成: %s", path)
+    logger.debug("📨 收到请求: %s", payload)   # 默认不输出
+
+应用启动时调用 setup_logging() 和 init_app(app)。每个请求会分配一个关联ID
+（优先使用请求头 X-Request-ID），自动附加到该请求期间的所有日志上，并在响应头中返回。
+
+环境变量：
+    LOG_LEVEL        日志级别，默认 INFO（设为 DEBUG 才会输出请求内容等调试信息）
+    LOG_FORMAT       text（默认，适合控制台）或 json（每行一个JSON对象，适合日志采集）
+    LOG_FILE         额外写入的日志文件路径（可选）
+    LOG_QUEUE_SIZE   日志队列长度，默认 10000；队列满时丢弃新日志而不是阻塞请求
+"""
+
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+
+# 当前请求的关联ID（由Flask钩子设置）
+_request_id = ContextVar('request_id', default='-')
+
+# 这些LogRecord自带的属性不作为额外字段输出到JSON
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def get_request_id() -> str:
+    """获取当前请求的关联ID（不在请求中时为 '-'）"""
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """给日志记录附加当前请求的关联ID（必须在产生日志的线程中执行）"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """队列满时直接丢弃日志并计数，保证写日志永远不会阻塞请求线程"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 在请求线程中只做最少的工作：合并参数、把异常转为文本，格式化留给后台线程
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _env_level(default: str = 'INFO') -> int:
+    name = os.getenv('LOG_LEVEL', default).strip().upper()
+    return getattr(logging, name, logging.INFO)
+
+
+def setup_logging(level: int = None, json_output: bool = None, log_file: str = None):
+    """
+    配置根日志器：请求线程 → 队列 → 后台线程 → 控制台/文件。
+    可以重复调用，只有第一次生效。
+    """
+    global _listener, _queue_handler
+
+    with _setup_lock:
+        if _listener is not None:
+            return _queue_handler
+
+        level = level if level is not None else _env_level()
+        if json_output is None:
+            json_output = os.getenv('LOG_FORMAT', 'text').strip().lower() == 'json'
+        log_file = log_file or os.getenv('LOG_FILE')
+
+        if json_output:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s %(levelname)-7s [%(request_id)s] %(message)s', '%H:%M:%S')
+
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+
+        # 第三方库的调试日志太多，最多只输出INFO
+        for noisy in ('urllib3', 'PIL', 'google', 'httpx', 'tencentcloud'):
+            logging.getLogger(noisy).setLevel(max(level, logging.INFO))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def reinit_after_fork():
+    """在fork出的子进程中重建队列和后台线程（父进程的日志线程不会被继承）"""
+    global _listener, _queue_handler, _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is None:
+        return
+    _listener = None
+    root = logging.getLogger()
+    if _queue_handler in root.handlers:
+        root.removeHandler(_queue_handler)
+    _queue_handler = None
+    setup_logging()
+
+
+def dropped_count() -> int:
+    """因队列已满而被丢弃的日志条数"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def init_app(app):
+    """为每个请求分配关联ID，并在响应头 X-Request-ID 中返回"""
+    from flask import request, g
+
+    @app.before_request
+    def _assign_request_id():
+        request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex[:12]
+        g._request_id_token = _request_id.set(request_id)
+
+    @app.after_request
+    def _return_request_id(response):
+        response.headers['X-Request-ID'] = _request_id.get()
+        return response
+
+    @app.teardown_request
+    def _reset_request_id(exc=None):
+        token = g.pop('_request_id_token', None)
+        if token is not None:
+            try:
+                _request_id.reset(token)
+            except ValueError:
+                _request_id.set('-')
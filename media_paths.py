@@ -0,0 +1,45 @@
+"""
+媒体文件路径和URL的互相转换
+
+生成的图片和模型可能保存在三个地方，前端拿到的是对应的URL：
+    uploads/x.png                          <->  /uploads/x.png
+    models/x.glb                           <->  /models/x.glb
+    creation_sessions/<会话ID>/image_v1.png  <->  /session-files/creation_sessions/<会话ID>/image_v1.png
+
+前端把URL传回来（调整图片、生成3D模型、转换视频图片）时用 to_path 转换为文件路径。
+"""
+
+import os
+
+SESSION_FILES_PREFIX = '/session-files/'
+
+# 直接以目录名作为URL前缀的目录
+URL_FOLDERS = ('uploads', 'models')
+
+
+def to_path(url: str, default_folder: str = 'uploads') -> str:
+    """
+    把前端传回的URL或路径转换为相对于应用根目录的文件路径；
+    只有文件名时视为 default_folder 中的文件。路径试图跳出应用目录时抛出ValueError。
+    """
+    if url.startswith(SESSION_FILES_PREFIX):
+        path = url[len(SESSION_FILES_PREFIX):]
+    elif url.startswith('/'):
+        path = url.lstrip('/')
+    else:
+        path = url
+
+    path = os.path.normpath(path)
+    if os.path.isabs(path) or path == '..' or path.startswith('..' + os.sep):
+        raise ValueError(f"无效的文件路径: {url}")
+    if os.sep not in path and default_folder:
+        path = os.path.join(default_folder, path)
+    return path.replace(os.sep, '/')
+
+
+def to_url(path: str) -> str:
+    """把文件路径转换为前端可以访问的URL"""
+    path = os.path.normpath(path).replace(os.sep, '/')
+    if path.split('/', 1)[0] in URL_FOLDERS:
+        return '/' + path
+    return SESSION_FILES_PREFIX + path
@@ -0,0 +1,228 @@
+"""
+轻量级性能指标 - 记录每个路由各阶段的耗时，并以Prometheus文本格式在 /metrics 输出
+
+用法：
+    from metrics import span
+
+    with span('preprocess_sketch'):
+        processed = preprocess_sketch(path)
+
+阶段耗时会自动带上当前请求的路由标签。通过 METRICS_ENABLED=false 可以完全关闭，
+关闭后 span() 只是一个空的上下文管理器。
+"""
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Tuple
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# 默认的耗时分桶（秒）：覆盖从毫秒级的文件操作到分钟级的3D/视频生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# 当前请求的路由（由Flask钩子设置，span()据此打标签）
+_current_route = ContextVar('metrics_route', default='background')
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """带标签的直方图（累计分桶，兼容Prometheus）"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                label_str = _format_labels(self.label_names + ('le',), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, enabled: bool = None, buckets=None):
+        self.enabled = _env_flag('METRICS_ENABLED') if enabled is None else enabled
+        if buckets is None:
+            env_buckets = os.getenv('METRICS_BUCKETS')
+            buckets = tuple(float(b) for b in env_buckets.split(',')) if env_buckets else DEFAULT_BUCKETS
+
+        self.request_duration = Histogram(
+            'hltraining_request_duration_seconds', '每个路由的请求总耗时',
+            ('route', 'method', 'status'), buckets)
+        self.requests_total = Counter(
+            'hltraining_requests_total', '每个路由的请求次数',
+            ('route', 'method', 'status'))
+        self.stage_duration = Histogram(
+            'hltraining_stage_duration_seconds', '路由内各处理阶段的耗时',
+            ('route', 'stage', 'outcome'), buckets)
+        self.upstream_duration = Histogram(
+            'hltraining_upstream_call_duration_seconds', '上游AI服务单次调用耗时（不含排队）',
+            ('model', 'outcome'), buckets)
+        self.upstream_calls_total = Counter(
+            'hltraining_upstream_calls_total', '上游AI服务调用次数',
+            ('model', 'outcome'))
+        self.upstream_queue_wait = Histogram(
+            'hltraining_upstream_queue_wait_seconds', '上游AI服务在限流调度器中的排队时间',
+            ('model',), buckets)
+
+        self._metrics = [
+            self.request_duration, self.requests_total, self.stage_duration,
+            self.upstream_duration, self.upstream_calls_total, self.upstream_queue_wait
+        ]
+
+    def render(self) -> str:
+        """输出Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def _timed_span(stage: str):
+    start = time.perf_counter()
+    outcome = 'success'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        registry.stage_duration.observe((_current_route.get(), stage, outcome), time.perf_counter() - start)
+
+
+def span(stage: str):
+    """记录一个处理阶段的耗时"""
+    if not registry.enabled:
+        return nullcontext()
+    return _timed_span(stage)
+
+
+def record_upstream_call(model: str, outcome: str, duration: float = None):
+    """记录一次上游AI服务调用（没有真正发出的调用如排队超时、熔断拒绝不记录耗时）"""
+    if registry.enabled:
+        if duration is not None:
+            registry.upstream_duration.observe((model, outcome), duration)
+        registry.upstream_calls_total.inc((model, outcome))
+
+
+def record_queue_wait(model: str, waited: float):
+    """记录在限流调度器中的排队时间"""
+    if registry.enabled:
+        registry.upstream_queue_wait.observe((model,), waited)
+
+
+def init_app(app):
+    """为Flask应用注册请求计时钩子和 /metrics 路由"""
+    from flask import request, g, Response
+
+    @app.before_request
+    def _metrics_start_request():
+        if not registry.enabled:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g._metrics_start = time.perf_counter()
+        g._metrics_token = _current_route.set(route)
+
+    @app.teardown_request
+    def _metrics_end_request(exc=None):
+        start = g.pop('_metrics_start', None)
+        token = g.pop('_metrics_token', None)
+        if start is None:
+            return
+        status = g.pop('_metrics_status', '500' if exc else '200')
+        labels = (_current_route.get(), request.method, status)
+        registry.request_duration.observe(labels, time.perf_counter() - start)
+        registry.requests_total.inc(labels)
+        if token is not None:
+            try:
+                _current_route.reset(token)
+            except ValueError:
+                # 异步视图等在不同上下文中结束的请求
+                _current_route.set('background')
+
+    @app.after_request
+    def _metrics_record_status(response):
+        if registry.enabled:
+            g._metrics_status = str(response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus指标"""
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,254 @@
+"""
+按需请求性能分析 - 用cProfile记录单个请求的CPU耗时分布，保存到磁盘供离线分析
+
+触发方式（二选一）：
+    1. 管理员在请求头中带上 X-Profile-Token: <PROFILE_ADMIN_TOKEN>
+    2. 配置 PROFILE_SAMPLE_RATE（0~1），按比例随机采样
+
+分析结果保存在 profiles/ 目录（最多保留 PROFILE_MAX_FILES 个，超出后删除最旧的），
+文件名包含请求关联ID，可以和日志对应起来。管理接口（需要同一个令牌，放在请求头 X-Profile-Token 中）：
+    GET /admin/profiles                 列出已保存的分析结果
+    GET /admin/profiles/<名称>          下载 .prof 文件（用 snakeviz / pstats 打开）
+    GET /admin/profiles/<名称>?format=text   直接查看按累计耗时排序的前50个函数
+
+同一线程同时只分析一个请求。通过 asgi.py 部署时，生成接口（app.STEP_VIEWS）在事件循环中
+交错执行，无法单独分析，这些请求不做分析；其他路由在线程池中执行，照常分析。
+
+环境变量：
+    PROFILE_ADMIN_TOKEN   管理员令牌，不设置时请求头触发和管理接口都不可用
+    PROFILE_SAMPLE_RATE   随机采样比例，默认 0（不采样）
+    PROFILE_ROUTES        只分析这些路由（逗号分隔，如 /generate-image,/gallery），默认全部
+    PROFILE_DIR           保存目录，默认 profiles
+    PROFILE_MAX_FILES     最多保留的分析结果数量，默认 50
+"""
+
+import io
+import os
+import asyncio
+import re
+import hmac
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from logging_setup import get_request_id
+
+logger = logging.getLogger(__name__)
+
+# 不参与采样的路由（静态文件、指标和分析结果本身）
+EXCLUDED_ROUTES = ('/static/<path:filename>', '/metrics', '/admin/profiles', '/admin/profiles/<name>')
+
+_SAFE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+# 每个线程正在运行的分析器：同一线程上再启动一个cProfile会悄悄接管钩子并清空前一个的数据
+_active = threading.local()
+
+
+class ProfileStore:
+    """磁盘上的分析结果环形缓冲区：每个结果一个 .prof 文件和一个 .json 元数据文件"""
+
+    def __init__(self, folder: str = None, max_files: int = None):
+        self.folder = folder or os.getenv('PROFILE_DIR', 'profiles')
+        self.max_files = max_files if max_files is not None else int(os.getenv('PROFILE_MAX_FILES', '50'))
+        self._lock = threading.Lock()
+
+    def save(self, profiler: cProfile.Profile, meta: Dict) -> str:
+        """保存分析结果并淘汰最旧的，返回文件名"""
+        os.makedirs(self.folder, exist_ok=True)
+        route_part = re.sub(r'[^\w-]+', '_', meta.get('route', '')).strip('_')[:40] or 'root'
+        # 请求ID可能来自客户端的 X-Request-ID 请求头，只保留字母数字、下划线和连字符
+        request_id = re.sub(r'[^\w-]', '_', meta.get('request_id', '-'))[:64]
+        if request_id.strip('_-') == '':
+            request_id = uuid.uuid4().hex[:12]
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request_id}_{route_part}.prof"
+        path = os.path.join(self.folder, name)
+
+        profiler.dump_stats(path)
+        with open(path[:-5] + '.json', 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, name=name), f, ensure_ascii=False)
+
+        with self._lock:
+            self._evict()
+        return name
+
+    def _evict(self):
+        names = sorted(n for n in os.listdir(self.folder) if n.endswith('.prof'))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.folder, name[:-5] + suffix))
+                except OSError:
+                    pass
+
+    def list(self) -> List[Dict]:
+        """列出所有分析结果（最新的在前）"""
+        if not os.path.isdir(self.folder):
+            return []
+        results = []
+        for name in sorted((n for n in os.listdir(self.folder) if n.endswith('.prof')), reverse=True):
+            meta_path = os.path.join(self.folder, name[:-5] + '.json')
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {'name': name}
+            meta['size_bytes'] = os.path.getsize(os.path.join(self.folder, name))
+            results.append(meta)
+        return results
+
+    def path_for(self, name: str) -> Optional[str]:
+        """根据文件名获取路径（拒绝非法文件名）"""
+        if not _SAFE_NAME.match(name):
+            return None
+        path = os.path.join(self.folder, name)
+        return path if os.path.exists(path) else None
+
+    def render_text(self, name: str, limit: int = 50) -> Optional[str]:
+        """按累计耗时输出前limit个函数"""
+        path = self.path_for(name)
+        if not path:
+            return None
+        buffer = io.StringIO()
+        stats = pstats.Stats(path, stream=buffer)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return buffer.getvalue()
+
+
+class RequestProfiler:
+    """决定哪些请求需要分析，并负责启动/停止cProfile"""
+
+    def __init__(self, store: ProfileStore = None, admin_token: str = None,
+                 sample_rate: float = None, routes: List[str] = None):
+        self.store = store or ProfileStore()
+        self.admin_token = admin_token if admin_token is not None else os.getenv('PROFILE_ADMIN_TOKEN', '')
+        self.sample_rate = sample_rate if sample_rate is not None else \
+            float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        if routes is None:
+            routes = [r.strip() for r in os.getenv('PROFILE_ROUTES', '').split(',') if r.strip()]
+        self.routes = set(routes)
+
+    def is_admin(self, token: str) -> bool:
+        """校验管理员令牌（未配置令牌时始终返回False）"""
+        return bool(self.admin_token) and hmac.compare_digest(token or '', self.admin_token)
+
+    def should_profile(self, route: str, token: str) -> Optional[str]:
+        """返回触发原因（'header' / 'sampled'），不需要分析时返回None"""
+        if route in EXCLUDED_ROUTES:
+            return None
+        if token and self.is_admin(token):
+            return 'header'
+        if self.sample_rate > 0 and (not self.routes or route in self.routes):
+            if random.random() < self.sample_rate:
+                return 'sampled'
+        return None
+
+
+def _in_event_loop() -> bool:
+    """当前线程是否在运行事件循环（asgi.py 中的生成接口在事件循环中交错执行）"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _admin_token_from_request(request) -> str:
+    # 只从请求头读取，令牌放在查询参数中会被记录到访问日志和浏览器历史
+    return request.headers.get('X-Profile-Token', '')
+
+
+def init_app(app, profiler: RequestProfiler = None):
+    """为Flask应用注册分析钩子和 /admin/profiles 管理接口"""
+    from flask import request, g, jsonify, send_file, Response
+
+    profiler = profiler or RequestProfiler()
+    app.extensions['request_profiler'] = profiler
+
+    def _finish(status: str):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return None
+        profile.disable()
+        if getattr(_active, 'profile', None) is profile:
+            _active.profile = None
+        meta = g.pop('_profile_meta')
+        meta['duration_seconds'] = round(time.perf_counter() - meta.pop('_start'), 4)
+        meta['status'] = status
+        meta['request_id'] = get_request_id()
+        try:
+            name = profiler.store.save(profile, meta)
+            logger.info(f"🔬 已保存请求分析结果: {name} ({meta['duration_seconds']}秒)")
+            return name
+        except OSError as e:
+            logger.warning(f"⚠️ 保存请求分析结果失败: {str(e)}")
+            return None
+
+    @app.before_request
+    def _profile_start():
+        route = request.url_rule.rule if request.url_rule else None
+        if route is None:
+            return
+        reason = profiler.should_profile(route, request.headers.get('X-Profile-Token', ''))
+        if reason is None:
+            return
+        if getattr(_active, 'profile', None) is not None:
+            logger.debug(f"🔬 当前线程已有请求在分析，跳过: {request.path}")
+            return
+        if _in_event_loop():
+            # 事件循环中其他请求的协程会混进分析结果，线程池中的步骤又分析不到
+            logger.debug(f"🔬 事件循环中执行的请求不做分析: {request.path}")
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        _active.profile = profile
+        g._profile = profile
+        g._profile_meta = {
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'trigger': reason,
+            'created_at': datetime.now().isoformat(),
+            '_start': time.perf_counter()
+        }
+
+    @app.after_request
+    def _profile_stop(response):
+        name = _finish(str(response.status_code))
+        if name:
+            response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def _profile_cleanup(exc=None):
+        # 视图抛出未处理异常时after_request不会执行
+        _finish('500')
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        """列出已保存的请求分析结果"""
+        if not profiler.is_admin(_admin_token_from_request(request)):
+            return jsonify({'error': '需要管理员令牌'}), 403
+        return jsonify({'success': True, 'profiles': profiler.store.list()})
+
+    @app.route('/admin/profiles/<name>')
+    def download_profile(name):
+        """下载分析结果，format=text 时返回文本摘要"""
+        if not profiler.is_admin(_admin_token_from_request(request)):
+            return jsonify({'error': '需要管理员令牌'}), 403
+        if request.args.get('format') == 'text':
+            text = profiler.store.render_text(name)
+            if text is None:
+                return jsonify({'error': '分析结果不存在'}), 404
+            return Response(text, content_type='text/plain; charset=utf-8')
+        path = profiler.store.path_for(name)
+        if not path:
+            return jsonify({'error': '分析结果不存在'}), 404
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=name,
+                         mimetype='application/octet-stream')
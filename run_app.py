@@ -10,6 +10,7 @@ import webbrowser
 import threading
 import time
 from app import app
+import server
 
 def open_browser():
     """延迟打开浏览器"""
@@ -31,13 +32,8 @@ def main():
         browser_thread.daemon = True
         browser_thread.start()
         
-        # 启动Flask应用
-        app.run(
-            host='127.0.0.1',
-            port=8080,
-            debug=False,
-            use_reloader=False
-        )
+        # 启动应用（安装了waitress时使用多线程生产服务器，可通过SERVER_MODE修改）
+        server.run(app, host='127.0.0.1', port=8080)
         
     except KeyboardInterrupt:
         print("\n👋 服务器已停止")
@@ -0,0 +1,240 @@
+"""
+作品集全文搜索 - 内存中的倒排索引
+
+索引作品的标题、作者、分类、说明和生成时使用的提示词（保存作品时从创作会话的版本元数据中取出，存为 prompts 字段）。
+
+分词：
+    - 中日韩文字没有空格分词，按字切分：每个字（单字查询）和相邻两个字组成的二元组（多字查询）都作为词项
+    - 其他文字按字母数字连续串切分并转为小写
+    - 文本先做NFKC规范化，全角字母数字和半角一样处理
+
+排序使用BM25，各字段按权重累加词频（标题和作者名权重较高）。查询的所有词项都要命中（AND），
+没有结果时退回到命中任意词项（OR）按分数排序。
+
+索引随作品集数据增量更新：GalleryManager 每次保存作品集数据都调用 refresh()，
+只重新分词内容有变化的作品，删除已不存在的作品。搜索前检查数据文件的大小和修改时间，
+其他进程修改过时同样用 refresh() 增量同步。
+"""
+
+import os
+import re
+import math
+import json
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 字段权重
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'artist_name': 3.0,
+    'category': 1.5,
+    'description': 1.0,
+    'prompts': 1.0,
+}
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 中日韩文字：汉字（含扩展A）、假名、谚文、兼容汉字
+_CJK_RANGES = '぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+_TOKEN_PATTERN = re.compile(f'[{_CJK_RANGES}]+|[^\\W_{_CJK_RANGES}]+')
+_CJK_PATTERN = re.compile(f'[{_CJK_RANGES}]')
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为词项：中日韩文字输出单字和二元组，其他文字输出小写的字母数字串"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text):
+        if _CJK_PATTERN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_terms(text: str) -> List[str]:
+    """查询的词项：中日韩文字有两个字以上时只用二元组（单字太宽泛），只有一个字时用单字"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).lower()
+    terms = []
+    for run in _TOKEN_PATTERN.findall(text):
+        if _CJK_PATTERN.match(run) and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return list(dict.fromkeys(terms))
+
+
+def _field_text(artwork: Dict, field: str) -> str:
+    value = artwork.get(field)
+    if isinstance(value, list):
+        return '\n'.join(str(item) for item in value if item)
+    return str(value) if value else ''
+
+
+def _signature(artwork: Dict):
+    """作品中被索引的内容，没有变化的作品不重新分词"""
+    return tuple(_field_text(artwork, field) for field in FIELD_WEIGHTS)
+
+
+def _file_stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class SearchIndex:
+    """作品倒排索引：词项 -> {作品ID: 加权词频}"""
+
+    def __init__(self, data_file: Optional[str] = None):
+        self.data_file = data_file
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_length: Dict[str, float] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._docs: Dict[str, Dict] = {}
+        self._order: Dict[str, int] = {}    # 作品在作品集中的位置（新作品在前），分数相同时按它排序
+        self._total_length = 0.0
+        self._stamp = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ===== 更新 =====
+
+    def _remove(self, artwork_id: str):
+        for term in self._doc_terms.pop(artwork_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(artwork_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_length.pop(artwork_id, 0.0)
+        self._signatures.pop(artwork_id, None)
+        self._docs.pop(artwork_id, None)
+        self._order.pop(artwork_id, None)
+
+    def _add(self, artwork_id: str, signature: tuple):
+        terms = Counter()
+        length = 0.0
+        for weight, text in zip(FIELD_WEIGHTS.values(), signature):
+            tokens = tokenize(text)
+            for token in tokens:
+                terms[token] += weight
+            length += weight * len(tokens)
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[artwork_id] = frequency
+        self._doc_terms[artwork_id] = terms
+        self._doc_length[artwork_id] = length
+        self._total_length += length
+        self._signatures[artwork_id] = signature
+
+    def refresh(self, artworks: List[Dict], stamp=None):
+        """
+        按作品集数据增量更新：新增和内容变化的作品重新分词，已删除的作品移出索引；
+        stamp 是这份数据对应的数据文件状态（调用方刚写入文件时传入，避免搜索时重复加载）
+        """
+        with self._lock:
+            seen = set()
+            for position, artwork in enumerate(artworks):
+                artwork_id = artwork.get('id')
+                if not artwork_id or artwork_id in seen:
+                    continue
+                seen.add(artwork_id)
+                signature = _signature(artwork)
+                if self._signatures.get(artwork_id) != signature:
+                    self._remove(artwork_id)
+                    self._add(artwork_id, signature)
+                self._docs[artwork_id] = artwork
+                self._order[artwork_id] = position
+            for artwork_id in set(self._docs) - seen:
+                self._remove(artwork_id)
+            self._stamp = stamp if stamp is not None else (_file_stamp(self.data_file) if self.data_file else None)
+
+    def sync(self):
+        """数据文件在本进程之外被修改过时重新同步"""
+        if not self.data_file:
+            return
+        stamp = _file_stamp(self.data_file)
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    artworks = json.load(f)
+            except (OSError, ValueError):
+                artworks = []
+            self.refresh(artworks, stamp)
+
+    # ===== 查询 =====
+
+    def _score(self, terms: List[str], require_all: bool) -> Dict[str, float]:
+        doc_count = len(self._docs)
+        average_length = (self._total_length / doc_count) if doc_count else 0.0
+        postings = [self._postings.get(term, {}) for term in terms]
+        if require_all:
+            if not all(postings):
+                return {}
+            # 从最短的倒排表开始取交集
+            candidates = set(min(postings, key=len))
+            for items in postings:
+                candidates.intersection_update(items)
+        else:
+            candidates = set().union(*postings)
+
+        scores = {}
+        for items in postings:
+            if not items:
+                continue
+            idf = math.log(1 + (doc_count - len(items) + 0.5) / (len(items) + 0.5))
+            for artwork_id in candidates.intersection(items):
+                frequency = items[artwork_id]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_length[artwork_id] / (average_length or 1.0))
+                scores[artwork_id] = scores.get(artwork_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query: str, category: str = None, offset: int = 0, limit: int = 20) -> Dict:
+        """
+        搜索作品，返回 {'total': 命中数, 'results': [{'artwork': 作品数据, 'score': 分数}, ...]}，
+        按分数从高到低、分数相同时新作品在前排序
+        """
+        self.sync()
+        terms = query_terms(query)
+        with self._lock:
+            if not terms:
+                return {'total': 0, 'results': []}
+            scores = self._score(terms, require_all=True) or self._score(terms, require_all=False)
+            if category and category != 'all':
+                scores = {artwork_id: score for artwork_id, score in scores.items()
+                          if self._docs[artwork_id].get('category') == category}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+            return {
+                'total': len(ranked),
+                'results': [{'artwork': self._docs[artwork_id], 'score': round(score, 4)}
+                            for artwork_id, score in ranked[offset:offset + limit]]
+            }
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(data_file: str) -> SearchIndex:
+    """同一个数据文件在进程内共用一个索引（GalleryManager 可能被创建多次）"""
+    key = os.path.abspath(data_file)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SearchIndex(data_file)
+        return index
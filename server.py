@@ -0,0 +1,115 @@
+"""
+应用启动器 - 根据 SERVER_MODE 选择开发服务器或生产WSGI服务器
+
+    SERVER_MODE=auto         默认：安装了waitress就用waitress，否则用Flask开发服务器
+    SERVER_MODE=waitress     多线程生产服务器（Windows/Linux/macOS都可用）
+    SERVER_MODE=gunicorn     多进程+多线程生产服务器（仅Linux/macOS），配置见 gunicorn.conf.py
+    SERVER_MODE=asgi         uvicorn + asgi.py：生成接口以协程执行，等待上游时不占线程
+    SERVER_MODE=development  Flask开发服务器（FLASK_DEBUG=true 时开启调试模式）
+
+默认只用一个进程、多个线程：作品集/版本/会话数据保存在JSON文件中，
+Veo视频任务、限流调度器和性能指标都在进程内存中，多进程部署前请先阅读 PRODUCTION_DEPLOYMENT.md。
+
+用法：
+    python server.py
+    SERVER_MODE=gunicorn python server.py
+    gunicorn -c gunicorn.conf.py app:app
+    uvicorn asgi:application --port 8080
+"""
+
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def resolve_mode(mode: str = None) -> str:
+    """确定实际使用的服务器类型"""
+    mode = (mode or os.getenv('SERVER_MODE', 'auto')).strip().lower()
+    if mode == 'auto':
+        try:
+            import waitress  # noqa: F401
+            return 'waitress'
+        except ImportError:
+            return 'development'
+    return mode
+
+
+def run_waitress(app, host: str, port: int):
+    """用waitress启动（单进程多线程）"""
+    from waitress import serve
+
+    threads = int(os.getenv('SERVER_THREADS', '16'))
+    logger.info(f"🚀 使用waitress启动: http://{host}:{port} （{threads} 个线程）")
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        # 生成图片/3D模型的请求可能持续数分钟，连接超时要足够长
+        channel_timeout=int(os.getenv('SERVER_TIMEOUT', '600')),
+        connection_limit=int(os.getenv('SERVER_CONNECTION_LIMIT', '200')),
+        ident='HLTraining'
+    )
+
+
+def run_gunicorn(host: str, port: int):
+    """用gunicorn启动，读取 gunicorn.conf.py"""
+    from gunicorn.app.wsgiapp import run as gunicorn_run
+
+    config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    os.environ.setdefault('GUNICORN_BIND', f'{host}:{port}')
+    sys.argv = ['gunicorn', '-c', config_file, 'app:app']
+    gunicorn_run()
+
+
+def run_asgi(host: str, port: int):
+    """用uvicorn启动 asgi.py（单进程，生成请求在事件循环中等待上游）"""
+    import uvicorn
+
+    logger.info(f"🚀 使用uvicorn(ASGI)启动: http://{host}:{port}")
+    uvicorn.run(
+        'asgi:application',
+        host=host,
+        port=port,
+        # 日志由 logging_setup 统一配置
+        log_config=None,
+        limit_concurrency=int(os.getenv('SERVER_CONNECTION_LIMIT', '200'))
+    )
+
+
+def run(app=None, host: str = None, port: int = None, mode: str = None):
+    """按配置启动应用"""
+    host = host or os.getenv('SERVER_HOST', '0.0.0.0')
+    port = int(port or os.getenv('SERVER_PORT', '8080'))
+    mode = resolve_mode(mode)
+
+    if mode == 'gunicorn':
+        return run_gunicorn(host, port)
+    if mode == 'asgi':
+        return run_asgi(host, port)
+
+    if app is None:
+        from app import app
+
+    if mode == 'waitress':
+        return run_waitress(app, host, port)
+
+    if mode != 'development':
+        logger.warning(f"⚠️ 未知的SERVER_MODE: {mode}，使用Flask开发服务器")
+    debug = _env_flag('FLASK_DEBUG')
+    logger.info(f"🚀 使用Flask开发服务器启动: http://{host}:{port}（调试模式: {debug}）")
+    app.run(host=host, port=port, debug=debug, use_reloader=debug, threaded=True)
+
+
+if __name__ == '__main__':
+    run()
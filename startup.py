@@ -0,0 +1,161 @@
+"""
+启动耗时 - 重量级依赖（OpenCV、Gemini、腾讯云SDK）延迟到第一次使用时导入，并记录每个模块的导入耗时
+
+用法：
+    from startup import lazy_import
+
+    cv2 = lazy_import('cv2')            # 第一次调用时真正导入，之后直接返回已导入的模块
+
+应用启动时调用 init_app(app)：
+    - 记录进程启动到应用加载完成、到第一个请求的耗时
+    - 稍等片刻后在后台线程中预热这些依赖，学生第一次点“生成”时不用再等导入
+
+冷启动报告（每个模块在独立的新进程中导入，反映双击启动时的真实耗时）：
+    python startup.py
+
+环境变量：
+    STARTUP_WARMUP         是否在后台预热重量级依赖，默认开启
+    STARTUP_WARMUP_DELAY   应用加载后多少秒开始预热，默认 2（先让首页尽快打开）
+"""
+
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+import subprocess
+
+# 尽量早地导入本模块（app.py第一行），作为启动计时的起点
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# 需要延迟导入的重量级依赖：(模块名, 说明)
+HEAVY_MODULES = (
+    ('cv2', 'OpenCV（手绘图预处理）'),
+    ('google.generativeai', 'Gemini SDK（图片生成）'),
+    ('google.genai', 'Google GenAI SDK（视频生成）'),
+    ('tencentcloud.ai3d.v20250513.ai3d_client', '腾讯云AI3D SDK（3D模型）'),
+)
+
+_import_timings = {}   # 模块名 -> 导入耗时（秒）
+_events = {}           # 事件名 -> 距进程启动的秒数
+_lock = threading.Lock()
+_warmup_thread = None
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def lazy_import(name: str):
+    """导入模块并记录第一次导入的耗时；模块未安装时抛出ImportError"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    duration = time.perf_counter() - started
+    with _lock:
+        _import_timings.setdefault(name, duration)
+    logger.debug("📦 导入 %s 耗时 %.2f 秒", name, duration)
+    return module
+
+
+def mark(event: str):
+    """记录一个启动事件（只记第一次）"""
+    with _lock:
+        _events.setdefault(event, time.perf_counter() - PROCESS_START)
+
+
+def report() -> dict:
+    """启动耗时报告：各事件距进程启动的秒数和各模块的导入耗时"""
+    with _lock:
+        return {'events': dict(_events), 'imports': dict(_import_timings)}
+
+
+def warm_up(modules=HEAVY_MODULES):
+    """依次导入重量级依赖，未安装的跳过"""
+    for name, description in modules:
+        try:
+            lazy_import(name)
+        except ImportError:
+            logger.debug("⚠️ 预热跳过未安装的模块: %s（%s）", name, description)
+        except Exception as e:
+            logger.warning(f"⚠️ 预热导入 {name} 失败: {str(e)}")
+    mark('warmup_done')
+    imports = report()['imports']
+    if imports:
+        details = '，'.join(f"{name} {duration:.2f}s" for name, duration in imports.items())
+        logger.info(f"🔥 依赖预热完成（进程启动后 {_events['warmup_done']:.1f} 秒）: {details}")
+
+
+def start_warmup(delay: float = None):
+    """在后台线程中预热（只启动一次）"""
+    global _warmup_thread
+    if delay is None:
+        delay = float(os.getenv('STARTUP_WARMUP_DELAY', '2'))
+
+    def run():
+        time.sleep(delay)
+        warm_up()
+
+    with _lock:
+        if _warmup_thread is not None:
+            return _warmup_thread
+        _warmup_thread = threading.Thread(target=run, name='startup-warmup', daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+def init_app(app):
+    """记录应用加载和第一个请求的时间，并启动后台预热"""
+    mark('app_loaded')
+    logger.info(f"⏱️ 应用加载完成，用时 {_events['app_loaded']:.2f} 秒")
+
+    first_request_seen = threading.Event()
+
+    @app.before_request
+    def _record_first_request():
+        if not first_request_seen.is_set():
+            first_request_seen.set()
+            mark('first_request')
+            logger.info(f"⏱️ 收到第一个请求：进程启动后 {_events['first_request']:.2f} 秒")
+
+    if _env_flag('STARTUP_WARMUP'):
+        start_warmup()
+
+
+def measure_cold_imports(modules=None):
+    """在独立的新进程中分别测量每个模块的冷导入耗时，返回 {模块名: 秒数或None（未安装）}"""
+    modules = modules or [('app', 'Flask应用（不含延迟导入的依赖）')] + list(HEAVY_MODULES)
+    code = ("import time, importlib, sys; t = time.perf_counter(); "
+            "importlib.import_module(sys.argv[1]); print(time.perf_counter() - t)")
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, LOG_LEVEL='WARNING', STARTUP_WARMUP='false')
+    results = {}
+    for name, _ in modules:
+        proc = subprocess.run([sys.executable, '-c', code, name], cwd=root_dir, env=env,
+                              capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        results[name] = float(lines[-1]) if proc.returncode == 0 and lines else None
+    return results
+
+
+def main():
+    print("⏱️ 冷启动导入耗时（每个模块在新进程中单独导入）")
+    modules = [('app', 'Flask应用（不含延迟导入的依赖）')] + list(HEAVY_MODULES)
+    results = measure_cold_imports(modules)
+    for name, description in modules:
+        duration = results[name]
+        value = f"{duration:>6.2f} 秒" if duration is not None else "  未安装/导入失败"
+        print(f"   {name:<42}{value}  {description}")
+
+
+if __name__ == '__main__':
+    main()
@@ -322,6 +322,7 @@ async function generateImage() {
     const style = document.getElementById('image-style').value;
     const colorPreference = document.getElementById('color-preference').value;
     const expertMode = document.getElementById('expert-mode').checked; // 获取expert模式状态
+    const generateFresh = document.getElementById('generate-fresh')?.checked || false; // 是否跳过生成结果缓存
 
     // 允许三种情况：1)有prompt 2)有uploadedImageFile 3)有originalImagePath（生成更多）
     if (!prompt && !uploadedImageFile && !originalImagePath) {
@@ -337,6 +338,7 @@ async function generateImage() {
         formData.append('style', style);
         formData.append('color_preference', colorPreference);
         formData.append('expert_mode', expertMode); // 添加expert模式参数
+        formData.append('generate_fresh', generateFresh); // 添加重新生成参数
         
         // 添加会话ID（支持内联版本管理器）
         if (window.inlineVersionManager && window.inlineVersionManager.currentSessionId) {
@@ -681,7 +683,7 @@ async function generate3DModel() {
                 
                 // 加载3D模型（如果有模型文件URL）
                 if (result.model_url) {
-                    load3DModel(result.model_url);
+                    load3DModel(result.model_url, result.model_preview_url);
                 }
                 
                 // 通知版本管理器刷新（支持内联版本管理器）
@@ -703,8 +705,8 @@ async function generate3DModel() {
     }
 }
 
-// 加载3D模型（Three.js）
-function load3DModel(modelUrl) {
+// 加载3D模型（Three.js），有预览模型时先显示预览
+function load3DModel(modelUrl, previewUrl = null) {
     // 保存当前模型URL用于下载
     window.currentModelUrl = modelUrl;
     
@@ -759,8 +761,8 @@ function load3DModel(modelUrl) {
         }
     });
     
-    // 加载模型
-    createModelViewer.loadModel(modelUrl);
+    // 加载模型（先显示低面数预览，完整模型下载完成后替换）
+    createModelViewer.loadModelProgressive(previewUrl, modelUrl);
 }
 
 // 下载图片
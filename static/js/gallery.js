@@ -9,6 +9,9 @@ function initializeGallery() {
     // 设置筛选按钮事件
     setupFilterButtons();
     
+    // 设置作品搜索
+    setupGallerySearch();
+    
     // 设置加载更多按钮
     setupLoadMoreButton();
     
@@ -30,6 +33,13 @@ function setupFilterButtons() {
             
             const filter = this.getAttribute('data-filter');
             
+            // 正在搜索时按新的分类重新搜索
+            const searchInput = document.getElementById('gallerySearchInput');
+            if (searchInput && searchInput.value.trim()) {
+                runGallerySearch();
+                return;
+            }
+            
             // 筛选作品
             galleryItems.forEach(item => {
                 if (filter === 'all' || item.getAttribute('data-category') === filter) {
@@ -44,6 +54,83 @@ function setupFilterButtons() {
     });
 }
 
+// 作品搜索：服务器按相关度返回结果，页面上只显示命中的作品并按结果顺序排列
+let galleryOriginalOrder = null;  // 开始搜索前的作品顺序，清空搜索时恢复
+
+function setupGallerySearch() {
+    const form = document.getElementById('gallerySearchForm');
+    const input = document.getElementById('gallerySearchInput');
+    if (!form || !input) return;
+    
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        runGallerySearch();
+    });
+    
+    // 清空搜索框时恢复全部作品
+    input.addEventListener('search', function() {
+        if (!input.value.trim()) clearGallerySearch();
+    });
+}
+
+async function runGallerySearch() {
+    const query = document.getElementById('gallerySearchInput').value.trim();
+    if (!query) {
+        clearGallerySearch();
+        return;
+    }
+    
+    const activeFilter = document.querySelector('.filter-btn.active[data-filter]');
+    const params = new URLSearchParams({ q: query, per_page: 50 });
+    if (activeFilter) params.set('category', activeFilter.getAttribute('data-filter'));
+    
+    try {
+        const response = await fetch(`/api/search?${params}`);
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error || '搜索失败');
+        
+        const grid = document.getElementById('galleryGrid');
+        if (!galleryOriginalOrder) {
+            galleryOriginalOrder = Array.from(grid.querySelectorAll('.gallery-item'));
+        }
+        galleryOriginalOrder.forEach(item => item.style.display = 'none');
+        data.results.forEach(artwork => {
+            const item = grid.querySelector(`.gallery-item[data-artwork-id="${artwork.id}"]`);
+            if (item) {
+                item.style.display = 'block';
+                grid.appendChild(item);
+            }
+        });
+        
+        let status = `找到 ${data.total} 个作品`;
+        if (data.total > data.results.length) status += `，显示最相关的 ${data.results.length} 个`;
+        showGallerySearchStatus(status);
+    } catch (error) {
+        console.error('搜索错误:', error);
+        showGallerySearchStatus('搜索失败：' + error.message);
+    }
+}
+
+function clearGallerySearch() {
+    showGallerySearchStatus('');
+    if (!galleryOriginalOrder) return;
+    
+    const grid = document.getElementById('galleryGrid');
+    const activeFilter = document.querySelector('.filter-btn.active[data-filter]');
+    const filter = activeFilter ? activeFilter.getAttribute('data-filter') : 'all';
+    galleryOriginalOrder.forEach(item => {
+        grid.appendChild(item);
+        item.style.display = (filter === 'all' || item.getAttribute('data-category') === filter) ? 'block' : 'none';
+    });
+    galleryOriginalOrder = null;
+}
+
+function showGallerySearchStatus(text) {
+    const status = document.getElementById('gallerySearchStatus');
+    status.textContent = text;
+    status.style.display = text ? 'block' : 'none';
+}
+
 function setupLoadMoreButton() {
     const loadMoreBtn = document.getElementById('loadMoreBtn');
     
@@ -754,6 +841,11 @@ function showArtworkModal(element) {
         originalImage: element.dataset.artworkOriginal,
         generatedImage: element.dataset.artworkGenerated,
         modelFile: element.dataset.artworkModel,
+        modelPreview: element.dataset.artworkModelPreview,
+        type: element.dataset.artworkType,
+        videoFile: element.dataset.artworkVideo,
+        videoPoster: element.dataset.artworkVideoPoster,
+        videoPreview: element.dataset.artworkVideoPreview,
         likes: element.dataset.artworkLikes,
         views: element.dataset.artworkViews
     };
@@ -793,8 +885,27 @@ function showArtworkModal(element) {
         showcase.appendChild(originalStep);
     }
     
-    // AI生成图片
-    if (artworkData.generatedImage) {
+    // 视频作品：先静音循环播放低分辨率预览，点击后才加载完整视频
+    if (artworkData.videoFile) {
+        const videoStep = document.createElement('div');
+        videoStep.className = 'artwork-detail-step';
+        const poster = artworkData.videoPoster ? `/static/${artworkData.videoPoster}` : '';
+        const previewSrc = `/static/${artworkData.videoPreview || artworkData.videoFile}`;
+        videoStep.innerHTML = `
+            <h4>AI生成视频</h4>
+            <video class="artwork-video" poster="${poster}" muted loop autoplay playsinline
+                   preload="${artworkData.videoPreview ? 'auto' : 'none'}"
+                   style="width: 100%; cursor: pointer;" title="点击播放完整视频">
+                <source src="${previewSrc}">
+            </video>
+        `;
+        const video = videoStep.querySelector('video');
+        video.addEventListener('click', () => playFullVideo(video, `/static/${artworkData.videoFile}`), { once: true });
+        showcase.appendChild(videoStep);
+    }
+    
+    // AI生成图片（视频作品的生成图片就是视频封面，不再重复显示）
+    if (artworkData.generatedImage && !artworkData.videoFile) {
         const generatedStep = document.createElement('div');
         generatedStep.className = 'artwork-detail-step';
         generatedStep.innerHTML = `
@@ -815,7 +926,7 @@ function showArtworkModal(element) {
         modelStep.innerHTML = `
             <h4>3D模型</h4>
             <div class="model-preview-container">
-                <div class="model-preview-thumb" onclick="showModelModal('${artworkData.modelFile}', '3D模型')">
+                <div class="model-preview-thumb" onclick="showModelModal('${artworkData.modelFile}', '3D模型', '${artworkData.modelPreview || ''}')">
                     <div class="model-thumbnail">
                         <i class="fas fa-cube"></i>
                         <span>点击查看3D模型</span>
@@ -869,6 +980,17 @@ function showArtworkModal(element) {
     }, 10);
 }
 
+// 把预览视频切换为带控制条的完整视频
+function playFullVideo(video, fullUrl) {
+    video.pause();
+    video.loop = false;
+    video.muted = false;
+    video.controls = true;
+    video.preload = 'auto';
+    video.src = fullUrl;
+    video.play().catch(() => {});
+}
+
 function closeArtworkModal() {
     const modal = document.getElementById('artworkModal');
     const content = modal.querySelector('.artwork-modal-content');
@@ -877,6 +999,9 @@ function closeArtworkModal() {
     content.style.transform = 'scale(0.9)';
     content.style.opacity = '0';
     
+    // 停止视频作品的播放
+    modal.querySelectorAll('video').forEach(video => video.pause());
+    
     setTimeout(() => {
         modal.style.display = 'none';
         document.body.style.overflow = 'auto'; // 恢复背景滚动
@@ -961,7 +1086,7 @@ function closeImageOverlay() {
 let modelViewer = null;
 
 // 显示3D模型模态框
-function showModelModal(modelSrc, title) {
+function showModelModal(modelSrc, title, previewSrc = '') {
     event.stopPropagation();
     
     console.log('显示3D模型:', modelSrc, title);
@@ -997,7 +1122,9 @@ function showModelModal(modelSrc, title) {
             if (modelViewer) {
                 if (modelSrc && modelSrc.trim() !== '' && modelSrc !== 'null') {
                     const modelUrl = `/static/${modelSrc}`;
-                    modelViewer.loadModel(modelUrl);
+                    // 有预览模型时先显示预览，完整模型在后台加载
+                    const previewUrl = previewSrc ? `/static/${previewSrc}` : null;
+                    modelViewer.loadModelProgressive(previewUrl, modelUrl);
                 } else {
                     // 直接创建占位符模型，不依赖于外部文件
                     modelViewer.createPlaceholderModel();
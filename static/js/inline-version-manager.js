@@ -220,14 +220,19 @@ class InlineVersionManager {
 
         this.loadingVersions = true;
         try {
-            if (stageNum === 2 || stageNum === 3) {
-                await this.loadImageVersions();
-            } else if (stageNum === 4) {
-                await this.loadModelVersions();
+            // 版本列表和选择的版本来自同一次快照请求；没有版本面板的阶段只取选择的版本
+            const type = stageNum === 4 ? 'model' : (stageNum === 2 || stageNum === 3 ? 'image' : null);
+            const snapshot = await this.fetchSnapshot(type, type ? null : 0);
+            if (!snapshot) return;
+            
+            if (type === 'image') {
+                this.renderImageVersions(snapshot.versions);
+            } else if (type === 'model') {
+                this.renderModelVersions(snapshot.versions);
                 this.updateModelGenerationButton();
             }
             
-            await this.loadSelectedVersions();
+            this.selectedVersions = snapshot.selected;
             this.updateUI();
         } catch (error) {
             console.error('❌ 加载版本失败:', error);
@@ -236,18 +241,6 @@ class InlineVersionManager {
         }
     }
 
-    // 加载图片版本
-    async loadImageVersions() {
-        const versions = await this.fetchVersions('image');
-        this.renderImageVersions(versions);
-    }
-
-    // 加载3D模型版本
-    async loadModelVersions() {
-        const versions = await this.fetchVersions('model');
-        this.renderModelVersions(versions);
-    }
-
     // 渲染图片版本
     renderImageVersions(versions) {
         const gallery = document.getElementById('image-version-gallery') || 
@@ -435,19 +428,27 @@ class InlineVersionManager {
         });
     }
 
+    // 获取会话快照（版本列表和选择的版本；服务器用ETag验证，没有变化时浏览器直接使用缓存）
+    async fetchSnapshot(type = null, limit = null) {
+        const params = new URLSearchParams();
+        if (type) params.set('type', type);
+        if (limit !== null) params.set('limit', limit);
+        const response = await fetch(`/session/${this.currentSessionId}/snapshot?${params}`);
+        const result = await response.json();
+        return result.success ? result : null;
+    }
+
     // 获取版本列表
     async fetchVersions(type) {
-        const response = await fetch(`/session/${this.currentSessionId}/versions?type=${type}`);
-        const result = await response.json();
-        return result.success ? result.versions : [];
+        const snapshot = await this.fetchSnapshot(type);
+        return snapshot ? snapshot.versions : [];
     }
 
     // 加载选中的版本
     async loadSelectedVersions() {
-        const response = await fetch(`/session/${this.currentSessionId}/selected-versions`);
-        const result = await response.json();
-        if (result.success) {
-            this.selectedVersions = result.selected;
+        const snapshot = await this.fetchSnapshot(null, 0);
+        if (snapshot) {
+            this.selectedVersions = snapshot.selected;
         }
     }
 
@@ -31,6 +31,8 @@ class ModelViewer3D {
         this.controls = null;
         this.currentModel = null;
         this.animationId = null;
+        // 每次加载递增，丢弃过期加载（切换模型后才返回的请求）的结果
+        this.loadToken = 0;
         
         // 状态
         this.isAutoRotating = false;
@@ -244,6 +246,7 @@ class ModelViewer3D {
     loadModel(modelUrl, format = 'auto') {
         // 清除之前的模型
         this.clearModel();
+        this.loadToken++;
         
         // 自动检测格式
         if (format === 'auto') {
@@ -268,6 +271,57 @@ class ModelViewer3D {
         }
     }
     
+    /**
+     * 渐进加载GLB模型：先显示低面数预览模型，完整模型在后台下载完成后替换
+     * @param {string} previewUrl - 预览模型URL（没有时直接加载完整模型）
+     * @param {string} fullUrl - 完整模型URL
+     */
+    loadModelProgressive(previewUrl, fullUrl) {
+        if (!previewUrl) {
+            this.loadModel(fullUrl);
+            return;
+        }
+        
+        this.clearModel();
+        const token = ++this.loadToken;
+        let fullShown = false;
+        let previewFailed = false;
+        let fullFailed = false;
+        
+        const show = (model, isPreview) => {
+            // 完整模型先到时不再显示预览
+            if (isPreview && fullShown) return;
+            if (!isPreview) fullShown = true;
+            this.clearModel();
+            this.currentModel = model;
+            this.addModelToScene();
+            if (this.onModelLoaded) {
+                this.onModelLoaded(this.currentModel, { preview: isPreview });
+            }
+        };
+        const fail = (error, isPreview) => {
+            if (isPreview) previewFailed = true; else fullFailed = true;
+            if (!isPreview && !previewFailed) {
+                console.warn('完整模型加载失败，继续显示预览模型:', error);
+            }
+            if (previewFailed && fullFailed) {
+                this.createPlaceholderModel();
+            }
+        };
+        
+        console.log('渐进加载GLB模型:', previewUrl, '->', fullUrl);
+        this.loadGLBDirectly(previewUrl, {
+            token,
+            onParsed: (model) => show(model, true),
+            onError: (error) => fail(error, true)
+        });
+        this.loadGLBDirectly(fullUrl, {
+            token,
+            onParsed: (model) => show(model, false),
+            onError: (error) => fail(error, false)
+        });
+    }
+    
     /**
      * 加载GLTF/GLB模型
      */
@@ -275,13 +329,14 @@ class ModelViewer3D {
         console.log('尝试加载真实GLB文件:', modelUrl);
         
         // 直接使用fetch加载GLB文件，绕过GLTFLoader的依赖问题
-        this.loadGLBDirectly(modelUrl);
+        this.loadGLBDirectly(modelUrl, { token: this.loadToken });
     }
     
     /**
      * 直接加载GLB文件
+     * @param {Object} options - token: 加载序号；onParsed/onError: 替代默认的显示和占位符处理
      */
-    loadGLBDirectly(modelUrl) {
+    loadGLBDirectly(modelUrl, options = {}) {
         console.log('直接加载GLB文件:', modelUrl);
         
         // 等待GLTFLoader模块加载完成
@@ -304,6 +359,15 @@ class ModelViewer3D {
             });
         };
         
+        const handleError = (error) => {
+            if (options.token !== undefined && options.token !== this.loadToken) return;
+            if (options.onError) {
+                options.onError(error);
+            } else {
+                this.createPlaceholderModel();
+            }
+        };
+        
         Promise.all([
             fetch(modelUrl).then(response => {
                 if (!response.ok) {
@@ -323,6 +387,14 @@ class ModelViewer3D {
             loader.parse(data, '', 
                 (gltf) => {
                     console.log('GLB文件解析成功!');
+                    if (options.token !== undefined && options.token !== this.loadToken) {
+                        console.log('模型已切换，忽略过期的加载结果:', modelUrl);
+                        return;
+                    }
+                    if (options.onParsed) {
+                        options.onParsed(gltf.scene);
+                        return;
+                    }
                     this.currentModel = gltf.scene;
                     this.addModelToScene();
                     
@@ -332,13 +404,13 @@ class ModelViewer3D {
                 },
                 (error) => {
                     console.error('GLB文件解析错误:', error);
-                    this.createPlaceholderModel();
+                    handleError(error);
                 }
             );
         })
         .catch(error => {
             console.error('GLB文件加载或GLTFLoader初始化错误:', error);
-            this.createPlaceholderModel();
+            handleError(error);
         });
     }    /**
      * 加载OBJ模型
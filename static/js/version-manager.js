@@ -118,35 +118,20 @@ class CreationVersionManager {
         if (!this.currentSessionId) return;
 
         try {
-            const [imageVersions, modelVersions, selectedVersions] = await Promise.all([
-                this.fetchVersions('image'),
-                this.fetchVersions('model'),
-                this.fetchSelectedVersions()
-            ]);
-
-            this.renderVersions('image', imageVersions);
-            this.renderVersions('model', modelVersions);
-            this.selectedVersions = selectedVersions;
+            // 一次快照请求取回全部版本和选择的版本
+            const response = await fetch(`/session/${this.currentSessionId}/snapshot`);
+            const snapshot = await response.json();
+            if (!snapshot.success) return;
+
+            this.renderVersions('image', snapshot.versions.filter(v => v.type === 'image'));
+            this.renderVersions('model', snapshot.versions.filter(v => v.type === 'model'));
+            this.selectedVersions = snapshot.selected;
             this.updateUI();
         } catch (error) {
             console.error('❌ 刷新版本失败:', error);
         }
     }
 
-    // 获取版本列表
-    async fetchVersions(type) {
-        const response = await fetch(`/session/${this.currentSessionId}/versions?type=${type}`);
-        const result = await response.json();
-        return result.success ? result.versions : [];
-    }
-
-    // 获取选中的版本
-    async fetchSelectedVersions() {
-        const response = await fetch(`/session/${this.currentSessionId}/selected-versions`);
-        const result = await response.json();
-        return result.success ? result.selected : {};
-    }
-
     // 渲染版本列表
     renderVersions(type, versions) {
         const container = document.getElementById(`${type}-versions`);
@@ -165,7 +165,7 @@ async function pollVideoStatus(taskId, duration = 8, quality = '720p') {
                 updateStatus('生成完成！', 100);
                 setTimeout(() => {
                     hideGenerationStatus(); // 恢复按钮状态
-                    showVideoResult(data.video_url);
+                    showVideoResult(data.video_url, data.poster_url);
                     isGenerating = false;
                 }, 500);
             } else if (data.status === 'content_filtered') {
@@ -295,7 +295,7 @@ function updateStatus(message, progress) {
 /**
  * 显示视频结果
  */
-function showVideoResult(videoUrl) {
+function showVideoResult(videoUrl, posterUrl) {
     currentVideoUrl = videoUrl;
     
     const statusSection = document.getElementById('video-generation-status');
@@ -306,6 +306,9 @@ function showVideoResult(videoUrl) {
     if (resultSection) resultSection.style.display = 'block';
     
     if (videoElement) {
+        // 有封面时先显示封面，点击播放时才下载完整视频
+        videoElement.poster = posterUrl || '';
+        videoElement.preload = posterUrl ? 'none' : 'auto';
         videoElement.src = videoUrl;
         videoElement.load();
     }
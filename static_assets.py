@@ -0,0 +1,423 @@
+"""
+静态资源构建 - 压缩 static/css 和 static/js，生成带内容哈希的文件名，供浏览器长期缓存
+
+构建：
+    python static_assets.py            # 输出到 static/dist/，并写入 static/dist/manifest.json
+
+每个文件同时生成预压缩的 .gz（以及安装了brotli时的 .br），请求时按 Accept-Encoding 直接返回，
+不需要在每次请求时压缩。
+
+应用启动时调用 init_app(app)：模板中的 url_for('static', filename='js/create.js')
+会自动变成 /static/dist/js/create.<哈希>.js，这些文件的响应头带
+Cache-Control: public, max-age=31536000, immutable，浏览器在内容变化（文件名变化）之前不会再请求。
+没有构建过、或者源文件在构建后被修改过时，自动回退到原始文件，不会用到过期的压缩文件。
+
+环境变量：
+    STATIC_FINGERPRINT   是否使用构建后的文件，默认开启；FLASK_DEBUG=true 时默认关闭，方便改完JS直接刷新
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import mimetypes
+import argparse
+from datetime import datetime
+
+import compression
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(ROOT_DIR, 'static')
+DIST_DIRNAME = 'dist'
+MANIFEST_FILENAME = 'manifest.json'
+
+# 参与构建的目录和扩展名（相对 static/）
+SOURCE_DIRS = {'css': '.css', 'js': '.js'}
+# 备份文件不会被页面引用，不参与构建
+EXCLUDE_PATTERN = re.compile(r'_(backup|broken)\.')
+
+# 预压缩文件的后缀
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# 构建后的文件一年内不需要重新验证
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_IDENT_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$\\')
+# 出现在这些字符或关键字之后的 / 是正则表达式的开始，而不是除号
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                   'void', 'throw', 'instanceof', 'yield', 'await'}
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _is_ident(ch: str) -> bool:
+    return ch in _IDENT_CHARS or ord(ch) > 127
+
+
+def minify_js(source: str) -> str:
+    """
+    保守的JS压缩：去掉注释和多余空白，字符串、模板字符串和正则表达式原样保留。
+    换行会保留（最多一个），不会因为自动分号插入改变语义。
+    """
+    out = []
+    i = 0
+    n = len(source)
+    pending_space = None   # None / ' ' / '\n'
+    last_char = ''         # 最后输出的非空白字符
+    last_word = ''         # 最后输出的标识符
+    # 模板字符串中 ${...} 的嵌套：每层记录花括号深度
+    template_stack = []
+
+    def emit(text):
+        nonlocal pending_space, last_char
+        if pending_space and out:
+            first = text[0]
+            if pending_space == '\n':
+                # 这些位置不会发生自动分号插入，换行可以去掉
+                if last_char not in ';{,([' and first not in ')]},;':
+                    out.append('\n')
+            elif (_is_ident(last_char) and _is_ident(first)) or \
+                    (last_char in '+-/' and first == last_char):
+                out.append(' ')
+        pending_space = None
+        out.append(text)
+        last_char = text[-1]
+
+    def scan_string(start, quote):
+        j = start + 1
+        while j < n:
+            c = source[j]
+            if c == '\\':
+                j += 2
+                continue
+            if c == quote or (c == '\n' and quote != '`'):
+                return j + 1
+            j += 1
+        return n
+
+    def scan_template(start):
+        """从start（` 之后或 } 之后）扫描到模板结束或 ${，返回 (结束位置, 是否遇到${)"""
+        j = start
+        while j < n:
+            c = source[j]
+            if c == '\\':
+                j += 2
+                continue
+            if c == '`':
+                return j + 1, False
+            if c == '$' and j + 1 < n and source[j + 1] == '{':
+                return j + 2, True
+            j += 1
+        return n, False
+
+    while i < n:
+        c = source[i]
+
+        if c in ' \t\r\n\f\v\u00a0\ufeff':
+            if c == '\n':
+                pending_space = '\n'
+            elif pending_space is None:
+                pending_space = ' '
+            i += 1
+            continue
+
+        if c == '/' and i + 1 < n and source[i + 1] == '/':
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            continue
+
+        if c == '/' and i + 1 < n and source[i + 1] == '*':
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                pending_space = '\n'
+            elif pending_space is None:
+                pending_space = ' '
+            i = end
+            continue
+
+        if c in '\'"':
+            end = scan_string(i, c)
+            emit(source[i:end])
+            last_word = ''
+            i = end
+            continue
+
+        if c == '`':
+            end, opened = scan_template(i + 1)
+            emit(source[i:end])
+            last_word = ''
+            if opened:
+                template_stack.append(0)
+                last_char = '{'
+            i = end
+            continue
+
+        if template_stack:
+            if c == '{':
+                template_stack[-1] += 1
+            elif c == '}':
+                if template_stack[-1] == 0:
+                    template_stack.pop()
+                    end, opened = scan_template(i + 1)
+                    emit(source[i:end])
+                    last_word = ''
+                    if opened:
+                        template_stack.append(0)
+                        last_char = '{'
+                    i = end
+                    continue
+                template_stack[-1] -= 1
+
+        if c == '/' and (not last_char or last_char in _REGEX_PRECEDERS or last_word in _REGEX_KEYWORDS):
+            j = i + 1
+            in_class = False
+            while j < n and source[j] != '\n':
+                ch = source[j]
+                if ch == '\\':
+                    j += 2
+                    continue
+                if ch == '[':
+                    in_class = True
+                elif ch == ']':
+                    in_class = False
+                elif ch == '/' and not in_class:
+                    j += 1
+                    break
+                j += 1
+            while j < n and _is_ident(source[j]):
+                j += 1
+            emit(source[i:j])
+            last_word = ''
+            i = j
+            continue
+
+        if _is_ident(c):
+            j = i + 1
+            while j < n and _is_ident(source[j]):
+                j += 1
+            word = source[i:j]
+            emit(word)
+            last_word = word
+            i = j
+            continue
+
+        emit(c)
+        last_word = ''
+        i += 1
+
+    return ''.join(out).strip() + '\n'
+
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.S)
+
+
+def minify_css(source: str) -> str:
+    """CSS压缩：去掉注释和多余空白，字符串原样保留"""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        return ' '
+
+    collapsed = _CSS_TOKENS.sub(replace, source)
+    # 字符串之外，去掉 { } ; , > 两侧和 : 之后的空格
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', collapsed)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', parts[index])
+        part = re.sub(r':\s+', ':', part)
+        parts[index] = part.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+def _source_files(static_folder):
+    for folder, ext in SOURCE_DIRS.items():
+        base = os.path.join(static_folder, folder)
+        if not os.path.isdir(base):
+            continue
+        for root, _, files in os.walk(base):
+            for name in sorted(files):
+                if name.endswith(ext) and not EXCLUDE_PATTERN.search(name):
+                    full = os.path.join(root, name)
+                    yield os.path.relpath(full, static_folder).replace(os.sep, '/'), full
+
+
+def _file_signature(path):
+    # 用内容哈希而不是修改时间：打包（PyInstaller）或复制部署后修改时间会变，内容不会
+    with open(path, 'rb') as f:
+        return {'sha256': hashlib.sha256(f.read()).hexdigest()}
+
+
+def build(static_folder: str = STATIC_FOLDER, minify: bool = True) -> dict:
+    """压缩并生成带哈希的文件，返回新的manifest"""
+    dist_folder = os.path.join(static_folder, DIST_DIRNAME)
+    manifest_path = os.path.join(dist_folder, MANIFEST_FILENAME)
+    previous = load_manifest(manifest_path)
+
+    assets = {}
+    total_before = total_after = 0
+    for rel_path, full_path in _source_files(static_folder):
+        with open(full_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(rel_path)
+        content = MINIFIERS[ext](source) if minify else source
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+        hashed_path = f'{DIST_DIRNAME}/{stem}.{digest}{ext}'
+
+        output_path = os.path.join(static_folder, hashed_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        data = content.encode('utf-8')
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        encodings = []
+        for encoding in compression.supported_encodings():
+            with open(output_path + PRECOMPRESSED_SUFFIXES[encoding], 'wb') as f:
+                f.write(compression.compress(data, encoding, gzip_level=9, brotli_quality=11))
+            encodings.append(encoding)
+
+        before, after = len(source.encode('utf-8')), len(data)
+        total_before += before
+        total_after += after
+        assets[rel_path] = {'path': hashed_path, 'source': _file_signature(full_path), 'encodings': encodings}
+        print(f"   {rel_path:<36} {before / 1024:>7.1f} KB → {after / 1024:>7.1f} KB  {hashed_path}")
+
+    manifest = {
+        'built_at': datetime.now().isoformat(),
+        'assets': assets,
+        # 保留上一次构建的文件，已经打开旧页面的浏览器仍能加载到
+        'previous': sorted({entry['path'] for entry in previous.get('assets', {}).values()}),
+    }
+    _prune(static_folder, manifest)
+
+    os.makedirs(dist_folder, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if total_before:
+        print(f"✅ 构建完成：{len(assets)} 个文件，{total_before / 1024:.1f} KB → {total_after / 1024:.1f} KB"
+              f"（减少 {(1 - total_after / total_before) * 100:.0f}%）")
+    return manifest
+
+
+def _prune(static_folder, manifest):
+    """删除既不属于本次构建、也不属于上一次构建的旧文件"""
+    keep = {entry['path'] for entry in manifest['assets'].values()} | set(manifest['previous'])
+    dist_folder = os.path.join(static_folder, DIST_DIRNAME)
+    for root, _, files in os.walk(dist_folder):
+        for name in files:
+            if name == MANIFEST_FILENAME:
+                continue
+            rel_path = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+            for suffix in PRECOMPRESSED_SUFFIXES.values():
+                if rel_path.endswith(suffix):
+                    rel_path = rel_path[:-len(suffix)]
+            if rel_path not in keep:
+                os.remove(os.path.join(root, name))
+
+
+def load_manifest(manifest_path: str) -> dict:
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fresh_assets(static_folder: str) -> dict:
+    """读取manifest，只返回源文件在构建后没有被修改过的条目：{原路径: 构建后路径}"""
+    manifest = load_manifest(os.path.join(static_folder, DIST_DIRNAME, MANIFEST_FILENAME))
+    mapping = {}
+    stale = []
+    for rel_path, entry in manifest.get('assets', {}).items():
+        source_path = os.path.join(static_folder, rel_path)
+        try:
+            unchanged = _file_signature(source_path) == entry.get('source')
+        except OSError:
+            unchanged = False
+        if unchanged and os.path.exists(os.path.join(static_folder, entry['path'])):
+            mapping[rel_path] = entry['path']
+        else:
+            stale.append(rel_path)
+    if stale:
+        logger.warning("⚠️ 以下静态文件在构建后被修改，将使用原始文件（请重新运行 python static_assets.py）: %s",
+                       ', '.join(stale))
+    return mapping
+
+
+def init_app(app):
+    """让 url_for('static') 指向构建后的文件，返回预压缩版本，并给这些文件加上长期缓存头"""
+    from flask import request, send_from_directory
+
+    if not _env_flag('STATIC_FINGERPRINT', default=not _env_flag('FLASK_DEBUG')):
+        return {}
+
+    mapping = fresh_assets(app.static_folder)
+    if not mapping:
+        return mapping
+    logger.info("📦 使用构建后的静态资源: %d 个文件", len(mapping))
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if endpoint == 'static':
+            hashed = mapping.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    @app.before_request
+    def _serve_precompressed():
+        if request.endpoint != 'static' or request.method not in ('GET', 'HEAD'):
+            return None
+        filename = (request.view_args or {}).get('filename', '')
+        if not filename.startswith(DIST_DIRNAME + '/'):
+            return None
+        available = [encoding for encoding in compression.supported_encodings()
+                     if os.path.isfile(os.path.join(app.static_folder, filename + PRECOMPRESSED_SUFFIXES[encoding]))]
+        encoding = compression.choose_encoding(request.accept_encodings, available)
+        if encoding is None:
+            return None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(app.static_folder, filename + PRECOMPRESSED_SUFFIXES[encoding], mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    @app.after_request
+    def _cache_fingerprinted(response):
+        filename = (request.view_args or {}).get('filename', '') if request.endpoint == 'static' else ''
+        if filename.startswith(DIST_DIRNAME + '/') and response.status_code in (200, 206, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.expires = None
+        return response
+
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='压缩静态资源并生成带内容哈希的文件名')
+    parser.add_argument('--static-folder', default=STATIC_FOLDER, help='static目录路径')
+    parser.add_argument('--no-minify', action='store_true', help='只生成哈希文件名，不压缩（排查问题时使用）')
+    args = parser.parse_args(argv)
+
+    print(f"📦 构建静态资源: {args.static_folder}")
+    build(args.static_folder, minify=not args.no_minify)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
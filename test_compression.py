@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+响应压缩测试脚本
+
+测试 compression 的gzip压缩、最小长度阈值和已压缩媒体类型的跳过
+"""
+
+import sys
+import os
+import gzip
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, jsonify, Response
+
+import compression
+
+
+def _make_app():
+    app = Flask(__name__)
+
+    @app.route('/big')
+    def big():
+        return jsonify({'versions': [{'id': i, 'note': '从创作会话保存'} for i in range(200)]})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'success': True})
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' + b'\x00' * 4096, mimetype='image/png')
+
+    compression.init_app(app)
+    return app
+
+
+def test_large_json_is_gzipped():
+    """大于阈值的JSON按Accept-Encoding压缩，解压后内容不变"""
+    client = _make_app().test_client()
+    plain = client.get('/big').get_data()
+
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.get_data()) < len(plain)
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_small_and_media_responses_are_not_compressed():
+    """小响应和PNG等已压缩的媒体原样返回"""
+    client = _make_app().test_client()
+    for path in ('/small', '/image'):
+        response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+        assert 'Content-Encoding' not in response.headers
+
+
+if __name__ == "__main__":
+    test_large_json_is_gzipped()
+    test_small_and_media_responses_are_not_compressed()
+    print("🎉 响应压缩测试全部通过!")
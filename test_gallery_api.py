@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+作品集搜索接口测试脚本
+
+用Flask测试客户端请求 /api/search（空查询、分页参数的限制、分类筛选和响应格式），
+以及 /save-artwork 把会话中生成和调整图片使用的提示词保存到作品中
+"""
+
+import sys
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app_test_support import import_app
+from creation_session_manager import CreationSessionManager
+from gallery_manager import GalleryManager
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+app_module = import_app()
+
+
+def _artwork(artwork_id, title, category='animals', prompts=None):
+    return {'id': artwork_id, 'title': title, 'artist_name': '小朋友', 'category': category,
+            'description': '', 'prompts': prompts or [], 'likes': 0}
+
+
+@contextmanager
+def _client(artworks=()):
+    """作品集和会话都保存在临时目录中的测试客户端，返回 (客户端, 会话管理器, 临时目录)"""
+    original = app_module.gallery_manager, app_module.session_manager
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # 版本记录文件使用相对路径，在临时目录中运行
+            os.chdir(tmp)
+            with open('gallery_data.json', 'w', encoding='utf-8') as f:
+                json.dump(list(artworks), f, ensure_ascii=False)
+            app_module.gallery_manager = GalleryManager(data_file=os.path.join(tmp, 'gallery_data.json'),
+                                                        gallery_folder=os.path.join(tmp, 'gallery'))
+            app_module.session_manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'))
+            yield app_module.app.test_client(), app_module.session_manager, tmp
+    finally:
+        app_module.gallery_manager, app_module.session_manager = original
+        os.chdir(ROOT_DIR)
+
+
+def test_search_endpoint():
+    """空查询返回400，分页参数限制在有效范围内，按分类筛选，结果带相关度分数"""
+    artworks = [_artwork(f'cat{i}', f'小猫{i}号') for i in range(3)] + \
+        [_artwork('robot', '小猫机器人', category='characters'), _artwork('sea', '大海', category='nature')]
+    with _client(artworks) as (client, _, _):
+        assert client.get('/api/search').status_code == 400
+        assert client.get('/api/search', query_string={'q': '   '}).status_code == 400
+
+        data = client.get('/api/search', query_string={'q': '小猫'}).get_json()
+        assert data['success'] and data['query'] == '小猫'
+        assert data['total'] == 4 and data['page'] == 1 and data['per_page'] == 20
+        assert {item['id'] for item in data['results']} == {'cat0', 'cat1', 'cat2', 'robot'}
+        assert all(item['score'] > 0 and 'title' in item for item in data['results'])
+
+        page = client.get('/api/search', query_string={'q': '小猫', 'page': 2, 'per_page': 3}).get_json()
+        assert page['total'] == 4 and len(page['results']) == 1
+
+        # 超出范围的分页参数被限制：page最小为1，per_page在1到50之间
+        clamped = client.get('/api/search', query_string={'q': '小猫', 'page': 0, 'per_page': 500}).get_json()
+        assert clamped['page'] == 1 and clamped['per_page'] == 50 and len(clamped['results']) == 4
+        clamped = client.get('/api/search', query_string={'q': '小猫', 'page': -3, 'per_page': 0}).get_json()
+        assert clamped['page'] == 1 and clamped['per_page'] == 1 and len(clamped['results']) == 1
+
+        filtered = client.get('/api/search', query_string={'q': '小猫', 'category': 'characters'}).get_json()
+        assert filtered['total'] == 1 and filtered['results'][0]['id'] == 'robot'
+        assert client.get('/api/search', query_string={'q': '小猫', 'category': 'all'}).get_json()['total'] == 4
+        assert client.get('/api/search', query_string={'q': '恐龙'}).get_json()['total'] == 0
+
+
+def test_save_artwork_stores_session_prompts():
+    """保存作品时带上会话中生成和调整图片的提示词（去重，按使用顺序），之后可以按提示词搜到"""
+    with _client() as (client, manager, tmp):
+        session_id = manager.create_session()
+        steps = [{'prompt': '一只会飞的小猫'}, {'adjust_prompt': '加一顶红帽子'}, {'prompt': '一只会飞的小猫'}]
+        for index, metadata in enumerate(steps):
+            source = os.path.join(tmp, f'generated_{index}.png')
+            with open(source, 'wb') as f:
+                f.write(b'png')
+            version = manager.add_version(session_id, 'image', source, metadata, move=True)
+        manager.select_version(session_id, version['version_id'])
+
+        response = client.post('/save-artwork', json={'session_id': session_id, 'title': '我的作品'})
+        assert response.status_code == 200, response.get_json()
+        artwork_id = response.get_json()['artwork_id']
+
+        artwork = app_module.gallery_manager.get_artwork_by_id(artwork_id)
+        assert artwork['prompts'] == ['一只会飞的小猫', '加一顶红帽子']
+        found = client.get('/api/search', query_string={'q': '红帽子'}).get_json()
+        assert [item['id'] for item in found['results']] == [artwork_id]
+
+
+if __name__ == "__main__":
+    test_search_endpoint()
+    test_save_artwork_stores_session_prompts()
+    print("🎉 作品集搜索接口测试全部通过!")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+磁盘垃圾回收测试脚本
+
+测试按类别过期、引用保护、最近文件保护、磁盘预算LRU淘汰和演练模式，
+以及多进程部署时只有一个进程执行定期回收
+"""
+
+import sys
+import os
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import garbage_collector
+from garbage_collector import GarbageCollector, GarbageCollectorScheduler
+
+HOUR = 3600
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@contextmanager
+def _temp_root():
+    """临时目录，结束时回到项目根目录"""
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            yield tmp
+    finally:
+        os.chdir(ROOT_DIR)
+
+
+def _write(path, size=100, age_hours=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * size)
+    mtime = time.time() - age_hours * HOUR
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _make_collector(tmp, **kwargs):
+    # 和应用中一样使用相对路径，测试在临时目录中运行
+    os.chdir(tmp)
+    return GarbageCollector(sessions_folder='sessions', reference_files=('gallery_data.json',),
+                            index_file='gc_index.json', **kwargs)
+
+
+def _write_session(tmp, session_id, data, age_hours=0):
+    path = os.path.join(tmp, 'sessions', session_id, 'session.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    mtime = time.time() - age_hours * HOUR
+    os.utime(path, (mtime, mtime))
+    os.utime(os.path.dirname(path), (mtime, mtime))
+    return path
+
+
+def test_ttl_and_references():
+    """过期文件被删除，被会话引用的文件和最近的文件保留"""
+    with _temp_root() as tmp:
+        old_colored = _write(os.path.join(tmp, 'uploads', 'a_colored.png'), age_hours=100)
+        referenced = _write(os.path.join(tmp, 'uploads', 'sketch_x.png'), age_hours=100)
+        fresh = _write(os.path.join(tmp, 'uploads', 'b_adjusted_1.png'), age_hours=0)
+        temp = _write(os.path.join(tmp, 'uploads', 'temp_veo_1.png'), age_hours=2)
+        old_model = _write(os.path.join(tmp, 'models', 'm.glb'), size=500, age_hours=100)
+        gc = _make_collector(tmp)
+        # 会话中的路径和请求中一样带有前导 /
+        _write_session(tmp, 's1', {'versions': [{'metadata': {'source_image': '/uploads/sketch_x.png'}}]})
+        _write_session(tmp, 'abandoned', {'status': 'active'}, age_hours=200)
+
+        report = gc.collect()
+
+        assert not os.path.exists(old_colored) and not os.path.exists(temp) and not os.path.exists(old_model)
+        assert os.path.exists(referenced) and os.path.exists(fresh)
+        assert not os.path.exists(os.path.join(tmp, 'sessions', 'abandoned'))
+        assert os.path.exists(os.path.join(tmp, 'sessions', 's1'))
+        assert report['deleted']['temp']['count'] == 1
+        assert report['deleted']['session']['count'] == 1
+        assert report['reclaimed_bytes'] >= 700
+
+
+def test_disk_budget_lru():
+    """超出预算时从最久未访问的文件开始删除，刚访问过的文件保留"""
+    with _temp_root() as tmp:
+        paths = [_write(os.path.join(tmp, 'uploads', f'img_{i}.png'), size=1000, age_hours=5 - i) for i in range(4)]
+        gc = _make_collector(tmp, disk_budget_bytes=2500, min_age_seconds=0)
+        # 最旧的文件刚被访问过
+        gc.touch('uploads/img_0.png')
+
+        report = gc.collect()
+
+        assert os.path.exists(paths[0])
+        assert not os.path.exists(paths[1]) and not os.path.exists(paths[2])
+        assert os.path.exists(paths[3])
+        assert report['deleted']['upload']['over_budget'] == 2
+        assert report['usage_bytes_after'] <= 2500
+
+
+def test_dry_run_and_index():
+    """演练模式不删除文件；访问记录在回收后保存，重新加载后仍然有效"""
+    with _temp_root() as tmp:
+        old = _write(os.path.join(tmp, 'uploads', 'old.png'), age_hours=100)
+        gc = _make_collector(tmp)
+        report = gc.collect(dry_run=True)
+        assert report['deleted']['upload']['count'] == 1 and os.path.exists(old)
+
+        gc.touch('uploads/old.png')
+        gc.collect()
+        assert os.path.exists(old)
+        assert _make_collector(tmp)._access['uploads/old.png'] > time.time() - 60
+
+
+def test_single_leader():
+    """多个进程的回收线程中只有拿到回收锁的一个执行回收，持有者退出后其他进程接替"""
+    with _temp_root() as tmp:
+        gc = _make_collector(tmp)
+        first = GarbageCollectorScheduler(gc, lock_file=os.path.join(tmp, 'cache', 'gc.lock'))
+        second = GarbageCollectorScheduler(gc, lock_file=os.path.join(tmp, 'cache', 'gc.lock'))
+        assert first.acquire_leadership() and first.acquire_leadership()
+        assert not second.acquire_leadership()
+
+        # 模拟持有锁的worker退出
+        os.close(first._lock_fd)
+        assert second.acquire_leadership()
+        os.close(second._lock_fd)
+
+
+def test_preload_master_defers_scheduler():
+    """GC_START_IN_WORKERS时加载应用不启动回收线程，fork出的worker中才启动"""
+    from flask import Flask
+    os.environ['GC_START_IN_WORKERS'] = 'true'
+    try:
+        with _temp_root() as tmp:
+            garbage_collector.init_app(Flask(__name__), collector=_make_collector(tmp))
+            scheduler = garbage_collector._scheduler
+            assert scheduler is not None and scheduler._thread is None
+
+            garbage_collector.reinit_after_fork()
+            assert scheduler._thread.is_alive()
+            scheduler.stop()
+            scheduler._thread.join(timeout=5)
+    finally:
+        os.environ.pop('GC_START_IN_WORKERS', None)
+        garbage_collector._scheduler = None
+
+
+if __name__ == "__main__":
+    test_ttl_and_references()
+    test_disk_budget_lru()
+    test_dry_run_and_index()
+    test_single_leader()
+    test_preload_master_defers_scheduler()
+    print("🎉 磁盘垃圾回收测试全部通过!")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+生成结果缓存测试脚本
+
+测试 GenerationCache 的命中、跳过、LRU淘汰和过期功能，以及多个进程共用同一个缓存目录
+"""
+
+import sys
+import os
+import json
+import time
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generation_cache import GenerationCache
+
+
+def _write_file(folder, name, content):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_cache_hit_and_miss():
+    """相同参数第二次查询应命中缓存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GenerationCache(cache_folder=os.path.join(tmp, 'cache'), enabled=True)
+        sketch = _write_file(tmp, 'sketch.png', b'sketch-bytes')
+        result = _write_file(tmp, 'result.png', b'generated-image')
+
+        key = cache.make_key('一只猫', 'cute', 'colorful', False, sketch_path=sketch, model_name='m')
+        assert cache.get(key, tmp) is None
+
+        assert cache.put(key, result)
+        cached_path = cache.get(key, tmp)
+        assert cached_path and cached_path != result
+        with open(cached_path, 'rb') as f:
+            assert f.read() == b'generated-image'
+
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+
+
+def test_key_depends_on_sketch_content():
+    """手绘图内容不同时缓存键不同，内容相同时缓存键相同"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GenerationCache(cache_folder=os.path.join(tmp, 'cache'), enabled=True)
+        a = _write_file(tmp, 'a.png', b'drawing-1')
+        b = _write_file(tmp, 'b.png', b'drawing-1')
+        c = _write_file(tmp, 'c.png', b'drawing-2')
+
+        key_a = cache.make_key('', 'cute', 'colorful', False, sketch_path=a, model_name='m')
+        key_b = cache.make_key('', 'cute', 'colorful', False, sketch_path=b, model_name='m')
+        key_c = cache.make_key('', 'cute', 'colorful', False, sketch_path=c, model_name='m')
+        assert key_a == key_b
+        assert key_a != key_c
+        assert key_a != cache.make_key('', 'cute', 'colorful', True, sketch_path=a, model_name='m')
+
+
+def test_lru_eviction_and_ttl():
+    """超过条目上限时淘汰最久未访问的条目，过期条目不再命中"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GenerationCache(cache_folder=os.path.join(tmp, 'cache'), enabled=True,
+                                max_entries=2, ttl_seconds=3600)
+        result = _write_file(tmp, 'result.png', b'image')
+
+        cache.put('k1', result)
+        cache.put('k2', result)
+        # 最近访问时间是结果文件的修改时间：k1 最近被访问过
+        future = time.time() + 10
+        os.utime(os.path.join(tmp, 'cache', 'k1.png'), (future, future))
+        cache.put('k3', result)
+        assert set(cache._index.keys()) == {'k1', 'k3'}
+
+        index_file = os.path.join(tmp, 'cache', 'index.json')
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        index['k1']['created_at'] = time.time() - 7200
+        with open(index_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        assert cache.get('k1', tmp) is None
+        assert 'k1' not in cache._index
+        assert not os.path.exists(os.path.join(tmp, 'cache', 'k1.png'))
+
+
+def test_shared_between_processes():
+    """两个缓存实例（两个worker）共用目录：互相看到写入的条目，命中不重写索引，写入不覆盖对方的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'cache')
+        first = GenerationCache(cache_folder=folder, enabled=True)
+        second = GenerationCache(cache_folder=folder, enabled=True)
+        result = _write_file(tmp, 'result.png', b'image')
+
+        assert first.put('k1', result)
+        assert second.put('k2', result)
+        assert first.put('k3', result)
+        assert first.stats()['entries'] == second.stats()['entries'] == 3
+        assert second.get('k3', tmp) is not None
+
+        index_file = os.path.join(folder, 'index.json')
+        stamp = os.stat(index_file).st_mtime_ns
+        cached_file = os.path.join(folder, 'k2.png')
+        os.utime(cached_file, (0, 0))
+        assert first.get('k2', tmp) is not None
+        assert os.stat(index_file).st_mtime_ns == stamp
+        assert os.path.getmtime(cached_file) > 0
+
+        # 没有留下临时文件
+        assert sorted(os.listdir(folder)) == ['index.json', 'index.lock', 'k1.png', 'k2.png', 'k3.png']
+        assert second.clear() == 3 and first.stats()['entries'] == 0
+
+
+def test_disabled_cache_is_noop():
+    """未开启缓存时不读写磁盘"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GenerationCache(cache_folder=os.path.join(tmp, 'cache'), enabled=False)
+        result = _write_file(tmp, 'result.png', b'image')
+        assert not cache.put('k', result)
+        assert cache.get('k', tmp) is None
+        assert not os.path.exists(os.path.join(tmp, 'cache'))
+
+
+if __name__ == "__main__":
+    test_cache_hit_and_miss()
+    test_key_depends_on_sketch_content()
+    test_lru_eviction_and_ttl()
+    test_shared_between_processes()
+    test_disabled_cache_is_noop()
+    print("🎉 生成结果缓存测试全部通过!")
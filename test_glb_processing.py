@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+GLB模型处理测试脚本
+
+测试预览模型的简化和贴图缩小、统计信息、完整模型的量化压缩、交错顶点数据读取和无效文件处理
+"""
+
+import sys
+import os
+import io
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import glb_processing
+
+
+def _sphere_glb(rings=120, segments=120, texture_size=1024, duplicate_image=False):
+    """带贴图的球面网格GLB（duplicate_image 时同一张贴图内嵌两份）"""
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rings), np.linspace(0, 2 * np.pi, segments), indexing='ij')
+    normals = np.stack([np.sin(theta) * np.cos(phi), np.cos(theta), np.sin(theta) * np.sin(phi)], axis=-1)
+    normals = normals.reshape(-1, 3).astype(np.float32)
+    uvs = np.stack([phi / (2 * np.pi), theta / np.pi], axis=-1).reshape(-1, 2).astype(np.float32)
+    r, s = np.meshgrid(np.arange(rings - 1), np.arange(segments - 1), indexing='ij')
+    a = (r * segments + s).ravel()
+    b = a + segments
+    indices = np.stack([a, b, a + 1, a + 1, b, b + 1], axis=-1).reshape(-1).astype(np.uint32)
+    texture = io.BytesIO()
+    Image.new('RGB', (texture_size, texture_size), 'orange').save(texture, format='PNG')
+
+    binary, views = b'', []
+    for blob in (normals.tobytes(), normals.tobytes(), uvs.tobytes(), indices.tobytes(), texture.getvalue()):
+        views.append({'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(blob)})
+        binary += blob + b'\x00' * (-len(blob) % 4)
+    gltf = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1, 'TEXCOORD_0': 2},
+                                    'indices': 3, 'material': 0}]}],
+        'materials': [{'pbrMetallicRoughness': {'baseColorTexture': {'index': 0}}}],
+        'textures': [{'source': 0}],
+        'images': [{'bufferView': 4, 'mimeType': 'image/png'}],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126, 'count': len(normals), 'type': 'VEC3',
+             'min': normals.min(axis=0).tolist(), 'max': normals.max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': 5126, 'count': len(normals), 'type': 'VEC3'},
+            {'bufferView': 2, 'componentType': 5126, 'count': len(uvs), 'type': 'VEC2'},
+            {'bufferView': 3, 'componentType': 5125, 'count': len(indices), 'type': 'SCALAR'},
+        ],
+        'bufferViews': views,
+        'buffers': [{'byteLength': len(binary)}],
+    }
+    if duplicate_image:
+        blob = texture.getvalue()
+        views.append({'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(blob)})
+        binary += blob + b'\x00' * (-len(blob) % 4)
+        gltf['images'].append({'bufferView': 5, 'mimeType': 'image/png'})
+        gltf['textures'].append({'source': 1})
+        gltf['buffers'][0]['byteLength'] = len(binary)
+    return glb_processing.write_glb(gltf, binary)
+
+
+def _write(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_preview_is_decimated():
+    """预览模型的三角形数和贴图尺寸不超过目标，索引有效且外形基本不变"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _write(tmp, 'model.glb', _sphere_glb())
+        stats = glb_processing.process_model(model, target_triangles=2000, texture_size=256)
+
+        assert stats['triangles'] == 2 * 119 * 119 and stats['textures'] == [[1024, 1024]]
+        preview = stats['preview']
+        assert 0 < preview['triangles'] <= 2000 and preview['bytes'] < stats['bytes']
+        assert preview['textures'] == [[256, 256]]
+
+        with open(glb_processing.preview_path(model), 'rb') as f:
+            gltf, bin_data = glb_processing.read_glb(f.read())
+        primitive = gltf['meshes'][0]['primitives'][0]
+        positions = glb_processing.read_accessor(gltf, bin_data, primitive['attributes']['POSITION'])
+        indices = glb_processing.read_accessor(gltf, bin_data, primitive['indices'])
+        assert indices.max() < len(positions)
+        radius = np.linalg.norm(positions, axis=1)
+        assert radius.min() > 0.8 and radius.max() <= 1.0001
+        assert gltf['images'][0]['mimeType'] == 'image/jpeg'
+
+
+def test_small_model_has_no_preview():
+    """已经足够小的模型只统计，不生成预览"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _write(tmp, 'small.glb', _sphere_glb(rings=10, segments=10, texture_size=64))
+        stats = glb_processing.process_model(model, target_triangles=2000, texture_size=256)
+        assert stats['preview'] is None and stats['vertices'] == 100
+        assert not os.path.exists(glb_processing.preview_path(model))
+
+
+def test_optimize_quantizes_and_deduplicates():
+    """压缩后的模型使用量化扩展，文件更小，重复贴图只保存一份，反量化后外形不变"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _write(tmp, 'model.glb', _sphere_glb(duplicate_image=True))
+        stats = glb_processing.process_model(model, target_triangles=2000, optimize=True)
+        assert stats['bytes'] < stats['original_bytes'] * 0.6
+        assert stats['triangles'] == 2 * 119 * 119 and stats['preview'] is not None
+
+        with open(model, 'rb') as f:
+            gltf, bin_data = glb_processing.read_glb(f.read())
+        assert 'KHR_mesh_quantization' in gltf['extensionsRequired']
+        assert gltf['images'][0]['bufferView'] == gltf['images'][1]['bufferView']
+        primitive = gltf['meshes'][0]['primitives'][0]
+        position_accessor = gltf['accessors'][primitive['attributes']['POSITION']]
+        assert position_accessor['componentType'] == 5122
+        assert gltf['bufferViews'][position_accessor['bufferView']]['byteStride'] == 8
+
+        child = gltf['nodes'][gltf['nodes'][0]['children'][0]]
+        positions = glb_processing.read_accessor(gltf, bin_data, primitive['attributes']['POSITION'])
+        radius = np.linalg.norm(positions * child['scale'][0] + child['translation'], axis=1)
+        assert np.abs(radius - 1).max() < 1e-3
+
+        # 已经压缩过的模型保持原样
+        size = os.path.getsize(model)
+        assert glb_processing.process_model(model, optimize=True)['bytes'] == size
+
+
+def test_interleaved_accessor():
+    """按步长交错存储的顶点属性可以正确读取"""
+    interleaved = np.array([[0, 1, 2, 10, 11], [3, 4, 5, 12, 13]], dtype=np.float32)
+    gltf = {
+        'bufferViews': [{'buffer': 0, 'byteLength': interleaved.nbytes, 'byteStride': 20}],
+        'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': 2, 'type': 'VEC3'},
+                      {'bufferView': 0, 'byteOffset': 12, 'componentType': 5126, 'count': 2, 'type': 'VEC2'}],
+    }
+    data = interleaved.tobytes()
+    assert glb_processing.read_accessor(gltf, data, 0).tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert glb_processing.read_accessor(gltf, data, 1).tolist() == [[10, 11], [12, 13]]
+
+
+def test_invalid_file_and_move_preview():
+    """无法解析的文件返回None；模型改名后预览随之改名"""
+    with tempfile.TemporaryDirectory() as tmp:
+        assert glb_processing.process_model(_write(tmp, 'broken.glb', b'not a glb file at all')) is None
+
+        model = _write(tmp, 'model.glb', _sphere_glb())
+        glb_processing.process_model(model, target_triangles=2000)
+        moved = os.path.join(tmp, 'model_v1.glb')
+        os.replace(model, moved)
+        new_preview = glb_processing.move_preview(model, moved)
+        assert new_preview == os.path.join(tmp, 'model_v1_preview.glb') and os.path.exists(new_preview)
+        assert glb_processing.move_preview(model, moved) is None
+
+
+if __name__ == "__main__":
+    test_preview_is_decimated()
+    test_small_model_has_no_preview()
+    test_optimize_quantizes_and_deduplicates()
+    test_interleaved_accessor()
+    test_invalid_file_and_move_preview()
+    print("🎉 GLB模型处理测试全部通过!")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+共享HTTP连接池测试脚本
+
+在本机启动一个支持keep-alive的HTTP服务器，测试多次下载复用同一个TCP连接，
+以及未指定超时时使用默认超时
+"""
+
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api import http_session
+from api.upstream import http_get
+
+PAYLOAD = b'\x00' * 4096
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_GET(self):
+        _Handler.connections.add(self.client_address)
+        status = 404 if self.path.endswith('/missing') else 200
+        body = PAYLOAD if status == 200 else b'missing'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_downloads_reuse_connection():
+    """同一台主机的多次下载只建立一个连接"""
+    server = _start_server()
+    http_session.reset_session()
+    _Handler.connections.clear()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/model.glb"
+        for _ in range(5):
+            assert http_get(url, timeout=5).content == PAYLOAD
+        assert len(_Handler.connections) == 1
+    finally:
+        server.shutdown()
+        http_session.reset_session()
+
+
+def test_error_status_raises():
+    """HTTP错误状态抛出异常，交给 call_with_retry 判断是否重试"""
+    server = _start_server()
+    try:
+        try:
+            http_get(f"http://127.0.0.1:{server.server_port}/missing", timeout=5)
+            assert False, "应该抛出异常"
+        except Exception as e:
+            assert '404' in str(e)
+    finally:
+        server.shutdown()
+        http_session.reset_session()
+
+
+def test_default_timeout():
+    """调用方未指定超时时使用环境变量配置的超时"""
+    os.environ['HTTP_CONNECT_TIMEOUT'] = '3'
+    os.environ['HTTP_READ_TIMEOUT'] = '30'
+    try:
+        assert http_session.request_timeout() == (3.0, 30.0)
+        assert http_session.request_timeout(60) == (3.0, 60)
+        http_session.reset_session()
+        adapter = http_session.get_session().get_adapter('https://example.com')
+        assert adapter.default_timeout == (3.0, 30.0)
+    finally:
+        del os.environ['HTTP_CONNECT_TIMEOUT']
+        del os.environ['HTTP_READ_TIMEOUT']
+        http_session.reset_session()
+
+
+if __name__ == "__main__":
+    test_downloads_reuse_connection()
+    test_error_status_raises()
+    test_default_timeout()
+    print("🎉 HTTP连接池测试全部通过!")
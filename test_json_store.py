@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+JSON数据文件并发写入测试脚本
+
+测试 json_store 的原子写入，以及多线程同时点赞时计数不会丢失
+"""
+
+import sys
+import os
+import json
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_store import atomic_write_json
+from gallery_manager import GalleryManager
+
+
+def test_atomic_write_leaves_no_temp_files():
+    """写入完成后只留下目标文件，内容完整"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'data.json')
+        atomic_write_json(path, [{'title': '旧作品'}])
+        atomic_write_json(path, [{'title': '新作品'}])
+
+        assert os.listdir(folder) == ['data.json']
+        with open(path, 'r', encoding='utf-8') as f:
+            assert json.load(f) == [{'title': '新作品'}]
+
+
+def test_concurrent_likes_are_not_lost():
+    """多个线程同时点赞，每一次都要计入"""
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            data_file = os.path.join(folder, 'gallery_data.json')
+            atomic_write_json(data_file, [{'id': 'a1', 'title': '小猫', 'likes': 0, 'views': 0}])
+            gallery = GalleryManager(data_file=data_file, gallery_folder=os.path.join(folder, 'gallery'))
+
+            def like():
+                for _ in range(20):
+                    gallery.toggle_like('a1')
+
+            threads = [threading.Thread(target=like) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert gallery.get_artwork_by_id('a1')['likes'] == 160
+        finally:
+            os.chdir(original_cwd)
+
+
+if __name__ == "__main__":
+    test_atomic_write_leaves_no_temp_files()
+    test_concurrent_likes_are_not_lost()
+    print("🎉 JSON存储测试全部通过!")
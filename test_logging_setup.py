@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+非阻塞日志测试脚本
+
+测试 logging_setup 的JSON格式、关联ID和队列满时丢弃功能
+"""
+
+import sys
+import os
+import json
+import queue
+import logging
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from logging_setup import JsonFormatter, NonBlockingQueueHandler, RequestIdFilter, _request_id
+
+
+def _make_handler(maxsize=10):
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=maxsize))
+    handler.addFilter(RequestIdFilter())
+    logger = logging.getLogger(f'test_logging_setup.{maxsize}')
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger, handler
+
+
+def test_json_output_with_request_id():
+    """日志记录带上当前请求的关联ID，并输出为一行JSON"""
+    logger, handler = _make_handler()
+    token = _request_id.set('abc123')
+    try:
+        logger.info("✅ 图片生成完成: %s", 'uploads/a.png', extra={'session_id': 's1'})
+    finally:
+        _request_id.reset(token)
+
+    record = handler.queue.get_nowait()
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload['request_id'] == 'abc123'
+    assert payload['message'] == '✅ 图片生成完成: uploads/a.png'
+    assert payload['level'] == 'INFO'
+    assert payload['session_id'] == 's1'
+
+
+def test_debug_disabled_by_default_level():
+    """INFO级别下调试日志不会进入队列"""
+    logger, handler = _make_handler()
+    logger.debug("📨 收到请求: %s", {'big': 'payload'})
+    assert handler.queue.empty()
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """队列满时丢弃日志而不是阻塞"""
+    logger, handler = _make_handler(maxsize=2)
+    for i in range(5):
+        logger.info("消息 %d", i)
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_exception_text_is_captured():
+    """异常堆栈在请求线程中转为文本，后台线程可以直接输出"""
+    logger, handler = _make_handler()
+    try:
+        raise ValueError("坏参数")
+    except ValueError:
+        logger.exception("❌ 处理失败")
+
+    record = handler.queue.get_nowait()
+    assert record.exc_info is None
+    assert 'ValueError: 坏参数' in json.loads(JsonFormatter().format(record))['exception']
+
+
+if __name__ == "__main__":
+    test_json_output_with_request_id()
+    test_debug_disabled_by_default_level()
+    test_full_queue_drops_instead_of_blocking()
+    test_exception_text_is_captured()
+    print("🎉 日志测试全部通过!")
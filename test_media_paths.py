@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+媒体路径与会话文件转移测试脚本
+
+测试URL和文件路径的互相转换、路径穿越检查，以及生成结果移动（而不是复制）到会话目录
+"""
+
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import media_paths
+from creation_session_manager import CreationSessionManager
+
+
+def test_url_path_round_trip():
+    """三种存放位置的URL和文件路径可以互相转换"""
+    assert media_paths.to_path('/uploads/a.png') == 'uploads/a.png'
+    assert media_paths.to_path('uploads/a.png') == 'uploads/a.png'
+    assert media_paths.to_path('a.png') == 'uploads/a.png'
+    assert media_paths.to_path('/models/m.glb') == 'models/m.glb'
+    session_url = '/session-files/creation_sessions/s1/image_v1_ab.png'
+    assert media_paths.to_path(session_url) == 'creation_sessions/s1/image_v1_ab.png'
+    for url in ('/uploads/a.png', '/models/m.glb', session_url):
+        assert media_paths.to_url(media_paths.to_path(url)) == url
+
+
+def test_traversal_rejected():
+    """试图跳出应用目录的路径被拒绝"""
+    for url in ('/uploads/../../etc/passwd', '../secret.png', '/session-files/../../x.png'):
+        try:
+            media_paths.to_path(url)
+        except ValueError:
+            continue
+        raise AssertionError(f"未拒绝路径: {url}")
+
+
+def test_add_version_moves_file():
+    """move=True时文件被重命名到会话目录，原文件不再保留；默认仍然复制"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'))
+        session_id = manager.create_session()
+        session_dir = manager.session_dir(session_id)
+        assert session_dir and manager.session_dir('missing') is None
+
+        generated = os.path.join(session_dir, 'sketch_colored_1234.png')
+        with open(generated, 'wb') as f:
+            f.write(b'png')
+        result = manager.add_version(session_id, 'image', generated, move=True)
+        assert result['success'] and not os.path.exists(generated)
+        assert os.path.dirname(result['file_path']) == session_dir
+        assert result['url_path'].startswith('/session-files/')
+
+        copied = os.path.join(tmp, 'other.png')
+        with open(copied, 'wb') as f:
+            f.write(b'png')
+        assert manager.add_version(session_id, 'image', copied)['success'] and os.path.exists(copied)
+
+
+if __name__ == "__main__":
+    test_url_path_round_trip()
+    test_traversal_rejected()
+    test_add_version_moves_file()
+    print("🎉 媒体路径测试全部通过!")
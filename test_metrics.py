@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+性能指标测试脚本
+
+测试 /metrics 的Prometheus文本格式输出，以及请求、处理阶段和上游调用指标的路由/阶段/结果标签
+"""
+
+import sys
+import os
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, jsonify
+
+import metrics
+from metrics import MetricsRegistry, span
+from api.upstream import UpstreamCall, run_steps
+from api.retry_policy import RetryPolicy
+
+
+@contextmanager
+def _fresh_registry(enabled=True, **kwargs):
+    """测试期间使用独立的指标注册表"""
+    original = metrics.registry
+    metrics.registry = MetricsRegistry(enabled=enabled, **kwargs)
+    try:
+        yield metrics.registry
+    finally:
+        metrics.registry = original
+
+
+def _make_app():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/items/<item_id>')
+    def item(item_id):
+        with span('load'):
+            pass
+        return jsonify({'id': item_id})
+
+    @app.route('/generate', methods=['POST'])
+    def generate():
+        def failing_call():
+            raise ValueError('400 INVALID_ARGUMENT: bad prompt')
+
+        def steps():
+            with span('upstream'):
+                yield UpstreamCall(failing_call, service='test-metrics-model', rate_limit='test-metrics-model',
+                                   policy=RetryPolicy(max_attempts=1, base_delay=0, max_delay=0))
+
+        try:
+            run_steps(steps())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 500
+        return jsonify({'success': True})
+
+    return app
+
+
+def _samples(text):
+    """解析Prometheus文本格式：样本名（含标签） -> 值"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_prometheus_text_format():
+    """计数器和直方图按Prometheus文本格式输出：HELP/TYPE、累计分桶、+Inf、_sum和_count，标签值转义"""
+    with _fresh_registry(buckets=(0.1, 1)) as registry:
+        registry.requests_total.inc(('/a', 'GET', '200'))
+        registry.requests_total.inc(('/a', 'GET', '200'))
+        registry.stage_duration.observe(('/a', 'say "hi"\n', 'success'), 0.05)
+        registry.stage_duration.observe(('/a', 'say "hi"\n', 'success'), 0.5)
+        registry.stage_duration.observe(('/a', 'say "hi"\n', 'success'), 5)
+        text = registry.render()
+
+    assert text.endswith('\n')
+    assert '# HELP hltraining_requests_total 每个路由的请求次数' in text
+    assert '# TYPE hltraining_requests_total counter' in text
+    assert '# TYPE hltraining_stage_duration_seconds histogram' in text
+
+    samples = _samples(text)
+    assert samples['hltraining_requests_total{route="/a",method="GET",status="200"}'] == 2
+    labels = 'route="/a",stage="say \\"hi\\"\\n",outcome="success"'
+    assert samples[f'hltraining_stage_duration_seconds_bucket{{{labels},le="0.1"}}'] == 1
+    assert samples[f'hltraining_stage_duration_seconds_bucket{{{labels},le="1"}}'] == 2
+    assert samples[f'hltraining_stage_duration_seconds_bucket{{{labels},le="+Inf"}}'] == 3
+    assert samples[f'hltraining_stage_duration_seconds_sum{{{labels}}}'] == 5.55
+    assert samples[f'hltraining_stage_duration_seconds_count{{{labels}}}'] == 3
+
+
+def test_route_stage_and_outcome_labels():
+    """请求和阶段指标使用路由模板作为标签；阶段和上游调用失败时记录为error"""
+    with _fresh_registry():
+        client = _make_app().test_client()
+        assert client.get('/items/42').status_code == 200
+        assert client.get('/items/43').status_code == 200
+        assert client.post('/generate').status_code == 500
+        assert client.get('/missing').status_code == 404
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        samples = _samples(response.get_data(as_text=True))
+
+    assert samples['hltraining_requests_total{route="/items/<item_id>",method="GET",status="200"}'] == 2
+    assert samples['hltraining_requests_total{route="/generate",method="POST",status="500"}'] == 1
+    assert samples['hltraining_requests_total{route="unmatched",method="GET",status="404"}'] == 1
+    assert samples['hltraining_stage_duration_seconds_count{route="/items/<item_id>",stage="load",outcome="success"}'] == 2
+    assert samples['hltraining_stage_duration_seconds_count{route="/generate",stage="upstream",outcome="error"}'] == 1
+
+    # 上游调用失败：记录调用结果和耗时，排队时间照常记录
+    assert samples['hltraining_upstream_calls_total{model="test-metrics-model",outcome="error"}'] == 1
+    assert samples['hltraining_upstream_call_duration_seconds_count{model="test-metrics-model",outcome="error"}'] == 1
+    assert samples['hltraining_upstream_queue_wait_seconds_count{model="test-metrics-model"}'] == 1
+    assert not any('outcome="success"' in name and 'test-metrics-model' in name for name in samples)
+
+
+def test_disabled_registry_records_nothing():
+    """关闭指标后 span() 是空的上下文管理器，不记录任何数据"""
+    with _fresh_registry(enabled=False) as registry:
+        with span('noop'):
+            pass
+        metrics.record_upstream_call('test-metrics-model', 'success', 0.1)
+        assert _samples(registry.render()) == {}
+
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_route_stage_and_outcome_labels()
+    test_disabled_registry_records_nothing()
+    print("🎉 性能指标测试全部通过!")
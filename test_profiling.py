@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+按需请求性能分析测试脚本
+
+测试 profiling 的请求头触发、环形淘汰和管理接口
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import cProfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+import profiling
+from profiling import ProfileStore, RequestProfiler
+
+
+def _make_app(folder, max_files=3, sample_rate=0.0):
+    app = Flask(__name__)
+
+    @app.route('/gallery')
+    def gallery():
+        return 'ok' if sum(i * i for i in range(10000)) else ''
+
+    store = ProfileStore(folder=folder, max_files=max_files)
+    profiling.init_app(app, RequestProfiler(store=store, admin_token='secret', sample_rate=sample_rate))
+    return app.test_client()
+
+
+def test_header_triggers_profile_and_admin_download():
+    """带管理员令牌的请求会被分析，并可以通过管理接口下载"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp)
+
+        assert 'X-Profile-Id' not in client.get('/gallery').headers
+        assert 'X-Profile-Id' not in client.get('/gallery', headers={'X-Profile-Token': 'wrong'}).headers
+
+        response = client.get('/gallery', headers={'X-Profile-Token': 'secret'})
+        name = response.headers['X-Profile-Id']
+
+        assert client.get('/admin/profiles').status_code == 403
+        listing = client.get('/admin/profiles', headers={'X-Profile-Token': 'secret'}).get_json()
+        assert [p['name'] for p in listing['profiles']] == [name]
+        assert listing['profiles'][0]['route'] == '/gallery'
+
+        download = client.get(f'/admin/profiles/{name}', headers={'X-Profile-Token': 'secret'})
+        assert download.status_code == 200 and len(download.data) > 0
+        text = client.get(f'/admin/profiles/{name}?format=text', headers={'X-Profile-Token': 'secret'}).get_data(as_text=True)
+        assert 'cumulative' in text
+        # 令牌不能放在查询参数中
+        assert client.get('/admin/profiles?token=secret').status_code == 403
+
+
+def test_ring_keeps_newest_profiles():
+    """超过最大数量后删除最旧的分析结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp, max_files=2, sample_rate=1.0)
+        for _ in range(4):
+            client.get('/gallery')
+        assert len([n for n in os.listdir(tmp) if n.endswith('.prof')]) == 2
+        assert len([n for n in os.listdir(tmp) if n.endswith('.json')]) == 2
+
+
+def test_one_profile_per_thread():
+    """同一线程已有请求在分析时不再分析，已有的分析器不受影响"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp, sample_rate=1.0)
+        outer = cProfile.Profile()
+        profiling._active.profile = outer
+        try:
+            assert 'X-Profile-Id' not in client.get('/gallery').headers
+            assert profiling._active.profile is outer
+        finally:
+            profiling._active.profile = None
+        assert 'X-Profile-Id' in client.get('/gallery').headers
+        assert profiling._active.profile is None
+
+
+def test_requests_in_event_loop_not_profiled():
+    """在事件循环线程中处理的请求（asgi.py 的生成接口）不做分析"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp, sample_rate=1.0)
+
+        async def request_in_loop():
+            return client.get('/gallery')
+
+        assert 'X-Profile-Id' not in asyncio.run(request_in_loop()).headers
+        assert not any(n.endswith('.prof') for n in os.listdir(tmp))
+
+
+def test_request_id_sanitized_in_file_name():
+    """客户端提供的请求ID中的路径分隔符等字符不会进入文件名"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(folder=os.path.join(tmp, 'profiles'))
+        profiler = cProfile.Profile()
+        name = store.save(profiler, {'route': '/gallery', 'request_id': '../../evil id'})
+        assert '/' not in name and '..' not in name and ' ' not in name
+        assert os.listdir(tmp) == ['profiles'] and store.path_for(name) is not None
+        # 只剩下替换字符时改用随机ID
+        assert '___' not in store.save(profiler, {'route': '/gallery', 'request_id': '///'})
+
+
+def test_rejects_unsafe_names():
+    """下载接口拒绝路径穿越"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(folder=tmp)
+        assert store.path_for('../app.py') is None
+        assert store.path_for('missing.prof') is None
+
+
+if __name__ == "__main__":
+    test_header_triggers_profile_and_admin_download()
+    test_ring_keeps_newest_profiles()
+    test_one_profile_per_thread()
+    test_requests_in_event_loop_not_profiled()
+    test_request_id_sanitized_in_file_name()
+    test_rejects_unsafe_names()
+    print("🎉 请求性能分析测试全部通过!")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+上游限流调度器测试脚本
+
+测试 TokenBucket 的先来先服务排队、截止时间超时、被限流后降速并遵守Retry-After、
+成功后恢复速率，以及排队统计和指标
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics
+from api.rate_limiter import (
+    TokenBucket, RateLimitScheduler, RateLimitTimeout, DEFAULT_THROTTLE_SECONDS, _Slot
+)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+def _metric_value(line_prefix):
+    """从 /metrics 的文本格式中取出一行的值"""
+    for line in metrics.registry.render().splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_fifo_order():
+    """并发名额释放后，排队的请求按到达顺序依次取得名额"""
+    bucket = TokenBucket('test-fifo', requests_per_minute=6000, max_concurrency=1)
+    bucket.acquire()
+    order = []
+
+    def worker(index):
+        bucket.acquire(timeout=5)
+        order.append(index)
+        bucket.release()
+
+    threads = []
+    for index in range(5):
+        thread = threading.Thread(target=worker, args=(index,))
+        thread.start()
+        threads.append(thread)
+        # 确认进入队列后再启动下一个，保证到达顺序
+        _wait_for(lambda: bucket.stats()['queue_depth'] == index + 1)
+
+    bucket.release()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [0, 1, 2, 3, 4]
+    assert bucket.stats()['queue_depth'] == 0 and bucket.in_flight == 0
+
+
+def test_async_waiters_share_queue():
+    """协程和线程在同一个队列中排队，同样按到达顺序取得名额"""
+    bucket = TokenBucket('test-fifo-async', requests_per_minute=6000, max_concurrency=1)
+    bucket.acquire()
+    order = []
+
+    def sync_worker():
+        bucket.acquire(timeout=5)
+        order.append('sync')
+        bucket.release()
+
+    async def main():
+        first = asyncio.ensure_future(bucket.acquire_async(timeout=5))
+        await asyncio.sleep(0.02)
+        thread = threading.Thread(target=sync_worker)
+        thread.start()
+        _wait_for(lambda: bucket.stats()['queue_depth'] == 2)
+        bucket.release()
+        await first
+        order.append('async')
+        bucket.release()
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(main())
+    assert order == ['async', 'sync']
+
+
+def test_deadline_timeout():
+    """截止时间前没有取得名额时抛出RateLimitTimeout，并离开队列"""
+    bucket = TokenBucket('test-timeout', requests_per_minute=6000, max_concurrency=1)
+    bucket.acquire()
+
+    started = time.monotonic()
+    try:
+        bucket.acquire(timeout=0.1)
+        assert False, "应该排队超时"
+    except RateLimitTimeout:
+        pass
+    assert 0.09 <= time.monotonic() - started < 1.0
+
+    try:
+        asyncio.run(bucket.acquire_async(timeout=0.05))
+        assert False, "应该排队超时"
+    except RateLimitTimeout:
+        pass
+
+    stats = bucket.stats()
+    assert stats['timeout_total'] == 2 and stats['queue_depth'] == 0 and stats['acquired_total'] == 1
+
+    # 超时的请求不影响之后的请求
+    bucket.release()
+    bucket.acquire(timeout=1)
+
+
+def test_throttle_halves_rate_and_honours_retry_after():
+    """被限流后速率减半，暂停到Retry-After之后；没有Retry-After时使用默认暂停时间"""
+    bucket = TokenBucket('test-throttle', requests_per_minute=6000, max_concurrency=4)
+    bucket.on_throttled(retry_after=0.2)
+    stats = bucket.stats()
+    assert stats['current_rpm'] == 3000 and stats['throttled_total'] == 1
+    assert 0 < stats['blocked_for_seconds'] <= 0.2
+
+    waited = bucket.acquire(timeout=5)
+    assert waited >= 0.18
+    bucket.release()
+
+    bucket.on_throttled()
+    stats = bucket.stats()
+    assert stats['current_rpm'] == 1500
+    assert DEFAULT_THROTTLE_SECONDS - 1 < stats['blocked_for_seconds'] <= DEFAULT_THROTTLE_SECONDS
+
+    # 速率最低降到每分钟1次
+    slow = TokenBucket('test-throttle-min', requests_per_minute=1, max_concurrency=1)
+    slow.on_throttled(retry_after=0)
+    assert slow.rpm == 1.0
+
+
+def test_slot_reports_quota_errors():
+    """名额内的调用遇到429时按响应头中的Retry-After暂停并降速，其他错误不影响速率"""
+    bucket = TokenBucket('test-slot', requests_per_minute=6000, max_concurrency=2)
+    error = Exception('429 Too Many Requests')
+    error.response = SimpleNamespace(headers={'Retry-After': '0.3'})
+    try:
+        with _Slot(bucket, timeout=1):
+            raise error
+    except Exception:
+        pass
+    assert bucket.rpm == 3000 and bucket.throttled_total == 1
+    assert 0.2 < bucket.blocked_until - time.monotonic() <= 0.3
+
+    try:
+        with _Slot(bucket, timeout=1):
+            raise ValueError('400 INVALID_ARGUMENT')
+    except ValueError:
+        pass
+    assert bucket.rpm == 3000 and bucket.throttled_total == 1 and bucket.in_flight == 0
+
+
+def test_recovery_after_success():
+    """调用成功后速率每次恢复配置值的十分之一（至少1），不超过配置值"""
+    bucket = TokenBucket('test-recovery', requests_per_minute=100, max_concurrency=1)
+    bucket.on_throttled(retry_after=0)
+    bucket.on_throttled(retry_after=0)
+    assert bucket.rpm == 25
+
+    bucket.on_success()
+    assert bucket.rpm == 35
+    for _ in range(10):
+        bucket.on_success()
+    assert bucket.rpm == 100
+
+    small = TokenBucket('test-recovery-small', requests_per_minute=4, max_concurrency=1)
+    small.on_throttled(retry_after=0)
+    small.on_success()
+    assert small.rpm == 3
+
+
+def test_queue_metrics():
+    """排队统计（次数、平均/最大等待、队列深度）和Prometheus指标"""
+    scheduler = RateLimitScheduler(limits={'test-metrics': (6000, 1)}, queue_timeout=5)
+    slot = scheduler.acquire('test-metrics')
+    slot.wait()
+
+    def waiter():
+        with scheduler.acquire('test-metrics'):
+            pass
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    _wait_for(lambda: scheduler.stats()['test-metrics']['queue_depth'] == 1)
+    time.sleep(0.05)
+    with slot:
+        pass
+    thread.join(timeout=5)
+
+    stats = scheduler.stats()['test-metrics']
+    assert stats['acquired_total'] == 2 and stats['queue_depth'] == 0 and stats['in_flight'] == 0
+    assert stats['wait_seconds_max'] >= 0.05 and 0 < stats['wait_seconds_avg'] < stats['wait_seconds_max']
+
+    if metrics.registry.enabled:
+        assert _metric_value('hltraining_upstream_queue_wait_seconds_count{model="test-metrics"}') == 2
+        assert _metric_value('hltraining_upstream_calls_total{model="test-metrics",outcome="success"}') == 2
+
+        # 排队超时也记录为一次调用结果
+        blocker = scheduler.acquire('test-metrics').wait()
+        try:
+            scheduler.acquire('test-metrics', timeout=0.05).wait()
+        except RateLimitTimeout:
+            pass
+        with blocker:
+            pass
+        assert _metric_value('hltraining_upstream_calls_total{model="test-metrics",outcome="queue_timeout"}') == 1
+
+
+if __name__ == "__main__":
+    test_fifo_order()
+    test_async_waiters_share_queue()
+    test_deadline_timeout()
+    test_throttle_halves_rate_and_honours_retry_after()
+    test_slot_reports_quota_errors()
+    test_recovery_after_success()
+    test_queue_metrics()
+    print("🎉 限流调度器测试全部通过!")
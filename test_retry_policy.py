@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+上游调用重试策略与熔断器测试脚本
+
+测试 call_with_retry 的错误分类（异常类型、HTTP状态码、SDK错误码，最后才整词匹配错误信息）、退避重试和熔断功能
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from google.api_core import exceptions as google_exceptions
+
+from api.rate_limiter import is_quota_error
+from api.retry_policy import (
+    call_with_retry, RetryPolicy, CircuitBreaker, CircuitOpenError,
+    is_retryable_error, _breakers
+)
+
+# 测试中不真正等待
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, deadline=10)
+
+
+def test_error_classification():
+    """可重试与不可重试错误的区分"""
+    assert is_retryable_error(Exception("503 UNAVAILABLE"))
+    assert is_retryable_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert is_retryable_error(TimeoutError())
+    assert not is_retryable_error(Exception("400 INVALID_ARGUMENT"))
+    assert not is_retryable_error(FileNotFoundError("missing.png"))
+    assert not is_retryable_error(CircuitOpenError())
+
+
+def _http_error(status, message=''):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(message or f"{status} Error", response=response)
+
+
+class _TencentError(Exception):
+    """和腾讯云SDK的 TencentCloudSDKException 一样带字符串错误码"""
+
+    def __init__(self, code, message=''):
+        super().__init__(f"[TencentCloudSDKException] code:{code} message:{message}")
+        self.code = code
+
+
+def test_status_code_classification():
+    """有HTTP状态码时按状态码判断，不看错误信息中的数字"""
+    assert is_retryable_error(_http_error(503))
+    assert is_retryable_error(_http_error(408))
+    assert is_retryable_error(_http_error(429)) and is_quota_error(_http_error(429))
+    assert not is_retryable_error(_http_error(400, "400 Client Error: retry after 503 ms"))
+    assert not is_retryable_error(_http_error(404))
+    assert not is_quota_error(_http_error(500, "500 Server Error: quota service 429"))
+
+    # google.api_core 异常的code就是HTTP状态码
+    assert is_retryable_error(google_exceptions.ServiceUnavailable("backend overloaded"))
+    assert is_retryable_error(google_exceptions.ResourceExhausted("slow down"))
+    assert is_quota_error(google_exceptions.ResourceExhausted("slow down"))
+    assert not is_retryable_error(google_exceptions.InvalidArgument("bad prompt, try 500 words"))
+    assert not is_retryable_error(google_exceptions.PermissionDenied("API key not valid"))
+
+
+def test_sdk_error_code_classification():
+    """腾讯云SDK的错误码按 "大类" 前缀匹配"""
+    assert is_retryable_error(_TencentError('InternalError'))
+    assert is_retryable_error(_TencentError('FailedOperation.InnerError'))
+    assert is_retryable_error(_TencentError('RequestLimitExceeded.UinLimitExceeded'))
+    assert is_quota_error(_TencentError('LimitExceeded'))
+    assert not is_retryable_error(_TencentError('AuthFailure.SignatureExpire', 'timeout 503'))
+    assert not is_retryable_error(_TencentError('InvalidParameterValue.ImageSizeExceed'))
+    assert not is_quota_error(_TencentError('ResourceNotFound', 'quota'))
+
+
+def test_message_fallback_matches_whole_words():
+    """没有结构化信息时才匹配错误信息，并且只匹配完整的状态码和词"""
+    assert is_retryable_error(Exception("upstream returned 502 Bad Gateway"))
+    assert is_retryable_error(Exception("HTTPSConnectionPool: Read timed out."))
+    assert not is_retryable_error(Exception("failed to read generated_5003.png"))
+    assert not is_retryable_error(Exception("upload_500.png could not be decoded"))
+    assert is_retryable_error(Exception("took 1.503s, 503 UNAVAILABLE"))
+    assert not is_quota_error(Exception("Connection closed after 1429 ms"))
+    assert is_quota_error(Exception("Quota exceeded for aiplatform requests"))
+
+
+def test_retries_until_success():
+    """可重试错误会重试，成功后返回结果"""
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception("503 UNAVAILABLE")
+        return 'ok'
+
+    assert call_with_retry(flaky, service='test-success', policy=FAST_POLICY) == 'ok'
+    assert len(calls) == 3
+
+
+def test_non_retryable_fails_immediately():
+    """不可重试的错误只调用一次"""
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise Exception("400 INVALID_ARGUMENT")
+
+    try:
+        call_with_retry(bad_request, service='test-bad-request', policy=FAST_POLICY)
+        assert False, "应该抛出异常"
+    except Exception as e:
+        assert 'INVALID_ARGUMENT' in str(e)
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_opens_and_fails_fast():
+    """连续失败达到阈值后熔断，后续请求不再调用上游"""
+    _breakers['test-circuit'] = CircuitBreaker('test-circuit', failure_threshold=3, reset_timeout=60)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise Exception("503 UNAVAILABLE")
+
+    try:
+        call_with_retry(down, service='test-circuit', policy=FAST_POLICY)
+    except Exception:
+        pass
+    assert len(calls) == 3
+    assert _breakers['test-circuit'].state == CircuitBreaker.OPEN
+
+    try:
+        call_with_retry(down, service='test-circuit', policy=FAST_POLICY)
+        assert False, "应该快速失败"
+    except CircuitOpenError:
+        pass
+    assert len(calls) == 3
+
+
+if __name__ == "__main__":
+    test_error_classification()
+    test_status_code_classification()
+    test_sdk_error_code_classification()
+    test_message_fallback_matches_whole_words()
+    test_retries_until_success()
+    test_non_retryable_fails_immediately()
+    test_circuit_breaker_opens_and_fails_fast()
+    print("🎉 重试策略与熔断器测试全部通过!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+作品搜索索引测试脚本
+
+测试中文按字和二元组分词、相关度排序和分页、分类筛选、作品集数据变化时的增量更新，
+以及其他进程修改数据文件后的同步
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import search_index
+from search_index import SearchIndex
+
+
+def _artwork(artwork_id, title, artist_name='小朋友', category='animals', description='', prompts=None):
+    return {'id': artwork_id, 'title': title, 'artist_name': artist_name, 'category': category,
+            'description': description, 'prompts': prompts or [], 'likes': 0}
+
+
+ARTWORKS = [
+    _artwork('a1', '会飞的小猫', artist_name='王小明', prompts=['一只长着翅膀的小猫在云上']),
+    _artwork('a2', '机器人朋友', artist_name='李华', category='characters', description='小猫和机器人一起玩'),
+    _artwork('a3', 'Space Rocket', artist_name='Tom', category='objects', prompts=['a red rocket flying to the moon']),
+    _artwork('a4', '大海', artist_name='小明同学', category='nature'),
+]
+
+
+def test_tokenize():
+    """中文输出单字和二元组，英文按单词小写，全角字符规范化"""
+    assert search_index.tokenize('小猫ＡＢＣ cat') == ['小', '猫', '小猫', 'abc', 'cat']
+    assert search_index.query_terms('王小明') == ['王小', '小明']
+    assert search_index.query_terms('猫') == ['猫']
+
+
+def test_ranking_and_pagination():
+    """标题和作者命中排在说明命中之前；所有词项都命中的优先，没有时退回到任意词项"""
+    index = SearchIndex()
+    index.refresh(ARTWORKS)
+
+    found = index.search('小猫')
+    assert found['total'] == 2
+    assert [item['artwork']['id'] for item in found['results']] == ['a1', 'a2']
+
+    # 作者名同样命中时，内容较短的作品分数更高
+    assert [item['artwork']['id'] for item in index.search('小明')['results']] == ['a4', 'a1']
+    assert [item['artwork']['id'] for item in index.search('ROCKET moon')['results']] == ['a3']
+    # "小猫 大海" 没有作品同时命中，退回到任意词项
+    assert index.search('小猫 大海')['total'] == 3
+
+    page = index.search('小猫', offset=1, limit=1)
+    assert page['total'] == 2 and [item['artwork']['id'] for item in page['results']] == ['a2']
+    assert [item['artwork']['id'] for item in index.search('小猫', category='characters')['results']] == ['a2']
+    assert index.search('   ')['total'] == 0
+
+
+def test_incremental_refresh():
+    """修改、删除和新增的作品都能反映到索引中"""
+    index = SearchIndex()
+    index.refresh(ARTWORKS)
+    updated = [dict(ARTWORKS[0], title='彩虹独角兽')] + ARTWORKS[1:3] + [_artwork('a5', '独角兽')]
+    index.refresh(updated)
+
+    assert {item['artwork']['id'] for item in index.search('独角兽')['results']} == {'a1', 'a5'}
+    assert index.search('大海')['total'] == 0
+    # 提示词没变，仍然可以搜到
+    assert index.search('翅膀')['results'][0]['artwork']['id'] == 'a1'
+    assert len(index) == 4
+
+
+def test_sync_with_data_file():
+    """数据文件被其他进程修改后，搜索前自动同步"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, 'gallery_data.json')
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump(ARTWORKS, f, ensure_ascii=False)
+        index = search_index.get_index(data_file)
+        assert search_index.get_index(data_file) is index
+        assert index.search('机器人')['total'] == 1
+
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump(ARTWORKS + [_artwork('a6', '机器人小狗', category='characters')], f, ensure_ascii=False)
+        assert index.search('机器人')['total'] == 2
+
+
+if __name__ == "__main__":
+    test_tokenize()
+    test_ranking_and_pagination()
+    test_incremental_refresh()
+    test_sync_with_data_file()
+    print("🎉 作品搜索测试全部通过!")
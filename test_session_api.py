@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+会话接口测试脚本
+
+用Flask测试客户端请求 /session/<id>/info、/versions 和 /selected-versions，
+测试ETag响应头、If-None-Match 命中时返回304，以及压缩后的响应按弱比较匹配；
+/session/<id>/snapshot 的类型筛选、分页、查询参数校验和304
+"""
+
+import sys
+import os
+import json
+import gzip
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app_test_support import import_app
+from creation_session_manager import CreationSessionManager
+
+app_module = import_app()
+
+SESSION_ENDPOINTS = ('info', 'versions', 'selected-versions')
+
+
+@contextmanager
+def _client():
+    """会话保存在临时目录中的测试客户端，返回 (客户端, 会话管理器, 临时目录)"""
+    original = app_module.session_manager
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'))
+        app_module.session_manager = manager
+        try:
+            yield app_module.app.test_client(), manager, tmp
+        finally:
+            app_module.session_manager = original
+
+
+def _add_image(manager, session_id, tmp, index, note=''):
+    source = os.path.join(tmp, f'generated_{index}.png')
+    with open(source, 'wb') as f:
+        f.write(b'png')
+    return manager.add_version(session_id, 'image', source, {'prompt': f'第{index}张', 'note': note}, move=True)
+
+
+def test_etag_and_not_modified():
+    """响应带弱ETag；If-None-Match 相同时返回304，会话修改后返回新内容"""
+    with _client() as (client, manager, tmp):
+        session_id = manager.create_session()
+        version_id = _add_image(manager, session_id, tmp, 1)['version_id']
+
+        for endpoint in SESSION_ENDPOINTS:
+            url = f'/session/{session_id}/{endpoint}'
+            response = client.get(url)
+            assert response.status_code == 200 and response.get_json()['success']
+            assert response.headers['ETag'] == 'W/"session-1"'
+            assert response.headers['Cache-Control'] == 'no-cache'
+
+            not_modified = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+            assert not_modified.status_code == 304 and not_modified.get_data() == b''
+            assert not_modified.headers['ETag'] == 'W/"session-1"'
+            # 强ETag形式的同一个值按弱比较同样匹配
+            assert client.get(url, headers={'If-None-Match': '"session-1"'}).status_code == 304
+
+        manager.select_version(session_id, version_id)
+        url = f'/session/{session_id}/selected-versions'
+        changed = client.get(url, headers={'If-None-Match': 'W/"session-1"'})
+        assert changed.status_code == 200 and changed.headers['ETag'] == 'W/"session-2"'
+        assert changed.get_json()['selected']['image']['version_id'] == version_id
+
+        # 不存在的会话没有ETag
+        missing = client.get('/session/missing/info')
+        assert missing.status_code == 404 and 'ETag' not in missing.headers
+
+
+def test_compressed_response_matches_weakly():
+    """gzip压缩后的响应使用同一个弱ETag，带着它重新验证时返回304"""
+    with _client() as (client, manager, tmp):
+        session_id = manager.create_session()
+        for index in range(20):
+            _add_image(manager, session_id, tmp, index, note='从创作会话保存的版本说明' * 4)
+
+        url = f'/session/{session_id}/versions'
+        plain = client.get(url)
+        compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert compressed.headers['ETag'] == plain.headers['ETag'] == 'W/"session-20"'
+        assert json.loads(gzip.decompress(compressed.get_data())) == plain.get_json()
+
+        revalidated = client.get(url, headers={'Accept-Encoding': 'gzip',
+                                               'If-None-Match': compressed.headers['ETag']})
+        assert revalidated.status_code == 304 and 'Content-Encoding' not in revalidated.headers
+
+
+def test_snapshot_endpoint():
+    """快照接口按类型筛选和分页，limit=0只返回会话信息，参数无效时返回400，未修改时返回304"""
+    with _client() as (client, manager, tmp):
+        session_id = manager.create_session()
+        ids = [_add_image(manager, session_id, tmp, index)['version_id'] for index in range(5)]
+        manager.select_version(session_id, ids[0])
+        url = f'/session/{session_id}/snapshot'
+
+        full = client.get(url)
+        data = full.get_json()
+        assert full.status_code == 200 and full.headers['ETag'] == 'W/"session-6"'
+        assert data['total'] == 5 and data['revision'] == 6 and len(data['versions']) == 5
+        assert data['selected']['image']['version_id'] == ids[0]
+
+        page = client.get(url, query_string={'type': 'image', 'offset': 1, 'limit': 2}).get_json()
+        assert page['total'] == 5 and [v['version_id'] for v in page['versions']] == [ids[3], ids[2]]
+        assert client.get(url, query_string={'type': 'model'}).get_json()['versions'] == []
+        assert client.get(url, query_string={'offset': 10}).get_json()['versions'] == []
+
+        summary = client.get(url, query_string={'limit': 0}).get_json()
+        assert summary['versions'] == [] and summary['total'] == 5
+        assert summary['session']['stats']['image_versions'] == 5
+
+        for query in ({'type': 'video'}, {'offset': 'abc'}, {'limit': '1.5'}, {'offset': -1}, {'limit': -2}):
+            response = client.get(url, query_string=query)
+            assert response.status_code == 400, query
+
+        assert client.get(url, headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+        assert client.get('/session/missing/snapshot').status_code == 404
+
+
+if __name__ == "__main__":
+    test_etag_and_not_modified()
+    test_compressed_response_matches_weakly()
+    test_snapshot_endpoint()
+    print("🎉 会话接口测试全部通过!")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+创作会话事件日志测试脚本
+
+测试修改只追加事件、达到阈值和关闭会话时压缩为快照、崩溃留下的半行和重复事件的处理，
+多个管理器实例（多进程）之间能看到彼此的修改，以及会话修订号和快照
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from creation_session_manager import CreationSessionManager, load_session
+
+
+def _add_image(manager, session_id, tmp, index):
+    source = os.path.join(tmp, f'generated_{index}.png')
+    with open(source, 'wb') as f:
+        f.write(b'png')
+    return manager.add_version(session_id, 'image', source, {'prompt': f'第{index}张'}, move=True)
+
+
+def _session_files(manager, session_id):
+    session_dir = manager.session_dir(session_id)
+    return os.path.join(session_dir, 'session.json'), os.path.join(session_dir, 'events.jsonl')
+
+
+def test_mutations_append_events():
+    """添加和选择版本只追加事件，不重写快照；重新加载后状态一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'), compact_events=100)
+        session_id = manager.create_session()
+        snapshot, log = _session_files(manager, session_id)
+        with open(snapshot, 'rb') as f:
+            original_snapshot = f.read()
+
+        first = _add_image(manager, session_id, tmp, 1)
+        second = _add_image(manager, session_id, tmp, 2)
+        manager.select_version(session_id, first['version_id'])
+        manager.select_version(session_id, second['version_id'])
+        manager.delete_version(session_id, first['version_id'])
+
+        with open(snapshot, 'rb') as f:
+            assert f.read() == original_snapshot
+        with open(log, 'r', encoding='utf-8') as f:
+            ops = [json.loads(line)['op'] for line in f]
+        assert ops == ['add_version', 'add_version', 'select_version', 'select_version', 'delete_version']
+
+        selected = manager.get_selected_versions(session_id)['image']
+        assert selected['version_id'] == second['version_id']
+        data = load_session(manager.session_dir(session_id))
+        assert [v['version_id'] for v in data['versions']] == [second['version_id']]
+        assert data['current_step'] == 'image_generated' and 'log_seq' not in data
+
+
+def test_compaction_and_close():
+    """事件数达到阈值时压缩为快照；关闭会话时也会压缩"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'), compact_events=4)
+        session_id = manager.create_session()
+        snapshot, log = _session_files(manager, session_id)
+        for index in range(5):
+            _add_image(manager, session_id, tmp, index)
+
+        with open(snapshot, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        assert data['log_seq'] == 4 and len(data['versions']) == 4
+        with open(log, 'r', encoding='utf-8') as f:
+            assert len(f.readlines()) == 1
+
+        manager.close_session(session_id)
+        assert os.path.getsize(log) == 0
+        data = load_session(manager.session_dir(session_id))
+        assert data['status'] == 'completed' and len(data['versions']) == 5
+
+
+def test_crash_recovery():
+    """快照写入后日志未清空时重复事件被跳过；追加到一半的行被忽略并在下次追加前截掉"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'), compact_events=100)
+        session_id = manager.create_session()
+        snapshot, log = _session_files(manager, session_id)
+        _add_image(manager, session_id, tmp, 1)
+        _add_image(manager, session_id, tmp, 2)
+
+        # 模拟压缩时在清空日志之前崩溃：快照已经包含两个事件
+        with open(snapshot, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data.update(load_session(manager.session_dir(session_id)), log_seq=2)
+        with open(snapshot, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        # 再模拟追加到一半时崩溃
+        with open(log, 'ab') as f:
+            f.write(b'{"seq": 3, "op": "add_ver')
+
+        restarted = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'))
+        assert len(restarted.get_session_versions(session_id)) == 2
+        _add_image(restarted, session_id, tmp, 3)
+        assert len(load_session(restarted.session_dir(session_id))['versions']) == 3
+        with open(log, 'r', encoding='utf-8') as f:
+            assert [json.loads(line)['seq'] for line in f] == [1, 2, 3]
+
+
+def test_other_instance_sees_changes():
+    """另一个管理器实例（另一个进程）的追加和压缩都能被读到"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'sessions')
+        writer = CreationSessionManager(sessions_folder=folder, compact_events=3)
+        reader = CreationSessionManager(sessions_folder=folder, compact_events=3)
+        session_id = writer.create_session()
+        assert reader.get_session_versions(session_id) == []
+
+        _add_image(writer, session_id, tmp, 1)
+        assert len(reader.get_session_versions(session_id)) == 1
+        for index in range(2, 6):
+            _add_image(writer, session_id, tmp, index)
+        assert len(reader.get_session_versions(session_id)) == 5
+        _add_image(reader, session_id, tmp, 6)
+        assert len(writer.get_session_info(session_id)['versions']) == 6
+
+
+def test_interleaved_instances():
+    """两个管理器实例（两个worker）交错修改同一会话：读取状态之后、追加之前另一个实例追加的事件不会被截掉"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'sessions')
+        first = CreationSessionManager(sessions_folder=folder)
+        second = CreationSessionManager(sessions_folder=folder)
+        session_id = first.create_session()
+        _add_image(first, session_id, tmp, 1)
+        _add_image(second, session_id, tmp, 2)
+
+        # 第一个实例复制文件时（已读取会话状态，尚未追加），第二个实例完成一次添加
+        transfer = first._transfer_file
+        def transfer_with_interleaving(src, dest, move):
+            transfer(src, dest, move)
+            _add_image(second, session_id, tmp, 3)
+        first._transfer_file = transfer_with_interleaving
+        moved = _add_image(first, session_id, tmp, 4)
+        first._transfer_file = transfer
+
+        first.close_session(session_id)
+        data = load_session(second.session_dir(session_id))
+        assert data['status'] == 'completed' and len(data['versions']) == 4
+        assert moved['version_id'] in [v['version_id'] for v in data['versions']]
+        assert len(second.get_session_versions(session_id)) == 4
+        assert first.get_revision(session_id) == second.get_revision(session_id) == 5
+        # 所有版本引用的文件都在会话目录中
+        for version in data['versions']:
+            assert os.path.exists(version['file_path'])
+
+
+def _add_images_in_process(folder, session_id, tmp, start, count):
+    manager = CreationSessionManager(sessions_folder=folder, compact_events=8)
+    for index in range(start, start + count):
+        assert _add_image(manager, session_id, tmp, index)['success']
+
+
+def test_concurrent_processes():
+    """两个进程同时向同一会话添加版本（期间还会压缩），所有事件都保留，序号连续"""
+    import multiprocessing
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'sessions')
+        session_id = CreationSessionManager(sessions_folder=folder).create_session()
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        workers = [context.Process(target=_add_images_in_process, args=(folder, session_id, tmp, start, 30))
+                   for start in (0, 100)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            assert worker.exitcode == 0
+
+        manager = CreationSessionManager(sessions_folder=folder)
+        assert len(manager.get_session_versions(session_id)) == 60
+        assert manager.get_revision(session_id) == 60
+
+
+def test_revision_increases():
+    """每次修改修订号加一，压缩后不变，不存在的会话返回None"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'sessions')
+        manager = CreationSessionManager(sessions_folder=folder, compact_events=2)
+        session_id = manager.create_session()
+        assert manager.get_revision(session_id) == 0 and manager.get_revision('missing') is None
+        version_id = _add_image(manager, session_id, tmp, 1)['version_id']
+        manager.select_version(session_id, version_id)
+        _add_image(manager, session_id, tmp, 2)
+        assert manager.get_revision(session_id) == 3
+        assert CreationSessionManager(sessions_folder=folder).get_revision(session_id) == 3
+
+
+def test_session_snapshot():
+    """快照一次返回会话信息、按类型筛选和分页的版本列表、选择的版本和修订号"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = CreationSessionManager(sessions_folder=os.path.join(tmp, 'sessions'))
+        session_id = manager.create_session()
+        ids = [_add_image(manager, session_id, tmp, index)['version_id'] for index in range(5)]
+        manager.select_version(session_id, ids[1])
+
+        snapshot = manager.get_session_snapshot(session_id, 'image', offset=1, limit=2)
+        assert snapshot['total'] == 5 and snapshot['revision'] == 6
+        assert [v['version_id'] for v in snapshot['versions']] == [ids[3], ids[2]]
+        assert snapshot['versions'][0]['url_path'].startswith('/session-files/')
+        assert snapshot['selected']['image']['version_id'] == ids[1]
+        assert snapshot['session']['stats']['image_versions'] == 5 and 'versions' not in snapshot['session']
+        assert manager.get_session_snapshot(session_id, 'model')['versions'] == []
+        assert manager.get_session_snapshot('missing') is None
+
+
+if __name__ == "__main__":
+    test_mutations_append_events()
+    test_compaction_and_close()
+    test_crash_recovery()
+    test_other_instance_sees_changes()
+    test_interleaved_instances()
+    test_concurrent_processes()
+    test_revision_increases()
+    test_session_snapshot()
+    print("🎉 会话事件日志测试全部通过!")
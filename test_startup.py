@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+启动耗时测试脚本
+
+测试 startup 的延迟导入计时、第一个请求的记录，以及导入应用时不加载重量级依赖
+"""
+
+import sys
+import os
+import json
+import subprocess
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+import startup
+
+
+def test_lazy_import_records_first_import_only():
+    """第一次导入记录耗时，之后直接返回已导入的模块"""
+    sys.modules.pop('colorsys', None)
+    module = startup.lazy_import('colorsys')
+    assert module is sys.modules['colorsys']
+    first = startup.report()['imports']['colorsys']
+
+    assert startup.lazy_import('colorsys') is module
+    assert startup.report()['imports']['colorsys'] == first
+
+
+def test_first_request_is_recorded():
+    """init_app记录应用加载时间和第一个请求的时间"""
+    os.environ['STARTUP_WARMUP'] = 'false'
+    try:
+        app = Flask(__name__)
+
+        @app.route('/')
+        def index():
+            return 'ok'
+
+        startup.init_app(app)
+        app.test_client().get('/')
+    finally:
+        os.environ.pop('STARTUP_WARMUP', None)
+
+    events = startup.report()['events']
+    assert 0 < events['app_loaded'] <= events['first_request']
+
+
+def test_import_app_skips_heavy_modules():
+    """在新进程中导入app，重量级依赖都不应出现在 sys.modules 中"""
+    heavy = ['cv2', 'numpy', 'google.generativeai', 'google.genai', 'tencentcloud']
+    code = ("import sys, json; import app; "
+            "print(json.dumps([name for name in sys.argv[1:] if name in sys.modules]))")
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, LOG_LEVEL='WARNING', STARTUP_WARMUP='false')
+    proc = subprocess.run([sys.executable, '-c', code] + heavy, cwd=root_dir, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+
+
+if __name__ == "__main__":
+    test_lazy_import_records_first_import_only()
+    test_first_request_is_recorded()
+    test_import_app_skips_heavy_modules()
+    print("🎉 启动耗时测试全部通过!")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+静态资源构建测试脚本
+
+测试 static_assets 的JS/CSS压缩、带哈希的文件名、url_for改写、预压缩文件和长期缓存响应头
+"""
+
+import sys
+import os
+import gzip
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, render_template_string
+
+import static_assets
+from static_assets import minify_js, minify_css, build
+
+
+def test_minify_keeps_strings_and_regex():
+    """注释和空白被去掉，字符串、模板字符串和正则表达式保持不变"""
+    source = (
+        "// 注释\n"
+        "const re = /[/]\\d+/g;  /* 块注释 */\n"
+        "const url = 'http://example.com';\n"
+        "const html = `<div>  ${ name }  </div>`;\n"
+        "let x = a + +b\n"
+        "let y = 1\n"
+    )
+    result = minify_js(source)
+    assert '注释' not in result
+    assert "/[/]\\d+/g" in result
+    assert "'http://example.com'" in result
+    assert "`<div>  ${name}  </div>`" in result
+    assert 'a+ +b' in result
+    # 保留换行，避免自动分号插入出错
+    assert 'let x=a+ +b\nlet y=1' in result
+
+    assert minify_css('.a  >  .b { color : red ; content: "a  b" } /* x */') == '.a>.b{color :red;content:"a  b"}\n'
+
+
+def test_url_for_uses_fingerprinted_file():
+    """构建后url_for指向带哈希的文件，响应头带长期缓存；源文件修改后回退到原始文件"""
+    with tempfile.TemporaryDirectory() as folder:
+        static_folder = os.path.join(folder, 'static')
+        os.makedirs(os.path.join(static_folder, 'js'))
+        source_path = os.path.join(static_folder, 'js', 'main.js')
+        with open(source_path, 'w', encoding='utf-8') as f:
+            f.write("// 主页脚本\nconsole.log('hello');\n")
+
+        manifest = build(static_folder)
+        hashed = manifest['assets']['js/main.js']['path']
+        assert hashed.startswith('dist/js/main.') and hashed.endswith('.js')
+
+        os.environ['STATIC_FINGERPRINT'] = 'true'
+        try:
+            app = Flask(__name__, static_folder=static_folder)
+            static_assets.init_app(app)
+            client = app.test_client()
+            with app.test_request_context():
+                url = render_template_string("{{ url_for('static', filename='js/main.js') }}")
+            assert url == '/static/' + hashed
+
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.get_data(as_text=True) == "console.log('hello');\n"
+            assert 'immutable' in response.headers['Cache-Control']
+            assert 'max-age=31536000' in response.headers['Cache-Control']
+            response.close()
+
+            # 构建时预压缩的版本按 Accept-Encoding 直接返回
+            response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert response.mimetype in ('text/javascript', 'application/javascript')
+            assert gzip.decompress(response.get_data()) == b"console.log('hello');\n"
+            response.close()
+
+            with open(source_path, 'a', encoding='utf-8') as f:
+                f.write("console.log('changed');\n")
+            app = Flask(__name__, static_folder=static_folder)
+            static_assets.init_app(app)
+            with app.test_request_context():
+                url = render_template_string("{{ url_for('static', filename='js/main.js') }}")
+            assert url == '/static/js/main.js'
+        finally:
+            os.environ.pop('STATIC_FINGERPRINT', None)
+
+
+if __name__ == "__main__":
+    test_minify_keeps_strings_and_regex()
+    test_url_for_uses_fingerprinted_file()
+    print("🎉 静态资源测试全部通过!")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+上传文件接收测试脚本
+
+测试上传图片的流式保存、按内容去重、文件头检查和大小限制
+"""
+
+import sys
+import os
+import io
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, request, jsonify
+from PIL import Image
+
+import upload_ingest
+from upload_ingest import UploadRejected
+
+
+def _png_bytes(color='red', size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _make_app(upload_folder):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = upload_folder
+    upload_ingest.init_app(app)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        try:
+            result = upload_ingest.ingest(request.files['sketch'], upload_folder)
+        except UploadRejected as e:
+            return jsonify({'error': e.description}), e.code
+        return jsonify({'path': result.path, 'reused': result.reused, 'sha256': result.sha256})
+
+    return app
+
+
+def _post(client, data, filename='sketch.png'):
+    return client.post('/upload', data={'sketch': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_identical_uploads_are_deduplicated():
+    """同一张图片上传两次只保存一份，第二次复用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp).test_client()
+        first = _post(client, _png_bytes()).get_json()
+        second = _post(client, _png_bytes(), filename='again.png').get_json()
+        other = _post(client, _png_bytes('blue')).get_json()
+
+        assert first['path'] == second['path'] and not first['reused'] and second['reused']
+        assert other['path'] != first['path']
+        # 只剩两个正式文件，临时文件都已清理
+        assert sorted(os.listdir(tmp)) == sorted(os.path.basename(r['path']) for r in (first, other))
+
+
+def test_invalid_header_rejected():
+    """不是图片的文件被拒绝，且不留下临时文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_app(tmp).test_client()
+        response = _post(client, b'<html>not an image</html>' * 10)
+        assert response.status_code == 415
+        assert _post(client, b'BM').status_code == 415
+        assert os.listdir(tmp) == []
+
+
+def test_oversized_upload_rejected():
+    """超过大小上限时停止接收并返回413"""
+    os.environ['UPLOAD_MAX_SIZE_MB'] = '0.01'
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = _make_app(tmp).test_client()
+            data = _png_bytes() + b'\x00' * 20000
+            assert _post(client, data).status_code == 413
+            assert os.listdir(tmp) == []
+    finally:
+        del os.environ['UPLOAD_MAX_SIZE_MB']
+
+
+def test_derived_paths():
+    """派生文件路径与原图同名，原图复用时派生文件也能复用"""
+    assert upload_ingest.derived_path('uploads/sketch_ab.png', 'processed') == 'uploads/sketch_ab_processed.png'
+    temp = upload_ingest.atomic_temp_path('uploads/sketch_ab_processed.png')
+    assert temp.startswith('uploads/sketch_ab_processed.') and temp.endswith('.tmp.png')
+
+
+if __name__ == "__main__":
+    test_identical_uploads_are_deduplicated()
+    test_invalid_header_rejected()
+    test_oversized_upload_rejected()
+    test_derived_paths()
+    print("🎉 上传文件接收测试全部通过!")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+上游调用步骤测试脚本
+
+测试同一份步骤生成器在同步执行（Flask线程）和协程执行（asgi.py）下结果一致，
+以及上游异常、限流名额在两种执行方式下的处理
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.upstream import UpstreamCall, Sleep, run_steps, run_steps_async
+from api.rate_limiter import RateLimitScheduler, RateLimitTimeout
+from api.retry_policy import RetryPolicy
+
+# 测试中不真正等待
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, deadline=10)
+
+
+def _double(x):
+    return x * 2
+
+
+async def _double_async(x):
+    await asyncio.sleep(0)
+    return x * 2
+
+
+def _flow(calls):
+    """两次上游调用，中间等待一次"""
+    first = yield UpstreamCall(_double, 1, async_func=_double_async, service='test-steps', policy=FAST_POLICY)
+    calls.append(first)
+    yield Sleep(0)
+    second = yield UpstreamCall(_double, first, service='test-steps', policy=FAST_POLICY)
+    calls.append(second)
+    return first + second
+
+
+def test_sync_and_async_give_same_result():
+    """同步和协程执行同一个流程，结果一致"""
+    sync_calls, async_calls = [], []
+    assert run_steps(_flow(sync_calls)) == 6
+    assert asyncio.run(run_steps_async(_flow(async_calls))) == 6
+    assert sync_calls == async_calls == [2, 4]
+
+
+def test_errors_raised_inside_flow():
+    """上游异常在 yield 处抛出，流程可以自己捕获"""
+    def broken():
+        raise FileNotFoundError("missing.png")
+
+    def flow():
+        try:
+            yield UpstreamCall(broken, service='test-steps-error', policy=FAST_POLICY)
+        except FileNotFoundError as e:
+            return f"handled: {e}"
+
+    assert run_steps(flow()) == "handled: missing.png"
+    assert asyncio.run(run_steps_async(flow())) == "handled: missing.png"
+
+
+def test_retry_in_async_mode():
+    """协程执行时同样按重试策略重试"""
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise Exception("503 UNAVAILABLE")
+        return 'ok'
+
+    def flow():
+        return (yield UpstreamCall(None, async_func=flaky, service='test-steps-retry', policy=FAST_POLICY))
+
+    assert asyncio.run(run_steps_async(flow())) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_async_rate_limit_does_not_block_loop():
+    """限流排队时事件循环中的其他协程继续执行"""
+    scheduler = RateLimitScheduler({'test-model': (600, 1)})
+
+    def flow():
+        slot = yield scheduler.acquire('test-model')
+        with slot:
+            yield Sleep(0.1)
+        return time.monotonic()
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.02)
+
+        results = await asyncio.gather(run_steps_async(flow()), run_steps_async(flow()), ticker())
+        return results, ticks
+
+    (first, second, _), ticks = asyncio.run(main())
+    # 并发名额只有1个，两个流程依次执行
+    assert abs(second - first) >= 0.09
+    assert len(ticks) == 5
+    assert scheduler.stats()['test-model']['in_flight'] == 0
+
+
+def test_failed_image_call_is_not_followed_by_more_calls():
+    """文字生成图片的上游调用失败（重试用完或排队超时）后直接抛出，不再发起其他上游调用"""
+    from api.nano_banana import NanoBananaAPI
+    api = NanoBananaAPI()
+    if api.client is None:
+        print("⚠️ 未安装Gemini客户端，跳过")
+        return
+
+    for error in (ValueError('503 UNAVAILABLE'), RateLimitTimeout('排队超时')):
+        steps = api.generate_image_from_text_steps('一只小猫')
+        assert isinstance(next(steps), UpstreamCall)
+        try:
+            steps.throw(error)
+            assert False, "应该直接抛出上游错误"
+        except type(error) as raised:
+            assert raised is error
+
+
+if __name__ == "__main__":
+    test_sync_and_async_give_same_result()
+    test_errors_raised_inside_flow()
+    test_retry_in_async_mode()
+    test_async_rate_limit_does_not_block_loop()
+    test_failed_image_call_is_not_followed_by_more_calls()
+    print("🎉 上游调用步骤测试全部通过!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+视频封面和预览测试脚本
+
+测试封面图和低分辨率预览视频的生成、视频统计信息、已有结果的复用和无效文件处理
+"""
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import video_processing
+
+
+def _write_clip(path, seconds=2, fps=24, size=(640, 360)):
+    """写一段画面颜色逐帧变化的测试视频"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(seconds * fps):
+        frame = np.full((size[1], size[0], 3), (i * 5) % 256, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_poster_and_preview():
+    """生成缩小的封面和预览视频，统计信息正确"""
+    with tempfile.TemporaryDirectory() as tmp:
+        video = _write_clip(os.path.join(tmp, 'video.mp4'))
+        info = video_processing.process_video(video)
+
+        assert info['width'] == 640 and info['height'] == 360
+        assert info['fps'] == 24 and info['duration'] == 2
+        assert info['poster'] == os.path.join(tmp, 'video_poster.jpg')
+        poster = cv2.imread(info['poster'])
+        assert poster.shape[:2] == (360, 640)
+
+        assert info['preview'] and os.path.exists(info['preview'])
+        capture = cv2.VideoCapture(info['preview'])
+        assert int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) == 320
+        assert int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) == 180
+        capture.release()
+        assert info['preview_bytes'] == os.path.getsize(info['preview'])
+
+        # 复用已经生成的封面和预览
+        mtime = os.path.getmtime(info['poster'])
+        reused = video_processing.process_video(video, reuse_existing=True)
+        assert reused['poster'] == info['poster'] and reused['preview'] == info['preview']
+        assert os.path.getmtime(info['poster']) == mtime
+
+
+def test_invalid_video():
+    """无法解码的文件返回None，不抛出异常"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'broken.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'not a video file')
+        assert video_processing.process_video(path) is None
+        assert video_processing.find_renditions(path) == {'poster': None, 'preview': None}
+
+
+def test_failed_poster_write_leaves_no_temp_file():
+    """封面写入失败时不留下临时文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        video = _write_clip(os.path.join(tmp, 'video.mp4'))
+
+        def failing_imwrite(path, frame, params):
+            # 写了一部分后失败（例如磁盘已满）
+            with open(path, 'wb') as f:
+                f.write(b'partial')
+            return False
+
+        failing_cv2 = SimpleNamespace(**{name: getattr(cv2, name) for name in dir(cv2) if not name.startswith('_')})
+        failing_cv2.imwrite = failing_imwrite
+        capture = cv2.VideoCapture(video)
+        try:
+            assert video_processing._write_poster(failing_cv2, capture, video, 24, 48, 640, 360) is None
+        finally:
+            capture.release()
+        assert sorted(os.listdir(tmp)) == ['video.mp4']
+
+
+if __name__ == "__main__":
+    test_poster_and_preview()
+    test_invalid_video()
+    test_failed_poster_write_leaves_no_temp_file()
+    print("🎉 视频处理测试全部通过!")
@@ -0,0 +1,220 @@
+"""
+上传文件接收 - 边接收边计算SHA-256、检查图片文件头，相同内容的上传直接复用已保存的文件
+
+以前每次上传都用新的uuid文件名整个保存一份，预处理再写一份 _processed 副本，
+同一张手绘图反复上传（“再生成一次”、换个风格）会在 uploads/ 中留下大量相同的文件。
+
+现在的流程：
+    1. 表单解析时每个上传文件直接流式写入 uploads/ 下的临时文件（不整体缓存在内存中），
+       同时计算SHA-256；第一个数据块到达时就检查文件头，不是PNG/JPEG/GIF/BMP立即拒绝，
+       超过 UPLOAD_MAX_SIZE_MB 时立即停止接收
+    2. ingest() 用PIL只读取图片头检查尺寸，然后按哈希命名（sketch_<哈希>.png）：
+       文件已存在就删除临时文件直接复用，否则原子地重命名为正式文件
+    3. 预处理结果的文件名由原图文件名派生，原图相同时预处理结果同样复用
+
+被拒绝的上传抛出 UploadRejected（werkzeug的HTTPException，带状态码和中文说明）。
+
+环境变量：
+    UPLOAD_MAX_SIZE_MB   单个上传文件的大小上限，默认 10（整个请求仍受 MAX_CONTENT_LENGTH 限制）
+    UPLOAD_MAX_PIXELS    图片像素数上限（宽×高），默认 25000000，防止解码超大图片耗尽内存
+"""
+
+import os
+import uuid
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+
+from PIL import Image
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# 文件头 -> (格式名, 保存时使用的扩展名)
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'PNG', 'png'),
+    (b'\xff\xd8\xff', 'JPEG', 'jpg'),
+    (b'GIF87a', 'GIF', 'gif'),
+    (b'GIF89a', 'GIF', 'gif'),
+    (b'BM', 'BMP', 'bmp'),
+)
+_HEADER_SIZE = max(len(signature) for signature, _, _ in IMAGE_SIGNATURES)
+
+
+class UploadRejected(HTTPException):
+    """上传的文件不符合要求"""
+
+    def __init__(self, description: str, code: int = 400):
+        self.code = code
+        super().__init__(description)
+
+
+def max_upload_bytes() -> int:
+    return int(float(os.getenv('UPLOAD_MAX_SIZE_MB', '10')) * 1024 * 1024)
+
+
+def max_upload_pixels() -> int:
+    return int(os.getenv('UPLOAD_MAX_PIXELS', '25000000'))
+
+
+def sniff_image_type(header: bytes):
+    """根据文件头判断图片格式，返回 (格式名, 扩展名)，不是支持的图片时返回None"""
+    for signature, image_format, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format, extension
+    return None
+
+
+class IngestStream:
+    """
+    表单解析时写入上传数据的文件对象：数据直接写入临时文件，同时计算哈希、检查文件头和大小。
+    werkzeug会在写完后 seek(0)，FileStorage 的读取接口照常可用。
+    """
+
+    def __init__(self, upload_folder: str, max_bytes: int = None):
+        os.makedirs(upload_folder, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix='.ingest_', suffix='.part', dir=upload_folder)
+        self._file = os.fdopen(fd, 'w+b')
+        self.max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+        self.size = 0
+        self.image_type = None
+        self._digest = hashlib.sha256()
+        self._header = b''
+        self._committed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadRejected(f"图片太大，请上传小于 {self.max_bytes // (1024 * 1024)}MB 的图片", 413)
+        if self.image_type is None and len(self._header) < _HEADER_SIZE:
+            self._header += data[:_HEADER_SIZE - len(self._header)]
+            if len(self._header) >= _HEADER_SIZE:
+                self._check_header()
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _check_header(self):
+        self.image_type = sniff_image_type(self._header)
+        if self.image_type is None:
+            self.discard()
+            raise UploadRejected("只支持 PNG、JPG、GIF、BMP 格式的图片", 415)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def finish(self):
+        """接收完成：检查不足一个文件头长度的小文件，返回临时文件路径"""
+        if self.image_type is None:
+            self._check_header()
+        self._file.flush()
+        return self.temp_path
+
+    def commit(self):
+        """临时文件已被移走或复用，关闭时不再删除"""
+        self._committed = True
+
+    def discard(self):
+        """关闭并删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        if not self._committed and os.path.exists(self.temp_path):
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+
+    def close(self):
+        # 请求结束时werkzeug关闭所有上传文件；没有被ingest()使用的临时文件在这里删除
+        self.discard()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __getattr__(self, name):
+        # read / readline / seek / tell 等直接交给临时文件
+        return getattr(self._file, name)
+
+
+@dataclass
+class IngestedUpload:
+    """保存好的上传文件"""
+    path: str
+    sha256: str
+    size: int
+    format: str
+    reused: bool
+
+
+def _copy_into_stream(file_storage, upload_folder: str) -> IngestStream:
+    """上传文件不是由 IngestStream 接收时（例如直接构造的FileStorage），补一次流式复制"""
+    stream = IngestStream(upload_folder)
+    source = file_storage.stream
+    source.seek(0)
+    for chunk in iter(lambda: source.read(64 * 1024), b''):
+        stream.write(chunk)
+    return stream
+
+
+def ingest(file_storage, upload_folder: str, prefix: str = 'sketch') -> IngestedUpload:
+    """保存上传的图片，内容相同的文件只保存一份；不符合要求时抛出UploadRejected"""
+    stream = file_storage.stream
+    if not isinstance(stream, IngestStream):
+        stream = _copy_into_stream(file_storage, upload_folder)
+
+    try:
+        temp_path = stream.finish()
+        image_format, extension = stream.image_type
+        try:
+            with Image.open(temp_path) as img:
+                width, height = img.size
+                actual_format = img.format
+        except Exception as e:
+            # 包括 Image.DecompressionBombError
+            raise UploadRejected(f"无法识别的图片文件: {str(e)}", 415)
+        if actual_format != image_format:
+            raise UploadRejected("图片内容与文件格式不符", 415)
+        if width * height > max_upload_pixels():
+            raise UploadRejected(f"图片尺寸太大（{width}×{height}），请缩小后再上传", 413)
+
+        sha256 = stream.sha256
+        path = os.path.join(upload_folder, f"{prefix}_{sha256[:32]}.{extension}")
+        reused = os.path.exists(path)
+        if reused:
+            # 更新修改时间，表示这份文件仍在使用
+            os.utime(path)
+            logger.info(f"♻️ 复用内容相同的已上传图片: {path}")
+        else:
+            stream._file.close()
+            os.replace(temp_path, path)
+            stream.commit()
+            logger.debug("📥 已保存上传图片 %s（%d 字节）", path, stream.size)
+        return IngestedUpload(path=path, sha256=sha256, size=stream.size, format=image_format, reused=reused)
+    finally:
+        stream.discard()
+
+
+def derived_path(source_path: str, suffix: str, extension: str = None) -> str:
+    """由原图派生的文件路径（如预处理结果），原图按内容命名时派生文件也随之复用"""
+    root, ext = os.path.splitext(source_path)
+    return f"{root}_{suffix}{'.' + extension if extension else ext}"
+
+
+def atomic_temp_path(path: str) -> str:
+    """与目标文件同目录、同扩展名的临时文件路径（写完后 os.replace 到目标）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{uuid.uuid4().hex[:8]}.tmp{ext}"
+
+
+def init_app(app):
+    """让表单解析把上传文件直接流式写入 IngestStream"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    class IngestRequest(app.request_class):
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            return IngestStream(upload_folder)
+
+    app.request_class = IngestRequest
@@ -3,7 +3,9 @@ import os
 from datetime import datetime
 import uuid
 import shutil
+import threading
 from typing import List, Dict, Optional
+from json_store import atomic_write_json, locked
 
 class VersionManager:
     """作品版本管理器，支持图片和3D模型的版本控制和回退"""
@@ -11,6 +13,7 @@ class VersionManager:
     def __init__(self, base_folder='static/gallery'):
         self.base_folder = base_folder
         self.versions_file = 'artwork_versions.json'
+        self._lock = threading.RLock()
         self.ensure_directories()
     
     def ensure_directories(self):
@@ -29,9 +32,9 @@ class VersionManager:
     
     def save_versions_data(self, data: List[Dict]):
         """保存版本数据"""
-        with open(self.versions_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        atomic_write_json(self.versions_file, data)
     
+    @locked
     def create_version(self, artwork_id: str, image_path: str = None, model_path: str = None, 
                       version_note: str = "", auto_note: str = "") -> Dict:
         """
@@ -107,6 +110,7 @@ class VersionManager:
         
         return artwork_versions
     
+    @locked
     def set_current_version(self, artwork_id: str, version_id: str) -> Dict:
         """设置当前版本（回退功能）"""
         try:
@@ -170,6 +174,7 @@ class VersionManager:
         
         return None
     
+    @locked
     def delete_version(self, artwork_id: str, version_id: str) -> Dict:
         """删除指定版本"""
         try:
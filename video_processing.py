@@ -0,0 +1,207 @@
+"""
+视频处理 - 为生成的视频提取封面图，并转出一段低分辨率的预览视频
+
+Veo生成的视频是720p/1080p的完整MP4，作品集列表和视频页以前都直接加载完整文件。
+视频下载完成后在这里用OpenCV处理：
+
+    1. 封面：取第 VIDEO_POSTER_SECOND 秒的画面，缩小到 VIDEO_POSTER_WIDTH 宽，保存为 <视频名>_poster.jpg
+    2. 预览：前 VIDEO_PREVIEW_SECONDS 秒按 VIDEO_PREVIEW_FPS 抽帧，缩小到 VIDEO_PREVIEW_WIDTH 宽，
+       优先编码为H.264的MP4，当前OpenCV不支持时使用VP8的WebM（浏览器都能播放），保存为 <视频名>_preview.mp4/.webm
+    3. 统计时长、分辨率、帧率和文件大小
+
+列表页只加载封面，预览视频用于作品集中的自动播放，点击后才加载完整视频。
+视频无法解码时返回None，不影响视频生成流程。
+
+环境变量：
+    VIDEO_PROCESSING_ENABLED   是否生成封面和预览，默认 true
+    VIDEO_POSTER_WIDTH         封面宽度，默认 640
+    VIDEO_POSTER_SECOND        封面取第几秒的画面，默认 0.5
+    VIDEO_PREVIEW_WIDTH        预览视频宽度，默认 320
+    VIDEO_PREVIEW_SECONDS      预览视频时长（秒），默认 4
+    VIDEO_PREVIEW_FPS          预览视频帧率，默认 12
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Optional
+
+from startup import lazy_import
+from upload_ingest import derived_path, atomic_temp_path
+
+logger = logging.getLogger(__name__)
+
+# 依次尝试的预览编码：(FourCC, 扩展名)
+PREVIEW_CODECS = (
+    ('avc1', 'mp4'),
+    ('VP80', 'webm'),
+)
+
+_codec_lock = threading.Lock()
+_working_codec = None
+
+
+def processing_enabled() -> bool:
+    return os.getenv('VIDEO_PROCESSING_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def poster_path(video_path: str) -> str:
+    """封面图路径（与视频同目录）"""
+    return derived_path(video_path, 'poster', 'jpg')
+
+
+def find_renditions(video_path: str) -> Dict[str, Optional[str]]:
+    """查找已经生成的封面和预览视频"""
+    poster = poster_path(video_path)
+    preview = None
+    for _, extension in PREVIEW_CODECS:
+        candidate = derived_path(video_path, 'preview', extension)
+        if os.path.exists(candidate):
+            preview = candidate
+            break
+    return {'poster': poster if os.path.exists(poster) else None, 'preview': preview}
+
+
+def _scaled_size(width: int, height: int, target_width: int):
+    """按宽度等比缩小（不放大），宽高取偶数，方便视频编码"""
+    if width <= target_width:
+        target_width = width
+    target_height = max(2, int(round(height * target_width / width)))
+    return target_width - target_width % 2, target_height - target_height % 2
+
+
+def _open_writer(cv2, video_path: str, fps: float, size):
+    """按 PREVIEW_CODECS 的顺序打开视频写入器，记住第一个可用的编码"""
+    global _working_codec
+    with _codec_lock:
+        codecs = (_working_codec,) if _working_codec else PREVIEW_CODECS
+    for fourcc, extension in codecs:
+        path = derived_path(video_path, 'preview', extension)
+        temp_path = atomic_temp_path(path)
+        writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if writer.isOpened():
+            with _codec_lock:
+                _working_codec = (fourcc, extension)
+            return writer, temp_path, path
+        writer.release()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return None, None, None
+
+
+def _write_poster(cv2, capture, video_path: str, fps: float, frame_count: int, width: int, height: int):
+    second = float(os.getenv('VIDEO_POSTER_SECOND', '0.5'))
+    frame_index = min(int(second * fps), max(frame_count - 1, 0))
+    capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    ok, frame = capture.read()
+    if not ok:
+        # 部分容器不支持按帧定位，退回到第一帧
+        capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ok, frame = capture.read()
+    if not ok:
+        return None
+
+    size = _scaled_size(width, height, int(os.getenv('VIDEO_POSTER_WIDTH', '640')))
+    if size != (width, height):
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    path = poster_path(video_path)
+    temp_path = atomic_temp_path(path)
+    if not cv2.imwrite(temp_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+        # 写入失败时可能留下不完整的临时文件，垃圾回收不认识它
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+    os.replace(temp_path, path)
+    return path
+
+
+def _write_preview(cv2, capture, video_path: str, fps: float, width: int, height: int):
+    preview_fps = float(os.getenv('VIDEO_PREVIEW_FPS', '12'))
+    seconds = float(os.getenv('VIDEO_PREVIEW_SECONDS', '4'))
+    size = _scaled_size(width, height, int(os.getenv('VIDEO_PREVIEW_WIDTH', '320')))
+    step = max(fps / preview_fps, 1.0)
+    output_fps = fps / step
+
+    writer, temp_path, path = _open_writer(cv2, video_path, output_fps, size)
+    if writer is None:
+        logger.warning("⚠️ 当前OpenCV没有可用的视频编码器，只生成封面")
+        return None
+
+    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    written = 0
+    next_frame = 0.0
+    frame_index = 0
+    last_frame = int(seconds * fps)
+    try:
+        while frame_index < last_frame:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if frame_index >= next_frame:
+                writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+                written += 1
+                next_frame += step
+            frame_index += 1
+    finally:
+        writer.release()
+
+    if not written:
+        os.remove(temp_path)
+        return None
+    os.replace(temp_path, path)
+    return path
+
+
+def process_video(video_path: str, reuse_existing: bool = False) -> Optional[Dict]:
+    """
+    生成封面和预览视频，返回
+    {'duration', 'width', 'height', 'fps', 'bytes', 'poster': 路径或None, 'preview': 路径或None, 'preview_bytes'}；
+    reuse_existing 时已有的封面和预览直接使用。视频无法打开时返回None。
+    """
+    try:
+        cv2 = lazy_import('cv2')
+    except ImportError:
+        logger.warning("⚠️ 未安装OpenCV，跳过视频处理")
+        return None
+
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            logger.warning(f"⚠️ 无法打开视频 {video_path}")
+            return None
+        fps = capture.get(cv2.CAP_PROP_FPS) or 24.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if not width or not height:
+            logger.warning(f"⚠️ 视频 {video_path} 没有可解码的画面")
+            return None
+
+        info = {
+            'duration': round(frame_count / fps, 2) if frame_count else None,
+            'width': width,
+            'height': height,
+            'fps': round(fps, 2),
+            'bytes': os.path.getsize(video_path),
+            'poster': None,
+            'preview': None,
+            'preview_bytes': None,
+        }
+        existing = find_renditions(video_path) if reuse_existing else {'poster': None, 'preview': None}
+        info.update(existing)
+        if not processing_enabled():
+            return info
+
+        if not info['poster']:
+            info['poster'] = _write_poster(cv2, capture, video_path, fps, frame_count, width, height)
+        if not info['preview']:
+            info['preview'] = _write_preview(cv2, capture, video_path, fps, width, height)
+        if info['preview']:
+            info['preview_bytes'] = os.path.getsize(info['preview'])
+        logger.info(f"🎞️ 视频处理完成 {video_path}：封面 {info['poster']}，预览 {info['preview']}")
+        return info
+    except Exception as e:
+        logger.warning(f"⚠️ 视频处理失败 {video_path}: {str(e)}")
+        return None
+    finally:
+        capture.release()